@@ -3,9 +3,10 @@ from datetime import datetime, timedelta
 from Appointment.models import Appoint
 from Appointment.utils.log import logger
 from Appointment.appoint.status_control import start_appoint, finish_appoint
-from Appointment.extern.jobs import remove_appoint_reminder
+from Appointment.extern.jobs import appoint_reminder_id
 from scheduler.adder import ScheduleAdder
-from scheduler.cancel import remove_job
+from scheduler.executors import REALTIME
+from scheduler.cancel import remove_jobs
 
 
 @logger.secure_func('设置预约定时任务出错', fail_value=False)
@@ -34,28 +35,42 @@ def set_scheduler(appoint: Appoint) -> bool:
 
     if not (has_started and appoint.Astatus == Appoint.Status.PROCESSING):
         ScheduleAdder(start_appoint, id=f'{appoint.pk}_start',
-                      run_time=start)(appoint.pk)
+                      run_time=start, executor=REALTIME)(appoint.pk)
 
     ScheduleAdder(finish_appoint, id=f'{appoint.pk}_finish',
-                  run_time=finish)(appoint.pk)
+                  run_time=finish, executor=REALTIME)(appoint.pk)
     return True
 
 
+def _appoint_job_ids(aid: int) -> list[str]:
+    return [f'{aid}_finish', f'{aid}_start', appoint_reminder_id(aid)]
+
+
 def cancel_scheduler(appoint: Appoint | int, record_miss: bool = False) -> bool:
     '''
     取消预约的定时任务，不抛出异常
 
     Hint:
-        如果结束任务不存在，则不会处理其它任务
+        结束、开始和提醒任务一次删除，返回结束任务是否存在
     '''
     aid = appoint.pk if isinstance(appoint, Appoint) else appoint
-    if not remove_job(f'{aid}_finish'):
+    removed = remove_jobs(_appoint_job_ids(aid))
+    if f'{aid}_finish' not in removed:
         if record_miss:
             logger.warning(f"预约{aid}取消时未发现计时器")
         return False
 
-    if not remove_job(f'{aid}_start') and record_miss:
+    if f'{aid}_start' not in removed and record_miss:
         logger.warning(f"预约{aid}取消时未发现开始计时器")
-    if not remove_appoint_reminder(aid) and record_miss:
+    if appoint_reminder_id(aid) not in removed and record_miss:
         logger.info(f"预约{aid}取消时未发现微信提醒")
     return True
+
+
+def cancel_schedulers(appoints: list[Appoint | int]) -> int:
+    '''批量取消预约的定时任务，只访问一次任务存储，不抛出异常，返回删除的任务数'''
+    job_ids = []
+    for appoint in appoints:
+        aid = appoint.pk if isinstance(appoint, Appoint) else appoint
+        job_ids.extend(_appoint_job_ids(aid))
+    return len(remove_jobs(job_ids))
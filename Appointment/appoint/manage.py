@@ -192,11 +192,13 @@ def create_appoint(
 
 
 @transaction.atomic
-def cancel_appoint(appoint: Appoint, record: bool = True, lock: bool = True):
-    '''原子化取消预约，不加锁时使用原对象'''
+def cancel_appoint(appoint: Appoint, record: bool = True, lock: bool = True,
+                   cancel_jobs: bool = True):
+    '''原子化取消预约，不加锁时使用原对象，批量取消时可由调用者统一取消定时任务'''
     if lock:
         appoint = Appoint.objects.select_for_update().get(pk=appoint.pk)
     appoint.Astatus = Appoint.Status.CANCELED
     appoint.save()
-    cancel_scheduler(appoint, record_miss=record)
+    if cancel_jobs:
+        cancel_scheduler(appoint, record_miss=record)
     get_user_logger(appoint).info(f"预约{appoint.pk}已取消")
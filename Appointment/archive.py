@@ -0,0 +1,222 @@
+'''预约归档
+
+定期清理的预约在删除前按主键分块写入gzip压缩的JSON Lines文件，
+每个归档目录包含若干数据文件和一个记录文件列表、行数和校验和的清单：
+
+    <archive_dir>/<时间戳>/
+        manifest.json
+        appoint-00001.jsonl.gz
+        appoint-00002.jsonl.gz
+        ...
+
+每行是一个Django序列化对象，包括预约（含参与者）及随之级联删除的长期预约。
+每块写入文件并更新清单后，在单独的短事务中删除，中途失败时已归档的批次不受影响。
+
+See Also:
+    - :func:`Appointment.jobs.clear_appointments`: 定期归档一周前的预约
+    - :module:`Appointment.management.commands.restore_appointments`: 从归档恢复
+'''
+import os
+import json
+import gzip
+import hashlib
+from datetime import datetime, time
+from typing import Any, Iterable
+
+from django.db import transaction
+from django.db.models import Model
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+
+from boot.config import absolute_path
+from Appointment.config import appointment_config as CONFIG
+from Appointment.models import Appoint, LongTermAppoint
+
+
+__all__ = [
+    'ArchiveError',
+    'archive_appoints',
+    'read_manifest',
+    'restore_archive',
+]
+
+
+MANIFEST = 'manifest.json'
+FORMAT_VERSION = 1
+
+
+class ArchiveError(Exception):
+    '''归档文件缺失、损坏或格式不正确'''
+
+
+class _ArchiveEncoder(DjangoJSONEncoder):
+    # DjangoJSONEncoder将时间截断至毫秒，归档需保留完整精度
+    def default(self, o):
+        if isinstance(o, (datetime, time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _atomic_write(path: str, write) -> None:
+    '''写入临时文件后替换，保证文件要么完整要么不存在'''
+    tmp_path = path + '.tmp'
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def _write_manifest(directory: str, manifest: dict[str, Any]) -> None:
+    def write(path: str):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+    _atomic_write(os.path.join(directory, MANIFEST), write)
+
+
+def _write_chunk(path: str, objects: Iterable[Model]) -> int:
+    rows = 0
+
+    def write(tmp_path: str):
+        nonlocal rows
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            for record in serializers.serialize('python', objects):
+                f.write(json.dumps(record, cls=_ArchiveEncoder, ensure_ascii=False))
+                f.write('\n')
+                rows += 1
+        with open(tmp_path, 'rb') as f:
+            os.fsync(f.fileno())
+    _atomic_write(path, write)
+    return rows
+
+
+def _chunk_objects(ids: list[int]) -> list[Model]:
+    '''一块预约及删除预约时级联删除的对象，预约在前以便按顺序恢复'''
+    appoints = Appoint.objects.filter(Aid__in=ids).order_by('Aid').prefetch_related(
+        'students')
+    longterms = LongTermAppoint.objects.filter(appoint__in=ids).order_by('pk')
+    return [*appoints, *longterms]
+
+
+def archive_appoints(before: datetime, chunk_size: int | None = None,
+                     directory: str | None = None) -> tuple[str | None, int]:
+    '''
+    将结束时间不晚于before的预约归档后删除
+
+    :param before: 结束时间不晚于该时间的预约将被归档
+    :type before: datetime
+    :param chunk_size: 每个文件的预约数，默认使用配置, defaults to None
+    :type chunk_size: int | None, optional
+    :param directory: 归档目录，默认在配置的目录下按时间新建, defaults to None
+    :type directory: str | None, optional
+    :return: 归档目录和归档的预约数，没有需要归档的预约时不创建目录
+    :rtype: tuple[str | None, int]
+    '''
+    if chunk_size is None:
+        chunk_size = CONFIG.archive_chunk_size
+    archivable = Appoint.objects.filter(Afinish__lte=before).order_by('Aid')
+    if directory is None:
+        directory = os.path.join(absolute_path(CONFIG.archive_dir),
+                                 datetime.now().strftime('%Y%m%d-%H%M%S'))
+    manifest = dict(
+        version=FORMAT_VERSION,
+        created=datetime.now().isoformat(timespec='seconds'),
+        before=before.isoformat(timespec='seconds'),
+        total=0,
+        files=[],
+        complete=False,
+    )
+    last_id = 0
+    while True:
+        ids = list(archivable.filter(Aid__gt=last_id)
+                   .values_list('Aid', flat=True)[:chunk_size])
+        if not ids:
+            break
+        if not manifest['files']:
+            os.makedirs(directory, exist_ok=True)
+        name = f'appoint-{len(manifest["files"]) + 1:05d}.jsonl.gz'
+        path = os.path.join(directory, name)
+        rows = _write_chunk(path, _chunk_objects(ids))
+        manifest['files'].append(dict(
+            name=name, rows=rows, appoints=len(ids),
+            first=ids[0], last=ids[-1], sha256=_sha256(path),
+        ))
+        manifest['total'] += len(ids)
+        # 先记录清单再删除，保证删除的数据都能找到
+        _write_manifest(directory, manifest)
+        with transaction.atomic():
+            Appoint.objects.filter(Aid__in=ids).delete()
+        last_id = ids[-1]
+        if len(ids) < chunk_size:
+            break
+    if not manifest['files']:
+        return None, 0
+    manifest['complete'] = True
+    _write_manifest(directory, manifest)
+    return directory, manifest['total']
+
+
+def read_manifest(directory: str, verify: bool = True) -> dict[str, Any]:
+    '''
+    读取归档清单，并检查数据文件是否存在及校验和是否一致
+
+    :raises ArchiveError: 清单或数据文件缺失、校验和不一致
+    '''
+    try:
+        with open(os.path.join(directory, MANIFEST), encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ArchiveError(f'无法读取归档清单: {e}')
+    if manifest.get('version') != FORMAT_VERSION:
+        raise ArchiveError(f'不支持的归档版本: {manifest.get("version")}')
+    if not verify:
+        return manifest
+    for file in manifest['files']:
+        path = os.path.join(directory, file['name'])
+        if not os.path.exists(path):
+            raise ArchiveError(f'归档文件缺失: {file["name"]}')
+        if _sha256(path) != file['sha256']:
+            raise ArchiveError(f'归档文件校验失败: {file["name"]}')
+    return manifest
+
+
+def _read_chunk(path: str) -> list[dict[str, Any]]:
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def restore_archive(directory: str, dry_run: bool = False) -> int:
+    '''
+    校验归档后恢复其中的预约，已存在的对象跳过，每个文件在单独的事务中恢复
+
+    :param directory: 归档目录
+    :type directory: str
+    :param dry_run: 只校验不写入, defaults to False
+    :type dry_run: bool, optional
+    :raises ArchiveError: 归档文件缺失或损坏
+    :return: 恢复的预约数，dry_run时为可恢复的预约数
+    :rtype: int
+    '''
+    manifest = read_manifest(directory)
+    restored = 0
+    for file in manifest['files']:
+        records = _read_chunk(os.path.join(directory, file['name']))
+        if len(records) != file['rows']:
+            raise ArchiveError(f'归档文件行数不一致: {file["name"]}')
+        with transaction.atomic():
+            for obj in serializers.deserialize('python', records):
+                model = type(obj.object)
+                if model._default_manager.filter(pk=obj.object.pk).exists():
+                    continue
+                if model is Appoint:
+                    restored += 1
+                if not dry_run:
+                    obj.save()
+    return restored
@@ -0,0 +1,202 @@
+'''刷卡记录的延迟写入
+
+门禁接口只需判断是否开门，刷卡记录仅用于审计，不应让开门等待数据库写入。
+刷卡记录先放入进程内的缓冲区，由后台线程每累积若干条或每隔一段时间批量写入，
+进程退出时写入剩余记录。
+
+数据库不可用或缓冲区已满时，记录以JSON Lines格式写入本地溢出文件，
+下次批量写入成功后自动补写并删除溢出文件，补写前以改名认领文件，各进程不会重复补写。
+
+See Also:
+    - :func:`Appointment.hardware_api.door_check`
+'''
+import os
+import json
+import atexit
+import threading
+from datetime import datetime
+from typing import Any
+
+from django.db import close_old_connections, transaction
+
+from boot.config import absolute_path
+from Appointment.config import appointment_config as CONFIG
+from Appointment.models import CardCheckInfo, Room, Participant
+from Appointment.utils.log import logger
+
+
+__all__ = [
+    'CardCheckBuffer',
+    'cardcheck_buffer',
+    'record_cardcheck',
+]
+
+
+class CardCheckBuffer:
+    '''刷卡记录的有界缓冲区
+
+    Attributes:
+        flush_size (int): 累积该数量的记录后立即写入
+        interval (float): 最长写入间隔（秒）
+        max_pending (int): 缓冲区容量，超出的记录直接写入溢出文件
+        spill_dir (str): 溢出文件目录
+    '''
+    def __init__(self, flush_size: int, interval: float, max_pending: int,
+                 spill_dir: str, background: bool = True):
+        self.flush_size = flush_size
+        self.interval = interval
+        self.max_pending = max_pending
+        self.spill_dir = spill_dir
+        self.background = background
+        self._pending: list[CardCheckInfo] = []
+        self._lock = threading.Lock()
+        # 保证同一时间只有一个线程写入数据库和读写溢出文件
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker: threading.Thread | None = None
+        self._pid: int | None = None
+        self._exit_hook = False
+
+    def add(self, record: CardCheckInfo) -> None:
+        '''放入一条记录，不访问数据库'''
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                overflow = True
+            else:
+                overflow = False
+                self._pending.append(record)
+            full = len(self._pending) >= self.flush_size
+        if overflow:
+            self.spill([record])
+        if self.background:
+            self._ensure_worker()
+            if full:
+                self._wakeup.set()
+
+    def _ensure_worker(self) -> None:
+        # 多进程服务器在fork后启动工作进程，线程需在子进程中重新创建
+        if self._worker is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._worker is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._worker = threading.Thread(
+                target=self._run, name='cardcheck-writer', daemon=True)
+            self._worker.start()
+            # fork得到的子进程继承父进程的退出回调，只注册一次
+            if not self._exit_hook:
+                atexit.register(self.flush)
+                self._exit_hook = True
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            # 工作线程长期持有连接，写入前后清理失效的连接
+            close_old_connections()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+    def flush(self) -> int:
+        '''
+        写入缓冲区中的记录，失败时写入溢出文件，成功后补写已有的溢出文件
+
+        :return: 写入数据库的记录数
+        :rtype: int
+        '''
+        with self._flush_lock:
+            with self._lock:
+                records, self._pending = self._pending, []
+            try:
+                if records:
+                    CardCheckInfo.objects.bulk_create(records)
+            except Exception as e:
+                logger.warning(f'刷卡记录写入失败，已写入溢出文件: {e}')
+                self.spill(records)
+                return 0
+            try:
+                return len(records) + self._replay()
+            except Exception as e:
+                logger.warning(f'刷卡记录溢出文件补写失败: {e}')
+                return len(records)
+
+    @staticmethod
+    def _dump(record: CardCheckInfo) -> dict[str, Any]:
+        return {
+            field.attname: getattr(record, field.attname)
+            for field in CardCheckInfo._meta.concrete_fields
+            if not field.primary_key
+        }
+
+    def spill(self, records: list[CardCheckInfo]) -> None:
+        '''将记录写入新的溢出文件，写完后改名，补写时不会读到不完整的文件'''
+        if not records:
+            return
+        os.makedirs(self.spill_dir, exist_ok=True)
+        name = f'{datetime.now():%Y%m%d-%H%M%S-%f}-{os.getpid()}-{threading.get_ident()}'
+        path = os.path.join(self.spill_dir, name)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(self._dump(record), default=str, ensure_ascii=False))
+                f.write('\n')
+        os.replace(path + '.tmp', path + '.jsonl')
+
+    def _replay(self) -> int:
+        '''
+        补写溢出文件，写入成功的文件删除
+
+        多个工作进程共享溢出目录，补写前将文件改名为.replaying认领，
+        改名失败说明已被其它进程认领，跳过；写入失败时改回原名，留待下次补写
+        '''
+        if not os.path.isdir(self.spill_dir):
+            return 0
+        written = 0
+        for name in sorted(os.listdir(self.spill_dir)):
+            if not name.endswith('.jsonl'):
+                continue
+            path = os.path.join(self.spill_dir, name)
+            claimed = path[:-len('.jsonl')] + '.replaying'
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue
+            try:
+                with open(claimed, encoding='utf-8') as f:
+                    records = [CardCheckInfo(**json.loads(line)) for line in f if line.strip()]
+                for record in records:
+                    if isinstance(record.Cardtime, str):
+                        record.Cardtime = datetime.fromisoformat(record.Cardtime)
+                with transaction.atomic():
+                    CardCheckInfo.objects.bulk_create(records)
+            except Exception:
+                os.rename(claimed, path)
+                raise
+            # 事务已提交，删除认领的文件
+            os.remove(claimed)
+            written += len(records)
+        return written
+
+
+cardcheck_buffer = CardCheckBuffer(
+    CONFIG.cardcheck_flush_size,
+    CONFIG.cardcheck_flush_interval,
+    CONFIG.cardcheck_max_pending,
+    absolute_path(CONFIG.cardcheck_spill_dir),
+)
+
+
+def record_cardcheck(user: Participant | None, room: Room, real_status,
+                     message: str | None = None) -> None:
+    '''记录一次刷卡，记录时间为调用时间，默认延迟写入'''
+    record = CardCheckInfo(
+        Cardroom=room, Cardstudent=user,
+        CardStatus=real_status, Message=message,
+        Cardtime=datetime.now(),
+    )
+    if CONFIG.cardcheck_write_behind:
+        cardcheck_buffer.add(record)
+    else:
+        record.save()
@@ -24,6 +24,19 @@ class AppointmentConfig(Config):
 
     # 是否清除一周前的预约
     delete_appoint_weekly = False
+    # 清除的预约归档目录和每个归档文件的预约数
+    archive_dir = LazySetting('archive/dir', default='./logstore/appoint_archive')
+    archive_chunk_size = LazySetting('archive/chunk_size', default=500)
+
+    # 刷卡记录是否延迟批量写入，及每批条数、最长间隔（秒）和缓冲区容量
+    cardcheck_write_behind = LazySetting('cardcheck/write_behind', default=True)
+    cardcheck_flush_size = LazySetting('cardcheck/flush_size', default=50)
+    cardcheck_flush_interval = LazySetting('cardcheck/flush_interval', default=5,
+                                           type=(int, float))
+    cardcheck_max_pending = LazySetting('cardcheck/max_pending', default=2000)
+    # 数据库不可用时刷卡记录的溢出目录
+    cardcheck_spill_dir = LazySetting('cardcheck/spill_dir',
+                                      default='./logstore/cardcheck_spill')
 
     # 表示当天预约时放宽的人数下限
     today_min = 2
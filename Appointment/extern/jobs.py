@@ -9,10 +9,12 @@ from scheduler.cancel import remove_job
 __all__ = [
     'set_appoint_reminder',
     'remove_appoint_reminder',
+    'appoint_reminder_id',
 ]
 
 
-def _remind_job_id(appoint_id: int) -> str:
+def appoint_reminder_id(appoint_id: int) -> str:
+    '''预约开始前提醒的任务ID，用于批量取消'''
     return f'{appoint_id}_appoint_remind'
 
 
@@ -28,10 +30,10 @@ def set_appoint_reminder(appoint: Appoint, students_id: list[str] | None = None,
     else:
         job_time = appoint.Astart - timedelta(minutes=15)
     notify_appoint(appoint, MessageType.REMIND, students_id=students_id,
-                   id=_remind_job_id(appoint.Aid), job_time=job_time)
+                   id=appoint_reminder_id(appoint.Aid), job_time=job_time)
     return True
 
 
 def remove_appoint_reminder(appoint_id: int, no_except: bool = True):
     '''取消预约开始前的提醒，不进行任何日志记录，返回值同`remove_job`'''
-    return remove_job(_remind_job_id(appoint_id), no_except=no_except)
+    return remove_job(appoint_reminder_id(appoint_id), no_except=no_except)
@@ -6,7 +6,8 @@ from django.http import JsonResponse, HttpRequest
 from django.db.models import QuerySet
 from django.db import transaction
 
-from Appointment.models import Room, Appoint, Participant, CardCheckInfo
+from Appointment.models import Room, Appoint
+from Appointment.cardcheck import record_cardcheck
 from Appointment.extern.wechat import notify_user
 from Appointment.utils.utils import (
     door2room, ip2room,
@@ -50,13 +51,6 @@ def _update_camera_check_state(appoint: Appoint, current_num: int, refresh=False
     appoint.save()
 
 
-def _record_cardcheck(user: Participant | None, room: Room, real_status, message=None):
-    CardCheckInfo.objects.create(
-        Cardroom=room, Cardstudent=user,
-        CardStatus=real_status, Message=message
-    )
-
-
 def _doorid2room(DoorId: str) -> Room | None:
     """什么破东西，懒得改了"""
     try:
@@ -193,11 +187,11 @@ def door_check(request: HttpRequest):
 
     # --------- 对接接口 --------- #
     def _open(message: str):
-        _record_cardcheck(student, room, True, message)
+        record_cardcheck(student, room, True, message)
         return JsonResponse({"code": 0, "openDoor": "true"}, status=200)
 
     def _fail(message: str):
-        _record_cardcheck(student, room, False, message)
+        record_cardcheck(student, room, False, message)
         return JsonResponse({"code": 1, "openDoor": "false"}, status=400)
 
     # --------- 基本信息 --------- #
@@ -5,12 +5,14 @@ from datetime import datetime, timedelta
 from django.db import transaction
 
 from Appointment.appoint.jobs import set_scheduler
+from Appointment.archive import archive_appoints
 from Appointment.config import appointment_config as CONFIG
 from Appointment.extern.jobs import set_appoint_reminder
 from Appointment.models import Appoint
-from Appointment.utils.log import get_user_logger, logger, write_before_delete
+from Appointment.utils.log import get_user_logger, logger
 from Appointment.utils.utils import get_conflict_appoints
 from scheduler.periodic import periodical
+from scheduler.executors import BATCH
 
 '''
 YWolfeee:
@@ -25,21 +27,18 @@ __all__ = [
 ]
 
 
-# 每周清除预约的程序，会写入logstore中
+# 每周清除预约的程序，删除前归档至archive_dir中
 @periodical('cron', 'clear_appointments', day_of_week='sat',
-            hour=3, minute=30, second=0,)
+            hour=3, minute=30, second=0, executor=BATCH)
 def clear_appointments():
     if CONFIG.delete_appoint_weekly:   # 是否清除一周之前的预约
-        appoints_to_delete = Appoint.objects.filter(
-            Afinish__lte=datetime.now()-timedelta(days=7))
         try:
-            write_before_delete(appoints_to_delete)  # 删除之前写在记录内
-            appoints_to_delete.delete()
+            directory, count = archive_appoints(datetime.now() - timedelta(days=7))
         except Exception as e:
             return logger.warning(f"定时删除任务出现错误: {e}")
 
         # 写入日志
-        logger.info("定时删除任务成功")
+        logger.info(f"定时删除任务成功，归档{count}条预约至{directory}")
 
 
 def get_longterm_display(times: int, interval_week: int, type: str = 'adj'):
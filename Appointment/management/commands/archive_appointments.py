@@ -0,0 +1,26 @@
+from datetime import datetime, timedelta
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from Appointment.archive import archive_appoints
+
+
+class Command(BaseCommand):
+    help = "归档并删除已结束若干天的预约，可用restore_appointments恢复"
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument('-d', '--days', type=int, default=7,
+                            help='归档结束超过该天数的预约，默认7天')
+        parser.add_argument('--chunk-size', type=int, default=None,
+                            help='每个归档文件的预约数，默认使用配置')
+        parser.add_argument('-o', '--output', default=None,
+                            help='归档目录，默认在配置的目录下按时间新建')
+
+    def handle(self, *args, **options):
+        before = datetime.now() - timedelta(days=options['days'])
+        directory, count = archive_appoints(
+            before, options['chunk_size'], options['output'])
+        if directory is None:
+            self.stdout.write('没有需要归档的预约')
+        else:
+            self.stdout.write(f'已归档{count}条预约至{directory}')
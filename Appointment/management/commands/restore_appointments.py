@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from Appointment.archive import ArchiveError, restore_archive
+
+
+class Command(BaseCommand):
+    help = "校验归档的清单和校验和，并恢复其中的预约，已存在的预约跳过"
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument('directory', help='归档目录，包含manifest.json')
+        parser.add_argument('--dry-run', action='store_true', help='只校验，不写入数据库')
+
+    def handle(self, *args, **options):
+        try:
+            count = restore_archive(options['directory'], options['dry_run'])
+        except ArchiveError as e:
+            raise CommandError(str(e))
+        if options['dry_run']:
+            self.stdout.write(f'校验通过，可恢复{count}条预约')
+        else:
+            self.stdout.write(f'已恢复{count}条预约')
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:26
+
+import datetime
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Appointment', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cardcheckinfo',
+            name='Cardtime',
+            field=models.DateTimeField(default=datetime.datetime.now, editable=False, verbose_name='刷卡时间'),
+        ),
+    ]
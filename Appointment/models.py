@@ -1,4 +1,4 @@
-from datetime import timedelta
+from datetime import datetime, timedelta
 from typing import cast
 
 from django.db import models
@@ -378,7 +378,8 @@ class CardCheckInfo(models.Model):
     Cardstudent: Participant = models.ForeignKey(
         Participant, on_delete=models.CASCADE, verbose_name='刷卡者',
         null=True, blank=True, db_index=True)
-    Cardtime = models.DateTimeField('刷卡时间', auto_now_add=True)
+    # 刷卡记录延迟写入，记录时间由刷卡时确定
+    Cardtime = models.DateTimeField('刷卡时间', default=datetime.now, editable=False)
 
     class Status(models.IntegerChoices):
         DOOR_CLOSE = 0, '不开门'  # 开门：否
@@ -463,6 +464,7 @@ class LongTermAppoint(models.Model):
         :rtype: int
         '''
         from Appointment.appoint.manage import cancel_appoint
+        from Appointment.appoint.jobs import cancel_schedulers
         with transaction.atomic():
             # 取消子预约
             appoints = self.sub_appoints(lock=True)
@@ -472,7 +474,8 @@ class LongTermAppoint(models.Model):
                 return appoints.delete()[0]
             count = len(appoints)
             for appoint in appoints:
-                cancel_appoint(appoint, record=True, lock=False)
+                cancel_appoint(appoint, record=True, lock=False, cancel_jobs=False)
+            cancel_schedulers(appoints)
             self.status = LongTermAppoint.Status.CANCELED
             self.save()
             return count
@@ -128,7 +128,7 @@ def summary(request):  # 主页
 
 def summary2021(request: HttpRequest):
     # 年度总结
-    from dm.summary import generic_info, person_info
+    from dm.summary import generic_info, load_person_summary
 
     base_dir = 'test_data'
 
@@ -150,7 +150,7 @@ def summary2021(request: HttpRequest):
 
     if user_accept and logged_in and not is_freshman:
         try:
-            infos.update(person_info(request.user))
+            infos.update(load_person_summary(request.user))
             with open(os.path.join(base_dir, 'rank_info.json')) as f:
                 rank_info = json.load(f)
                 sid = request.user.username
@@ -0,0 +1,62 @@
+import os
+import json
+import tempfile
+from datetime import datetime, time, timedelta
+
+from django.test import TestCase
+
+from app.models import User
+from Appointment.models import Room, Participant, Appoint, LongTermAppoint
+from Appointment.archive import ArchiveError, archive_appoints, restore_archive
+
+
+class ArchiveTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        users = [User.objects.create_user(f'{i}', f'学生{i}') for i in range(3)]
+        cls.participants = [Participant.objects.create(Sid=user) for user in users]
+        cls.room = Room.objects.create(Rid='B101', Rtitle='自习室',
+                                       Rstart=time(8), Rfinish=time(23))
+
+    def appoint(self, days: int) -> Appoint:
+        start = datetime.now().replace(microsecond=0) - timedelta(days=days)
+        appoint = Appoint.objects.create(
+            Room=self.room, major_student=self.participants[0], Astart=start,
+            Afinish=start + timedelta(hours=1), Ausage='学习', Aneed_num=2)
+        appoint.students.set(self.participants[:2])
+        return appoint
+
+    def snapshot(self):
+        return (list(Appoint.objects.order_by('Aid').values()),
+                sorted(Appoint.students.through.objects.values_list(
+                    'appoint', 'participant')),
+                list(LongTermAppoint.objects.values()))
+
+    def test_archive_restore(self):
+        '''分块归档后删除，恢复后与原数据一致'''
+        old = [self.appoint(10 + i) for i in range(5)]
+        recent = self.appoint(1)
+        LongTermAppoint.objects.create(appoint=old[1], applicant=self.participants[0])
+        expected = self.snapshot()
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            directory = os.path.join(tmpdir, 'archive')
+            before = datetime.now() - timedelta(days=7)
+            self.assertEqual(archive_appoints(before, 2, directory), (directory, 5))
+            self.assertEqual(list(Appoint.objects.all()), [recent])
+            self.assertFalse(LongTermAppoint.objects.exists())
+            with open(os.path.join(directory, 'manifest.json'), encoding='utf-8') as f:
+                manifest = json.load(f)
+            self.assertTrue(manifest['complete'])
+            self.assertEqual([file['appoints'] for file in manifest['files']], [2, 2, 1])
+            self.assertEqual(archive_appoints(before, 2, directory), (None, 0))
+
+            self.assertEqual(restore_archive(directory, dry_run=True), 5)
+            self.assertEqual(Appoint.objects.count(), 1)
+            self.assertEqual(restore_archive(directory), 5)
+            self.assertEqual(self.snapshot(), expected)
+            self.assertEqual(restore_archive(directory), 0)
+
+            with open(os.path.join(directory, manifest['files'][0]['name']), 'ab') as f:
+                f.write(b'\0')
+            self.assertRaises(ArchiveError, restore_archive, directory)
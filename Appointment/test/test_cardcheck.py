@@ -0,0 +1,80 @@
+import os
+import tempfile
+from datetime import datetime, time, timedelta
+from unittest import mock
+
+from django.db import DatabaseError
+from django.test import TestCase
+
+from app.models import User
+from Appointment.models import Room, Participant, CardCheckInfo
+from Appointment.cardcheck import CardCheckBuffer
+
+
+class CardCheckBufferTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.participant = Participant.objects.create(Sid=User.objects.create_user('0', '学生'))
+        cls.room = Room.objects.create(Rid='B101', Rtitle='自习室',
+                                       Rstart=time(8), Rfinish=time(23))
+
+    def setUp(self):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        self.spill_dir = tmpdir.name
+        self.buffer = CardCheckBuffer(3, 5, 4, self.spill_dir, background=False)
+        self.start = datetime.now().replace(microsecond=0) - timedelta(hours=1)
+
+    def add(self, count: int):
+        for i in range(count):
+            self.buffer.add(CardCheckInfo(
+                Cardroom=self.room, Cardstudent=self.participant, CardStatus=i % 2,
+                Message=f'刷卡{i}', Cardtime=self.start + timedelta(minutes=i)))
+
+    def test_flush(self):
+        '''批量写入时保留刷卡时间'''
+        self.add(2)
+        self.assertFalse(CardCheckInfo.objects.exists())
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(list(CardCheckInfo.objects.order_by('Cardtime').values_list(
+            'Cardtime', 'CardStatus')), [(self.start, 0), (self.start + timedelta(minutes=1), 1)])
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_spill(self):
+        '''数据库不可用或缓冲区已满时写入溢出文件，恢复后补写'''
+        self.add(6)
+        self.assertEqual(len(os.listdir(self.spill_dir)), 2)
+        with mock.patch.object(CardCheckInfo.objects, 'bulk_create',
+                               side_effect=DatabaseError):
+            self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(len(os.listdir(self.spill_dir)), 3)
+        self.assertFalse(CardCheckInfo.objects.exists())
+
+        self.add(1)
+        self.assertEqual(self.buffer.flush(), 7)
+        self.assertEqual(os.listdir(self.spill_dir), [])
+        self.assertEqual(sorted(CardCheckInfo.objects.values_list('Message', flat=True)),
+                         sorted([f'刷卡{i}' for i in range(6)] + ['刷卡0']))
+        self.assertEqual(CardCheckInfo.objects.filter(Cardtime=self.start).count(), 2)
+
+    def test_replay_claim(self):
+        '''已被其它进程认领的溢出文件不再补写，补写失败时文件恢复原名'''
+        self.buffer.spill([CardCheckInfo(
+            Cardroom=self.room, Cardstudent=self.participant, CardStatus=0,
+            Message='刷卡', Cardtime=self.start)])
+        name, = os.listdir(self.spill_dir)
+        path = os.path.join(self.spill_dir, name)
+        with mock.patch.object(CardCheckInfo.objects, 'bulk_create',
+                               side_effect=DatabaseError):
+            self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(os.listdir(self.spill_dir), [name])
+
+        claimed = path[:-len('.jsonl')] + '.replaying'
+        os.rename(path, claimed)
+        self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(os.listdir(self.spill_dir), [os.path.basename(claimed)])
+        self.assertFalse(CardCheckInfo.objects.exists())
+
+        os.rename(claimed, path)
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(os.listdir(self.spill_dir), [])
@@ -1,7 +1,4 @@
 import logging
-from datetime import datetime, timedelta
-
-from django.db.models import QuerySet
 
 from Appointment.models import (
     User,
@@ -18,7 +15,6 @@ from utils.inspect import find_caller
 
 
 __all__ = [
-    "write_before_delete",
     "logger",
     "get_user_logger",
 ]
@@ -27,23 +23,6 @@ __all__ = [
 
 
 
-class AppointRecordLogger(Logger):
-    def add_default_handler(self, name: str, *paths: str) -> None:
-        return super().add_default_handler(
-            name, 'appoint_record', *paths, format='%(message)s')
-
-
-def write_before_delete(appoint_list: QuerySet[Appoint]):
-    """每周定时删除预约的程序，用于减少系统内的预约数量"""
-    date = str(datetime.now().date())
-    logger = AppointRecordLogger.getLogger(date)
-    period_start = (datetime.now() - timedelta(days=7)).date()
-    logger.info(f"{period_start}~{date}")
-    for appoint in appoint_list.exclude(Astatus=Appoint.Status.CANCELED):
-        logger.info(appoint.toJson())
-    logger.info("end of file")
-
-
 class AppointmentLogger(Logger):
     def _log(self, level, msg, args, exc_info = None, extra = None, stack_info = False, stacklevel = 1) -> None:
         stacklevel = stacklevel + 1
@@ -2,7 +2,8 @@ import random
 from typing import List, Dict, Optional, Tuple
 from datetime import datetime, timedelta, date
 
-from django.db.models import QuerySet, Q
+from django.db import connection
+from django.db.models import QuerySet, Q, F, Max
 from django.forms.models import model_to_dict
 
 from generic.models import User, YQPointRecord
@@ -12,6 +13,7 @@ from app.models import (
     Pool,
     PoolItem,
     PoolRecord,
+    PoolSlot,
     Notification,
     Organization,
 )
@@ -25,6 +27,7 @@ __all__ = [
     'get_pools_and_items',
     'buy_exchange_item',
     'buy_lottery_pool',
+    'build_random_deck',
     'buy_random_pool',
     'run_lottery',
     'get_income_expenditure',
@@ -418,10 +421,64 @@ def select_random_prize(poolitems: QuerySet[PoolItem], select_num: Optional[int]
     return selected_items_id
 
 
+def build_random_deck(pool: Pool, rebuild: bool = False) -> int:
+    """
+    生成盲盒奖池的奖品序列：将剩余的每件奖品打乱后依次排列
+
+    :param pool: 盲盒奖池
+    :type pool: Pool
+    :param rebuild: 是否丢弃未抽出的部分并按当前剩余数量重新生成，修改奖品数量后使用，
+                    否则只在序列不存在时生成, defaults to False
+    :type rebuild: bool, optional
+    :return: 新生成的序列长度
+    :rtype: int
+    """
+    # 序列已生成时无需加锁，购买时不会在奖池上互相阻塞
+    if not rebuild and PoolSlot.objects.filter(pool_id=pool.id).exists():
+        return 0
+    with transaction.atomic():
+        # 锁定奖池，保证序列只生成一次
+        pool = Pool.objects.select_for_update().get(id=pool.id)
+        slots = PoolSlot.objects.filter(pool=pool)
+        if rebuild:
+            slots.filter(claimed=False).delete()
+        elif slots.exists():
+            return 0
+        deck = [item.id for item in pool.items.all()
+                for _ in range(item.origin_num - item.consumed_num)]
+        random.shuffle(deck)
+        start = (slots.aggregate(Max('order'))['order__max'] or 0) + 1
+        PoolSlot.objects.bulk_create([
+            PoolSlot(pool=pool, order=start + i, item_id=item_id)
+            for i, item_id in enumerate(deck)
+        ], batch_size=1000)
+        return len(deck)
+
+
+def _claim_random_slot(pool: Pool) -> Optional[PoolSlot]:
+    """
+    抽出序列中下一件奖品，已售罄时返回None
+
+    锁定读取时跳过其它事务正在抽取的位置，条件更新保证每个位置只被抽出一次，
+    不支持跳过锁的数据库在冲突时重试
+    """
+    slots = PoolSlot.objects.filter(pool=pool, claimed=False).order_by('order')
+    skip_locked = connection.features.has_select_for_update_skip_locked
+    while True:
+        slot = slots.select_for_update(skip_locked=skip_locked).first()
+        if slot is None:
+            return None
+        if PoolSlot.objects.filter(id=slot.id, claimed=False).update(claimed=True):
+            return slot
+
+
 def buy_random_pool(user: User, pool_id: str) -> Tuple[MESSAGECONTEXT, int, int]:
     """
     购买盲盒
 
+    奖品从预先打乱的奖品序列中依次取出，购买时只锁定当前用户和取出的位置，
+    不同用户的购买互不阻塞
+
     :param user: 当前用户
     :type user: User
     :param pool_id: 待购买的奖池id，因为是前端传过来的所以是str
@@ -443,30 +500,25 @@ def buy_random_pool(user: User, pool_id: str) -> Tuple[MESSAGECONTEXT, int, int]
     my_entry_time = PoolRecord.objects.filter(pool=pool, user=user).count()
     if my_entry_time >= pool.entry_time:
         return wrong('您兑换这款盲盒的次数已达上限!'), -1, 2
-    total_entry_time = PoolRecord.objects.filter(pool=pool).count()
-    capacity = pool.get_capacity()
-    if capacity <= total_entry_time:
-        return wrong('盲盒已售罄!'), -1, 2
+    # 奖池开放后首次购买时生成序列，之后不再锁定奖池
+    build_random_deck(pool)
 
     try:
         with transaction.atomic():
-            pool = Pool.objects.select_for_update().get(id=pool_id, type=Pool.Type.RANDOM)
-            assert pool.start <= datetime.now(), '盲盒兑换时间未开始!'
-            assert pool.end is None or pool.end >= datetime.now(), '盲盒兑换时间已结束!'
+            # 锁定用户，保证同一用户的次数限制和元气值检查有效
+            locked_user = User.objects.get_user(user, update=True)
             my_entry_time = PoolRecord.objects.filter(
-                pool=pool, user=user).count()
+                pool=pool, user=locked_user).count()
             assert my_entry_time < pool.entry_time, '您兑换这款盲盒的次数已达上限!'
-            assert user.YQpoint >= pool.ticket_price, '您的元气值不足，兑换失败!'
-            total_entry_time = PoolRecord.objects.filter(pool=pool).count()
-            capacity = pool.get_capacity()
-            assert capacity > total_entry_time, '盲盒已售罄!'
+            assert locked_user.YQpoint >= pool.ticket_price, '您的元气值不足，兑换失败!'
 
             # 开盒，修改poolitem记录，创建poolrecord记录
-            items = pool.items.select_for_update().all()
-            real_item_id = select_random_prize(items, 1)[0]
-            modify_item: PoolItem = PoolItem.objects.select_for_update().get(id=real_item_id)
-            modify_item.consumed_num += 1
-            modify_item.save()
+            slot = _claim_random_slot(pool)
+            assert slot is not None, '盲盒已售罄!'
+            PoolItem.objects.filter(id=slot.item_id).update(
+                consumed_num=F('consumed_num') + 1)
+            modify_item: PoolItem = PoolItem.objects.select_related(
+                'prize').get(id=slot.item_id)
 
             if modify_item.is_empty:  # 如果是空盲盒，没法兑奖，record的状态记为NOT_LUCKY
                 item_status = PoolRecord.Status.NOT_LUCKY
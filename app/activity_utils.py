@@ -16,12 +16,14 @@ from typing import Iterable
 from datetime import datetime, timedelta
 
 import qrcode
+from django.db import connection
+from django.db.models import F, Q
 
 from utils.http.utils import build_full_url
 import utils.models.query as SQ
 from generic.models import User, YQPointRecord
 from scheduler.adder import ScheduleAdder
-from scheduler.cancel import remove_job
+from scheduler.cancel import remove_jobs_by_prefix
 from app.utils_dependency import *
 from app.models import (
     User,
@@ -32,13 +34,17 @@ from app.models import (
     Position,
     Activity,
     Participation,
+    ActivityWaitlist,
     Notification,
+    BroadcastNotification,
     ActivityPhoto,
 )
 from app.utils import get_person_or_org, if_image
 from app.notification_utils import (
     notification_create,
     bulk_notification_create,
+    multi_notification_create,
+    broadcast_create,
     notification_status_change,
 )
 from app.extern.wechat import WechatApp, WechatMessageLevel
@@ -47,7 +53,9 @@ from app.log import logger
 
 __all__ = [
     'changeActivityStatus',
+    'sweep_activity_status',
     'notifyActivity',
+    'notify_course_activities',
     'ActivityException',
     'create_activity',
     'modify_activity',
@@ -103,36 +111,141 @@ def changeActivityStatus(aid, cur_status, to_status):
     if cur_status in LIMITED_STATUS:
         assert (cur_status, to_status) in FSM, f'不能从{cur_status}变更到{to_status}'
 
-    if to_status == Activity.Status.WAITING:
-        if activity.bidding:
-            draw_lots(activity)
+    _apply_status_effects([activity], cur_status, to_status)
+
+    # 过早进行这个修改，将被写到activity待执行的保存中，导致失败后调用activity.save仍会调整状态
+    activity.status = to_status
+    activity.save()
+
+
+def _apply_status_effects(activities: list[Activity], cur_status, to_status):
+    '''
+    活动状态转换的附带操作，需要在事务中调用，不修改活动状态
+
+    - 报名中->等待中：投点活动抽签，清空候补名单
+    - 等待中->进行中：报名成功者变为未签到，无需签到的活动直接变为已参与
+    - 进行中->已结束：非课程活动结算元气值
+    '''
+    if to_status == Activity.Status.WAITING and cur_status == Activity.Status.APPLYING:
+        for activity in activities:
+            if activity.bidding:
+                draw_lots(activity)
+                activity.save(update_fields=['current_participants'])
+        _clear_waitlist(activities)
 
     # 活动变更为进行中时，修改参与人参与状态
     elif to_status == Activity.Status.PROGRESSING:
-        unchecked = SQ.sfilter(Participation.activity, activity).filter(
+        unchecked = Participation.objects.filter(
+            activity__in=[activity.id for activity in activities],
             status=Participation.AttendStatus.APPLYSUCCESS)
-        if activity.need_checkin:
-            unchecked.update(status=Participation.AttendStatus.UNATTENDED)
-        else:
-            unchecked.update(status=Participation.AttendStatus.ATTENDED)
-
-        # if not activity.valid:
-        #     # 活动开始后，未审核自动通过
-        #     activity.valid = True
-        #     notification = Notification.objects.get(
-        #         relate_instance=activity,
-        #         status=Notification.Status.UNDONE,
-        #         title=Notification.Title.VERIFY_INFORM
-        #     )
-        #     notification_status_change(notification, Notification.Status.DONE)
+        unchecked.filter(activity__need_checkin=True).update(
+            status=Participation.AttendStatus.UNATTENDED)
+        unchecked.filter(activity__need_checkin=False).update(
+            status=Participation.AttendStatus.ATTENDED)
 
     # 结束，计算元气值
-    elif (to_status == Activity.Status.END
-            and activity.category != Activity.ActivityCategory.COURSE):
-        activity.settle_yqpoint(status=to_status)
-    # 过早进行这个修改，将被写到activity待执行的保存中，导致失败后调用activity.save仍会调整状态
-    activity.status = to_status
-    activity.save()
+    elif to_status == Activity.Status.END:
+        for activity in activities:
+            if activity.category != Activity.ActivityCategory.COURSE:
+                activity.settle_yqpoint(status=to_status)
+
+
+
+def _clear_waitlist(activities: list[Activity]) -> None:
+    '''报名截止时清空候补名单，事务提交后通知未能递补的候补者'''
+    for activity in activities:
+        waitlist = ActivityWaitlist.objects.filter(activity=activity)
+        receivers = list(User.objects.filter(id__in=waitlist.values(
+            SQ.f(ActivityWaitlist.person, Person.person_id))))
+        if not receivers:
+            continue
+        waitlist.delete()
+        transaction.on_commit(lambda activity=activity, receivers=receivers:
+                              bulk_notification_create(
+            receivers=receivers,
+            sender=activity.organization_id.get_user(),
+            typename=Notification.Type.NEEDREAD,
+            title=Notification.Title.ACTIVITY_INFORM,
+            content=f'您候补的活动“{activity.title}”报名已截止，未能递补，候补已取消。',
+            URL=f'/viewActivity/{activity.id}',
+            relate_instance=activity,
+            to_wechat=dict(app=WechatApp.TO_PARTICIPANT),
+        ))
+
+
+# 定时转换的活动状态：(当前状态, 下一状态, 到期时间字段, 额外条件)
+_SWEEP_STEPS = [
+    (Activity.Status.UNPUBLISHED, Activity.Status.APPLYING, 'publish_time', Q(need_apply=True)),
+    (Activity.Status.UNPUBLISHED, Activity.Status.WAITING, 'publish_time', Q(need_apply=False)),
+    (Activity.Status.APPLYING, Activity.Status.WAITING, 'apply_end', Q()),
+    (Activity.Status.WAITING, Activity.Status.PROGRESSING, 'start', Q()),
+    (Activity.Status.PROGRESSING, Activity.Status.END, 'end', Q()),
+]
+# 每个事务转换的活动数
+SWEEP_BATCH_SIZE = 100
+
+
+@transaction.atomic
+def _sweep_batch(due: QuerySet[Activity], cur_status, to_status,
+                 failed: set[int]) -> tuple[int, int]:
+    '''
+    锁定并转换一批到期的活动，跳过其它事务正在转换的活动
+
+    每个活动的附带操作在单独的保存点中执行，失败的活动回滚并记入failed，
+    本次执行不再转换，不影响同批的其它活动
+
+    :return: 锁定的活动数和转换的活动数
+    :rtype: tuple[int, int]
+    '''
+    skip_locked = connection.features.has_select_for_update_skip_locked
+    activities = list(due.exclude(id__in=failed)
+                      .select_for_update(skip_locked=skip_locked)
+                      .order_by('id')[:SWEEP_BATCH_SIZE])
+    if not activities:
+        return 0, 0
+    aids = []
+    for activity in activities:
+        try:
+            with transaction.atomic():
+                _apply_status_effects([activity], cur_status, to_status)
+        except Exception:
+            failed.add(activity.id)
+            logger.exception(f'活动{activity.id}状态转换失败：{cur_status}->{to_status}')
+        else:
+            aids.append(activity.id)
+    if not aids:
+        return len(activities), 0
+    if cur_status == Activity.Status.UNPUBLISHED:
+        # 课程活动发布时通知参与者，整批一次创建和发送
+        transaction.on_commit(lambda: notify_course_activities(aids))
+    return len(activities), Activity.objects.filter(
+        id__in=aids, status=cur_status).update(status=to_status)
+
+
+def sweep_activity_status(now: datetime | None = None) -> dict[str, int]:
+    '''
+    按时间范围查询到期的活动，批量转换状态，返回各目标状态转换的数量
+
+    幂等，可以并发执行：每批活动在事务中加锁后按原状态条件更新，
+    多次落下的活动在一次执行中依次完成各阶段。
+    转换失败的活动保持原状态，留待下次执行重试
+    '''
+    if now is None:
+        now = datetime.now()
+    counts: dict[str, int] = {}
+    failed: set[int] = set()
+    for cur_status, to_status, time_field, condition in _SWEEP_STEPS:
+        due = Activity.objects.filter(
+            condition, status=cur_status, **{f'{time_field}__lte': now})
+        while True:
+            locked, changed = _sweep_batch(due, cur_status, to_status, failed)
+            if changed:
+                counts[to_status] = counts.get(to_status, 0) + changed
+            if locked < SWEEP_BATCH_SIZE:
+                break
+    if counts:
+        logger.info(f'活动状态转换：{counts}')
+    return counts
 
 
 """
@@ -142,71 +255,65 @@ def changeActivityStatus(aid, cur_status, to_status):
 
 
 def draw_lots(activity: Activity):
+    '''
+    投点活动报名截止时抽签，不修改活动状态，由调用者保存活动
+
+    中签者从申请者编号中无放回抽样，状态用两条批量更新修改，
+    中签和未中签的通知在事务提交后批量创建
+    '''
     participation = SQ.sfilter(Participation.activity, activity)
     participation: QuerySet[Participation]
-    l = len(participation.filter(status=Participation.AttendStatus.APPLYING))
+    applicant_ids = list(participation.filter(
+        status__in=[Participation.AttendStatus.APPLYING,
+                    Participation.AttendStatus.APPLYFAILED]
+    ).select_for_update().values_list('id', flat=True))
 
-    engaged = len(participation.filter(
+    engaged = participation.filter(
         status__in=[Participation.AttendStatus.APPLYSUCCESS,
                     Participation.AttendStatus.UNATTENDED,
                     Participation.AttendStatus.ATTENDED]
-    ))
-
-    leftQuota = activity.capacity - engaged
+    ).count()
+    leftQuota = max(activity.capacity - engaged, 0)
 
-    if l <= leftQuota:
-        participation.filter(
-            status__in=[Participation.AttendStatus.APPLYING,
-                        Participation.AttendStatus.APPLYFAILED]
-        ).update(status=Participation.AttendStatus.APPLYSUCCESS)
-        activity.current_participants = engaged + l
+    if len(applicant_ids) <= leftQuota:
+        winner_ids = applicant_ids
     else:
-        lucky_ones = random.sample(range(l), leftQuota)
-        activity.current_participants = activity.capacity
-        for i, participant in enumerate(participation.select_for_update().filter(
-                status__in=[Participation.AttendStatus.APPLYING,
-                            Participation.AttendStatus.APPLYFAILED]
-        )):
-            if i in lucky_ones:
-                participant.status = Participation.AttendStatus.APPLYSUCCESS
-            else:
-                participant.status = Participation.AttendStatus.APPLYFAILED
-            participant.save()
-    # 签到成功的转发通知和微信通知
-    receivers = SQ.qsvlist(participation.filter(
-        status=Participation.AttendStatus.APPLYSUCCESS
-    ), Participation.person, Person.person_id)
-    receivers = User.objects.filter(id__in=receivers)
+        winner_ids = random.sample(applicant_ids, leftQuota)
+    loser_ids = list(set(applicant_ids).difference(winner_ids))
+    Participation.objects.filter(id__in=winner_ids).update(
+        status=Participation.AttendStatus.APPLYSUCCESS)
+    Participation.objects.filter(id__in=loser_ids).update(
+        status=Participation.AttendStatus.APPLYFAILED)
+    activity.current_participants = engaged + len(winner_ids)
+
+    def _receiver_ids(ids: list[int]) -> list[int]:
+        return SQ.qsvlist(Participation.objects.filter(id__in=ids),
+                          Participation.person, Person.person_id)
+
+    winners = _receiver_ids(winner_ids)
+    losers = _receiver_ids(loser_ids)
     sender = activity.organization_id.get_user()
-    typename = Notification.Type.NEEDREAD
-    content = f'您好！您参与抽签的活动“{activity.title}”报名成功！请准时参加活动！'
     URL = f'/viewActivity/{activity.id}'
-    if len(receivers) > 0:
+
+    def _notify(receiver_ids: list[int], content: str):
+        if not receiver_ids:
+            return
         bulk_notification_create(
-            receivers=receivers,
+            receivers=User.objects.filter(id__in=receiver_ids),
             sender=sender,
-            typename=typename,
+            typename=Notification.Type.NEEDREAD,
             title=Notification.Title.ACTIVITY_INFORM,
             content=content,
             URL=URL,
             to_wechat=dict(app=WechatApp.TO_PARTICIPANT, level=WechatMessageLevel.IMPORTANT),
         )
+
+    # 签到成功的转发通知和微信通知
+    transaction.on_commit(lambda: _notify(
+        winners, f'您好！您参与抽签的活动“{activity.title}”报名成功！请准时参加活动！'))
     # 抽签失败的同学发送通知
-    receivers = SQ.qsvlist(participation.filter(
-        status=Participation.AttendStatus.APPLYFAILED
-    ), Participation.person, Person.person_id)
-    receivers = User.objects.filter(id__in=receivers)
-    content = f'很抱歉通知您，您参与抽签的活动“{activity.title}”报名失败！'
-    if len(receivers) > 0:
-        bulk_notification_create(
-            receivers=receivers,
-            sender=sender,
-            typename=typename,
-            title=Notification.Title.ACTIVITY_INFORM,
-            content=content,
-            URL=URL,
-            to_wechat=dict(app=WechatApp.TO_PARTICIPANT, level=WechatMessageLevel.IMPORTANT),
-        )
+    transaction.on_commit(lambda: _notify(
+        losers, f'很抱歉通知您，您参与抽签的活动“{activity.title}”报名失败！'))
 
 
 """
@@ -226,10 +333,13 @@ def _participant_uids(activity: Activity) -> list[int]:
         id__in=participant_person_id), Person.person_id)
 
 
+def _subscribers(activity: Activity) -> QuerySet[Person]:
+    return Person.objects.activated().exclude(
+        id__in=activity.organization_id.unsubscribers.all())
+
+
 def _subscriber_uids(activity: Activity) -> list[int]:
-    return SQ.qsvlist(Person.objects.activated().exclude(
-        id__in=activity.organization_id.unsubscribers.all()
-    ), Person.person_id)
+    return SQ.qsvlist(_subscribers(activity), Person.person_id)
 
 
 @logger.secure_func('活动消息发送异常')
@@ -242,7 +352,9 @@ def notifyActivity(aid: int, msg_type: str, msg=""):
         msg = f"您关注的小组{activity.organization_id.oname}发布了新的活动。"
         msg += f"\n开始时间: {activity.start.strftime('%Y-%m-%d %H:%M')}"
         msg += f"\n活动地点: {activity.location}"
-        receivers = User.objects.filter(id__in=_subscriber_uids(activity))
+        # 延迟查询，公开活动使用广播通知时无需计算
+        receivers = User.objects.filter(
+            id__in=_subscribers(activity).values(SQ.f(Person.person_id)))
         publish_kws = dict(app=WechatApp.TO_SUBSCRIBER)
     elif msg_type == "remind":
         with transaction.atomic():
@@ -262,7 +374,8 @@ def notifyActivity(aid: int, msg_type: str, msg=""):
             publish_kws = dict(app=WechatApp.TO_PARTICIPANT)
 
     elif msg_type == 'modification_sub':
-        receivers = User.objects.filter(id__in=_subscriber_uids(activity))
+        receivers = User.objects.filter(
+            id__in=_subscribers(activity).values(SQ.f(Person.person_id)))
         publish_kws = dict(app=WechatApp.TO_SUBSCRIBER)
     elif msg_type == 'modification_par':
         receivers = User.objects.filter(id__in=_participant_uids(activity))
@@ -299,6 +412,17 @@ def notifyActivity(aid: int, msg_type: str, msg=""):
         member_id_list = SQ.qsvlist(Position.objects.activated().filter(
             org=activity.organization_id), Position.person, Person.person_id)
         receivers = receivers.filter(id__in=member_id_list)
+    elif msg_type in ['newActivity', 'modification_sub']:
+        # 接收者恰为全部订阅者，只创建一条广播通知，读取时计算接收范围
+        broadcast_create(
+            sender=activity.organization_id.get_user(),
+            title=title,
+            content=msg,
+            URL=f"/viewActivity/{aid}",
+            relate_instance=activity,
+            to_wechat=publish_kws,
+        )
+        return
 
     success, _ = bulk_notification_create(
         receivers=list(receivers),
@@ -313,6 +437,61 @@ def notifyActivity(aid: int, msg_type: str, msg=""):
     assert success, "批量创建通知并发送时失败"
 
 
+@logger.secure_func('活动消息发送异常')
+def notify_course_activities(aids: list[int]) -> None:
+    '''
+    通知一批课程活动发布，接收者同`notifyActivity`的newCourseActivity
+
+    各活动的接收者用固定次数的查询得到，所有通知一次创建，微信按活动分组发送
+    '''
+    activities = list(Activity.objects.filter(id__in=aids).select_related(
+        SQ.f(Activity.organization_id)))
+    if not activities:
+        return
+    org_ids = {activity.organization_id_id for activity in activities}
+    # 订阅者为未取消订阅的所有个人
+    person_uids: dict[int, int] = dict(Person.objects.activated().values_list(
+        'id', SQ.f(Person.person_id)))
+    unsubscribed: dict[int, set[int]] = {org_id: set() for org_id in org_ids}
+    for person_id, org_id in Person.unsubscribe_list.through.objects.filter(
+            organization_id__in=org_ids).values_list('naturalperson_id', 'organization_id'):
+        unsubscribed[org_id].add(person_id)
+    participants: dict[int, set[int]] = {activity.id: set() for activity in activities}
+    for aid, person_id in Participation.objects.filter(
+        activity__in=aids,
+        status__in=[Participation.AttendStatus.APPLYSUCCESS,
+                    Participation.AttendStatus.APPLYING],
+    ).values_list('activity_id', 'person_id'):
+        participants[aid].add(person_id)
+    members: dict[int, set[int]] = {org_id: set() for org_id in org_ids}
+    if any(activity.inner for activity in activities):
+        for org_id, person_id in Position.objects.activated().filter(
+                org__in=org_ids).values_list('org_id', 'person_id'):
+            members[org_id].add(person_id)
+
+    notifications = []
+    for activity in activities:
+        org = activity.organization_id
+        receivers = (set(person_uids) - unsubscribed[org.id]) | participants[activity.id]
+        if activity.inner:
+            receivers &= members[org.id]
+        content = (f"课程{org.oname}发布了新的课程活动。"
+                   f"\n开始时间: {activity.start.strftime('%Y-%m-%d %H:%M')}"
+                   f"\n活动地点: {activity.location}")
+        notifications.extend(Notification(
+            receiver_id=person_uids[person_id],
+            sender_id=org.organization_id_id,
+            typename=Notification.Type.NEEDREAD,
+            title=activity.title,
+            content=content,
+            URL=f"/viewActivity/{activity.id}",
+            relate_instance=activity,
+        ) for person_id in sorted(receivers) if person_id in person_uids)
+    success, _ = multi_notification_create(
+        notifications, to_wechat=dict(app=WechatApp.TO_SUBSCRIBER))
+    assert success, "批量创建通知并发送时失败"
+
+
 def get_activity_QRcode(activity):
     auth_code = GLOBAL_CONFIG.hasher.encode(str(activity.id))
     url = build_full_url(f'checkinActivity/{activity.id}?auth={auth_code}')
@@ -457,23 +636,23 @@ def activity_base_check(request, edit=False):
     return context
 
 
-def _set_change_status(activity: Activity, current, next, time, replace):
-    ScheduleAdder(changeActivityStatus, id=f'activity_{activity.id}_{next}',
-                  run_time=time, replace=replace)(activity.id, current, next)
-
-
 def _set_jobs_to_status(activity: Activity, replace: bool) -> Activity.Status:
+    '''
+    返回活动当前应处的状态，并添加开始前的提醒任务
+
+    状态转换由sweep_activity_status定时完成，不再为每个活动添加任务
+    '''
     now_time = datetime.now()
     status = Activity.Status.END
     if now_time < activity.end:
-        status, next = Activity.Status.PROGRESSING, Activity.Status.END
-        _set_change_status(activity, status, next, activity.end, replace)
+        status = Activity.Status.PROGRESSING
     if now_time < activity.start:
-        status, next = Activity.Status.WAITING, Activity.Status.PROGRESSING
-        _set_change_status(activity, status, next, activity.start, replace)
+        status = Activity.Status.WAITING
     if now_time < activity.apply_end:
-        status, next = Activity.Status.APPLYING, Activity.Status.WAITING
-        _set_change_status(activity, status, next, activity.apply_end, replace)
+        status = Activity.Status.APPLYING
+    if replace:
+        # 同时移除旧版本为状态转换添加的任务，避免按修改前的时间执行
+        _remove_activity_jobs(activity)
     if now_time < activity.start - timedelta(minutes=15):
         reminder = ScheduleAdder(notifyActivity, id=f'activity_{activity.id}_remind',
                                  run_time=activity.start - timedelta(minutes=15), replace=replace)
@@ -698,6 +877,8 @@ def modify_accepted_activity(request, activity):
     activity.URL = request.POST["URL"]
     activity.introduction = request.POST["introduction"]
     activity.save()
+    if not activity.bidding:
+        _fill_from_waitlist(activity)
 
     _set_jobs_to_status(activity, replace=True)
 
@@ -738,14 +919,9 @@ def accept_activity(request, activity):
     activity.save()
 
 
-def _remove_jobs(activity: Activity, *jobs):
-    for job in jobs:
-        remove_job(f"activity_{activity.id}_{job}")
-
-
 def _remove_activity_jobs(activity: Activity):
-    _remove_jobs(activity, 'remind', Activity.Status.WAITING,
-                 Activity.Status.PROGRESSING, Activity.Status.END)
+    '''一次删除活动的所有定时任务，包括旧版本的状态转换任务'''
+    remove_jobs_by_prefix(f"activity_{activity.id}_")
 
 
 def reject_activity(request, activity):
@@ -766,6 +942,7 @@ def reject_activity(request, activity):
         Notification.objects.filter(
             relate_instance=activity
         ).update(status=Notification.Status.DELETE)
+        BroadcastNotification.objects.filter(relate_instance=activity).delete()
         # 曾将所有报名的人的状态改为申请失败
         notifyActivity(activity.id, "modification_par",
                        f"您报名的活动{activity.title}已取消。")
@@ -786,12 +963,29 @@ def reject_activity(request, activity):
     activity.save()
 
 
+def _occupy_seat(activity: Activity) -> bool:
+    '''条件更新占用一个名额，活动不在报名中或已报满时返回False，不修改传入的活动'''
+    return Activity.objects.filter(
+        id=activity.id,
+        status=Activity.Status.APPLYING,
+        current_participants__lt=F('capacity'),
+    ).update(current_participants=F('current_participants') + 1) > 0
+
+
+def _change_participants(activity: Activity, delta: int):
+    '''不加锁地修改报名人数，不修改传入的活动'''
+    Activity.objects.filter(id=activity.id).update(
+        current_participants=F('current_participants') + delta)
+
+
 # 调用的时候用 try
-def apply_activity(request, activity: Activity):
-    '''这个函数在正常情况下只应该抛出提示错误信息的ActivityException'''
-    context = dict()
-    context["success"] = False
+def apply_activity(request, activity: Activity) -> bool:
+    '''
+    报名活动，返回是否报名成功，先到先得的活动报满时加入候补名单并返回False
 
+    不锁定活动，只锁定报名者，名额由条件更新保证不超过容量，调用者不应再保存活动，
+    这个函数在正常情况下只应该抛出提示错误信息的ActivityException
+    '''
     payer = Person.objects.get_by_user(request.user)
 
     if activity.inner:
@@ -802,15 +996,13 @@ def apply_activity(request, activity: Activity):
             raise ActivityException(
                 f"该活动是{activity.organization_id}内部活动，暂不开放对外报名。")
 
-    try:
-        participant = Participation.objects.select_for_update().get(
-            SQ.sq(Participation.activity, activity),
-            SQ.sq(Participation.person, payer),
-        )
-        participated = True
-    except:
-        participated = False
-    if participated:
+    # 同一用户的报名请求依次处理
+    payer = Person.objects.select_for_update().get(id=payer.id)
+    participant = Participation.objects.select_for_update().filter(
+        SQ.sq(Participation.activity, activity),
+        SQ.sq(Participation.person, payer),
+    ).first()
+    if participant is not None:
         if (
             participant.status == Participation.AttendStatus.APPLYSUCCESS or
             participant.status == Participation.AttendStatus.APPLYING
@@ -818,27 +1010,74 @@ def apply_activity(request, activity: Activity):
             raise ActivityException("您已报名该活动。")
         elif participant.status != Participation.AttendStatus.CANCELED:
             raise ActivityException(f"您的报名状态异常，当前状态为：{participant.status}")
-
-    if not activity.bidding:
-        if activity.current_participants < activity.capacity:
-            activity.current_participants += 1
-        else:
-            raise ActivityException("活动已报满，请稍后再试。")
+    if ActivityWaitlist.objects.filter(activity=activity, person=payer).exists():
+        raise ActivityException("您已在候补名单中，有人取消报名时将自动递补。")
+
+    if activity.bidding:
+        _change_participants(activity, 1)
+        status = Participation.AttendStatus.APPLYING
+    elif _occupy_seat(activity):
+        status = Participation.AttendStatus.APPLYSUCCESS
+    elif not Activity.objects.filter(
+            id=activity.id, status=Activity.Status.APPLYING).exists():
+        raise ActivityException("活动不在报名状态!")
     else:
-        activity.current_participants += 1
+        ActivityWaitlist.objects.create(activity=activity, person=payer)
+        return False
 
-    if not participated:
-        participant = Participation.objects.create(**dict([
+    if participant is None:
+        participant = Participation(**dict([
             (SQ.f(Participation.activity), activity),
             (SQ.f(Participation.person), payer),
         ]))
-    if not activity.bidding:
-        participant.status = Participation.AttendStatus.APPLYSUCCESS
-    else:
-        participant.status = Participation.AttendStatus.APPLYING
+    participant.status = status
+    participant.save()
+    return True
+
+
+def _pop_waitlist(activity: Activity) -> ActivityWaitlist | None:
+    '''取出最早的候补者，并发时跳过其它事务正在递补的候补者'''
+    waitlist = ActivityWaitlist.objects.filter(activity=activity).order_by('id')
+    skip_locked = connection.features.has_select_for_update_skip_locked
+    while True:
+        entry = waitlist.select_for_update(skip_locked=skip_locked).first()
+        if entry is None:
+            return None
+        if ActivityWaitlist.objects.filter(id=entry.id).delete()[0]:
+            return entry
 
+
+def _promote_waitlist(activity: Activity) -> bool:
+    '''将空出的名额直接交给最早的候补者并通知，没有候补者时返回False'''
+    entry = _pop_waitlist(activity)
+    if entry is None:
+        return False
+    participant, _ = Participation.objects.select_for_update().get_or_create(**dict([
+        (SQ.f(Participation.activity), activity),
+        (SQ.f(Participation.person), entry.person),
+    ]))
+    participant.status = Participation.AttendStatus.APPLYSUCCESS
     participant.save()
-    activity.save()
+    receiver = entry.person.get_user()
+    transaction.on_commit(lambda: notification_create(
+        receiver=receiver,
+        sender=activity.organization_id.get_user(),
+        typename=Notification.Type.NEEDREAD,
+        title=Notification.Title.ACTIVITY_INFORM,
+        content=f'您候补的活动“{activity.title}”已有空余名额，已为您报名成功！请准时参加活动！',
+        URL=f'/viewActivity/{activity.id}',
+        to_wechat=dict(app=WechatApp.TO_PARTICIPANT, level=WechatMessageLevel.IMPORTANT),
+    ))
+    return True
+
+
+def _fill_from_waitlist(activity: Activity):
+    '''扩大容量后依次递补候补者，直到报满或无人候补'''
+    while (ActivityWaitlist.objects.filter(activity=activity).exists()
+           and _occupy_seat(activity)):
+        if not _promote_waitlist(activity):
+            _change_participants(activity, -1)
+            break
 
 
 def cancel_activity(request, activity):
@@ -883,8 +1122,14 @@ def cancel_activity(request, activity):
 
 
 def withdraw_activity(request, activity: Activity):
+    '''
+    取消报名或退出候补，报名成功者退出后名额直接递补给最早的候补者
 
+    不锁定活动，调用者不应再保存活动
+    '''
     np = Person.objects.get_by_user(request.user)
+    if ActivityWaitlist.objects.filter(activity=activity, person=np).delete()[0]:
+        return
     participant = Participation.objects.select_for_update().get(
         SQ.sq(Participation.activity, activity),
         SQ.sq(Participation.person, np),
@@ -897,11 +1142,13 @@ def withdraw_activity(request, activity: Activity):
     )
     if participant.status == Participation.AttendStatus.CANCELED:
         raise ActivityException("已退出活动。")
+    seated = participant.status == Participation.AttendStatus.APPLYSUCCESS
     participant.status = Participation.AttendStatus.CANCELED
-    activity.current_participants -= 1
-
     participant.save()
-    activity.save()
+
+    if seated and not activity.bidding and _promote_waitlist(activity):
+        return
+    _change_participants(activity, -1)
 
 
 @transaction.atomic
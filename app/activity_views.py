@@ -20,6 +20,7 @@ from app.models import (
     Activity,
     ActivityPhoto,
     Participation,
+    ActivityWaitlist,
     ActivitySummary,
 )
 from app.activity_utils import (
@@ -140,12 +141,15 @@ def viewActivity(request: HttpRequest, aid=None):
 
         elif option == "apply":
             try:
+                # 不锁定活动，名额由apply_activity的条件更新保证
                 with transaction.atomic():
-                    activity = Activity.objects.select_for_update().get(id=int(aid))
+                    activity = Activity.objects.get(id=int(aid))
                     if activity.status != Activity.Status.APPLYING:
                         return redirect(message_url(wrong('活动不在报名状态!'), request.path))
-                    apply_activity(request, activity)
-                    if activity.bidding:
+                    applied = apply_activity(request, activity)
+                    if not applied:
+                        succeed(f"活动已报满，已加入候补名单，有人取消报名时将自动递补。", html_display)
+                    elif activity.bidding:
                         succeed(f"活动申请中，请等待报名结果。", html_display)
                     else:
                         succeed(f"报名成功。", html_display)
@@ -157,7 +161,7 @@ def viewActivity(request: HttpRequest, aid=None):
         elif option == "quit":
             try:
                 with transaction.atomic():
-                    activity = Activity.objects.select_for_update().get(id=aid)
+                    activity = Activity.objects.get(id=aid)
                     if activity.status not in [
                         Activity.Status.APPLYING,
                         Activity.Status.WAITING,
@@ -250,6 +254,9 @@ def viewActivity(request: HttpRequest, aid=None):
             pStatus = "未参与"
         if pStatus == "放弃":
             pStatus = "未参与"
+        if pStatus == "未参与" and ActivityWaitlist.objects.filter(
+                activity=activity, person=me).exists():
+            pStatus = "候补中"
 
     # 签到
     need_checkin = activity.need_checkin
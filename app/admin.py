@@ -8,7 +8,7 @@ from utils.http.dependency import HttpRequest
 from utils.models.query import sfilter, f
 from utils.admin_utils import *
 from app.models import *
-from scheduler.cancel import remove_job
+from scheduler.cancel import remove_job, remove_jobs
 
 
 # 通用内联模型
@@ -449,11 +449,13 @@ class ActivityAdmin(admin.ModelAdmin):
             Activity.Status.PROGRESSING,
             Activity.Status.WAITING,
         ]
+        removed = remove_jobs(f'activity_{activity.id}_{status}'
+                              for activity in queryset for status in CANCEL_STATUSES)
         for activity in queryset:
-            failed_statuses = []
-            for status in CANCEL_STATUSES:
-                if not remove_job(f'activity_{activity.id}_{status}'):
-                    failed_statuses.append(status)
+            failed_statuses = [
+                status for status in CANCEL_STATUSES
+                if f'activity_{activity.id}_{status}' not in removed
+            ]
             if failed_statuses:
                 if len(failed_statuses) != len(CANCEL_STATUSES):
                     failed_list.append(f'{activity.id}: {",".join(failed_statuses)}')
@@ -571,6 +573,29 @@ class NotificationAdmin(admin.ModelAdmin):
         return self.republish_bulk(request, queryset, app)
 
 
+class BroadcastReceiptInline(admin.TabularInline):
+    model = BroadcastReceipt
+    classes = ['collapse']
+    extra = 0
+    fields = ['receiver', 'status', 'finish_time']
+    raw_id_fields = ['receiver']
+
+
+@admin.register(NotificationArchive)
+class NotificationArchiveAdmin(admin.ModelAdmin):
+    list_display = ["id", "receiver", "sender", "title", "start_time", "archive_time"]
+    search_fields = ('id', "receiver__username", "sender__username", 'title')
+    list_filter = ('start_time', 'status', 'typename', 'archive_time')
+
+
+@admin.register(BroadcastNotification)
+class BroadcastNotificationAdmin(admin.ModelAdmin):
+    list_display = ["id", "sender", "title", "start_time"]
+    search_fields = ('id', "sender__username", 'title')
+    list_filter = ('start_time', 'typename')
+    inlines = [BroadcastReceiptInline]
+
+
 @admin.register(Help)
 class HelpAdmin(admin.ModelAdmin):
     list_display = ["id", "title"]
@@ -809,6 +834,15 @@ class PrizeAdmin(admin.ModelAdmin):
 @admin.register(Pool)
 class PoolAdmin(admin.ModelAdmin):
     inlines = [PoolItemInline]
+    actions = []
+
+    @as_action('重建盲盒序列', actions, 'change')
+    def rebuild_deck(self, request, queryset):
+        from app.YQPoint_utils import build_random_deck
+        total = 0
+        for pool in queryset.filter(type=Pool.Type.RANDOM):
+            total += build_random_deck(pool, rebuild=True)
+        return self.message_user(request, f'已按剩余数量重建，共{total}件奖品')
 
 
 @admin.register(PoolRecord)
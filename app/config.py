@@ -53,6 +53,24 @@ class ProfileConfig(Config):
     help_message = LazySetting('help_messages', default={}, type=dict[str, str])
     weather_api_key = LazySetting('weather/api_key', type=str)
 
+    # Notifications
+    # 通知信箱每页显示的通知数
+    notification_page_size = LazySetting(
+        'notification/page_size', lambda x: max(1, x), default=20)
+    # 已处理的通知保留天数，超过后归档
+    notification_archive_days = LazySetting(
+        'notification/archive_days', float, default=180.0)
+    notification_archive_chunk = LazySetting(
+        'notification/archive_chunk', lambda x: max(1, x), default=1000)
+    # 定时通知记录的保留天数，应长于定时任务的周期
+    periodic_record_days = LazySetting(
+        'notification/periodic_record_days', float, default=90.0)
+
+    # Exports
+    # 导出的记录数超过该值时在后台生成
+    export_background_rows = LazySetting(
+        'export/background_rows', int, default=20000)
+
 
 class YQPointConfig(Config):
     def __init__(self, source, dict_prefix = ''):
@@ -37,28 +37,26 @@ from app.notification_utils import (
     notification_status_change,
 )
 from app.activity_utils import (
-    changeActivityStatus,
     notifyActivity,
     create_participate_infos,
 )
 from app.extern.wechat import WechatApp, WechatMessageLevel
+from app.export_utils import export_response
 from app.log import logger
 
-import openpyxl
-import openpyxl.worksheet.worksheet
 from random import sample
-from urllib.parse import quote
 from collections import Counter
 from datetime import datetime, timedelta
-from typing import Tuple, List
+from typing import Any, Tuple, List
 
 from django.http import HttpRequest, HttpResponse
 from django.db import transaction
 from django.db.models import F, Q, Sum, Prefetch
 
 from scheduler.adder import ScheduleAdder, MultipleAdder
-from scheduler.cancel import remove_job
+from scheduler.cancel import remove_jobs_by_prefix
 from utils.config.cast import str_to_time
+from utils.export import Sheet
 from achievement.api import unlock_achievement
 
 __all__ = [
@@ -241,26 +239,10 @@ def create_single_course_activity(request: HttpRequest) -> Tuple[int, bool]:
         activity.capacity = len(person_pos)
         activity.save()
 
-    # 在活动发布时通知参与成员,创建定时任务并修改活动状态
-    if activity.need_apply:
-        ScheduleAdder(changeActivityStatus, id=f"activity_{activity.id}_{Activity.Status.APPLYING}",
-                      run_time=activity.publish_time)(activity.id, Activity.Status.UNPUBLISHED, Activity.Status.APPLYING)  # OK
-        ScheduleAdder(changeActivityStatus, id=f"activity_{activity.id}_{Activity.Status.WAITING}",
-                      run_time=activity.start - timedelta(hours=1))(activity.id, Activity.Status.APPLYING, Activity.Status.WAITING)  # OK
-    else:
-        ScheduleAdder(changeActivityStatus, id=f"activity_{activity.id}_{Activity.Status.WAITING}",
-                      run_time=activity.publish_time)(activity.id, Activity.Status.UNPUBLISHED, Activity.Status.WAITING)  # OK
-
-    ScheduleAdder(notifyActivity, id=f"activity_{activity.id}_newCourseActivity",
-                  run_time=activity.publish_time)(activity.id, "newCourseActivity")  # OK
-
-    # 引入定时任务：提前15min提醒、活动状态由WAITING变PROGRESSING再变END
+    # 活动状态的转换和发布时的通知由sweep_activity_status定时完成
+    # 引入定时任务：提前15min提醒
     ScheduleAdder(notifyActivity, id=f"activity_{activity.id}_remind",
                   run_time=activity.start - timedelta(minutes=15))(activity.id, "remind")  # OK
-    ScheduleAdder(changeActivityStatus, id=f"activity_{activity.id}_{Activity.Status.PROGRESSING}",
-                  run_time=activity.start)(activity.id, Activity.Status.WAITING, Activity.Status.PROGRESSING)
-    ScheduleAdder(changeActivityStatus, id=f"activity_{activity.id}_{Activity.Status.END}",
-                  run_time=activity.end)(activity.id, Activity.Status.PROGRESSING, Activity.Status.END)
     activity.save()
 
     # 设置活动照片
@@ -363,28 +345,11 @@ def modify_course_activity(request: HttpRequest, activity: Activity):
     #     to_participants.append(
     #         f"活动开始时间调整为{activity.start.strftime('%Y-%m-%d %H:%M')}")
 
-    # 更新定时任务
-    if old_need_apply:
-        # 删除报名中的状态阶段
-        remove_job(job_id=f"activity_{activity.id}_{Activity.Status.APPLYING}")
-
-    if activity.need_apply:
-        ScheduleAdder(changeActivityStatus, id=f"activity_{activity.id}_{Activity.Status.APPLYING}",
-                      run_time=activity.publish_time)(activity.id, Activity.Status.UNPUBLISHED, Activity.Status.APPLYING)  # OK
-        ScheduleAdder(changeActivityStatus, id=f"activity_{activity.id}_{Activity.Status.WAITING}",
-                      run_time=activity.start - timedelta(hours=1))(activity.id, Activity.Status.APPLYING, Activity.Status.WAITING)  # OK
-    else:
-        ScheduleAdder(changeActivityStatus, id=f"activity_{activity.id}_{Activity.Status.WAITING}",
-                      run_time=activity.publish_time)(activity.id, Activity.Status.UNPUBLISHED, Activity.Status.WAITING)  # OK
-
-    ScheduleAdder(notifyActivity, id=f"activity_{activity.id}_newCourseActivity",
-                  run_time=activity.publish_time)(activity.id, "newCourseActivity")  # OK
+    # 更新定时任务，状态转换由sweep_activity_status按新的时间完成
+    # 同时移除旧版本为状态转换和发布通知添加的任务
+    remove_jobs_by_prefix(f"activity_{activity.id}_")
     ScheduleAdder(notifyActivity, id=f"activity_{activity.id}_remind",
                   run_time=activity.start - timedelta(minutes=15))(activity.id, "remind")  # OK
-    ScheduleAdder(changeActivityStatus, id=f"activity_{activity.id}_{Activity.Status.PROGRESSING}",
-                  run_time=activity.start)(activity.id, Activity.Status.WAITING, Activity.Status.PROGRESSING)  # OK
-    ScheduleAdder(changeActivityStatus, id=f"activity_{activity.id}_{Activity.Status.END}",
-                  run_time=activity.end)(activity.id, Activity.Status.PROGRESSING, Activity.Status.END)  # OK
 
     # 发通知
     # notifyActivity(activity.id, "modification_par", "\n".join(to_participants))
@@ -435,13 +400,8 @@ def cancel_course_activity(request: HttpRequest, activity: Activity, cancel_all:
     )
     notification_status_change(notification, Notification.Status.DELETE)
 
-    # 取消定时任务（需要先判断一下是否已经被执行了）
-    if activity.start - timedelta(minutes=15) > datetime.now():
-        remove_job(f"activity_{activity.id}_remind")
-    if activity.start > datetime.now():
-        remove_job(f"activity_{activity.id}_{Activity.Status.PROGRESSING}")
-    if activity.end > datetime.now():
-        remove_job(f"activity_{activity.id}_{Activity.Status.END}")
+    # 取消定时任务，已执行的任务不存在，会被忽略
+    remove_jobs_by_prefix(f"activity_{activity.id}_")
 
     activity.save()
 
@@ -1329,86 +1289,62 @@ def finish_course(course):
     return succeed("结束课程成功！")
 
 
-def _excel_response(workbook: openpyxl.Workbook, file_name: str) -> HttpResponse:
-    '''创建Excel文件回应，file_name为未转义的文件名(不含后缀)'''
-    response = HttpResponse(content_type='application/vnd.ms-excel')
-    response['Content-Disposition'] = f'attachment; filename={quote(file_name)}.xlsx'
-    workbook.save(response)
-    return response
-
-
-def _write_detail_sheet(detail_sheet: openpyxl.worksheet.worksheet.Worksheet,
-                        records: QuerySet[CourseRecord], title: str = '详情') -> None:
-    '''将学时信息写入Excel文件的detail_sheet中'''
+def _detail_sheet(records: QuerySet[CourseRecord], title: str = '详情') -> Sheet:
+    '''学时信息的明细工作表'''
     # 注意，标题中的中文符号如：无法被解读
-    detail_sheet.title = title
-    # 从第一行开始写，因为Excel文件的行号是从1开始，列号也是从1开始
     detail_header = ['课程', '姓名', '学号', '次数', '学时', '学年', '学期', '有效']
-    detail_sheet.append(detail_header)
     _M = CourseRecord
-    for record in records.values_list(
+    values = records.values_list(
         SQ.f(_M.course, Course.name), SQ.f(_M.extra_name),
         SQ.f(_M.person, NaturalPerson.name),
         SQ.f(_M.person, NaturalPerson.person_id, User.username),
         SQ.f(_M.attend_times), SQ.f(_M.total_hours),
         SQ.f(_M.year), SQ.f(_M.semester), SQ.f(_M.invalid),
-    ):
-        record_info = [
-            record[0] or record[1],
-            *record[2:6],
-            f'{record[6]}-{record[6] + 1}',
-            '春' if record[7] == Semester.SPRING else '秋',
-            '否' if record[8] else '是',
-        ]
-        # 将每一个对象的所有字段的信息写入一行内
-        detail_sheet.append(record_info)
-
-
-def download_course_record(course: Course = None, year: int = None, semester: Semester = None) -> HttpResponse:
-    """返回需要导出的学时信息文件
-    course:
-        提供course时为单个课程服务，只导出该课程的相关人员的学时信息
-        不提供时下载所有学时信息，注意，只有相关负责老师可以访问！
-    :param course: 所选择的课程, defaults to None
-    :type course: Course, optional
-    :param year: 所选择的学年, defaults to None
-    :type year: int, optional
-    :param semester: 所选择的学期, defaults to None
-    :type semester: Semester, optional
-    :return: 返回下载的文件数据
-    :rtype: HttpResponse
-    """
-    wb = openpyxl.Workbook()  # 生成一个工作簿（即一个Excel文件）
-    wb.encoding = 'utf-8'
-    # 学时筛选内容
+    )
+    rows = ([
+        record[0] or record[1],
+        *record[2:6],
+        f'{record[6]}-{record[6] + 1}',
+        '春' if record[7] == Semester.SPRING else '秋',
+        '否' if record[8] else '是',
+    ] for record in values.iterator())
+    return title, detail_header, rows
+
+
+def _record_filters(year: int | None, semester: Semester | None) -> dict[str, Any]:
+    '''学时的筛选条件'''
     filter_kws = {}
-    if course is not None:
-        filter_kws[SQ.f(CourseRecord.course)] = course
     if year is not None:
         filter_kws[SQ.f(CourseRecord.year)] = year
     if semester is not None:
         filter_kws[SQ.f(CourseRecord.semester)] = semester
+    return filter_kws
 
-    if course is not None:
+
+def _exported_persons() -> QuerySet[NaturalPerson]:
+    '''导出所有学时时包含的学生'''
+    return NaturalPerson.objects.activated().filter(
+        identity=NaturalPerson.Identity.STUDENT)
+
+
+def course_record_export(course_id: int | None = None, year: int | None = None,
+                         semester: Semester | None = None
+                         ) -> tuple[str, list[Sheet]]:
+    '''学时信息，参数见`download_course_record`'''
+    # 学时筛选内容
+    filter_kws = _record_filters(year, semester)
+    now = datetime.now().strftime('%Y-%m-%d %H:%M')
+
+    if course_id is not None:
         # 助教下载自己课程的学时
-        records = CourseRecord.objects.filter(**filter_kws)
-        _write_detail_sheet(wb.active, records)
-        now = datetime.now().strftime('%Y-%m-%d %H:%M')
-        return _excel_response(wb, f'{course.name}-{now}')
+        course = Course.objects.get(id=course_id)
+        records = CourseRecord.objects.filter(course=course, **filter_kws)
+        return f'{course.name}-{now}', [_detail_sheet(records)]
 
     # 老师下载所有课程的学时
-    # 获取第一个工作表（detail_sheet）
-    detail_sheet = wb.active
-    # 设置明细和汇总两个sheet的相关信息
-    total_sheet: openpyxl.worksheet.worksheet.Worksheet = wb.create_sheet('汇总', 0)
-    first_line = ['学号', '姓名', '总有效学时', '总无效学时']
-    first_line.extend(Course.CourseType.labels)
-    first_line.append('其他')
-    total_sheet.append(first_line)
-
     # 下载所有学时信息，包括无效学时
-    all_person = NaturalPerson.objects.activated().filter(
-        identity=NaturalPerson.Identity.STUDENT)
+    all_person = _exported_persons()
+    records = SQ.mfilter(CourseRecord.person, IN=all_person).filter(**filter_kws)
 
     # 汇总表信息，姓名，学号，总学时
     relate = SQ.Reverse(CourseRecord.person)
@@ -1419,73 +1355,105 @@ def download_course_record(course: Course = None, year: int = None, semester: Se
                             filter=SQ.mq(relate, invalid=True, **filter_kws)),
     ).order_by(SQ.f(NaturalPerson.person_id, User.username))
 
-    def _sum_hours(records: QuerySet[CourseRecord]) -> float:
-        agg = records.filter(**filter_kws).aggregate(sum=Sum('total_hours'))
-        return agg['sum'] or 0
-
-    for person in person_record.select_related(SQ.f(NaturalPerson.person_id)):
-        line = [person.person_id.username, person.name,
-                person.record_hours or 0, 
-                person.invalid_hours or 0]
-        valid_records = SQ.sfilter(CourseRecord.person, person).exclude(invalid=True)
-        # 计算每个类别的学时
-        for course_type in list(Course.CourseType):
-            line.append(_sum_hours(valid_records.filter(course__type=course_type)))
-        # 计算没有对应Course的学时
-        line.append(_sum_hours(valid_records.filter(course__isnull=True)))
-        total_sheet.append(line)
+    # 一次查询每人每个类别的有效学时，没有对应Course的学时类别为None
+    type_hours: dict[tuple[int, int | None], float] = {
+        (person_id, course_type): hours or 0
+        for person_id, course_type, hours in records.filter(invalid=False).values(
+            SQ.f(CourseRecord.person), SQ.f(CourseRecord.course, Course.type),
+        ).annotate(hours=Sum(SQ.f(CourseRecord.total_hours))).values_list(
+            SQ.f(CourseRecord.person), SQ.f(CourseRecord.course, Course.type), 'hours',
+        ).order_by()
+    }
+    course_types = [*Course.CourseType, None]
+
+    total_header = ['学号', '姓名', '总有效学时', '总无效学时']
+    total_header.extend(Course.CourseType.labels)
+    total_header.append('其他')
+    total_rows = ([
+        username, name, record_hours or 0, invalid_hours or 0,
+        *[type_hours.get((person_id, course_type), 0) for course_type in course_types],
+    ] for person_id, username, name, record_hours, invalid_hours in person_record.values_list(
+        'id', SQ.f(NaturalPerson.person_id, User.username), 'name',
+        'record_hours', 'invalid_hours',
+    ).iterator())
 
     # 详细信息
-    records = SQ.mfilter(CourseRecord.person, IN=all_person).filter(**filter_kws)
     order = SQ.f(CourseRecord.person, NaturalPerson.person_id, User.username)
-    _write_detail_sheet(detail_sheet, records.order_by(order))
-    now = datetime.now().strftime('%Y-%m-%d %H:%M')
-    return _excel_response(wb, f'学时汇总-{now}')
+    return f'学时汇总-{now}', [
+        ('汇总', total_header, total_rows),
+        _detail_sheet(records.order_by(order)),
+    ]
 
 
-def download_select_info(single_course: Course | None = None):
-    """
-    下载选课信息
-    single_course:
-        提供single_course时为单个课程服务，只导出该课程的相关人员的选课信息
-        不提供时下载所有选课信息，注意，此时只有相关负责老师可以访问！
-        不提供手动选课人员名单。
+def download_course_record(course: Course = None, year: int = None, semester: Semester = None,
+                           *, user: User | None = None) -> HttpResponse:
+    """返回需要导出的学时信息文件
+    course:
+        提供course时为单个课程服务，只导出该课程的相关人员的学时信息
+        不提供时下载所有学时信息，注意，只有相关负责老师可以访问！
+    :param course: 所选择的课程, defaults to None
+    :type course: Course, optional
+    :param year: 所选择的学年, defaults to None
+    :type year: int, optional
+    :param semester: 所选择的学期, defaults to None
+    :type semester: Semester, optional
+    :param user: 下载者，提供时记录过多的导出在后台生成, defaults to None
+    :type user: User, optional
     :return: 返回下载的文件数据
     :rtype: HttpResponse
     """
-    wb = openpyxl.Workbook()  # 生成一个工作簿（即一个Excel文件）
-    wb.encoding = 'utf-8'
-    sheet_header = ['姓名', '学号']
-    if single_course is not None:
-        courses = [single_course]
+    background = False
+    if course is None and user is not None:
+        # 按实际导出的学时数判断
+        records = SQ.mfilter(CourseRecord.person, IN=_exported_persons()).filter(
+            **_record_filters(year, semester))
+        background = records.count() > CONFIG.export_background_rows
+    return export_response(
+        course_record_export, course and course.id, year, semester,
+        user=user, background=background,
+    )
+
+
+def select_info_export(course_id: int | None = None) -> tuple[str, list[Sheet]]:
+    '''选课信息，参数见`download_select_info`'''
+    if course_id is not None:
+        courses = list(Course.objects.filter(id=course_id))
     else:
-        courses = Course.objects.activated()
+        courses = list(Course.objects.activated())
+    # 导出相关信息，不包括手动选课
+    lucky_ones = CourseParticipant.objects.filter(
+        SQ.mq(CourseParticipant.course, IN=courses),
+        status=CourseParticipant.Status.SUCCESS)
+    course_infos: dict[int, list[list]] = {course.id: [] for course in courses}
+    for course_id, name, username in lucky_ones.values_list(
+        SQ.f(CourseParticipant.course),
+        SQ.f(CourseParticipant.person, NaturalPerson.name),
+        SQ.f(CourseParticipant.person, NaturalPerson.person_id, User.username),
+    ):
+        course_infos[course_id].append([name, username])
     # 为每一门课创建一个新的sheet
-    for course in courses:
-        # 生成新的sheet，并设置表头
-        sheet = wb.create_sheet(title=f'{course.name}')
-        sheet.append(sheet_header)
-        # 导出相关信息，不包括手动选课
-        lucky_ones = CourseParticipant.objects.filter(
-            course=course, status=CourseParticipant.Status.SUCCESS)
-        for info in lucky_ones.values_list(
-            SQ.f(CourseParticipant.person, NaturalPerson.name),
-            SQ.f(CourseParticipant.person, NaturalPerson.person_id, User.username)
-        ):
-            person_info = [
-                info[0],
-                info[1]
-            ]
-            sheet.append(person_info)
-    # 删除多余的第一个sheet
-    wb.remove_sheet(wb.active)
+    sheet_header = ['姓名', '学号']
+    sheets = [(f'{course.name}', sheet_header, course_infos[course.id])
+              for course in courses]
     # 设置文件名
     semester = "春" if courses[0].semester == Semester.SPRING else "秋"
     year = (courses[0].year + 1) if semester == "春" else courses[0].year
     ctime = datetime.now().strftime('%Y-%m-%d %H:%M')
-    if single_course is not None:
-        file_name = f'{year}{semester}{course.name}选课名单-{ctime}'
+    if len(courses) == 1 and course_id is not None:
+        file_name = f'{year}{semester}{courses[0].name}选课名单-{ctime}'
     else:
         file_name = f'{year}{semester}选课名单汇总-{ctime}'
-    # 保存并返回
-    return _excel_response(wb, file_name)
+    return file_name, sheets
+
+
+def download_select_info(single_course: Course | None = None):
+    """
+    下载选课信息
+    single_course:
+        提供single_course时为单个课程服务，只导出该课程的相关人员的选课信息
+        不提供时下载所有选课信息，注意，此时只有相关负责老师可以访问！
+        不提供手动选课人员名单。
+    :return: 返回下载的文件数据
+    :rtype: HttpResponse
+    """
+    return export_response(select_info_export, single_course and single_course.id)
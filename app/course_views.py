@@ -696,7 +696,7 @@ def outputRecord(request: UserRequest):
 
     if me not in examine_teachers:
         return redirect(message_url(wrong("只有书院课审核老师账号可以访问该链接！")))
-    return download_course_record()
+    return download_course_record(user=request.user)
 
 
 @login_required(redirect_field_name="origin")
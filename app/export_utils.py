@@ -0,0 +1,112 @@
+"""
+export_utils.py
+
+导出Excel文件
+
+export_response: 返回导出文件的下载回应，数据较多时改为在后台生成
+generate_export: 后台生成导出文件的定时任务，完成后通知用户下载
+get_export_file: 获取后台生成的导出文件
+
+导出函数返回文件名和工作表，参数需要能被定时任务保存，如主键、年份等
+"""
+import os
+import shutil
+import secrets
+from datetime import datetime, timedelta
+from typing import Callable, Iterable
+
+from django.http import HttpResponse
+from django.shortcuts import redirect
+from django.utils.module_loading import import_string
+
+from app.utils_dependency import *
+from app.models import User, Notification
+from scheduler.adder import ScheduleAdder
+from scheduler.executors import BATCH
+from utils.export import Sheet, write_xlsx, xlsx_response
+
+
+__all__ = [
+    'Exporter',
+    'export_response',
+    'generate_export',
+    'get_export_file',
+]
+
+
+Exporter = Callable[..., tuple[str, Iterable[Sheet]]]
+
+EXPORT_DIR = os.path.join(GLOBAL_CONFIG.temporary_dir, 'export')
+# 后台生成的文件保留时间
+EXPORT_EXPIRE = timedelta(days=1)
+
+
+def export_response(exporter: Exporter, *args, user: User | None = None,
+                    background: bool = False, back_url: str = '/welcome/'
+                    ) -> HttpResponse:
+    '''
+    返回导出文件的下载回应
+
+    :param exporter: 导出函数，须为模块的顶层函数
+    :type exporter: Exporter
+    :param user: 在后台生成时接收通知的用户, defaults to None
+    :type user: User | None, optional
+    :param background: 是否在后台生成，需要提供user, defaults to False
+    :type background: bool, optional
+    :param back_url: 在后台生成时跳转的页面, defaults to '/welcome/'
+    :type back_url: str, optional
+    :return: 文件下载回应，或在后台生成时跳转的提示页面
+    :rtype: HttpResponse
+    '''
+    if not background or user is None:
+        file_name, sheets = exporter(*args)
+        return xlsx_response(file_name, sheets)
+    token = secrets.token_hex(16)
+    # 大量导出在批处理进程池中生成，不占用交互任务的线程
+    ScheduleAdder(generate_export, id=f'export_{token}', executor=BATCH)(
+        user.id, f'{exporter.__module__}.{exporter.__qualname__}', token, *args)
+    return redirect(my_messages.message_url(succeed(
+        '导出的数据较多，正在后台生成，完成后将通过通知发送下载链接'), back_url))
+
+
+def _clear_expired() -> None:
+    if not os.path.isdir(EXPORT_DIR):
+        return
+    expire_time = (datetime.now() - EXPORT_EXPIRE).timestamp()
+    for user_dir in os.scandir(EXPORT_DIR):
+        for token_dir in os.scandir(user_dir.path):
+            if token_dir.stat().st_mtime < expire_time:
+                shutil.rmtree(token_dir.path, ignore_errors=True)
+
+
+def generate_export(user_id: int, exporter_path: str, token: str, *args) -> None:
+    '''生成导出文件并通知用户，exporter_path为导出函数的导入路径'''
+    # app.utils依赖本模块，通知模块间接依赖app.utils
+    from app.notification_utils import notification_create
+    _clear_expired()
+    exporter: Exporter = import_string(exporter_path)
+    file_name, sheets = exporter(*args)
+    export_dir = os.path.join(EXPORT_DIR, str(user_id), token)
+    os.makedirs(export_dir, exist_ok=True)
+    write_xlsx(os.path.join(export_dir, f'{file_name}.xlsx'), sheets)
+    notification_create(
+        receiver=User.objects.get(id=user_id),
+        sender=None,
+        typename=Notification.Type.NEEDREAD,
+        title='导出文件已生成',
+        content=f'{file_name}已生成，请在{EXPORT_EXPIRE.days}天内下载',
+        URL=f'/downloadExport/{token}/',
+    )
+
+
+def get_export_file(user: User, token: str) -> str | None:
+    '''获取用户在后台生成的导出文件路径，不存在时返回None'''
+    if not token.isalnum():
+        return None
+    export_dir = os.path.join(EXPORT_DIR, str(user.id), token)
+    if not os.path.isdir(export_dir):
+        return None
+    for entry in os.scandir(export_dir):
+        if entry.is_file():
+            return entry.path
+    return None
@@ -8,6 +8,10 @@ wechat.py
     由于异步假设，函数只返回尝试状态，即是否设置了定时任务，不保证成功发送
 '''
 from datetime import timedelta
+from collections import defaultdict
+from typing import NamedTuple
+
+from django.db.models import QuerySet, Min
 
 from extern.wechat import send_wechat, DEFAULT_URL
 from app.extern.config import (
@@ -15,7 +19,9 @@ from app.extern.config import (
     Levels as WechatMessageLevel,
     Apps as WechatApp,
 )
-from app.models import NaturalPerson, Organization, Notification, Position
+from app.models import (
+    NaturalPerson, Organization, Notification, Position, BroadcastNotification,
+)
 from app.utils import get_person_or_org
 import utils.models.query as SQ
 from utils.http.utils import build_full_url
@@ -24,7 +30,9 @@ from app.log import logger
 
 __all__ = [
     'WechatApp', 'WechatMessageLevel',
-    'publish_notification', 'publish_notifications',
+    'publish_notification', 'publish_notifications', 'publish_notification_groups',
+    'MessageKey', 'resolve_receivers',
+    'publish_broadcast',
 ]
 
 
@@ -100,31 +108,9 @@ def get_person_receivers(all_receiver_ids, level=None):
     return SQ.qsvlist(receivers, NaturalPerson.person_id, 'username')
 
 
-@logger.secure_func(fail_value=False)
-def publish_notification(notification_or_id,
-                        show_source=True,
-                        app=None, level=None):
-    """
-    根据单个通知或id（实际是主键）向通知的receiver发送
-    别创建了好多通知然后循环调用这个，批量发送用publish_notifications
-    - show_source: bool, 显示消息来源 默认显示
-    - app: str | WechatApp宏, 确定发送的应用 请推广类消息务必注意
-    - level: int | WechatMessageLevel宏, 用于筛选用户 推广类消息可以不填
-    """
-    try:
-        if isinstance(notification_or_id, Notification):
-            notification = notification_or_id
-        else:
-            notification = Notification.objects.get(pk=notification_or_id)
-    except:
-        raise ValueError("未找到该id的通知")
-    if app is None or app == WechatApp.DEFAULT:
-        app = _get_default_app('notification', notification)
-    check_block = app not in CONFIG.unblock_apps
-    url = notification.URL
-    if url and url[0] == "/":  # 相对路径变为绝对路径
-        url = build_full_url(url)
-
+def _build_message(notification, url: str | None,
+                   show_source: bool = True) -> tuple[str, str, dict]:
+    '''生成通知的微信标题、消息内容和发送参数，通知可以是广播通知'''
     title = notification.get_title_display()
     messages = []
     if len(notification.content) < 120:
@@ -155,6 +141,129 @@ def publish_notification(notification_or_id,
 
     # 获取完整消息
     message = '\n'.join(messages)
+    return title, message, kws
+
+
+class MessageKey(NamedTuple):
+    '''决定微信消息内容的通知字段，相同的通知可以合并发送'''
+    sender_id: int
+    typename: int
+    title: str
+    content: str
+    URL: str | None
+
+
+def resolve_receivers(
+    notifications: QuerySet[Notification],
+    level: int | None = None,
+    *,
+    force: bool = False,
+    exclude_unsubscribed: bool = False,
+) -> dict[MessageKey, list[str]]:
+    '''批量获取通知的微信接收人学号，按消息内容分组
+
+    与逐个调用`user2receivers`的结果一致，但查询数与通知数量无关：
+    通知、个人、小组、负责人和取消订阅关系各查询一次。
+
+    Args:
+        notifications(QuerySet[Notification]): 通知范围
+        level(int, optional): 消息等级，提供时筛选接收等级不高于该等级的用户
+        force(bool, optional): 小组负责人均不接收时，是否强制发送给最高职务的负责人
+        exclude_unsubscribed(bool, optional): 是否排除取消订阅了发送小组的个人
+
+    Returns:
+        dict[MessageKey, list[str]]: 消息内容到去重后接收人学号列表的映射
+    '''
+    receiver_groups: dict[MessageKey, list[int]] = defaultdict(list)
+    for receiver_id, *fields in notifications.values_list(
+            'receiver_id', 'sender_id', 'typename', 'title', 'content', 'URL'):
+        receiver_groups[MessageKey(*fields)].append(receiver_id)
+    if not receiver_groups:
+        return {}
+    receiver_ids = {uid for uids in receiver_groups.values() for uid in uids}
+
+    # 个人接收者：user_id -> 学号
+    persons = NaturalPerson.objects.activated().filter(
+        SQ.sq([NaturalPerson.person_id, 'in'], receiver_ids))
+    if level is not None:
+        persons = persons.filter(wechat_receive_level__lte=level)
+    person_usernames: dict[int, str] = dict(persons.values_list(
+        SQ.f(NaturalPerson.person_id), SQ.f(NaturalPerson.person_id, 'username')))
+
+    # 小组接收者：user_id -> 负责人学号
+    org_users: dict[int, int] = dict(
+        Organization.objects.activated().filter(
+            organization_id__in=receiver_ids
+        ).values_list('id', SQ.f(Organization.organization_id)))
+    managers = Position.objects.activated().filter(
+        org__in=list(org_users), is_admin=True,
+    ).values_list('org_id', 'pos', SQ.f(Position.person, 'wechat_receive_level'),
+                  SQ.f(Position.person, NaturalPerson.person_id, 'username'))
+    org_managers: dict[int, list[tuple[int, int, str]]] = defaultdict(list)
+    for org_id, pos, receive_level, username in managers:
+        org_managers[org_users[org_id]].append((pos, receive_level, username))
+    org_usernames: dict[int, list[str]] = {}
+    for org_uid, org_positions in org_managers.items():
+        receivers = [username for _, receive_level, username in org_positions
+                     if level is None or receive_level <= level]
+        if not receivers and force:
+            receivers = [username for pos, _, username in org_positions if pos == 0]
+        org_usernames[org_uid] = receivers
+
+    # 取消订阅关系：(个人user_id, 小组user_id)
+    unsubscribed: set[tuple[int, int]] = set()
+    if exclude_unsubscribed and person_usernames:
+        sender_ids = {key.sender_id for key in receiver_groups}
+        unsubscribed = set(NaturalPerson.unsubscribe_list.through.objects.filter(
+            naturalperson__person_id__in=list(person_usernames),
+            organization__organization_id__in=sender_ids,
+        ).values_list('naturalperson__person_id', 'organization__organization_id'))
+
+    results: dict[MessageKey, list[str]] = {}
+    for key, uids in receiver_groups.items():
+        wechat_receivers = []
+        receiver_set = set()
+        for uid in uids:
+            if uid in person_usernames:
+                if (uid, key.sender_id) in unsubscribed:
+                    continue
+                usernames = [person_usernames[uid]]
+            else:
+                usernames = org_usernames.get(uid, [])
+            for username in usernames:
+                if username not in receiver_set:
+                    wechat_receivers.append(username)
+                    receiver_set.add(username)
+        results[key] = wechat_receivers
+    return results
+
+
+@logger.secure_func(fail_value=False)
+def publish_notification(notification_or_id,
+                        show_source=True,
+                        app=None, level=None):
+    """
+    根据单个通知或id（实际是主键）向通知的receiver发送
+    别创建了好多通知然后循环调用这个，批量发送用publish_notifications
+    - show_source: bool, 显示消息来源 默认显示
+    - app: str | WechatApp宏, 确定发送的应用 请推广类消息务必注意
+    - level: int | WechatMessageLevel宏, 用于筛选用户 推广类消息可以不填
+    """
+    try:
+        if isinstance(notification_or_id, Notification):
+            notification = notification_or_id
+        else:
+            notification = Notification.objects.get(pk=notification_or_id)
+    except:
+        raise ValueError("未找到该id的通知")
+    if app is None or app == WechatApp.DEFAULT:
+        app = _get_default_app('notification', notification)
+    check_block = app not in CONFIG.unblock_apps
+    url = notification.URL
+    if url and url[0] == "/":  # 相对路径变为绝对路径
+        url = build_full_url(url)
+
+    title, message, kws = _build_message(notification, url, show_source)
 
     if check_block and (level is None or level == WechatMessageLevel.DEFAULT):
         # 考虑屏蔽时，获得默认行为的消息等级
@@ -255,36 +364,7 @@ def publish_notifications(
     if url and url[0] == "/":  # 相对路径变为绝对路径
         url = build_full_url(url)
 
-    title = latest_notification.get_title_display()
-    messages = []
-    if len(latest_notification.content) < 120:
-        # 卡片类型消息最多显示256字节
-        # 因留白等原因，内容120字左右就超出了
-        kws = {"card": True}
-        if show_source:
-            sender = get_person_or_org(latest_notification.sender)
-            # 通知内容暂时也一起去除了
-            messages += [f'发送者：{str(sender)}', '通知内容：']
-        messages += [latest_notification.content]
-        if url:
-            kws["url"] = url
-            kws["btntxt"] = "查看详情"
-    else:
-        # 超出卡片字数范围的消息使用文本格式发送
-        kws = {"card": False}
-        messages.append('')
-        if show_source:
-            sender = get_person_or_org(latest_notification.sender)
-            # 通知内容暂时也一起去除了
-            messages += ['发送者：' + f'{str(sender)}', '通知内容：']
-        messages += [latest_notification.content]
-        if url:
-            messages += ['', f'<a href="{url}">阅读原文</a>']
-        else:
-            messages += ['', f'<a href="{DEFAULT_URL}">查看详情</a>']
-
-    # 获取完整消息
-    message = '\n'.join(messages)
+    title, message, kws = _build_message(latest_notification, url, show_source)
 
     # 获得发送应用和消息发送等级
     if app is None or app == WechatApp.DEFAULT:
@@ -296,23 +376,96 @@ def publish_notifications(
         level = None
 
     # 获取接收者列表，小组的接收者为其负责人，去重
-    receiver_ids = notifications.values_list("receiver_id", flat=True)
-    person_receivers = get_person_receivers(receiver_ids, level)
-    wechat_receivers = person_receivers
-    receiver_set = set(wechat_receivers)
-
-    # 接下来是发送给小组的部分
-    org_receivers = Organization.objects.activated().filter(
-        organization_id__in=receiver_ids)
-    for org in org_receivers:
-        managers = [
-            manager for manager in org2receivers(org, level, force=False)
-            if manager not in receiver_set
-        ]
-        wechat_receivers.extend(managers)
-        receiver_set.update(managers)
+    wechat_receivers = []
+    receiver_set = set()
+    for receivers in resolve_receivers(notifications, level).values():
+        wechat_receivers.extend(r for r in receivers if r not in receiver_set)
+        receiver_set.update(receivers)
     if not wechat_receivers:    # 可能都不接收此等级的消息
         return True
 
     send_wechat(wechat_receivers, title, message, api_path=app2path(app), **kws)
     return True
+
+
+def publish_notification_groups(
+    notifications: QuerySet[Notification],
+    show_source=True,
+    app=None, level=None,
+) -> bool:
+    """
+    发送内容不同的一批通知，相同内容的通知合并为一条微信消息
+
+    接收人由`resolve_receivers`一次解析，查询数与通知和内容的种类数无关，
+    发送次数等于内容的种类数；参数含义同publish_notifications
+
+    Returns
+    -------
+    - success: bool, 是否尝试了发送
+    """
+    fields = list(MessageKey._fields)
+    samples = notifications.order_by().values(*fields).annotate(sample=Min('id'))
+    sample_ids = {MessageKey(**{field: row[field] for field in fields}): row['sample']
+                  for row in samples}
+    if not sample_ids:
+        return True
+    sample_objs = Notification.objects.in_bulk(list(sample_ids.values()))
+    first = sample_objs[min(sample_objs)]
+
+    if app is None or app == WechatApp.DEFAULT:
+        app = _get_default_app('notification', first)
+    check_block = app not in CONFIG.unblock_apps
+    if check_block and (level is None or level == WechatMessageLevel.DEFAULT):
+        level = _get_default_level('notification', first)
+    if not check_block:
+        level = None
+
+    for key, wechat_receivers in resolve_receivers(notifications, level).items():
+        if not wechat_receivers:
+            continue
+        notification = sample_objs[sample_ids[key]]
+        url = notification.URL
+        if url and url[0] == "/":  # 相对路径变为绝对路径
+            url = build_full_url(url)
+        title, message, kws = _build_message(notification, url, show_source)
+        send_wechat(wechat_receivers, title, message, api_path=app2path(app), **kws)
+    return True
+
+
+def broadcast_receivers(broadcast: BroadcastNotification, level=None) -> list[str]:
+    '''获取广播通知的接收人学号列表，即发送小组的订阅者'''
+    receivers = NaturalPerson.objects.activated().exclude(
+        SQ.sq([NaturalPerson.unsubscribe_list, Organization.organization_id],
+              broadcast.sender_id))
+    # 提供等级时，不小于接收等级
+    if level is not None:
+        receivers = receivers.filter(wechat_receive_level__lte=level)
+    return SQ.qsvlist(receivers, NaturalPerson.person_id, 'username')
+
+
+@logger.secure_func(fail_value=False)
+def publish_broadcast(broadcast: BroadcastNotification,
+                      show_source=True,
+                      app=None, level=None) -> bool:
+    """
+    向广播通知的所有接收人发送微信，参数含义同publish_notification
+    """
+    if app is None or app == WechatApp.DEFAULT:
+        app = _get_default_app('notification', broadcast)
+    check_block = app not in CONFIG.unblock_apps
+    url = broadcast.URL
+    if url and url[0] == "/":  # 相对路径变为绝对路径
+        url = build_full_url(url)
+
+    title, message, kws = _build_message(broadcast, url, show_source)
+
+    if check_block and (level is None or level == WechatMessageLevel.DEFAULT):
+        level = _get_default_level('notification', broadcast)
+    elif not check_block:
+        level = None
+    wechat_receivers = broadcast_receivers(broadcast, level)
+    if not wechat_receivers:    # 没有人接收
+        return True
+
+    send_wechat(wechat_receivers, title, message, api_path=app2path(app), **kws)
+    return True
@@ -8,13 +8,15 @@ from django.db import transaction  # 原子化更改数据库
 from django.db.models import F
 
 from utils.marker import script
+from utils.cache import cached, bump_version
 import utils.models.query as SQ
 from boot.config import GLOBAL_CONFIG
 from semester.api import current_semester
 from record.models import PageLog
-from scheduler.adder import MultipleAdder
-from scheduler.cancel import remove_job
+from scheduler.adder import ScheduleAdder
+from scheduler.cancel import remove_jobs
 from scheduler.periodic import periodical
+from scheduler.executors import BATCH
 from app.models import (
     User,
     NaturalPerson,
@@ -31,7 +33,7 @@ from app.models import (
     CourseParticipant,
 )
 from app.activity_utils import (
-    changeActivityStatus,
+    sweep_activity_status,
     notifyActivity,
     create_participate_infos,
     weekly_summary_orgs,
@@ -39,6 +41,9 @@ from app.activity_utils import (
 from app.notification_utils import (
     bulk_notification_create,
     notification_create,
+    periodic_notification_create,
+    archive_notifications,
+    prune_periodic_records,
 )
 from app.extern.wechat import WechatApp, WechatMessageLevel
 from app.log import logger
@@ -52,6 +57,8 @@ __all__ = [
     'get_weather',
     'get_weather_async',
     'update_active_score_per_day',
+    'archive_old_notifications',
+    'prune_periodic_notification_records',
     'longterm_launch_course',
     'happy_birthday',
     'weekly_activity_summary_reminder',
@@ -84,46 +91,12 @@ def send_to_orgs(title, message, url='/index/'):
     )
 
 
-@periodical('interval', job_id='activityStatusUpdater', minutes=5)
+@periodical('interval', job_id='activityStatusUpdater', minutes=1)
 def changeAllActivities():
     """
-    频繁执行，添加更新其他活动的定时任务，主要是为了异步调度
-    对于被多次落下的活动，每次更新一步状态
+    频繁执行，按时间范围批量转换所有到期活动的状态，见sweep_activity_status
     """
-    def next_time_generator(first: timedelta | datetime, step: timedelta):
-        while True:
-            yield first
-            first += step
-    now = datetime.now()
-    times = next_time_generator(
-        now + timedelta(seconds=20), timedelta(seconds=5))
-    adder = MultipleAdder(changeActivityStatus)
-
-    def _update_all(_cur, _next, activities):
-        for activity in activities:
-            adder.schedule(f'activity_{activity.id}_{_next}',
-                           run_time=next(times))(activity.id, _cur, _next)
-
-    applying_activities = Activity.objects.filter(
-        status=Activity.Status.APPLYING,
-        apply_end__lte=now,
-    )
-    _update_all(Activity.Status.APPLYING,
-                Activity.Status.WAITING, applying_activities)
-
-    waiting_activities = Activity.objects.filter(
-        status=Activity.Status.WAITING,
-        start__lte=now,
-    )
-    _update_all(Activity.Status.WAITING,
-                Activity.Status.PROGRESSING, waiting_activities)
-
-    progressing_activities = Activity.objects.filter(
-        status=Activity.Status.PROGRESSING,
-        end__lte=now,
-    )
-    _update_all(Activity.Status.PROGRESSING,
-                Activity.Status.END, progressing_activities)
+    sweep_activity_status()
 
 
 @periodical('interval', job_id="get weather per hour", hours=1)
@@ -144,10 +117,12 @@ def get_weather_async():
         os.makedirs(GLOBAL_CONFIG.temporary_dir, exist_ok=True)
         with open(os.path.join(GLOBAL_CONFIG.temporary_dir, "weather.json"), "w") as f:
             json.dump(weather_dict, f)
+        bump_version('weather')
     except:
         logger.exception('天气更新异常')
 
 
+@cached('app:weather', ttl=3600, version_key='weather')
 def get_weather() -> Dict[str, Any]:
     weather_file = os.path.join(GLOBAL_CONFIG.temporary_dir, "weather.json")
     if not os.path.exists(weather_file):
@@ -231,32 +206,9 @@ def add_week_course_activity(course_id: int, weektime_id: int, cur_week: int, co
         week_time.cur_week += 1
         week_time.save()
         activity.save()
-    # 在活动发布时通知参与成员,创建定时任务并修改活动状态
-    changer = MultipleAdder(changeActivityStatus)
-    notifier = MultipleAdder(notifyActivity)
-    # TODO: 修改UNPUBLISHED状态的诡异逻辑和状态切换
-    if activity.need_apply:
-        changer.schedule(f'activity_{activity.id}_{Activity.Status.APPLYING}',
-                         run_time=activity.publish_time
-                         )(activity.id, Activity.Status.UNPUBLISHED, Activity.Status.APPLYING)
-        changer.schedule(f'activity_{activity.id}_{Activity.Status.WAITING}',
-                         run_time=activity.start - timedelta(hours=1)
-                         )(activity.id, Activity.Status.APPLYING, Activity.Status.WAITING)
-    else:
-        changer.schedule(f'activity_{activity.id}_{Activity.Status.WAITING}',
-                         run_time=activity.publish_time
-                         )(activity.id, Activity.Status.UNPUBLISHED, Activity.Status.WAITING)
-
-    notifier.schedule(f'activity_{activity.id}_newCourseActivity',
-                      run_time=activity.publish_time)(activity.id, "newCourseActivity")
-    notifier.schedule(f'activity_{activity.id}_remind',
-                      run_time=activity.start - timedelta(minutes=15))(activity.id, "remind")
-    changer.schedule(f'activity_{activity.id}_{Activity.Status.PROGRESSING}',
-                     run_time=activity.start
-                     )(activity.id, Activity.Status.WAITING, Activity.Status.PROGRESSING)
-    changer.schedule(f'activity_{activity.id}_{Activity.Status.END}',
-                     run_time=activity.end
-                     )(activity.id, Activity.Status.PROGRESSING, Activity.Status.END)
+    # 活动状态的转换和发布时的通知由changeAllActivities定时完成
+    ScheduleAdder(notifyActivity, id=f'activity_{activity.id}_remind',
+                  run_time=activity.start - timedelta(minutes=15))(activity.id, "remind")
 
     notification_create(
         receiver=examine_teacher.person_id,
@@ -293,7 +245,7 @@ def longterm_launch_course():
                         course.id, week_time.id, cur_week, course_stage2)
 
 
-@periodical('cron', 'active_score_updater', hour=1)
+@periodical('cron', 'active_score_updater', hour=1, executor=BATCH)
 def update_active_score_per_day(days=14):
     '''每天计算用户活跃度， 计算前days天（不含今天）内的平均活跃度'''
     with transaction.atomic():
@@ -308,18 +260,36 @@ def update_active_score_per_day(days=14):
                 active_score=F('active_score') + 1 / days)
 
 
+@periodical('cron', 'notification_archiver', hour=4, minute=30, executor=BATCH)
+def archive_old_notifications():
+    '''每天归档超过保留期限的已处理和已删除通知'''
+    before = datetime.now() - timedelta(days=CONFIG.notification_archive_days)
+    count = archive_notifications(before)
+    if count:
+        logger.info(f'已归档{count}条通知')
+
+
+@periodical('cron', 'periodic_notification_pruner', hour=4, minute=45, executor=BATCH)
+def prune_periodic_notification_records():
+    '''每天删除超过保留期限的定时通知记录'''
+    before = datetime.now() - timedelta(days=CONFIG.periodic_record_days)
+    count = prune_periodic_records(before)
+    if count:
+        logger.info(f'已删除{count}条定时通知记录')
+
+
 # TODO: Move these to schedueler app
 def cancel_related_jobs(instance, extra_ids=None):
     '''删除关联的定时任务（可以在模型中预定义related_job_ids）'''
+    job_ids = []
     if hasattr(instance, 'related_job_ids'):
-        job_ids = instance.related_job_ids
-        if callable(job_ids):
-            job_ids = job_ids()
-        for job_id in job_ids:
-            remove_job(job_id)
+        related_ids = instance.related_job_ids
+        if callable(related_ids):
+            related_ids = related_ids()
+        job_ids.extend(related_ids)
     if extra_ids is not None:
-        for job_id in extra_ids:
-            remove_job(job_id)
+        job_ids.extend(extra_ids)
+    remove_jobs(job_ids)
 
 
 def _cancel_jobs(sender, instance, **kwargs):
@@ -362,11 +332,12 @@ def happy_birthday():
     title = "元培学院祝你生日快乐！"
     url = None
     sender = User.objects.get(username='zz00000')
+    period = date.today().isoformat()
     for np, message in zip(crowds, messages):
         receivers = User.objects.filter(
             id__in=SQ.qsvlist(np, NaturalPerson.person_id))
-        bulk_notification_create(
-            receivers, sender,
+        periodic_notification_create(
+            'happy_birthday', period, receivers, sender,
             Notification.Type.NEEDREAD, title, message, url,
             to_wechat=dict(level=WechatMessageLevel.IMPORTANT, show_source=False),
         )
@@ -385,11 +356,14 @@ def weekly_activity_summary_reminder():
     if not cur_semester.start_date <= today <= cur_semester.end_date:
         return
     notify_orgs = weekly_summary_orgs()
+    receivers = User.objects.filter(
+        id__in=SQ.qsvlist(notify_orgs, Organization.organization_id))
     sender = User.objects.get(username='zz00000')
-    for org in notify_orgs.select_related(SQ.f(Organization.organization_id)):
-        notification_create(
-            org.get_user(), sender,
-            Notification.Type.NEEDREAD, '每周活动总结提醒',
-            '如果本周举办了未在系统中申报的活动，请通过每周活动总结及时填报！',
-            to_wechat=dict(show_source=False),
-        )
+    year, week, _ = today.isocalendar()
+    periodic_notification_create(
+        'weekly_activity_summary_reminder', f'{year}-W{week:02d}',
+        receivers, sender,
+        Notification.Type.NEEDREAD, '每周活动总结提醒',
+        '如果本周举办了未在系统中申报的活动，请通过每周活动总结及时填报！',
+        to_wechat=dict(show_source=False),
+    )
@@ -0,0 +1,86 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from generic.models import User
+from app.models import (
+    NaturalPerson,
+    Organization,
+    OrganizationType,
+    Activity,
+    Participation,
+    Notification,
+)
+from app.activity_utils import draw_lots
+
+
+class Command(BaseCommand):
+    help = "测试投点活动抽签的耗时，在当前数据库中创建临时数据，结束后删除"
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument('-n', '--applicants', type=int, default=5000,
+                            help='申请人数，默认5000')
+        parser.add_argument('-c', '--capacity', type=int, default=1000,
+                            help='活动容量，默认1000')
+        parser.add_argument('--prefix', default='benchmark_lots_', help='临时数据的名称前缀')
+
+    def prepare(self, options) -> Activity:
+        prefix = options['prefix']
+        users = User.objects.bulk_create([
+            User(username=f'{prefix}{i}', name=f'{prefix}{i}', utype=User.Type.STUDENT)
+            for i in range(options['applicants'])
+        ], batch_size=500)
+        users = list(User.objects.filter(username__startswith=prefix))
+        persons = NaturalPerson.objects.bulk_create([
+            NaturalPerson(person_id=user, name=user.name) for user in users
+        ], batch_size=500)
+        persons = list(NaturalPerson.objects.filter(person_id__in=users))
+        org_user = User.objects.create_user(f'{prefix}org', f'{prefix}org', User.Type.ORG)
+        otype = OrganizationType.objects.create(
+            otype_id=max(OrganizationType.objects.values_list('otype_id', flat=True),
+                         default=0) + 1,
+            otype_name=f'{prefix}type', incharge=persons[0])
+        org = Organization.objects.create(
+            organization_id=org_user, oname=f'{prefix}org', otype=otype)
+        activity = Activity.objects.create(
+            title=f'{prefix}activity', organization_id=org, examine_teacher=persons[0],
+            capacity=options['capacity'], bidding=True, status=Activity.Status.APPLYING,
+            current_participants=len(persons),
+        )
+        Participation.objects.bulk_create([
+            Participation(activity=activity, person=person) for person in persons
+        ], batch_size=500)
+        return activity
+
+    def cleanup(self, prefix: str):
+        users = User.objects.filter(username__startswith=prefix)
+        Notification.objects.filter(receiver__in=users).delete()
+        Activity.objects.filter(title__startswith=prefix).delete()
+        Organization.objects.filter(oname__startswith=prefix).delete()
+        OrganizationType.objects.filter(otype_name__startswith=prefix).delete()
+        NaturalPerson.objects.filter(person_id__in=users).delete()
+        users.delete()
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        self.cleanup(prefix)
+        activity = self.prepare(options)
+        try:
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                with transaction.atomic():
+                    activity = Activity.objects.select_for_update().get(id=activity.id)
+                    draw_lots(activity)
+                    activity.save()
+                    draw_time = time.perf_counter() - start
+                total_time = time.perf_counter() - start
+            success = Participation.objects.filter(
+                activity=activity, status=Participation.AttendStatus.APPLYSUCCESS).count()
+            self.stdout.write(
+                f'{options["applicants"]}人申请，容量{activity.capacity}，中签{success}人；'
+                f'抽签事务{draw_time * 1000:.0f}ms，含通知共{total_time * 1000:.0f}ms，'
+                f'{len(queries)}次查询')
+        finally:
+            self.cleanup(prefix)
@@ -0,0 +1,86 @@
+import time
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import connection
+
+from generic.models import User, YQPointRecord
+from app.models import Prize, Pool, PoolItem, PoolRecord
+from app.YQPoint_utils import build_random_deck, buy_random_pool
+from utils.global_messages import SUCCEED
+
+
+class Command(BaseCommand):
+    help = "测试盲盒购买的吞吐量，在当前数据库中创建临时奖池和用户，结束后删除"
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument('-n', '--users', type=int, default=1000,
+                            help='购买人数，每人购买一次，默认1000')
+        parser.add_argument('--prizes', type=int, nargs='+', default=[5, 20, 100],
+                            help='各种奖品的数量，其余为空盒')
+        parser.add_argument('--capacity', type=int, default=None,
+                            help='盲盒总数，默认等于购买人数')
+        parser.add_argument('-w', '--workers', type=int, nargs='+', default=None,
+                            help='依次测试的并发数，SQLite只能为1，默认为1和8')
+
+    def prepare(self, options, prefix: str) -> tuple[Pool, list[User]]:
+        capacity = options['capacity'] or options['users']
+        pool = Pool.objects.create(
+            title=f'{prefix}盲盒', type=Pool.Type.RANDOM, ticket_price=1,
+            start=datetime.now() - timedelta(minutes=1),
+        )
+        prize_nums = options['prizes']
+        PoolItem.objects.create(pool=pool, origin_num=max(capacity - sum(prize_nums), 0))
+        for i, num in enumerate(prize_nums):
+            prize = Prize.objects.create(name=f'{prefix}{i}', reference_price=0, stock=num)
+            PoolItem.objects.create(pool=pool, prize=prize, origin_num=num)
+        users = [User.objects.create_user(f'{prefix}{i}', f'{prefix}{i}', YQpoint=10)
+                 for i in range(options['users'])]
+        return pool, users
+
+    def cleanup(self, prefix: str):
+        users = User.objects.filter(username__startswith=prefix)
+        YQPointRecord.objects.filter(user__in=users).delete()
+        Pool.objects.filter(title__startswith=prefix).delete()
+        Prize.objects.filter(name__startswith=prefix).delete()
+        users.delete()
+
+    def run(self, options, workers: int):
+        prefix = f'benchmark_pool_{workers}_'
+        self.cleanup(prefix)
+        pool, users = self.prepare(options, prefix)
+        try:
+            start = time.perf_counter()
+            size = build_random_deck(pool)
+            build_time = time.perf_counter() - start
+
+            def buy(user: User):
+                try:
+                    return buy_random_pool(user, str(pool.id))[0]
+                finally:
+                    if workers > 1:
+                        connection.close()
+
+            start = time.perf_counter()
+            if workers > 1:
+                with ThreadPoolExecutor(workers) as executor:
+                    results = list(executor.map(buy, users))
+            else:
+                results = [buy(user) for user in users]
+            cost = time.perf_counter() - start
+            succeeded = sum(result['warn_code'] == SUCCEED for result in results)
+            records = PoolRecord.objects.filter(pool=pool).count()
+            self.stdout.write(
+                f'并发{workers}：生成{size}件序列{build_time * 1000:.1f}ms，'
+                f'购买{len(users)}次成功{succeeded}次（记录{records}条），'
+                f'耗时{cost:.2f}s，{len(users) / cost:.0f}次/s')
+        finally:
+            self.cleanup(prefix)
+
+    def handle(self, *args, **options):
+        workers_list = options['workers']
+        if workers_list is None:
+            workers_list = [1] if connection.vendor == 'sqlite' else [1, 8]
+        for workers in workers_list:
+            self.run(options, workers)
@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandParser
+
+from app.models import NaturalPerson
+from extern.config import wechat_config as CONFIG
+from extern.stub import StubWechatServer
+# 基准测试需要同步获取发送统计，直接使用底层实现
+from extern.wechat import _deliver_wechat
+
+
+class Command(BaseCommand):
+    help = "离线测试微信群发的吞吐量，使用本地模拟接口，不会发送真实消息"
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument('-n', '--users', type=int, default=5000,
+                            help='模拟接收人数，默认5000')
+        parser.add_argument('--from-db', action='store_true',
+                            help='使用数据库中的全部学生作为接收人')
+        parser.add_argument('-b', '--batch', type=int, default=None,
+                            help='单批次人数，默认使用配置')
+        parser.add_argument('-w', '--workers', type=int, nargs='+', default=None,
+                            help='依次测试的并发批次数，默认为1和配置值')
+        parser.add_argument('--latency', type=float, default=0.2,
+                            help='模拟接口的单次延迟（秒）')
+        parser.add_argument('--jitter', type=float, default=0.0,
+                            help='模拟接口的随机延迟上限（秒）')
+        parser.add_argument('--error-rate', type=float, default=0.0,
+                            help='整批失败的概率')
+        parser.add_argument('--partial-rate', type=float, default=0.0,
+                            help='部分用户失败的概率')
+        parser.add_argument('--retry', type=int, default=1,
+                            help='单批次最多发送次数')
+        parser.add_argument('--seed', type=int, default=0, help='随机数种子')
+
+    def get_users(self, options) -> list[str]:
+        if options['from_db']:
+            students = NaturalPerson.objects.activated().filter(
+                identity=NaturalPerson.Identity.STUDENT)
+            return sorted(students.values_list('person_id__username', flat=True))
+        return [str(2300000000 + i) for i in range(options['users'])]
+
+    def handle(self, *args, **options):
+        users = self.get_users(options)
+        batch_size = options['batch'] or CONFIG.send_batch
+        workers_list = options['workers'] or sorted({1, CONFIG.send_workers})
+        self.stdout.write(f'接收人数：{len(users)}，单批次：{batch_size}')
+        for workers in workers_list:
+            with StubWechatServer(
+                latency=options['latency'], jitter=options['jitter'],
+                error_rate=options['error_rate'],
+                partial_rate=options['partial_rate'],
+                seed=options['seed'],
+            ) as stub:
+                report = _deliver_wechat(
+                    users, '基准测试<title>消息内容', stub.url,
+                    retry_times=options['retry'],
+                    batch_size=batch_size, workers=workers,
+                )
+            self.stdout.write(
+                f'并发{workers}：{report.batches}批，'
+                f'成功{report.succeeded}/{report.users}，'
+                f'失败{report.failed_batches}批，'
+                f'用时{report.elapsed:.2f}s，'
+                f'{report.rate:.0f}条/s，'
+                f'请求{stub.stats.requests}次，连接{stub.stats.connections}个'
+            )
@@ -0,0 +1,151 @@
+import time
+import random
+import threading
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+from django.db import connection, transaction
+
+from generic.models import User
+from app.models import (
+    NaturalPerson,
+    Organization,
+    OrganizationType,
+    Activity,
+    Participation,
+    ActivityWaitlist,
+)
+from app.activity_utils import apply_activity, withdraw_activity, ActivityException
+
+
+class Command(BaseCommand):
+    help = "多线程并发报名和取消报名，检查活动人数始终不超过容量，在当前数据库中创建临时数据，结束后删除"
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument('-n', '--users', type=int, default=200, help='报名人数，默认200')
+        parser.add_argument('-c', '--capacity', type=int, default=50, help='活动容量，默认50')
+        parser.add_argument('-w', '--workers', type=int, default=8,
+                            help='并发数，SQLite只能为1，默认8')
+        parser.add_argument('--withdraw', type=float, default=0.3,
+                            help='报名后取消的概率')
+        parser.add_argument('--seed', type=int, default=0, help='随机数种子')
+        parser.add_argument('--prefix', default='loadtest_apply_', help='临时数据的名称前缀')
+
+    def prepare(self, options) -> tuple[Activity, list[User]]:
+        prefix = options['prefix']
+        users = [User.objects.create_user(f'{prefix}{i}', f'{prefix}{i}')
+                 for i in range(options['users'])]
+        persons = [NaturalPerson.objects.create(user, name=user.name) for user in users]
+        org_user = User.objects.create_user(f'{prefix}org', f'{prefix}org',
+                                            User.Type.ORG)
+        otype = OrganizationType.objects.create(
+            otype_id=max(OrganizationType.objects.values_list('otype_id', flat=True),
+                         default=0) + 1,
+            otype_name=f'{prefix}type', incharge=persons[0])
+        org = Organization.objects.create(
+            organization_id=org_user, oname=f'{prefix}org', otype=otype)
+        activity = Activity.objects.create(
+            title=f'{prefix}activity', organization_id=org, examine_teacher=persons[0],
+            capacity=options['capacity'], status=Activity.Status.APPLYING,
+        )
+        return activity, users
+
+    def cleanup(self, prefix: str):
+        Activity.objects.filter(title__startswith=prefix).delete()
+        Organization.objects.filter(oname__startswith=prefix).delete()
+        OrganizationType.objects.filter(otype_name__startswith=prefix).delete()
+        NaturalPerson.objects.filter(person_id__username__startswith=prefix).delete()
+        User.objects.filter(username__startswith=prefix).delete()
+
+    def verify(self, activity: Activity) -> list[str]:
+        '''检查报名人数、参与信息和候补名单一致'''
+        activity.refresh_from_db(fields=['current_participants', 'capacity'])
+        participation = Participation.objects.filter(activity=activity)
+        seated = participation.filter(status=Participation.AttendStatus.APPLYSUCCESS)
+        waitlist = ActivityWaitlist.objects.filter(activity=activity)
+        errors = []
+        if activity.current_participants > activity.capacity:
+            errors.append(f'报名人数{activity.current_participants}超过容量{activity.capacity}')
+        if activity.current_participants != seated.count():
+            errors.append(f'报名人数{activity.current_participants}与'
+                          f'报名成功的参与信息{seated.count()}不一致')
+        if waitlist.filter(person__in=seated.values('person')).exists():
+            errors.append('存在既已报名又在候补的用户')
+        if waitlist.exists() and activity.current_participants < activity.capacity:
+            errors.append('仍有空余名额时存在候补者')
+        return errors
+
+    def run(self, activity: Activity, users: list[User], options) -> dict[str, int]:
+        rng = random.Random(options['seed'])
+        plans = [rng.random() < options['withdraw'] for _ in users]
+        counts = dict(applied=0, waiting=0, withdrawn=0, peak=0)
+        lock = threading.Lock()
+        stop = threading.Event()
+
+        def action(user: User, withdraw: bool):
+            request = SimpleNamespace(user=user)
+            try:
+                with transaction.atomic():
+                    applied = apply_activity(request, Activity.objects.get(id=activity.id))
+                if withdraw:
+                    with transaction.atomic():
+                        withdraw_activity(request, Activity.objects.get(id=activity.id))
+                with lock:
+                    counts['applied' if applied else 'waiting'] += 1
+                    counts['withdrawn'] += withdraw
+            except ActivityException:
+                pass
+            finally:
+                if options['workers'] > 1:
+                    connection.close()
+
+        def monitor():
+            try:
+                while not stop.is_set():
+                    current = Activity.objects.values_list(
+                        'current_participants', flat=True).get(id=activity.id)
+                    counts['peak'] = max(counts['peak'], current)
+                    time.sleep(0.01)
+            finally:
+                connection.close()
+
+        watcher = None
+        if options['workers'] > 1:
+            watcher = threading.Thread(target=monitor, daemon=True)
+            watcher.start()
+        try:
+            if options['workers'] > 1:
+                with ThreadPoolExecutor(options['workers']) as executor:
+                    list(executor.map(action, users, plans))
+            else:
+                for user, withdraw in zip(users, plans):
+                    action(user, withdraw)
+        finally:
+            stop.set()
+            if watcher is not None:
+                watcher.join()
+        return counts
+
+    def handle(self, *args, **options):
+        if connection.vendor == 'sqlite' and options['workers'] > 1:
+            raise CommandError('SQLite的写事务无法并发，请使用-w 1')
+        prefix = options['prefix']
+        self.cleanup(prefix)
+        activity, users = self.prepare(options)
+        try:
+            start = time.perf_counter()
+            counts = self.run(activity, users, options)
+            cost = time.perf_counter() - start
+            errors = self.verify(activity)
+            if counts['peak'] > activity.capacity:
+                errors.append(f'运行中报名人数达到{counts["peak"]}，超过容量')
+            self.stdout.write(
+                f'并发{options["workers"]}：{len(users)}人，容量{activity.capacity}，'
+                f'直接报名{counts["applied"]}，候补{counts["waiting"]}，'
+                f'取消{counts["withdrawn"]}，最终报名{activity.current_participants}，'
+                f'耗时{cost:.2f}s')
+        finally:
+            self.cleanup(prefix)
+        if errors:
+            raise CommandError('；'.join(errors))
@@ -0,0 +1,50 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:28
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('app', '0005_alter_participation_activity_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BroadcastNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(blank=True, max_length=50, null=True, verbose_name='通知标题')),
+                ('content', models.TextField(blank=True, verbose_name='通知内容')),
+                ('start_time', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='通知发出时间')),
+                ('typename', models.SmallIntegerField(choices=[(0, '知晓类'), (1, '处理类')], default=0)),
+                ('URL', models.URLField(blank=True, max_length=1024, null=True, verbose_name='相关网址')),
+                ('anonymous_flag', models.BooleanField(default=False, verbose_name='是否匿名')),
+                ('relate_instance', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='relate_broadcasts', to='app.commentbase')),
+                ('sender', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='send_broadcast', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'o.广播通知',
+                'verbose_name_plural': 'o.广播通知',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='BroadcastReceipt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.SmallIntegerField(choices=[(0, '已处理'), (1, '待处理'), (2, '已删除')], default=0)),
+                ('finish_time', models.DateTimeField(blank=True, null=True, verbose_name='通知处理时间')),
+                ('broadcast', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='receipts', to='app.broadcastnotification')),
+                ('receiver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='broadcast_receipts', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'o.广播通知状态',
+                'verbose_name_plural': 'o.广播通知状态',
+                'unique_together': {('broadcast', 'receiver')},
+            },
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:32
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('app', '0006_broadcastnotification'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationArchive',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='原通知id')),
+                ('status', models.SmallIntegerField(choices=[(0, '已处理'), (1, '待处理'), (2, '已删除')])),
+                ('title', models.CharField(blank=True, max_length=50, null=True, verbose_name='通知标题')),
+                ('content', models.TextField(blank=True, verbose_name='通知内容')),
+                ('start_time', models.DateTimeField(verbose_name='通知发出时间')),
+                ('finish_time', models.DateTimeField(blank=True, null=True, verbose_name='通知处理时间')),
+                ('typename', models.SmallIntegerField(choices=[(0, '知晓类'), (1, '处理类')])),
+                ('URL', models.URLField(blank=True, max_length=1024, null=True, verbose_name='相关网址')),
+                ('bulk_identifier', models.CharField(default='', max_length=64, verbose_name='批量信息标识')),
+                ('anonymous_flag', models.BooleanField(default=False, verbose_name='是否匿名')),
+                ('archive_time', models.DateTimeField(auto_now_add=True, verbose_name='归档时间')),
+            ],
+            options={
+                'verbose_name': 'o.归档通知',
+                'verbose_name_plural': 'o.归档通知',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['receiver', 'status', 'start_time'], name='notification_receiver_page'),
+        ),
+        migrations.AddField(
+            model_name='notificationarchive',
+            name='receiver',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='notificationarchive',
+            name='relate_instance',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='app.commentbase'),
+        ),
+        migrations.AddField(
+            model_name='notificationarchive',
+            name='sender',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:34
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('app', '0007_notificationarchive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PeriodicNotificationRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('job', models.CharField(max_length=64, verbose_name='任务')),
+                ('period', models.CharField(max_length=32, verbose_name='周期')),
+                ('create_time', models.DateTimeField(auto_now_add=True, verbose_name='通知时间')),
+                ('receiver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'o.定时通知记录',
+                'verbose_name_plural': 'o.定时通知记录',
+                'unique_together': {('job', 'period', 'receiver')},
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:56
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0008_periodicnotificationrecord'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PoolSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order', models.IntegerField(verbose_name='顺序')),
+                ('claimed', models.BooleanField(default=False, verbose_name='已抽出')),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.poolitem', verbose_name='奖池奖品')),
+                ('pool', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='app.pool', verbose_name='奖池')),
+            ],
+            options={
+                'verbose_name': '5.盲盒奖品序列',
+                'verbose_name_plural': '5.盲盒奖品序列',
+                'indexes': [models.Index(fields=['pool', 'claimed', 'order'], name='app_poolslo_pool_id_b08203_idx')],
+                'unique_together': {('pool', 'order')},
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_poolslot'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ActivityWaitlist',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('time', models.DateTimeField(auto_now_add=True, verbose_name='候补时间')),
+                ('activity', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.activity')),
+                ('person', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='app.naturalperson')),
+            ],
+            options={
+                'verbose_name': '3.活动候补',
+                'verbose_name_plural': '3.活动候补',
+                'ordering': ['id'],
+                'unique_together': {('activity', 'person')},
+            },
+        ),
+    ]
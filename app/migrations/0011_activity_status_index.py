@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_activitywaitlist'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['status', 'publish_time'], name='activity_status_publish'),
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['status', 'apply_end'], name='activity_status_apply_end'),
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['status', 'start'], name='activity_status_start'),
+        ),
+        migrations.AddIndex(
+            model_name='activity',
+            index=models.Index(fields=['status', 'end'], name='activity_status_end'),
+        ),
+    ]
@@ -43,6 +43,7 @@ from typing import TypeAlias
 
 from django.db import models, transaction
 from django.db.models import Q, QuerySet, Sum
+from django.db.models.functions import Coalesce
 from django_mysql.models.fields import ListCharField
 from typing_extensions import Self
 
@@ -52,6 +53,7 @@ import utils.models.query as SQ
 from utils.models.descriptor import (invalid_for_frontend,
                                      necessary_for_frontend)
 from utils.models.semester import Semester, select_current
+from utils.cache import invalidate_on
 
 __all__ = [
     # 模型
@@ -69,7 +71,12 @@ __all__ = [
     'Activity',
     'ActivityPhoto',
     'Participation',
+    'ActivityWaitlist',
     'Notification',
+    'NotificationArchive',
+    'PeriodicNotificationRecord',
+    'BroadcastNotification',
+    'BroadcastReceipt',
     'Comment',
     'CommentPhoto',
     'ModifyOrganization',
@@ -92,6 +99,7 @@ __all__ = [
     'Pool',
     'PoolItem',
     'PoolRecord',
+    'PoolSlot',
 ]
 
 
@@ -870,6 +878,13 @@ class Activity(CommentBase):
     class Meta:
         verbose_name = "3.活动"
         verbose_name_plural = verbose_name
+        indexes = [
+            # 定时按状态和时间范围查询到期的活动
+            models.Index(fields=["status", "publish_time"], name="activity_status_publish"),
+            models.Index(fields=["status", "apply_end"], name="activity_status_apply_end"),
+            models.Index(fields=["status", "start"], name="activity_status_start"),
+            models.Index(fields=["status", "end"], name="activity_status_end"),
+        ]
 
     """
     Jul 30晚, Activity类经历了较大的更新, 请阅读群里[活动发起逻辑]文档，看一下活动发起需要用到的变量
@@ -1131,6 +1146,23 @@ class Participation(models.Model):
     objects: ParticipationManager = ParticipationManager()
 
 
+class ActivityWaitlist(models.Model):
+    '''
+    先到先得活动报满后的候补名单，按加入顺序递补
+
+    候补者不创建参与信息，有人取消报名时，最早的候补者直接获得其名额
+    '''
+    class Meta:
+        verbose_name = "3.活动候补"
+        verbose_name_plural = verbose_name
+        ordering = ["id"]
+        unique_together = ["activity", "person"]
+
+    activity = models.ForeignKey(Activity, on_delete=models.CASCADE, related_name='+')
+    person = models.ForeignKey(NaturalPerson, on_delete=models.CASCADE, related_name='+')
+    time = models.DateTimeField("候补时间", auto_now_add=True)
+
+
 class NotificationManager(models.Manager['Notification']):
     def activated(self):
         return self.exclude(status=Notification.Status.DELETE)
@@ -1141,6 +1173,11 @@ class Notification(models.Model):
         verbose_name = "o.通知消息"
         verbose_name_plural = verbose_name
         ordering = ["id"]
+        indexes = [
+            # 通知信箱按状态和时间分页读取
+            models.Index(fields=["receiver", "status", "start_time"],
+                         name="notification_receiver_page"),
+        ]
 
     receiver = models.ForeignKey(
         User, related_name="recv_notice", on_delete=models.CASCADE
@@ -1198,6 +1235,153 @@ class Notification(models.Model):
         return str(self.title)
 
 
+class NotificationArchive(models.Model):
+    '''
+    归档的通知，保留原通知的id和内容
+
+    已处理或已删除且超过保留期限的通知由定时任务移入本表，不再在通知信箱中显示
+    '''
+    class Meta:
+        verbose_name = "o.归档通知"
+        verbose_name_plural = verbose_name
+        ordering = ["id"]
+
+    id = models.BigIntegerField("原通知id", primary_key=True)
+    receiver = models.ForeignKey(
+        User, related_name="+", on_delete=models.CASCADE
+    )
+    sender = models.ForeignKey(
+        User, related_name="+", on_delete=models.CASCADE
+    )
+    status = models.SmallIntegerField(choices=Notification.Status.choices)
+    title = models.CharField("通知标题", blank=True, null=True, max_length=50)
+    content = models.TextField("通知内容", blank=True)
+    start_time = models.DateTimeField("通知发出时间")
+    finish_time = models.DateTimeField("通知处理时间", blank=True, null=True)
+    typename = models.SmallIntegerField(choices=Notification.Type.choices)
+    URL = models.URLField("相关网址", null=True, blank=True, max_length=1024)
+    bulk_identifier = models.CharField("批量信息标识", max_length=64, default="")
+    anonymous_flag = models.BooleanField("是否匿名", default=False)
+    relate_instance = models.ForeignKey(
+        CommentBase,
+        related_name="+",
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+    )
+    archive_time = models.DateTimeField("归档时间", auto_now_add=True)
+
+    ARCHIVED_FIELDS = [
+        'id', 'receiver_id', 'sender_id', 'status', 'title', 'content',
+        'start_time', 'finish_time', 'typename', 'URL', 'bulk_identifier',
+        'anonymous_flag', 'relate_instance_id',
+    ]
+
+    @classmethod
+    def from_notification(cls, notification: Notification) -> 'NotificationArchive':
+        return cls(**{field: getattr(notification, field)
+                      for field in cls.ARCHIVED_FIELDS})
+
+
+class PeriodicNotificationRecord(models.Model):
+    '''
+    定时任务的通知记录，每个任务在同一周期内对每个接收者只通知一次
+
+    任务中断后重新执行时，已有记录的接收者不会被再次通知
+    '''
+    class Meta:
+        verbose_name = "o.定时通知记录"
+        verbose_name_plural = verbose_name
+        unique_together = ["job", "period", "receiver"]
+
+    job = models.CharField("任务", max_length=64)
+    period = models.CharField("周期", max_length=32)
+    receiver = models.ForeignKey(
+        User, related_name="+", on_delete=models.CASCADE
+    )
+    create_time = models.DateTimeField("通知时间", auto_now_add=True)
+
+
+class BroadcastNotificationManager(models.Manager['BroadcastNotification']):
+    def visible_to(self, user: User) -> QuerySet['BroadcastNotification']:
+        '''用户可见的广播：仅自然人可见，且须晚于注册、未取关发送小组'''
+        if not user.is_person():
+            return self.none()
+        return self.filter(start_time__gte=user.date_joined).exclude(
+            SQ.q(BroadcastNotification.sender, User.organization,
+                 Organization.unsubscribers, NaturalPerson.person_id, value=user))
+
+    def unread_by(self, user: User) -> QuerySet['BroadcastNotification']:
+        '''用户可见且没有状态记录的广播'''
+        return self.visible_to(user).exclude(
+            SQ.q(BroadcastNotification.receipts, BroadcastReceipt.receiver, value=user))
+
+    def with_status(self, user: User) -> QuerySet['BroadcastNotification']:
+        '''用户可见且未删除的广播，标注用户的status和finish_time'''
+        receipts = BroadcastReceipt.objects.filter(
+            broadcast=models.OuterRef('pk'), receiver=user)
+        return self.visible_to(user).annotate(
+            status=Coalesce(models.Subquery(receipts.values('status')[:1]),
+                            models.Value(Notification.Status.UNDONE)),
+            finish_time=models.Subquery(receipts.values('finish_time')[:1]),
+        ).exclude(status=Notification.Status.DELETE)
+
+
+class BroadcastNotification(models.Model):
+    '''
+    广播通知，每次发布只保存一条记录
+
+    接收范围为发送小组的订阅者，在读取时计算，用户的已读和删除状态记录在
+    BroadcastReceipt中，没有记录的广播视为未读
+    '''
+    class Meta:
+        verbose_name = "o.广播通知"
+        verbose_name_plural = verbose_name
+        ordering = ["id"]
+
+    sender = models.ForeignKey(
+        User, related_name="send_broadcast", on_delete=models.CASCADE
+    )
+    title = models.CharField("通知标题", blank=True, null=True, max_length=50)
+    content = models.TextField("通知内容", blank=True)
+    start_time = models.DateTimeField("通知发出时间", auto_now_add=True,
+                                      db_index=True)
+    typename = models.SmallIntegerField(choices=Notification.Type.choices,
+                                        default=Notification.Type.NEEDREAD)
+    URL = models.URLField("相关网址", null=True, blank=True, max_length=1024)
+    anonymous_flag = models.BooleanField("是否匿名", default=False)
+    relate_instance = models.ForeignKey(
+        CommentBase,
+        related_name="relate_broadcasts",
+        on_delete=models.CASCADE,
+        blank=True,
+        null=True,
+    )
+
+    objects: BroadcastNotificationManager = BroadcastNotificationManager()
+
+    def get_title_display(self):
+        return str(self.title)
+
+
+class BroadcastReceipt(models.Model):
+    '''广播通知的个人状态，只记录已读和删除'''
+    class Meta:
+        verbose_name = "o.广播通知状态"
+        verbose_name_plural = verbose_name
+        unique_together = ["broadcast", "receiver"]
+
+    broadcast = models.ForeignKey(
+        BroadcastNotification, related_name="receipts", on_delete=models.CASCADE
+    )
+    receiver: User = models.ForeignKey(
+        User, related_name="broadcast_receipts", on_delete=models.CASCADE
+    )
+    status = models.SmallIntegerField(choices=Notification.Status.choices,
+                                      default=Notification.Status.DONE)
+    finish_time = models.DateTimeField("通知处理时间", blank=True, null=True)
+
+
 class Comment(models.Model):
     class Meta:
         verbose_name = "2.评论"
@@ -1396,6 +1580,9 @@ class Help(models.Model):
         return self.title
 
 
+invalidate_on('help', Help)
+
+
 class Wishes(models.Model):
     class Meta:
         verbose_name = "~A.心愿"
@@ -1893,6 +2080,24 @@ class PoolRecord(models.Model):
     redeem_time = models.DateTimeField('兑奖时间', null=True, blank=True)
 
 
+class PoolSlot(models.Model):
+    '''
+    盲盒奖池预先打乱的奖品序列，每个位置对应一件奖品
+
+    购买时按顺序取出第一个未抽出的位置，与每次无放回随机抽取一件的概率相同
+    '''
+    class Meta:
+        verbose_name = '5.盲盒奖品序列'
+        verbose_name_plural = verbose_name
+        unique_together = ['pool', 'order']
+        indexes = [models.Index(fields=['pool', 'claimed', 'order'])]
+
+    pool = models.ForeignKey(Pool, verbose_name='奖池', on_delete=models.CASCADE)
+    order = models.IntegerField('顺序')
+    item = models.ForeignKey(PoolItem, verbose_name='奖池奖品', on_delete=models.CASCADE)
+    claimed = models.BooleanField('已抽出', default=False)
+
+
 class ActivitySummary(models.Model):
     class Meta:
         verbose_name = "3.活动总结"
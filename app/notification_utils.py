@@ -1,19 +1,30 @@
 from random import random
-from typing import Union, List
+from typing import Union, List, Iterable
 from datetime import datetime, timedelta
 
 from generic.models import User
 from boot.config import GLOBAL_CONFIG
 from app.utils_dependency import *
-from app.models import Notification
+from app.models import (
+    Notification,
+    NotificationArchive,
+    PeriodicNotificationRecord,
+    BroadcastNotification,
+    BroadcastReceipt,
+)
 from app.extern.wechat import (
     publish_notification,
     publish_notifications,
+    publish_notification_groups,
+    publish_broadcast,
     WechatApp,
     WechatMessageLevel,
 )
 from app.log import logger
 
+from django.db import IntegrityError
+from django.db.models import Q
+
 
 hasher = MySHA256Hasher("")
 
@@ -21,7 +32,15 @@ __all__ = [
     'notification_status_change',
     'notification_create',
     'bulk_notification_create',
+    'multi_notification_create',
+    'periodic_notification_create',
+    'broadcast_create',
+    'broadcast_status_change',
+    'parse_display_id',
     'notification2Display',
+    'notification_page',
+    'archive_notifications',
+    'prune_periodic_records',
 ]
 
 
@@ -323,6 +342,241 @@ def bulk_notification_create(
     return success, bulk_identifier
 
 
+def multi_notification_create(
+        notifications: list[Notification],
+        *,
+        to_wechat: bool | dict = False,
+) -> tuple[bool, str | None]:
+    """
+    一次创建内容不同的一批通知，如多个活动分别通知其接收者
+
+    通知共用一个识别码，微信按内容分组发送，见`publish_notification_groups`
+
+    :param notifications: 未保存的通知，识别码由本函数设置
+    :type notifications: list[Notification]
+    :param to_wechat: 仅关键字参数，同`bulk_notification_create`, defaults to False
+    :type to_wechat: bool | dict, optional
+    :return: 是否成功，以及识别码
+    :rtype: tuple[bool, str | None]
+    """
+    if not notifications:
+        return True, None
+    bulk_identifier = None
+    try:
+        first = notifications[0]
+        bulk_identifier = get_bulk_identifier(
+            sender=first.sender_id, typename=first.typename, title=first.title,
+            content=first.content, URL=first.URL,
+            extra_str=f'{len(notifications)}@{datetime.now()}{random()}',
+        )
+        for notification in notifications:
+            notification.bulk_identifier = bulk_identifier
+        Notification.objects.bulk_create(notifications, 50)
+        if to_wechat is True or isinstance(to_wechat, dict):
+            publish_kws = {} if to_wechat is True else to_wechat
+            publish_notification_groups(
+                Notification.objects.filter(bulk_identifier=bulk_identifier),
+                **publish_kws)
+    except Exception:
+        logger.exception(f'批量创建不同内容的通知时发生错误：识别码为{bulk_identifier}')
+        return False, bulk_identifier
+    return True, bulk_identifier
+
+
+def _publish_periodic(bulk_identifier: str, publish_kws: dict) -> None:
+    '''
+    发送定时通知的微信，个人通知批量发送
+
+    小组通知与`notification_create`一致逐个发送：负责人均不接收时转发给最高职务的负责人，
+    并注明消息来源，定时通知的接收小组通常很少
+    '''
+    org_filter = {'receiver__utype': User.Type.ORG}
+    for notification in Notification.objects.filter(
+            bulk_identifier=bulk_identifier, **org_filter):
+        publish_notification(notification, **publish_kws)
+    publish_notifications(filter_kws={'bulk_identifier': bulk_identifier},
+                          exclude_kws=org_filter, **publish_kws)
+
+
+def periodic_notification_create(
+        job: str,
+        period: str,
+        receivers: Iterable[User],
+        sender: User | None,
+        typename: Notification.Type,
+        title: str,
+        content: str,
+        URL: str | None = None,
+        *,
+        to_wechat: bool | dict = False,
+) -> int:
+    """
+    定时任务批量通知，同一任务在同一周期内对每个接收者只通知一次
+
+    通知和定时通知记录在同一事务中批量创建，任务中断后重新执行是幂等的；
+    事务提交后才一次性发送微信
+
+    :param job: 任务名，建议使用定时任务的id
+    :type job: str
+    :param period: 周期标识，如`2023-W08`，由任务自行决定
+    :type period: str
+    :param receivers: 接收者
+    :type receivers: Iterable[User]
+    :param to_wechat: 仅关键字参数，同`bulk_notification_create`, defaults to False
+    :type to_wechat: bool | dict, optional
+    :return: 本次新通知的人数
+    :rtype: int
+
+    其余参数同`notification_create`
+    """
+    sender = sender or get_default_sender()
+    receivers = list(receivers)
+    try:
+        with transaction.atomic():
+            notified = set(PeriodicNotificationRecord.objects.filter(
+                job=job, period=period,
+                receiver__in=receivers,
+            ).values_list('receiver_id', flat=True))
+            receivers = [receiver for receiver in receivers
+                         if receiver.id not in notified]
+            if not receivers:
+                return 0
+            # 每次执行的识别码不同，保证只发送本次创建的通知
+            bulk_identifier = get_bulk_identifier(
+                sender=sender.id, typename=typename, title=title,
+                content=content, URL=URL,
+                extra_str=f'{job}@{period}@{datetime.now()}',
+            )
+            PeriodicNotificationRecord.objects.bulk_create([
+                PeriodicNotificationRecord(job=job, period=period, receiver=receiver)
+                for receiver in receivers
+            ])
+            Notification.objects.bulk_create([
+                Notification(
+                    receiver=receiver,
+                    sender=sender,
+                    typename=typename,
+                    title=title,
+                    content=content,
+                    URL=URL,
+                    bulk_identifier=bulk_identifier,
+                ) for receiver in receivers
+            ], 50)
+            if to_wechat is True or isinstance(to_wechat, dict):
+                publish_kws = {} if to_wechat is True else to_wechat
+                transaction.on_commit(
+                    lambda: _publish_periodic(bulk_identifier, publish_kws))
+    except IntegrityError:
+        # 同一任务正在其它进程中执行，由其负责通知
+        logger.warning(f'定时通知{job}@{period}正在执行，已跳过')
+        return 0
+    return len(receivers)
+
+
+def broadcast_create(
+        sender: User,
+        title: str,
+        content: str,
+        URL: str | None = None,
+        relate_instance=None,
+        *,
+        to_wechat: bool | dict = False,
+) -> BroadcastNotification:
+    """
+    创建面向发送小组所有订阅者的知晓类广播通知，只写入一条记录
+
+    接收范围在读取时计算，适用于订阅者通知等接收人极多的场景，
+    面向具体个人的通知仍应使用`bulk_notification_create`
+
+    :param to_wechat: 仅关键字参数，为字典时视为发送给微信的额外参数，
+                      参考publish_notification即可，在线程锁或原子锁内时，不要发送
+    :type to_wechat: bool | dict
+    :return: 创建的广播通知
+    :rtype: BroadcastNotification
+    """
+    broadcast = BroadcastNotification.objects.create(
+        sender=sender,
+        typename=Notification.Type.NEEDREAD,
+        title=title,
+        content=content,
+        URL=URL,
+        relate_instance=relate_instance,
+    )
+    if to_wechat is True or isinstance(to_wechat, dict):
+        publish_kws = {} if to_wechat is True else to_wechat
+        publish_broadcast(broadcast, **publish_kws)
+    return broadcast
+
+
+def broadcast_status_change(
+    broadcast_id: int,
+    user: User,
+    to_status: Notification.Status = None,
+) -> MESSAGECONTEXT:
+    """
+    修改用户的广播通知状态，行为与`notification_status_change`相同
+
+    :param broadcast_id: 广播通知的主键
+    :type broadcast_id: int
+    :param user: 接收者
+    :type user: User
+    :param to_status: 希望转变为的状态，不填为翻转, defaults to None
+    :type to_status: Notification.Status, optional
+    :return: 执行情况的信息
+    :rtype: MESSAGECONTEXT
+    """
+    context = wrong("在修改通知状态的过程中发生错误，请联系管理员！")
+    if not BroadcastNotification.objects.visible_to(user).filter(
+            id=broadcast_id).exists():
+        return wrong("该通知不存在！", context)
+
+    with transaction.atomic():
+        receipt, _ = BroadcastReceipt.objects.select_for_update().get_or_create(
+            broadcast_id=broadcast_id, receiver=user,
+            defaults=dict(status=Notification.Status.UNDONE),
+        )
+        if to_status is None:
+            if receipt.status == Notification.Status.DONE:
+                to_status = Notification.Status.UNDONE
+            elif receipt.status == Notification.Status.UNDONE:
+                to_status = Notification.Status.DONE
+            else:
+                to_status = Notification.Status.DELETE
+        if receipt.status == to_status:
+            return succeed("通知状态无需改变！", context)
+        if receipt.status == Notification.Status.DELETE:
+            return wrong("不能修改已删除的通知！", context)
+        receipt.status = to_status
+        if to_status == Notification.Status.DONE:
+            receipt.finish_time = datetime.now()
+            succeed("您已成功阅读一条通知！", context)
+        elif to_status == Notification.Status.UNDONE:
+            succeed("成功设置一条通知为未读！", context)
+        elif to_status == Notification.Status.DELETE:
+            succeed("您已成功删除一条通知！", context)
+        receipt.save()
+        return context
+
+
+_BROADCAST_PREFIX = 'b'
+
+
+def parse_display_id(display_id: str | int) -> tuple[type, int]:
+    """
+    解析`notification2Display`呈现的通知id，广播通知的id带有前缀
+
+    :param display_id: 前端传回的通知id
+    :type display_id: str | int
+    :raises ValueError: id格式错误
+    :return: 通知模型和主键
+    :rtype: tuple[type, int]
+    """
+    display_id = str(display_id)
+    if display_id.startswith(_BROADCAST_PREFIX):
+        return BroadcastNotification, int(display_id[len(_BROADCAST_PREFIX):])
+    return Notification, int(display_id)
+
+
 # 对一个已经完成的申请, 构建相关的通知和对应的微信消息, 将有关的事务设为已完成
 # 如果有错误，则不应该是用户的问题，需要发送到管理员处解决
 # 用于报销的通知
@@ -370,23 +624,31 @@ def make_notification(application, request, content, receiver):
 
 
 @logger.secure_func(raise_exc=True)
-def notification2Display(notifications: QuerySet[Notification]) -> List[dict]:
+def notification2Display(
+    notifications: QuerySet[Notification] | QuerySet[BroadcastNotification]
+                   | List[Notification | BroadcastNotification]
+) -> List[dict]:
     """
     将通知转化为方便前端显示的形式
 
-    :param notifications: 通知的查询集
-    :type notifications: QuerySet[Notification]
+    :param notifications: 通知的查询集或列表，广播通知需由`with_status`标注状态
+    :type notifications: QuerySet[Notification] | QuerySet[BroadcastNotification]
+                         | List[Notification | BroadcastNotification]
     :return: 通知的列表，其中每一项是一个包含通知具体信息的字典
     :rtype: List[dict]
     """
-    notifications.select_related("sender")
+    if isinstance(notifications, QuerySet):
+        notifications = notifications.select_related("sender")
 
     displays = []
     for notification in notifications:
         note_display = {}
 
         # id
-        note_display["id"] = notification.id
+        if isinstance(notification, BroadcastNotification):
+            note_display["id"] = f'{_BROADCAST_PREFIX}{notification.id}'
+        else:
+            note_display["id"] = notification.id
 
         # 时间
         note_display["start_time"] = notification.start_time.strftime(
@@ -399,7 +661,7 @@ def notification2Display(notifications: QuerySet[Notification]) -> List[dict]:
         note_display["content"] = notification.content
 
         # 状态
-        note_display["status"] = notification.get_status_display()
+        note_display["status"] = Notification.Status(notification.status).label
         note_display["URL"] = notification.URL
         note_display["type"] = notification.get_typename_display()
         note_display["title"] = notification.get_title_display()
@@ -408,3 +670,151 @@ def notification2Display(notifications: QuerySet[Notification]) -> List[dict]:
                                   not notification.anonymous_flag else "匿名者")
         displays.append(note_display)
     return displays
+
+
+# 通知信箱按(发出时间, 类别, id)降序排列，同一时刻的广播通知排在个人通知之前
+_Cursor = tuple[datetime, int, int]
+
+
+def _seek_key(notification: Notification | BroadcastNotification) -> _Cursor:
+    rank = 1 if isinstance(notification, BroadcastNotification) else 0
+    return notification.start_time, rank, notification.id
+
+
+def _encode_cursor(notification: Notification | BroadcastNotification) -> str:
+    start_time, rank, id = _seek_key(notification)
+    prefix = _BROADCAST_PREFIX if rank else ''
+    return f'{start_time.isoformat()}_{prefix}{id}'
+
+
+def _decode_cursor(cursor: str) -> _Cursor:
+    start_time, display_id = cursor.rsplit('_', 1)
+    model, id = parse_display_id(display_id)
+    rank = 1 if model is BroadcastNotification else 0
+    return datetime.fromisoformat(start_time), rank, id
+
+
+def _seek(notifications: QuerySet, rank: int, cursor: _Cursor | None) -> QuerySet:
+    '''筛选排在游标之后的通知，个人通知和广播通知的字段名相同'''
+    if cursor is None:
+        return notifications
+    start_time, cursor_rank, cursor_id = cursor
+    after = Q(start_time__lt=start_time)
+    if rank < cursor_rank:
+        after |= Q(start_time=start_time)
+    elif rank == cursor_rank:
+        after |= Q(start_time=start_time, id__lt=cursor_id)
+    return notifications.filter(after)
+
+
+def notification_page(
+    user: User,
+    status: Notification.Status,
+    cursor: str | None = None,
+    page_size: int | None = None,
+) -> tuple[List[dict], str | None]:
+    """
+    按游标分页读取用户的通知，合并个人通知和广播通知，按发出时间从新到旧排列
+
+    每页查询只读取游标之后的`page_size + 1`条记录，耗时与历史通知数量无关
+
+    :param user: 接收者
+    :type user: User
+    :param status: 已处理或待处理
+    :type status: Notification.Status
+    :param cursor: 上一页返回的游标，不填表示第一页, defaults to None
+    :type cursor: str | None, optional
+    :param page_size: 每页通知数，默认使用配置, defaults to None
+    :type page_size: int | None, optional
+    :raises ValueError: 游标格式错误
+    :return: 本页通知的呈现形式，以及下一页的游标，没有下一页时为None
+    :rtype: tuple[List[dict], str | None]
+    """
+    if page_size is None:
+        page_size = CONFIG.notification_page_size
+    seek = _decode_cursor(cursor) if cursor else None
+    ordering = ('-start_time', '-id')
+    notifications = Notification.objects.activated().filter(
+        receiver=user, status=status).order_by(*ordering)
+    broadcasts = BroadcastNotification.objects.with_status(user).filter(
+        status=status).order_by(*ordering)
+    candidates = [
+        *_seek(notifications, 0, seek).select_related('sender')[:page_size + 1],
+        *_seek(broadcasts, 1, seek).select_related('sender')[:page_size + 1],
+    ]
+    candidates.sort(key=_seek_key, reverse=True)
+    page = candidates[:page_size]
+    next_cursor = None
+    if len(candidates) > page_size:
+        next_cursor = _encode_cursor(page[-1])
+    return notification2Display(page), next_cursor
+
+
+def archive_notifications(before: datetime, chunk_size: int | None = None) -> int:
+    """
+    将早于指定时间发出的已处理和已删除通知移入归档表
+
+    按id分批进行，每批在单独的事务中复制后删除，避免长时间锁表；
+    中途失败时已完成的批次不受影响，再次执行即可继续
+
+    :param before: 发出时间早于该时间的通知将被归档
+    :type before: datetime
+    :param chunk_size: 每批归档的通知数，默认使用配置, defaults to None
+    :type chunk_size: int | None, optional
+    :return: 归档的通知数
+    :rtype: int
+    """
+    if chunk_size is None:
+        chunk_size = CONFIG.notification_archive_chunk
+    archivable = Notification.objects.filter(
+        status__in=[Notification.Status.DONE, Notification.Status.DELETE],
+        start_time__lt=before,
+    ).order_by('id')
+    total = 0
+    last_id = 0
+    while True:
+        with transaction.atomic():
+            chunk = list(archivable.filter(id__gt=last_id)
+                         .select_for_update()[:chunk_size])
+            if not chunk:
+                break
+            NotificationArchive.objects.bulk_create(
+                [NotificationArchive.from_notification(n) for n in chunk],
+                ignore_conflicts=True,
+            )
+            Notification.objects.filter(
+                id__in=[n.id for n in chunk]).delete()
+        total += len(chunk)
+        last_id = chunk[-1].id
+        if len(chunk) < chunk_size:
+            break
+    return total
+
+
+def prune_periodic_records(before: datetime, chunk_size: int | None = None) -> int:
+    """
+    删除早于指定时间的定时通知记录，其周期已结束，不再用于去重
+
+    按id分批删除，每批在单独的事务中进行
+
+    :param before: 通知时间早于该时间的记录将被删除
+    :type before: datetime
+    :param chunk_size: 每批删除的记录数，默认使用通知归档的配置, defaults to None
+    :type chunk_size: int | None, optional
+    :return: 删除的记录数
+    :rtype: int
+    """
+    if chunk_size is None:
+        chunk_size = CONFIG.notification_archive_chunk
+    expired = PeriodicNotificationRecord.objects.filter(
+        create_time__lt=before).order_by('id')
+    total = 0
+    while True:
+        ids = list(expired.values_list('id', flat=True)[:chunk_size])
+        if not ids:
+            break
+        with transaction.atomic():
+            total += PeriodicNotificationRecord.objects.filter(id__in=ids).delete()[0]
+        if len(ids) < chunk_size:
+            break
+    return total
@@ -0,0 +1,128 @@
+from types import SimpleNamespace
+
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+
+from app.models import (
+    User,
+    NaturalPerson,
+    Organization,
+    OrganizationType,
+    Activity,
+    Participation,
+    ActivityWaitlist,
+    Notification,
+)
+from app.activity_utils import (
+    apply_activity, withdraw_activity, draw_lots, ActivityException,
+    changeActivityStatus,
+)
+
+
+class ActivityWaitlistTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f'{i}', f'{i}') for i in range(4)]
+        cls.persons = [NaturalPerson.objects.create(user, name=user.name)
+                       for user in cls.users]
+        otype = OrganizationType.objects.create(
+            otype_id=1, otype_name='type', incharge=cls.persons[0])
+        org_user = User.objects.create_user('org', 'org', User.Type.ORG)
+        org = Organization.objects.create(
+            organization_id=org_user, oname='org', otype=otype)
+        cls.activity = Activity.objects.create(
+            title='活动', organization_id=org, examine_teacher=cls.persons[0],
+            capacity=2, status=Activity.Status.APPLYING,
+        )
+
+    def apply(self, i: int) -> bool:
+        activity = Activity.objects.get(id=self.activity.id)
+        return apply_activity(SimpleNamespace(user=self.users[i]), activity)
+
+    def withdraw(self, i: int):
+        activity = Activity.objects.get(id=self.activity.id)
+        withdraw_activity(SimpleNamespace(user=self.users[i]), activity)
+
+    def status(self, i: int) -> str:
+        return Participation.objects.get(
+            activity=self.activity, person=self.persons[i]).status
+
+    def current(self) -> int:
+        return Activity.objects.get(id=self.activity.id).current_participants
+
+    def test_waitlist(self):
+        '''报满后候补，有人取消时按顺序递补'''
+        self.assertEqual([self.apply(i) for i in range(4)], [True, True, False, False])
+        self.assertEqual(self.current(), 2)
+        self.assertRaises(ActivityException, self.apply, 2)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.withdraw(0)
+        self.assertEqual(self.status(0), Participation.AttendStatus.CANCELED)
+        self.assertEqual(self.status(2), Participation.AttendStatus.APPLYSUCCESS)
+        self.assertEqual(self.current(), 2)
+        self.assertTrue(Notification.objects.filter(receiver=self.users[2]).exists())
+
+        self.withdraw(3)
+        self.assertFalse(ActivityWaitlist.objects.exists())
+        self.withdraw(1)
+        self.assertEqual(self.current(), 1)
+        self.assertTrue(self.apply(0))
+        self.assertEqual(self.current(), 2)
+
+    def test_deadline(self):
+        '''报名截止时清空候补名单，并通知候补者'''
+        self.assertEqual([self.apply(i) for i in range(4)], [True, True, False, False])
+        with self.captureOnCommitCallbacks(execute=True):
+            changeActivityStatus(self.activity.id, Activity.Status.APPLYING,
+                                 Activity.Status.WAITING)
+        self.assertEqual(Activity.objects.get(id=self.activity.id).status,
+                         Activity.Status.WAITING)
+        self.assertFalse(ActivityWaitlist.objects.exists())
+        self.assertEqual(set(Notification.objects.filter(
+            content__contains='候补已取消').values_list('receiver', flat=True)),
+            {self.users[2].id, self.users[3].id})
+
+    def test_closed(self):
+        '''不在报名状态时不占用名额'''
+        Activity.objects.filter(id=self.activity.id).update(status=Activity.Status.WAITING)
+        self.assertRaises(ActivityException, self.apply, 0)
+        self.assertEqual(self.current(), 0)
+        self.assertFalse(ActivityWaitlist.objects.exists())
+
+
+# SQLite的写事务无法并发，只在支持行锁的数据库上测试
+@skipUnlessDBFeature('has_select_for_update')
+class ActivityApplyLoadTestCase(TransactionTestCase):
+    def test_concurrent_apply(self):
+        '''并发报名和取消时人数不超过容量，且与参与信息一致'''
+        call_command('loadtest_activity_apply', users=60, capacity=20, workers=8)
+
+
+class DrawLotsTestCase(TestCase):
+    def test_draw_lots(self):
+        '''中签人数等于剩余名额，通知在提交后发送'''
+        users = [User.objects.create_user(f'{i}', f'{i}') for i in range(10)]
+        persons = [NaturalPerson.objects.create(user, name=user.name) for user in users]
+        otype = OrganizationType.objects.create(
+            otype_id=1, otype_name='type', incharge=persons[0])
+        org_user = User.objects.create_user('org', 'org', User.Type.ORG)
+        org = Organization.objects.create(
+            organization_id=org_user, oname='org', otype=otype)
+        activity = Activity.objects.create(
+            title='抽签', organization_id=org, examine_teacher=persons[0],
+            capacity=4, bidding=True, status=Activity.Status.APPLYING,
+        )
+        Participation.objects.create(activity=activity, person=persons[0],
+                                     status=Participation.AttendStatus.APPLYSUCCESS)
+        for person in persons[1:]:
+            Participation.objects.create(activity=activity, person=person)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            draw_lots(activity)
+            self.assertFalse(Notification.objects.exists())
+        self.assertEqual(activity.current_participants, 4)
+        status = Participation.objects.filter(activity=activity).values_list('status', flat=True)
+        self.assertEqual(list(status).count(Participation.AttendStatus.APPLYSUCCESS), 4)
+        self.assertEqual(list(status).count(Participation.AttendStatus.APPLYFAILED), 6)
+        self.assertEqual(Notification.objects.count(), 9)
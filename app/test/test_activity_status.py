@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from app.models import (
+    User,
+    NaturalPerson,
+    Organization,
+    OrganizationType,
+    Activity,
+    Participation,
+    Notification,
+)
+from app.activity_utils import sweep_activity_status, notify_course_activities
+
+
+class ActivityStatusSweepTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f'{i}', f'{i}') for i in range(4)]
+        cls.persons = [NaturalPerson.objects.create(user, name=user.name)
+                       for user in cls.users]
+        otype = OrganizationType.objects.create(
+            otype_id=1, otype_name='type', incharge=cls.persons[0])
+        org_user = User.objects.create_user('org', 'org', User.Type.ORG)
+        cls.org = Organization.objects.create(
+            organization_id=org_user, oname='org', otype=otype)
+
+    def create_activity(self, status: Activity.Status, hours: float, **fields) -> Activity:
+        '''创建报名截止、开始、结束依次间隔一小时的活动，hours为报名截止距现在的小时数'''
+        apply_end = datetime.now() + timedelta(hours=hours)
+        return Activity.objects.create(
+            title='活动', organization_id=self.org, examine_teacher=self.persons[0],
+            status=status, apply_end=apply_end, publish_time=apply_end - timedelta(hours=1),
+            start=apply_end + timedelta(hours=1), end=apply_end + timedelta(hours=2),
+            **fields,
+        )
+
+    def status(self, activity: Activity) -> str:
+        return Activity.objects.get(id=activity.id).status
+
+    def test_sweep(self):
+        '''到期活动依次完成各阶段，未到期的活动不变，重复执行无影响'''
+        future = self.create_activity(Activity.Status.APPLYING, 1)
+        closing = self.create_activity(Activity.Status.APPLYING, -0.5, bidding=True, capacity=1)
+        for person in self.persons[:3]:
+            Participation.objects.create(activity=closing, person=person)
+        starting = self.create_activity(Activity.Status.WAITING, -1.5, need_checkin=True)
+        Participation.objects.create(activity=starting, person=self.persons[0],
+                                     status=Participation.AttendStatus.APPLYSUCCESS)
+        overdue = self.create_activity(Activity.Status.APPLYING, -3)
+        publishing = self.create_activity(Activity.Status.UNPUBLISHED, 0.5,
+                                          category=Activity.ActivityCategory.COURSE)
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            counts = sweep_activity_status()
+        # 抽签结果的两批通知和课程活动的发布通知
+        self.assertEqual(len(callbacks), 3)
+        self.assertEqual(counts, {
+            Activity.Status.WAITING: 3,
+            Activity.Status.PROGRESSING: 2,
+            Activity.Status.END: 1,
+        })
+        self.assertEqual(self.status(future), Activity.Status.APPLYING)
+        self.assertEqual(self.status(closing), Activity.Status.WAITING)
+        self.assertEqual(self.status(starting), Activity.Status.PROGRESSING)
+        self.assertEqual(self.status(overdue), Activity.Status.END)
+        self.assertEqual(self.status(publishing), Activity.Status.WAITING)
+
+        self.assertEqual(Activity.objects.get(id=closing.id).current_participants, 1)
+        self.assertEqual(Participation.objects.filter(
+            activity=closing, status=Participation.AttendStatus.APPLYFAILED).count(), 2)
+        self.assertEqual(Participation.objects.get(activity=starting).status,
+                         Participation.AttendStatus.UNATTENDED)
+        self.assertEqual(sweep_activity_status(), {})
+
+    def test_sweep_failure(self):
+        '''转换失败的活动保持原状态，不影响同批的其它活动'''
+        broken = self.create_activity(Activity.Status.PROGRESSING, -3)
+        ending = self.create_activity(Activity.Status.PROGRESSING, -3)
+        original = Activity.settle_yqpoint
+
+        def settle_yqpoint(activity, *args, **kwargs):
+            if activity.id == broken.id:
+                raise RuntimeError('结算失败')
+            return original(activity, *args, **kwargs)
+
+        with patch.object(Activity, 'settle_yqpoint', settle_yqpoint):
+            counts = sweep_activity_status()
+        self.assertEqual(counts, {Activity.Status.END: 1})
+        self.assertEqual(self.status(broken), Activity.Status.PROGRESSING)
+        self.assertEqual(self.status(ending), Activity.Status.END)
+        self.assertEqual(sweep_activity_status(), {Activity.Status.END: 1})
+
+    def test_notify_course_activities(self):
+        '''一批活动的通知一次创建，每个活动发送一条微信，不通知取消订阅的个人'''
+        activities = [self.create_activity(Activity.Status.WAITING, 1,
+                                           category=Activity.ActivityCategory.COURSE)
+                      for _ in range(2)]
+        self.persons[1].unsubscribe_list.add(self.org)
+        Participation.objects.create(activity=activities[0], person=self.persons[1],
+                                     status=Participation.AttendStatus.APPLYSUCCESS)
+        with patch('app.extern.wechat.send_wechat') as send_wechat:
+            notify_course_activities([activity.id for activity in activities])
+        self.assertEqual(send_wechat.call_count, 2)
+        receivers = {
+            activity.id: set(Notification.objects.filter(
+                relate_instance=activity).values_list('receiver', flat=True))
+            for activity in activities
+        }
+        uids = [person.person_id_id for person in self.persons]
+        self.assertEqual(receivers[activities[0].id], set(uids))
+        self.assertEqual(receivers[activities[1].id], set(uids) - {uids[1]})
+        self.assertEqual(Notification.objects.values('bulk_identifier').distinct().count(), 1)
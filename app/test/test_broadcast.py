@@ -0,0 +1,71 @@
+from datetime import timedelta
+
+from django.test import TestCase
+
+from app.models import (
+    User,
+    NaturalPerson,
+    Organization,
+    OrganizationType,
+    Notification,
+    BroadcastNotification,
+)
+from app.notification_utils import (
+    broadcast_create,
+    broadcast_status_change,
+    notification2Display,
+    parse_display_id,
+)
+
+
+class BroadcastNotificationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = []
+        for i in range(3):
+            user = User.objects.create_user(
+                f'p{i}', f'p{i}', User.Type.PERSON, password='111')
+            NaturalPerson.objects.create(user, name=f'p{i}')
+            cls.users.append(user)
+        otype = OrganizationType.objects.create(otype_id=1, otype_name='xxx')
+        org_user = User.objects.create_user(
+            'o0', 'o0', User.Type.ORG, password='111')
+        cls.org = Organization.objects.create(
+            organization_id=org_user, oname='o0', otype=otype)
+        NaturalPerson.objects.get_by_user(cls.users[1]).unsubscribe_list.add(cls.org)
+        cls.broadcast = broadcast_create(org_user, '新活动', '内容', '/viewActivity/1')
+        # p2 在广播发出后才注册
+        User.objects.filter(id=cls.users[2].id).update(
+            date_joined=cls.broadcast.start_time + timedelta(days=1))
+        cls.users[2].refresh_from_db()
+
+    def test_visible(self):
+        '''只有发布时已注册、且未取关的个人可见'''
+        visible = [BroadcastNotification.objects.visible_to(user).exists()
+                   for user in self.users]
+        self.assertEqual(visible, [True, False, False])
+        self.assertFalse(BroadcastNotification.objects.visible_to(
+            self.org.get_user()).exists())
+
+    def test_status(self):
+        '''已读、未读和删除状态按用户记录'''
+        user = self.users[0]
+        broadcasts = BroadcastNotification.objects.with_status(user)
+        self.assertEqual(broadcasts.get().status, Notification.Status.UNDONE)
+        self.assertEqual(BroadcastNotification.objects.unread_by(user).count(), 1)
+
+        broadcast_status_change(self.broadcast.id, user)
+        self.assertEqual(broadcasts.get().status, Notification.Status.DONE)
+        self.assertEqual(BroadcastNotification.objects.unread_by(user).count(), 0)
+        display, = notification2Display(broadcasts)
+        self.assertEqual(parse_display_id(display['id']),
+                         (BroadcastNotification, self.broadcast.id))
+        self.assertIn('finish_time', display)
+
+        broadcast_status_change(self.broadcast.id, user,
+                                Notification.Status.DELETE)
+        self.assertFalse(broadcasts.all().exists())
+        # 不可见的用户无法修改状态
+        broadcast_status_change(self.broadcast.id, self.users[1])
+        self.assertFalse(self.broadcast.receipts.filter(
+            receiver=self.users[1]).exists())
@@ -0,0 +1,51 @@
+import os
+from io import BytesIO
+from tempfile import TemporaryDirectory
+from unittest.mock import patch
+
+from openpyxl import load_workbook
+from django.test import TestCase
+
+from boot.config import GLOBAL_CONFIG
+from app.models import User, NaturalPerson, Notification
+from app import export_utils
+from app.export_utils import generate_export, get_export_file
+from utils.export import xlsx_response
+
+
+def people_export(count: int):
+    rows = ([f'p{i}', i] for i in range(count))
+    return '名单', [('名单', ['姓名', '序号'], rows)]
+
+
+class ExportTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            'p0', 'p0', User.Type.PERSON, password='111')
+        NaturalPerson.objects.create(cls.user, name='p0')
+        # 默认的通知发送者
+        User.objects.create_user(
+            GLOBAL_CONFIG.official_uid, 'official', User.Type.PERSON, password='111')
+
+    def test_response(self):
+        file_name, sheets = people_export(3)
+        response = xlsx_response(file_name, sheets)
+        self.assertIn('attachment', response['Content-Disposition'])
+        workbook = load_workbook(BytesIO(b''.join(response.streaming_content)))
+        rows = list(workbook['名单'].values)
+        self.assertEqual(rows, [('姓名', '序号'), ('p0', 0), ('p1', 1), ('p2', 2)])
+
+    def test_background(self):
+        '''后台生成后通知用户，只有本人可以获取文件'''
+        with TemporaryDirectory() as tmpdir, patch.object(export_utils, 'EXPORT_DIR', tmpdir):
+            generate_export(self.user.id, f'{__name__}.people_export', 'abc123', 5)
+            path = get_export_file(self.user, 'abc123')
+            self.assertIsNotNone(path)
+            self.assertEqual(os.path.basename(path), '名单.xlsx')
+            self.assertEqual(load_workbook(path)['名单'].max_row, 6)
+            notification = Notification.objects.get(receiver=self.user)
+            self.assertEqual(notification.URL, '/downloadExport/abc123/')
+            other = User.objects.create_user('p1', 'p1', User.Type.PERSON, password='111')
+            self.assertIsNone(get_export_file(other, 'abc123'))
+            self.assertIsNone(get_export_file(self.user, '../abc123'))
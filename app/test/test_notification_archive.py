@@ -0,0 +1,98 @@
+from datetime import datetime, timedelta
+
+from django.test import TestCase
+
+from app.models import (
+    User,
+    NaturalPerson,
+    Organization,
+    OrganizationType,
+    Notification,
+    NotificationArchive,
+    BroadcastNotification,
+)
+from app.notification_utils import (
+    broadcast_create,
+    notification_page,
+    archive_notifications,
+)
+
+
+class NotificationPageTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            'p0', 'p0', User.Type.PERSON, password='111')
+        NaturalPerson.objects.create(cls.user, name='p0')
+        User.objects.filter(id=cls.user.id).update(
+            date_joined=datetime.now() - timedelta(days=30))
+        cls.user.refresh_from_db()
+        otype = OrganizationType.objects.create(otype_id=1, otype_name='xxx')
+        org_user = User.objects.create_user(
+            'o0', 'o0', User.Type.ORG, password='111')
+        Organization.objects.create(
+            organization_id=org_user, oname='o0', otype=otype)
+        base = datetime.now() - timedelta(days=10)
+        for i in range(7):
+            note = Notification.objects.create(
+                receiver=cls.user, sender=org_user, title='t', content=str(i))
+            # 部分通知的发出时间相同，检验游标的次序
+            Notification.objects.filter(id=note.id).update(
+                start_time=base + timedelta(hours=i // 2))
+        for i in range(3):
+            broadcast = broadcast_create(org_user, 't', f'b{i}')
+            BroadcastNotification.objects.filter(id=broadcast.id).update(
+                start_time=base + timedelta(hours=i))
+
+    def test_pages(self):
+        '''逐页读取的结果不重不漏，且按时间从新到旧排列'''
+        status = Notification.Status.UNDONE
+        everything, cursor = notification_page(self.user, status, page_size=100)
+        self.assertIsNone(cursor)
+        self.assertEqual(len(everything), 10)
+        self.assertEqual(everything, sorted(
+            everything, key=lambda note: note['start_time'], reverse=True))
+        pages = []
+        while True:
+            page, cursor = notification_page(self.user, status, cursor, 3)
+            self.assertLessEqual(len(page), 3)
+            pages.extend(page)
+            if cursor is None:
+                break
+        self.assertEqual(pages, everything)
+
+    def test_bad_cursor(self):
+        with self.assertRaises(ValueError):
+            notification_page(self.user, Notification.Status.UNDONE, 'abc')
+
+
+class ArchiveNotificationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            'p0', 'p0', User.Type.PERSON, password='111')
+        old = datetime.now() - timedelta(days=400)
+        statuses = [Notification.Status.DONE, Notification.Status.DELETE,
+                    Notification.Status.UNDONE]
+        for i in range(9):
+            Notification.objects.create(
+                receiver=cls.user, sender=cls.user, title='t',
+                content=str(i), status=statuses[i % 3])
+        Notification.objects.filter(id__in=Notification.objects.order_by(
+            'id').values_list('id', flat=True)[:6]).update(start_time=old)
+
+    def test_archive(self):
+        '''只分批归档过期的已处理和已删除通知'''
+        before = datetime.now() - timedelta(days=180)
+        archived_ids = sorted(Notification.objects.filter(
+            start_time__lt=before,
+        ).exclude(status=Notification.Status.UNDONE).values_list('id', flat=True))
+        self.assertEqual(archive_notifications(before, chunk_size=3), 4)
+        self.assertEqual(sorted(NotificationArchive.objects.values_list(
+            'id', flat=True)), archived_ids)
+        self.assertEqual(Notification.objects.count(), 5)
+        self.assertFalse(Notification.objects.filter(id__in=archived_ids).exists())
+        archive = NotificationArchive.objects.get(id=archived_ids[0])
+        self.assertEqual(archive.receiver, self.user)
+        self.assertEqual(archive.content, '0')
+        self.assertEqual(archive_notifications(before), 0)
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from django.test import TestCase
+
+from app.models import User, Notification, PeriodicNotificationRecord
+from app import notification_utils
+from app.notification_utils import periodic_notification_create, prune_periodic_records
+
+
+class PeriodicNotificationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.sender = User.objects.create_user(
+            'zz00000', 'zz00000', User.Type.PERSON, password='111')
+        cls.users = [
+            User.objects.create_user(f'p{i}', f'p{i}', User.Type.PERSON, password='111')
+            for i in range(4)
+        ]
+
+    def notify(self, receivers, period='2023-W08', **kwargs):
+        return periodic_notification_create(
+            'job', period, receivers, self.sender,
+            Notification.Type.NEEDREAD, '提醒', '内容', **kwargs)
+
+    def test_idempotent(self):
+        '''同一周期重复执行不会重复通知，新增的接收者仍会收到'''
+        self.assertEqual(self.notify(self.users[:3]), 3)
+        self.assertEqual(self.notify(self.users[:3]), 0)
+        self.assertEqual(self.notify(User.objects.filter(
+            id__in=[user.id for user in self.users])), 1)
+        self.assertEqual(Notification.objects.count(), 4)
+        self.assertEqual(PeriodicNotificationRecord.objects.count(), 4)
+        self.assertEqual(set(Notification.objects.values_list(
+            'receiver', flat=True)), {user.id for user in self.users})
+
+    def test_new_period(self):
+        self.notify(self.users)
+        self.assertEqual(self.notify(self.users, '2023-W09'), 4)
+        self.assertEqual(Notification.objects.count(), 8)
+
+    def test_publish_on_commit(self):
+        '''事务提交后才发送微信，小组通知逐个发送'''
+        org = User.objects.create_user('org', 'org', User.Type.ORG, password='111')
+        with (patch.object(notification_utils, 'publish_notifications') as publish,
+              patch.object(notification_utils, 'publish_notification') as publish_one):
+            with self.captureOnCommitCallbacks(execute=True) as callbacks:
+                self.notify(self.users + [org], to_wechat=True)
+                publish.assert_not_called()
+            self.assertEqual(len(callbacks), 1)
+            publish.assert_called_once()
+            publish_one.assert_called_once()
+            self.assertEqual(publish_one.call_args.args[0].receiver_id, org.id)
+
+    def test_prune(self):
+        '''删除过期的记录后，同一周期可以再次通知'''
+        self.notify(self.users[:2])
+        PeriodicNotificationRecord.objects.filter(receiver=self.users[0]).update(
+            create_time=datetime.now() - timedelta(days=10))
+        self.assertEqual(prune_periodic_records(datetime.now() - timedelta(days=5)), 1)
+        self.assertEqual(PeriodicNotificationRecord.objects.count(), 1)
@@ -0,0 +1,107 @@
+from collections import Counter
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, skipUnlessDBFeature
+
+from app.models import User, Prize, Pool, PoolItem, PoolRecord, PoolSlot
+from app.YQPoint_utils import build_random_deck, buy_random_pool
+from utils.global_messages import WRONG, SUCCEED
+
+
+def create_random_pool(empty_num: int, prize_nums: list[int], entry_time: int = 1):
+    pool = Pool.objects.create(
+        title='盲盒', type=Pool.Type.RANDOM, entry_time=entry_time,
+        ticket_price=10, start=datetime.now() - timedelta(minutes=1),
+    )
+    PoolItem.objects.create(pool=pool, origin_num=empty_num)
+    for i, num in enumerate(prize_nums):
+        prize = Prize.objects.create(name=f'奖品{i}', stock=num, reference_price=10)
+        PoolItem.objects.create(pool=pool, prize=prize, origin_num=num,
+                                is_big_prize=(i == 0))
+    return pool
+
+
+def create_users(num: int, point: int = 100) -> list[User]:
+    users = [User.objects.create_user(f'buyer{i}', f'{i}', password='111')
+             for i in range(num)]
+    User.objects.filter(id__in=[user.id for user in users]).update(YQpoint=point)
+    return users
+
+
+class RandomDeckTestCase(TestCase):
+    def test_deck(self):
+        '''序列包含每件剩余奖品，依次抽完后售罄'''
+        pool = create_random_pool(3, [1, 2])
+        PoolItem.objects.filter(pool=pool, prize=None).update(consumed_num=1)
+        self.assertEqual(build_random_deck(pool), 5)
+        # 序列已存在时只查询一次，不锁定奖池
+        with self.assertNumQueries(1):
+            self.assertEqual(build_random_deck(pool), 0)
+        remaining = {item.id: item.origin_num - item.consumed_num
+                     for item in pool.items.all()}
+        self.assertEqual(
+            Counter(PoolSlot.objects.filter(pool=pool).values_list('item', flat=True)),
+            remaining)
+
+        users = create_users(6)
+        results = [buy_random_pool(user, str(pool.id)) for user in users]
+        self.assertEqual([result[0]['warn_code'] for result in results], [SUCCEED] * 5 + [WRONG])
+        self.assertEqual(results[-1][0]['warn_message'], '盲盒已售罄!')
+        self.assertFalse(PoolSlot.objects.filter(pool=pool, claimed=False).exists())
+        prizes = Counter(PoolRecord.objects.filter(pool=pool).values_list('prize', flat=True))
+        self.assertEqual(prizes, Counter({
+            item.prize_id: remaining[item.id] for item in pool.items.all()}))
+        self.assertEqual(User.objects.get(id=users[0].id).YQpoint, 90)
+
+    def test_rebuild(self):
+        '''修改奖品数量后重建，只替换未抽出的部分'''
+        pool = create_random_pool(2, [2])
+        user = create_users(1)[0]
+        buy_random_pool(user, str(pool.id))
+        PoolItem.objects.filter(pool=pool, prize=None).update(origin_num=5)
+        build_random_deck(pool, rebuild=True)
+        self.assertEqual(PoolSlot.objects.filter(pool=pool, claimed=True).count(), 1)
+        self.assertEqual(PoolSlot.objects.filter(pool=pool, claimed=False).count(), 6)
+        self.assertEqual(len(set(
+            PoolSlot.objects.filter(pool=pool).values_list('order', flat=True))), 7)
+
+    def test_limits(self):
+        '''次数和元气值不足时不抽出奖品'''
+        pool = create_random_pool(5, [5], entry_time=1)
+        user, poor = create_users(2)
+        User.objects.filter(id=poor.id).update(YQpoint=5)
+        self.assertEqual(buy_random_pool(user, str(pool.id))[0]['warn_code'], SUCCEED)
+        self.assertEqual(buy_random_pool(user, str(pool.id))[0]['warn_code'], WRONG)
+        self.assertEqual(buy_random_pool(poor, str(pool.id))[0]['warn_code'], WRONG)
+        self.assertEqual(PoolSlot.objects.filter(claimed=True).count(), 1)
+
+
+# SQLite的写事务无法并发，只在支持行锁的数据库上测试
+@skipUnlessDBFeature('has_select_for_update')
+class RandomPoolConcurrencyTestCase(TransactionTestCase):
+    def test_concurrent_buy(self):
+        '''并发购买时每件奖品只被抽出一次，记录与库存一致'''
+        pool = create_random_pool(10, [3, 7], entry_time=2)
+        users = create_users(15)
+        build_random_deck(pool)
+
+        def buy(user: User):
+            try:
+                return [buy_random_pool(user, str(pool.id))[0] for _ in range(2)]
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(4) as executor:
+            results = [msg for msgs in executor.map(buy, users) for msg in msgs]
+
+        succeeded = sum(msg['warn_code'] == SUCCEED for msg in results)
+        self.assertEqual(succeeded, 20)
+        self.assertEqual(PoolRecord.objects.filter(pool=pool).count(), 20)
+        for item in pool.items.all():
+            self.assertEqual(item.consumed_num, item.origin_num)
+            self.assertEqual(PoolSlot.objects.filter(item=item, claimed=True).count(),
+                             item.origin_num)
+        self.assertEqual(sum(user.YQpoint for user in User.objects.filter(
+            id__in=[user.id for user in users])), 15 * 100 - 20 * 10)
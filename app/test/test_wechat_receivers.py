@@ -0,0 +1,76 @@
+from django.test import TestCase
+
+from app.models import (
+    User,
+    NaturalPerson,
+    Organization,
+    OrganizationType,
+    Position,
+    Notification,
+)
+from app.extern.wechat import resolve_receivers, user2receivers
+
+
+class ResolveReceiversTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        persons = []
+        for i in range(6):
+            user = User.objects.create_user(
+                f'p{i}', f'p{i}', User.Type.PERSON, password='111')
+            persons.append(NaturalPerson.objects.create(user, name=f'p{i}'))
+        # p1 只接收重要通知
+        persons[1].wechat_receive_level = NaturalPerson.ReceiveLevel.LESS
+        persons[1].save()
+        cls.persons = persons
+        otype = OrganizationType.objects.create(
+            otype_id=1, otype_name='xxx', incharge=persons[0])
+        orgs = []
+        for i in range(3):
+            user = User.objects.create_user(
+                f'o{i}', f'o{i}', User.Type.ORG, password='111')
+            orgs.append(Organization.objects.create(
+                organization_id=user, oname=f'o{i}', otype=otype))
+        cls.orgs = orgs
+        Position.objects.create(person=persons[1], org=orgs[0], pos=0, is_admin=True)
+        Position.objects.create(person=persons[2], org=orgs[0], pos=1, is_admin=True)
+        Position.objects.create(person=persons[3], org=orgs[1], pos=0, is_admin=True)
+        Position.objects.create(person=persons[4], org=orgs[1], pos=5)
+        persons[5].unsubscribe_list.add(orgs[2])
+
+        sender = orgs[2].get_user()
+        receivers = [p.get_user() for p in persons] + [o.get_user() for o in orgs[:2]]
+        for receiver in receivers:
+            Notification.objects.create(
+                receiver=receiver, sender=sender, title='t', content='a')
+        Notification.objects.create(
+            receiver=persons[0].get_user(), sender=sender, title='t', content='b')
+
+    def test_equivalent(self):
+        '''批量结果与逐个获取的结果一致'''
+        notifications = Notification.objects.filter(content='a')
+        for level in [None, 0, 500]:
+            expected = []
+            for notification in notifications:
+                for username in user2receivers(notification.receiver, level):
+                    if username not in expected:
+                        expected.append(username)
+            results = resolve_receivers(notifications, level)
+            self.assertEqual(len(results), 1)
+            self.assertEqual(sorted(*results.values()), sorted(expected))
+
+    def test_group_and_filter(self):
+        '''按内容分组，并排除取消订阅的个人'''
+        results = resolve_receivers(Notification.objects.all(), 0,
+                                    force=True, exclude_unsubscribed=True)
+        self.assertEqual(len(results), 2)
+        grouped = {key.content: receivers for key, receivers in results.items()}
+        self.assertEqual(grouped['b'], ['p0'])
+        self.assertNotIn('p5', grouped['a'])
+        # p1不接收该等级，且小组仍有其他负责人接收
+        self.assertNotIn('p1', grouped['a'])
+
+    def test_constant_queries(self):
+        '''查询数与接收人数无关'''
+        with self.assertNumQueries(5):
+            resolve_receivers(Notification.objects.all(), exclude_unsubscribed=True)
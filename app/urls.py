@@ -39,6 +39,8 @@ urlpatterns = [
     path("orginfo/", views.orginfo, name="orginfo"),
     path("userAccountSetting/", views.accountSetting, name="userAccountSetting"),
     path("notifications/", views.notifications, name="notifications"),
+    path("getNotifications/", views.getNotifications, name="getNotifications"),
+    path("downloadExport/<str:token>/", views.downloadExport, name="downloadExport"),
     path("search/", views.search, name="search"),
     path("subscribeOrganization/", views.subscribeOrganization,
          name="subscribeOrganization"),
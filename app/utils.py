@@ -1,30 +1,35 @@
 import string
 import random
 import urllib.parse
-from io import BytesIO
 from datetime import datetime, timedelta
 from functools import wraps
 from typing import cast, overload, Literal
 
-import xlwt
 import imghdr
 from django.contrib import auth
 from django.shortcuts import redirect
 from utils.http.dependency import HttpResponse, HttpRequest, UserRequest
 
 from utils.http.utils import get_ip
+from utils.cache import cached
+from record.config import ratelimit_config as RATELIMIT_CONFIG
+from record.ratelimit import RateLimiter
 from app.utils_dependency import *
 from app.log import logger
 from app.models import (
     User,
     NaturalPerson,
     Organization,
+    Activity,
     Position,
     Notification,
+    BroadcastNotification,
     Help,
     Participation,
     ModifyRecord,
 )
+from app.export_utils import export_response
+from utils.export import Sheet
 
 
 def check_user_access(redirect_url="/logout/", is_modpw=False):
@@ -54,15 +59,16 @@ def check_user_access(redirect_url="/logout/", is_modpw=False):
     return actual_decorator
 
 
-# TODO: Handle ip blocking
-_block_ips = set()
+# 被判定为攻击的IP，在窗口内的攻击次数达到上限后拒绝访问
+_attack_limiter = RateLimiter(
+    'attack', RATELIMIT_CONFIG.attack_limit, RATELIMIT_CONFIG.attack_window)
 
 
 def block_attack(view_function):
     @wraps(view_function)
     def _wrapped_view(request: HttpRequest, *args, **kwargs):
         ip = get_ip(request)
-        if ip in _block_ips:
+        if ip is not None and not _attack_limiter.check(ip):
             return HttpResponse(status=403)
         return view_function(request, *args, **kwargs)
     return _wrapped_view
@@ -90,7 +96,8 @@ def record_attack(except_type=None, as_attack=False):
                 if err is not None:
                     if not is_attack:
                         raise err
-                    _block_ips.add(ip)
+                    if ip is not None:
+                        _attack_limiter.hit(ip)
                     return HttpResponse(status=403)
         return _wrapped_view
     return actual_decorator
@@ -220,6 +227,8 @@ def get_sidebar_and_navbar(user: User, navbar_name="", title_name=""):
     # 信箱数量
     bar_display["mail_num"] = Notification.objects.filter(
         receiver=user, status=Notification.Status.UNDONE
+    ).count() + BroadcastNotification.objects.with_status(user).filter(
+        status=Notification.Status.UNDONE
     ).count()
 
     if user.is_person():
@@ -251,15 +260,21 @@ def get_sidebar_and_navbar(user: User, navbar_name="", title_name=""):
         help_key = navbar_name
         if help_key == "我的元气值":
             help_key += _utype.lower()
-        help_info = Help.objects.filter(title=navbar_name).first()
         bar_display.update(
             help_message=CONFIG.help_message.get(help_key, ""),
-            help_paragraphs=help_info.content if help_info is not None else "",
+            help_paragraphs=_help_paragraphs(navbar_name),
         )
 
     return bar_display
 
 
+@cached('app:help_paragraphs', ttl=3600, version_key='help')
+def _help_paragraphs(title: str) -> str:
+    '''页面帮助的内容，帮助修改后失效'''
+    help_info = Help.objects.filter(title=title).first()
+    return help_info.content if help_info is not None else ""
+
+
 def site_match(site, url, path_check_level=0, scheme_check=False):
     '''检查是否是同一个域名，也可以检查路径是否相同
     - path_check_level: 0-2, 不检查/忽视末尾斜杠/完全相同
@@ -484,95 +499,59 @@ def check_account_setting(request: UserRequest):
 # 导出Excel文件
 
 
-def export_activity(activity, inf_type):
-
-    # 设置HTTPResponse的类型
-    response = HttpResponse(content_type='application/vnd.ms-excel')
-    if activity is None:
-        return response
-    response['Content-Disposition'] = f'attachment;filename={activity.title}.xls'
+def activity_export(activity_id: int, inf_type: str) -> tuple[str, list[Sheet]]:
+    '''活动的签到信息(sign)或报名信息(enroll)'''
+    activity = Activity.objects.get(id=activity_id)
     participants: QuerySet[Participation] = SQ.sfilter(Participation.activity, activity)
+    columns = ['姓名', '学号', '年级/班级']
     if inf_type == "sign":  # 签到信息
         participants = participants.filter(status=Participation.AttendStatus.ATTENDED)
-    elif inf_type == "enroll":  # 报名信息
+    else:  # 报名信息
         participants = participants.exclude(status=Participation.AttendStatus.CANCELED)
-    else:
-        return response
-        """导出excel表"""
-    if len(participants) > 0:
-        # 创建工作簿
-        ws = xlwt.Workbook(encoding='utf-8')
-        # 添加第一页数据表
-        w = ws.add_sheet('sheet1')  # 新建sheet（sheet的名称为"sheet1"）
-        # 写入表头
-        w.write(0, 0, u'姓名')
-        w.write(0, 1, u'学号')
-        w.write(0, 2, u'年级/班级')
-        if inf_type == "enroll":
-            w.write(0, 3, u'报名状态')
-            w.write(0, 4, u'注：报名状态为“已参与”时表示报名成功并成功签到，“未签到”表示报名成功但未签到，'
-                          u'"已报名"表示报名成功，“活动申请失败”表示在抽签模式中落选，“申请中”则表示抽签尚未开始。')
-        # 写入数据
-        excel_row = 1
-        for participant in participants:
-            name = participant.person.name
-            Sno = participant.person.person_id.username
-            grade = str(participant.person.stu_grade) + '级' + \
-                str(participant.person.stu_class) + '班'
-            if inf_type == "enroll":
-                status = participant.status
-                w.write(excel_row, 3, status)
-            # 写入每一行对应的数据
-            w.write(excel_row, 0, name)
-            w.write(excel_row, 1, Sno)
-            w.write(excel_row, 2, grade)
-            excel_row += 1
-        # 写出到IO
-        output = BytesIO()
-        ws.save(output)
-        # 重新定位到开始
-        output.seek(0)
-        response.write(output.getvalue())
-    return response
+        columns.append('报名状态')
+        columns.append('注：报名状态为“已参与”时表示报名成功并成功签到，“未签到”表示报名成功但未签到，'
+                       '"已报名"表示报名成功，“活动申请失败”表示在抽签模式中落选，“申请中”则表示抽签尚未开始。')
+    _person = Participation.person
+    values = participants.values_list(
+        SQ.f(_person, NaturalPerson.name),
+        SQ.f(_person, NaturalPerson.person_id, User.username),
+        SQ.f(_person, NaturalPerson.stu_grade),
+        SQ.f(_person, NaturalPerson.stu_class),
+        SQ.f(Participation.status),
+    )
+    rows = (
+        [name, Sno, f'{grade}级{stu_class}班'] + ([status] if inf_type == "enroll" else [])
+        for name, Sno, grade, stu_class, status in values.iterator()
+    )
+    return activity.title, [('sheet1', columns, rows)]
+
+
+def export_activity(activity, inf_type):
+    if activity is None or inf_type not in ["sign", "enroll"]:
+        return HttpResponse(content_type='application/vnd.ms-excel')
+    return export_response(activity_export, activity.id, inf_type)
+
+
+def orgpos_export(org_id: int) -> tuple[str, list[Sheet]]:
+    '''小组在职成员信息'''
+    org = Organization.objects.select_related('otype').get(id=org_id)
+    positions = Position.objects.activated().filter(
+        org=org).filter(status=Position.Status.INSERVICE)
+    values = positions.values_list(
+        SQ.f(Position.person, NaturalPerson.name),
+        SQ.f(Position.person, NaturalPerson.person_id, User.username),
+        SQ.f(Position.pos),
+    )
+    rows = ([name, Sno, org.otype.get_name(pos)]
+            for name, Sno, pos in values.iterator())
+    return f'小组{org.oname}成员信息', [('sheet1', ['姓名', '学号', '职位'], rows)]
 
 
 # 导出小组成员信息Excel文件
 def export_orgpos_info(org):
-    # 设置HTTPResponse的类型
-    response = HttpResponse(content_type='application/vnd.ms-excel')
     if org is None:
-        return response
-    response['Content-Disposition'] = f'attachment;filename=小组{org.oname}成员信息.xls'
-    participants = Position.objects.activated().filter(
-        org=org).filter(status=Position.Status.INSERVICE)
-    """导出excel表"""
-    if len(participants) > 0:
-        # 创建工作簿
-        ws = xlwt.Workbook(encoding='utf-8')
-        # 添加第一页数据表
-        w = ws.add_sheet('sheet1')  # 新建sheet（sheet的名称为"sheet1"）
-        # 写入表头
-        w.write(0, 0, u'姓名')
-        w.write(0, 1, u'学号')
-        w.write(0, 2, u'职位')
-        # 写入数据
-        excel_row = 1
-        for participant in participants:
-            name = participant.person.name
-            Sno = participant.person.person_id.username
-            pos = org.otype.get_name(participant.pos)
-            # 写入每一行对应的数据
-            w.write(excel_row, 0, name)
-            w.write(excel_row, 1, Sno)
-            w.write(excel_row, 2, pos)
-            excel_row += 1
-        # 写出到IO
-        output = BytesIO()
-        ws.save(output)
-        # 重新定位到开始
-        output.seek(0)
-        response.write(output.getvalue())
-    return response
+        return HttpResponse(content_type='application/vnd.ms-excel')
+    return export_response(orgpos_export, org.id)
 
 
 def escape_for_templates(text: str):
@@ -1,3 +1,4 @@
+import os
 import json
 import random
 import requests
@@ -5,6 +6,7 @@ from datetime import datetime, timedelta
 from typing import cast
 
 from django.contrib import auth
+from django.http import FileResponse
 from django.db import transaction
 from django.db.models import Q, F, Sum, QuerySet
 from django.contrib.auth.password_validation import CommonPasswordValidator, NumericPasswordValidator
@@ -13,6 +15,7 @@ from django.core.exceptions import ValidationError
 from utils.config.cast import str_to_time
 from utils.marker import deprecated
 from utils.hasher import MyMD5Hasher
+from utils.cache import cached
 from app.views_dependency import *
 from app.models import (
     NaturalPerson,
@@ -28,6 +31,8 @@ from app.models import (
     ActivityPhoto,
     Participation,
     Notification,
+    BroadcastNotification,
+    BroadcastReceipt,
     Wishes,
     Course,
     CourseRecord,
@@ -45,8 +50,11 @@ from extern.wechat import (
 )
 from app.notification_utils import (
     notification_status_change,
-    notification2Display,
+    broadcast_status_change,
+    parse_display_id,
+    notification_page,
 )
+from app.export_utils import get_export_file
 from app.YQPoint_utils import add_signin_point
 from app.academic_utils import (
     get_search_results,
@@ -780,6 +788,15 @@ def orginfo(request: UserRequest):
     return render(request, "orginfo.html", locals() | dict(user=request.user))
 
 
+@cached('app:guide_pics', ttl=600)
+def _guide_pics() -> list[tuple[str, str]]:
+    '''从redirect.json读取要作为引导图的图片及链接，按照原始顺序'''
+    guidepicdir = "static/assets/img/guidepics"
+    with open(f"{guidepicdir}/redirect.json") as file:
+        img2url = json.load(file)
+    return list(img2url.items())
+
+
 @login_required(redirect_field_name="origin")
 @utils.check_user_access(redirect_url="/logout/")
 @logger.secure_view()
@@ -870,10 +887,7 @@ def homepage(request: UserRequest):
     ]
 
     # 从redirect.json读取要作为引导图的图片，按照原始顺序
-    guidepicdir = "static/assets/img/guidepics"
-    with open(f"{guidepicdir}/redirect.json") as file:
-        img2url = json.load(file)
-    guidepics = list(img2url.items())
+    guidepics = _guide_pics()
     # (firstpic, firsturl), guidepics = guidepics[0], guidepics[1:]
     # firstpic是第一个导航图，不是第一张图片，现在把这个逻辑在模板处理了
 
@@ -1790,6 +1804,39 @@ def saveSubscribeStatus(request: UserRequest):
     return JsonResponse({"success": True})
 
 
+@login_required(redirect_field_name="origin")
+@utils.check_user_access(redirect_url="/logout/")
+@logger.secure_view()
+def getNotifications(request: HttpRequest):
+    '''按游标分页获取通知，参数status为done或undone，cursor为上一页返回的next'''
+    status = {
+        "done": Notification.Status.DONE,
+        "undone": Notification.Status.UNDONE,
+    }.get(request.GET.get("status", "undone"))
+    if status is None:
+        return JsonResponse({"success": False}, status=400)
+    try:
+        notifications, next_cursor = notification_page(
+            request.user, status, request.GET.get("cursor"))
+    except ValueError:
+        return JsonResponse({"success": False}, status=400)
+    return JsonResponse({
+        "success": True, "notifications": notifications, "next": next_cursor,
+    })
+
+
+@login_required(redirect_field_name="origin")
+@utils.check_user_access(redirect_url="/logout/")
+@logger.secure_view()
+def downloadExport(request: HttpRequest, token: str):
+    '''下载在后台生成的导出文件，只有发起导出的用户可以下载'''
+    path = get_export_file(request.user, token)
+    if path is None:
+        return redirect(message_url(wrong('导出文件不存在或已过期，请重新导出！')))
+    return FileResponse(open(path, 'rb'), as_attachment=True,
+                        filename=os.path.basename(path))
+
+
 @login_required(redirect_field_name="origin")
 @utils.check_user_access(redirect_url="/logout/")
 @logger.secure_view()
@@ -1807,6 +1854,19 @@ def notifications(request: HttpRequest):
             count = notificaiton_set.count()
             notificaiton_set.update(
                 status=Notification.Status.DONE, finish_time=datetime.now())
+            # 广播通知：未读的可能没有状态记录，也可能被标为未读
+            unread_ids = BroadcastNotification.objects.unread_by(
+                request.user).values_list('id', flat=True)
+            receipts = BroadcastReceipt.objects.bulk_create([
+                BroadcastReceipt(broadcast_id=broadcast_id, receiver=request.user,
+                                 status=Notification.Status.DONE,
+                                 finish_time=datetime.now())
+                for broadcast_id in unread_ids
+            ], ignore_conflicts=True)
+            count += len(receipts)
+            count += BroadcastReceipt.objects.filter(
+                receiver=request.user, status=Notification.Status.UNDONE,
+            ).update(status=Notification.Status.DONE, finish_time=datetime.now())
             succeed(f"成功将{count}条通知设为已读！", html_display)
         elif get_name == "deleteall":
             notificaiton_set = Notification.objects.activated().filter(
@@ -1815,6 +1875,9 @@ def notifications(request: HttpRequest):
                 status=Notification.Status.DONE)
             count = notificaiton_set.count()
             notificaiton_set.update(status=Notification.Status.DELETE)
+            count += BroadcastReceipt.objects.filter(
+                receiver=request.user, status=Notification.Status.DONE,
+            ).update(status=Notification.Status.DELETE)
             succeed(f"您已成功删除{count}条通知！", html_display)
         else:
             # 读取外部错误信息
@@ -1825,32 +1888,38 @@ def notifications(request: HttpRequest):
         # 发生了通知处理的事件
         try:
             post_args = json.loads(request.body.decode("utf-8"))
-            notification_id = int(post_args['id'])
-            Notification.objects.activated().get(id=notification_id, receiver=request.user)
+            model, notification_id = parse_display_id(post_args['id'])
+            if model is Notification:
+                Notification.objects.activated().get(
+                    id=notification_id, receiver=request.user)
         except:
             wrong("请不要恶意发送post请求！！", html_display)
             return JsonResponse({"success": False})
         try:
+            to_status = None
             if "cancel" in post_args['function']:
-                context = notification_status_change(
-                    notification_id, Notification.Status.DELETE)
+                to_status = Notification.Status.DELETE
+            if model is BroadcastNotification:
+                context = broadcast_status_change(
+                    notification_id, request.user, to_status)
             else:
-                context = notification_status_change(notification_id)
+                context = notification_status_change(notification_id, to_status)
             my_messages.transfer_message_context(
                 context, html_display, normalize=False)
         except:
             wrong("删除通知的过程出现错误！请联系管理员。", html_display)
         return JsonResponse({"success": my_messages.get_warning(html_display)[0] == SUCCEED})
 
-    done_notifications = Notification.objects.activated().filter(
-        receiver=request.user,
-        status=Notification.Status.DONE).order_by("-finish_time")
-    undone_notifications = Notification.objects.activated().filter(
-        receiver=request.user,
-        status=Notification.Status.UNDONE).order_by("-start_time")
-
-    done_list = notification2Display(done_notifications)
-    undone_list = notification2Display(undone_notifications)
+    # 两个列表分别按游标分页，翻页时另一列表回到第一页
+    active_tab = "done" if "done" in request.GET else "undone"
+    try:
+        undone_list, undone_next = notification_page(
+            request.user, Notification.Status.UNDONE, request.GET.get("undone"))
+        done_list, done_next = notification_page(
+            request.user, Notification.Status.DONE, request.GET.get("done"))
+    except ValueError:
+        return redirect("/notifications/")
+    paged = "undone" in request.GET or "done" in request.GET
 
     # 新版侧边栏, 顶栏等的呈现，采用 bar_display, 必须放在render前最后一步
     bar_display = utils.get_sidebar_and_navbar(request.user,
@@ -18,6 +18,11 @@ class SettingConfig(Config):
     db_name = os.getenv('DB_DATABASE') or LazySetting(
         'db/NAME', default='yppf')
     db_port = os.getenv('DB_PORT') or LazySetting('db/PORT', default='3306')
+    # 缓存需在各进程间共享，默认使用文件缓存，也可配置为本地的memcached等
+    cache_backend = os.getenv('CACHE_BACKEND') or LazySetting(
+        'cache/BACKEND', default='django.core.cache.backends.filebased.FileBasedCache')
+    cache_location = os.getenv('CACHE_LOCATION') or LazySetting(
+        'cache/LOCATION', default='./tmp/django_cache')
 
     secret_key = ('k+8az5x&aq_!*@%v17(ptpeo@gp2$u-uc30^fze3u_+rqhb#@9'
                   if config.DEBUG else os.environ['SESSION_KEY'])
@@ -76,6 +81,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "record.ratelimit.RateLimitMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     # 'django.middleware.csrf.CsrfViewMiddleware',
@@ -132,6 +138,17 @@ DATABASES = {
 }
 
 
+# Cache
+CACHES = {
+    "default": {
+        "BACKEND": _configurables.cache_backend,
+        "LOCATION": config.absolute_path(_configurables.cache_location),
+    },
+}
+# 测试时由测试运行器替换为进程内缓存，并在每个测试前清空
+TEST_RUNNER = "boot.test_runner.CacheClearingTestRunner"
+
+
 # 两类文件URL配置在生产环境失效，在urls.py查看开发环境如何配置
 
 # Static files (CSS, JavaScript, Images)
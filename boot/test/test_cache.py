@@ -0,0 +1,43 @@
+from datetime import date
+
+from django.test import TestCase
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+from utils.cache import cached, bump_version, cache_stats
+from semester.models import Semester, SemesterType
+from semester.api import semester_of
+
+
+class CacheTestCase(TestCase):
+    def test_backend(self):
+        '''测试运行器将缓存替换为进程内缓存'''
+        self.assertIsInstance(caches['default'], LocMemCache)
+
+    def test_cached(self):
+        '''相同参数命中缓存，递增版本后重新计算'''
+        calls = []
+
+        @cached('test:square', version_key='test')
+        def square(x: int) -> int:
+            calls.append(x)
+            return x * x
+
+        self.assertEqual([square(2), square(2), square(x=2), square(3)], [4, 4, 4, 9])
+        self.assertEqual(calls, [2, 2, 3])
+        bump_version('test')
+        self.assertEqual(square(2), 4)
+        self.assertEqual(calls, [2, 2, 3, 2])
+        self.assertEqual(cache_stats()['test:square'], dict(hit=1, miss=4))
+
+    def test_invalidate_on(self):
+        '''模型修改后缓存的查询结果失效'''
+        semester_type = SemesterType.objects.create(name='秋季')
+        first = Semester.objects.create(year=2020, type=semester_type,
+                                        start_date=date(2020, 9, 1), end_date=date(2021, 1, 15))
+        self.assertEqual(semester_of(date(2021, 3, 1)), first)
+        second = Semester.objects.create(year=2021, type=semester_type,
+                                         start_date=date(2021, 2, 20), end_date=date(2021, 6, 30))
+        self.assertEqual(semester_of(date(2021, 3, 1)), second)
+        second.delete()
+        self.assertEqual(semester_of(date(2021, 3, 1)), first)
@@ -0,0 +1,42 @@
+from django.core.cache import cache
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+__all__ = [
+    'CacheClearingTestRunner',
+]
+
+
+TEST_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+
+class CacheClearingTestRunner(DiscoverRunner):
+    '''
+    测试时使用进程内缓存，不读写部署的缓存
+
+    每个测试开始前清空缓存，避免回滚的数据通过缓存影响其它测试
+    '''
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._cache_settings = override_settings(CACHES=TEST_CACHES)
+        self._cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._cache_settings.disable()
+        super().teardown_test_environment(**kwargs)
+
+    def get_resultclass(self):
+        base = super().get_resultclass()
+        if base is None:
+            base = self.test_runner.resultclass
+
+        class ResultClass(base):
+            def startTest(self, test):
+                cache.clear()
+                super().startTest(test)
+        return ResultClass
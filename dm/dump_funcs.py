@@ -1,5 +1,5 @@
 from datetime import datetime
-from typing import Callable
+from typing import Callable, Iterable, Iterator
 import pandas as pd
 
 from django.db import models
@@ -16,6 +16,10 @@ from feedback.models import Feedback
 from Appointment.models import Appoint
 
 
+# 流式导出时每次查询的行数
+CHUNK_SIZE = 2000
+
+
 class BaseDump():
 
     @staticmethod
@@ -50,60 +54,168 @@ class BaseDump():
     def dump(cls, hash_func: Callable = None, **options) -> pd.DataFrame:
         raise NotImplementedError
 
+    @classmethod
+    def stream(cls, hash_func: Callable = None, **options
+               ) -> tuple[tuple[str, ...], Iterable[tuple]]:
+        """流式导出，返回列名和逐行生成的数据
+
+        默认由`dump`的结果转换，数据量可能很大的子类应重写本方法
+
+        :return: 列名和行的迭代器
+        :rtype: tuple[tuple[str, ...], Iterable[tuple]]
+        """
+        df = cls.dump(hash_func=hash_func, **options)
+        df = df.astype(object).where(df.notna(), None)
+        return tuple(df.columns), df.itertuples(index=False, name=None)
+
+    @staticmethod
+    def chunked(queryset: QuerySet, chunk_size: int = CHUNK_SIZE) -> Iterator:
+        """按主键分块读取查询集
 
-class PageTrackingDump(BaseDump):
+        每块单独查询，MySQL驱动不支持流式游标时也不会一次载入全部结果，
+        查询集的select_related和prefetch_related在每块内生效
+
+        :param queryset: 查询集，可以是values_list等形式，但必须包含主键字段pk
+        :type queryset: QuerySet
+        :param chunk_size: 每块的行数, defaults to CHUNK_SIZE
+        :type chunk_size: int, optional
+        """
+        queryset = queryset.order_by('pk')
+        chunk = list(queryset[:chunk_size])
+        while chunk:
+            yield from chunk
+            if len(chunk) < chunk_size:
+                return
+            last = chunk[-1]
+            last_pk = last[0] if isinstance(last, tuple) else last.pk
+            chunk = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+
+    @staticmethod
+    def hash_columns(rows: Iterable[tuple], indices: tuple[int, ...],
+                     hash_func: Callable = None) -> Iterator[tuple]:
+        """对指定列逐行哈希，不提供哈希函数时原样返回"""
+        if hash_func is None:
+            yield from rows
+            return
+        for row in rows:
+            row = list(row)
+            for i in indices:
+                if row[i] is not None:
+                    row[i] = hash_func(str(row[i]))
+            yield tuple(row)
+
+
+class QuerySetDump(BaseDump):
+    """由单个查询集的字段构成的导出，支持流式导出
+
+    子类需定义columns, fields和get_queryset，hashed为需要哈希的列序号
+    """
+    columns: tuple[str, ...] = ()
+    fields: tuple[str, ...] = ()
+    hashed: tuple[int, ...] = (0,)
+
+    @classmethod
+    def get_queryset(cls, **options) -> QuerySet:
+        raise NotImplementedError
 
     @classmethod
     def dump(cls, hash_func: Callable = None, **options) -> pd.DataFrame:
-        user_page_data = pd.DataFrame(
-            cls.time_filter(PageLog, options.get('start_time', None),
-                            options.get('end_time', None))
-                .values_list('user__username', 'type',
-                            'url', 'time', 'platform'),
-            columns=('用户', '类型', '页面', '时间', '平台'))
-        if hash_func is not None:
-            user_page_data['用户'].map(hash_func)
-        return user_page_data
+        columns, rows = cls.stream(hash_func=hash_func, **options)
+        return pd.DataFrame(rows, columns=columns)
+
+    @classmethod
+    def stream(cls, hash_func: Callable = None, **options
+               ) -> tuple[tuple[str, ...], Iterable[tuple]]:
+        rows = (row[1:] for row in cls.chunked(
+            cls.get_queryset(**options).values_list('pk', *cls.fields)))
+        return cls.columns, cls.hash_columns(rows, cls.hashed, hash_func)
 
 
-class ModuleTrackingDump(BaseDump):
+class PageTrackingDump(QuerySetDump):
+    columns = ('用户', '类型', '页面', '时间', '平台')
+    fields = ('user__username', 'type', 'page', 'time', 'platform')
 
     @classmethod
-    def dump(cls, hash_func: Callable = None, **options) -> pd.DataFrame:
-        user_module_data = pd.DataFrame(
-            cls.time_filter(PageLog, options.get('start_time', None),
-                            options.get('end_time', None))
-                .values_list('user__username', 'type', 'module_name',
-                            'url', 'time', 'platform'),
-            columns=('用户', '类型', '模块', '页面', '时间', '平台'))
-        if hash_func is not None:
-            user_module_data['用户'].map(hash_func)
-        return user_module_data
+    def get_queryset(cls, **options) -> QuerySet:
+        return cls.time_filter(PageLog, options.get('start_time', None),
+                               options.get('end_time', None))
+
+
+class ModuleTrackingDump(QuerySetDump):
+    columns = ('用户', '类型', '模块', '页面', '时间', '平台')
+    fields = ('user__username', 'type', 'module_name', 'page', 'time', 'platform')
+
+    @classmethod
+    def get_queryset(cls, **options) -> QuerySet:
+        return cls.time_filter(ModuleLog, options.get('start_time', None),
+                               options.get('end_time', None))
+
+
+class YQPointRecordDump(QuerySetDump):
+    """元气值变化记录
+    """
+    columns = ('用户', '变化量', '来源', '来源类型', '时间')
+    fields = (SQ.f(YQPointRecord.user, User.username),
+              'delta', 'source', 'source_type', 'time')
+
+    @classmethod
+    def get_queryset(cls, **options) -> QuerySet:
+        return cls.time_filter(YQPointRecord, options.get('start_time', None),
+                               options.get('end_time', None))
+
+
+class NotificationDump(QuerySetDump):
+    """通知记录，接收者和发送者均会哈希
+    """
+    columns = ('接收者', '发送者', '标题', '内容', '状态', '类型', '发出时间', '处理时间')
+    fields = (SQ.f(Notification.receiver, User.username),
+              SQ.f(Notification.sender, User.username),
+              'title', 'content', 'status', 'typename', 'start_time', 'finish_time')
+    hashed = (0, 1)
+
+    @classmethod
+    def get_queryset(cls, **options) -> QuerySet:
+        return cls.time_filter(Notification, options.get('start_time', None),
+                               options.get('end_time', None),
+                               start_time_field='start_time',
+                               end_time_field='start_time')
 
 
 class AppointmentDump(BaseDump):
+    columns = ('预约人', '参与者', '预约房间', '开始时间', '结束时间', '预约用途')
 
     @classmethod
     def dump(cls, hash_func: Callable = None, **options) -> pd.DataFrame:
+        columns, rows = cls.stream(hash_func=hash_func, **options)
+        return pd.DataFrame(rows, columns=columns)
+
+    @classmethod
+    def stream(cls, hash_func: Callable = None, **options
+               ) -> tuple[tuple[str, ...], Iterable[tuple]]:
         appoint_queryset = cls.time_filter(Appoint, options.get('start_time', None),
                                            options.get('end_time', None),
                                            start_time_field='Astart',
                                            end_time_field='Astart')
-        appointments = pd.DataFrame(columns=('预约人', '参与者', '预约房间', 
-                                             '开始时间', '结束时间', '预约用途'))
-        for i, appoint in enumerate(appoint_queryset):
-            appointments.loc[i] = [
-                hash_func(str(appoint.major_student.Sid)) if hash_func is not None
-                else appoint.major_student.name,                  # 预约人
-                ','.join([hash_func(str(student.Sid)) if hash_func is not None \
-                        else student.name for student in appoint.students.all()]),  # 参与者
-                appoint.Room.Rid.strip('"') + ' ' + \
-                appoint.Room.Rtitle.strip('"'),  # 预约房间
-                appoint.Astart.strftime('%Y年%m月%d日 %H:%M'),    # 开始时间
-                appoint.Afinish.strftime('%Y年%m月%d日 %H:%M'),   # 结束时间
-                appoint.Ausage,                                  # 预约用途
-            ]
-        return appointments
+        appoint_queryset = appoint_queryset.select_related(
+            'major_student__Sid', 'Room').prefetch_related('students__Sid')
+
+        def _display(student) -> str:
+            if hash_func is not None:
+                return hash_func(str(student.Sid))
+            return student.name
+
+        def _rows():
+            for appoint in cls.chunked(appoint_queryset):
+                yield (
+                    _display(appoint.major_student),                  # 预约人
+                    ','.join(map(_display, appoint.students.all())),  # 参与者
+                    appoint.Room.Rid.strip('"') + ' ' + \
+                    appoint.Room.Rtitle.strip('"'),  # 预约房间
+                    appoint.Astart.strftime('%Y年%m月%d日 %H:%M'),    # 开始时间
+                    appoint.Afinish.strftime('%Y年%m月%d日 %H:%M'),   # 结束时间
+                    appoint.Ausage,                                  # 预约用途
+                )
+        return cls.columns, _rows()
 
 
 class OrgActivityDump(BaseDump):
@@ -154,7 +266,7 @@ class PersonPosDump(BaseDump):
                 .values_list(),
             columns=('用户', '参与组织个数', '参与组织'))
         if hash_func is not None:
-            position_data['用户'].map(hash_func)
+            position_data['用户'] = position_data['用户'].map(hash_func)
         return position_data
 
 
@@ -174,7 +286,7 @@ class PersonActivityDump(BaseDump):
                 .order_by(SQ.f(Participation.person, NaturalPerson.person_id)),
             columns=('用户', '组织', '活动'))
         if hash_func is not None:
-            participants_data['用户'].map(hash_func)
+            participants_data['用户'] = participants_data['用户'].map(hash_func)
         return participants_data
 
 
@@ -201,7 +313,7 @@ class PersonCourseDump(BaseDump):
                     'record_hours', 'invalid_hours'),
             columns=('用户', '课程数量', '有效次数', '无效次数', '有效时长', '无效时长'))
         if hash_func is not None:
-            course_data['用户'].map(hash_func)
+            course_data['用户'] = course_data['用户'].map(hash_func)
         return course_data
 
 
@@ -225,5 +337,5 @@ class PersonFeedbackDump(BaseDump):
                     'total_num', 'solved_num'),
             columns=('用户', '提交反馈数', '已解决反馈数'))
         if hash_func is not None:
-            feedback_data['用户'].map(hash_func)
+            feedback_data['用户'] = feedback_data['用户'].map(hash_func)
         return feedback_data
@@ -1,15 +1,19 @@
+import os
 import math
 from datetime import datetime
 from typing import Callable
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy
 import pandas as pd
 from tqdm import tqdm
 from django.db import transaction
+from django.contrib.auth.hashers import get_hasher
 
 import utils.models.query as SQ
 from boot.config import DEBUG
 from app.config import *
+from generic.models import get_pinyin, to_acronym
 from app.models import (
     User,
     NaturalPerson,
@@ -39,6 +43,7 @@ __all__ = [
     'create_user', 'create_person', 'create_org',
     'create_person_account', 'create_org_account',
     # load functions
+    'bulk_create_persons',
     'load_stu', 'load_orgtype', 'load_org',
     'load_activity',
     'load_freshman', 'load_help', 'load_course_record', 
@@ -349,20 +354,120 @@ def load_activity(filepath: str, output_func: Callable=None, html=False):
     return try_output("导入活动信息成功！", output_func, html)
 
 
-def load_stu(filepath: str, output_func: Callable=None, html=False):
+def _hash_passwords(passwords: list[str], workers: int | None = None) -> list[str]:
+    '''
+    多进程计算密码哈希，结果与`make_password`相同
+
+    :param passwords: 明文密码
+    :type passwords: list[str]
+    :param workers: 进程数，默认为CPU核数，为1时在当前进程计算, defaults to None
+    :type workers: int | None, optional
+    :return: 可直接存入`User.password`的哈希值
+    :rtype: list[str]
+    '''
+    hasher = get_hasher()
+    salts = [hasher.salt() for _ in passwords]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(passwords))
+    if workers <= 1:
+        return list(map(hasher.encode, passwords, salts))
+    # 哈希器只依赖标准库，子进程无需加载Django
+    chunksize = max(1, len(passwords) // (workers * 4))
+    with ProcessPoolExecutor(workers) as pool:
+        return list(pool.map(hasher.encode, passwords, salts, chunksize=chunksize))
+
+
+def _create_persons(rows: list[dict]):
+    '''在当前事务中批量创建用户和对应的自然人，rows见`bulk_create_persons`'''
+    User.objects.bulk_create([
+        User(
+            username=row['username'],
+            password=row['password'],
+            name=row['name'],
+            pinyin=''.join(get_pinyin(row['name'])),
+            acronym=to_acronym(row['name']),
+            utype=User.Type.STUDENT,
+        ) for row in rows
+    ])
+    # MySQL不返回批量创建的主键，需要重新查询
+    users = User.objects.only('id', 'username').in_bulk(
+        [row['username'] for row in rows], field_name='username')
+    NaturalPerson.objects.bulk_create([
+        NaturalPerson(
+            **{SQ.f(NaturalPerson.person_id): users[row['username']]},
+            stu_id_dbonly=row['username'],
+            **row['person'],
+        ) for row in rows
+    ])
+
+
+def bulk_create_persons(rows: list[dict], workers: int | None = None,
+                        batch_size: int = 500):
+    '''
+    批量创建学生账号，单行失败不影响其它行
+
+    先一次查询所有已存在的用户名，再多进程计算新用户的密码哈希，
+    最后分批在事务中批量创建用户和自然人；某批失败时逐行重试以定位错误
+
+    :param rows: 每项包含username, password, name和person，
+                 person为创建NaturalPerson的其它字段
+    :type rows: list[dict]
+    :param workers: 计算哈希的进程数，见`_hash_passwords`, defaults to None
+    :type workers: int | None, optional
+    :param batch_size: 每批创建的行数, defaults to 500
+    :type batch_size: int, optional
+    :return: 成功创建、已存在的用户名，以及失败的用户名及原因
+    :rtype: tuple[list[str], list[str], dict[str, str]]
+    '''
+    existed_names = set(User.objects.filter(
+        username__in=[row['username'] for row in rows],
+    ).values_list('username', flat=True))
+    existed, new_rows = [], []
+    for row in rows:
+        if row['username'] in existed_names:
+            existed.append(row['username'])
+            continue
+        # 表格中重复的学号也视为已存在
+        existed_names.add(row['username'])
+        new_rows.append(row)
+
+    hashed = _hash_passwords([row['password'] for row in new_rows], workers)
+    new_rows = [dict(row, password=password)
+                for row, password in zip(new_rows, hashed)]
+
+    created, failed = [], {}
+    for i in tqdm(range(0, len(new_rows), batch_size)):
+        chunk = new_rows[i : i + batch_size]
+        try:
+            with transaction.atomic():
+                _create_persons(chunk)
+            created.extend(row['username'] for row in chunk)
+            continue
+        except Exception:
+            pass
+        for row in chunk:
+            try:
+                with transaction.atomic():
+                    _create_persons([row])
+                created.append(row['username'])
+            except Exception as e:
+                failed[row['username']] = str(e)
+    return created, existed, failed
+
+
+def load_stu(filepath: str, output_func: Callable=None, html=False,
+             workers: int | None = None):
     stu_df = load_file(filepath)
     total = 0
-    stu_list = []
-    exist_list = []
-    failed_list = []
+    stu_rows = []
+    failed = {}
     Char2Gender = {"男": NaturalPerson.Gender.MALE, "女": NaturalPerson.Gender.FEMALE}
-    username = 'null'
-    fail_info = None
-    for _, stu_dict in tqdm(stu_df.iterrows()):
+    for stu_dict in tqdm(stu_df.to_dict('records')):
         total += 1
+        username = stu_dict.get("学号", 'null')
         try:
-            sid = username = stu_dict["学号"]
-            password = username
+            sid = username
             name = stu_dict["姓名"]
             gender = Char2Gender[stu_dict["性别"]]
             stu_major = stu_dict["专业"]
@@ -380,22 +485,11 @@ def load_stu(filepath: str, output_func: Callable=None, html=False):
             if not tel or tel == "None":
                 tel = None
 
-            user, created = User.objects.get_or_create(username=username)
-            if not created:
-                exist_list.append(username)
-                continue
-            # 这一步的PBKDF2加密算法太慢了
-            else:
-                # 设置密码
-                user.set_password(password)
-                user.save()
-
-            # 批量导入比循环导入快很多，但可惜由于外键pid的存在，必须先保存user，User模型无法批量导入。
-            # 但重点还是 set_password 的加密算法太 TM 的慢了！
-            stu_list.append(
-                NaturalPerson(
-                    **{SQ.f(NaturalPerson.person_id): user},
-                    stu_id_dbonly=sid,
+            stu_rows.append(dict(
+                username=username,
+                password=username,
+                name=name,
+                person=dict(
                     name=name,
                     gender=gender,
                     stu_major=stu_major,
@@ -403,21 +497,24 @@ def load_stu(filepath: str, output_func: Callable=None, html=False):
                     stu_class=stu_class,
                     email=email,
                     telephone=tel,
-                )
-            )
+                ),
+            ))
         except Exception as e:
-            fail_info = str(e)
-            failed_list.append(username)
+            failed[str(username)] = str(e)
             continue
-    NaturalPerson.objects.bulk_create(stu_list)
+    # PBKDF2加密算法太慢，在多个进程中计算，并批量导入
+    created, exist_list, db_failed = bulk_create_persons(stu_rows, workers)
+    failed.update(db_failed)
+    fail_info = next(reversed(failed.values()), None)
 
     msg = '<br/>'.join((
                 "导入学生信息成功！",
-                f"共{total}人，尝试导入{len(stu_list)}人",
+                f"共{total}人，尝试导入{len(stu_rows) - len(exist_list)}人，"
+                f"成功{len(created)}人",
                 f"已存在{len(exist_list)}人，名单为",
                 ','.join(exist_list),
-                f"失败{len(failed_list)}人，名单为",
-                ','.join(failed_list),
+                f"失败{len(failed)}人，名单为",
+                ','.join(failed),
                 f'最后一次失败原因为: {fail_info}' if fail_info is not None else '',
                 ))
     return try_output(msg, output_func, html)
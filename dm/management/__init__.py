@@ -48,6 +48,8 @@ def register_dump_groups(group: str, tasks: List[str]):
 register_dump('page', PageTrackingDump)
 register_dump('module', ModuleTrackingDump)
 register_dump('appointment', AppointmentDump)
+register_dump('yqpoint', YQPointRecordDump)
+register_dump('notification', NotificationDump)
 register_dump('org_activity', OrgActivityDump)
 register_dump('person_position', PersonPosDump, accept_params=['year', 'semester'])
 register_dump('person_activity', PersonActivityDump, accept_params=['year', 'semester'])
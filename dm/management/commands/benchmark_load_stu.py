@@ -0,0 +1,51 @@
+import os
+from time import perf_counter
+from tempfile import TemporaryDirectory
+
+import pandas as pd
+from django.db import transaction
+from django.core.management.base import BaseCommand, CommandParser
+
+from dm.load_funcs import load_stu
+
+
+class Command(BaseCommand):
+    help = "使用随机生成的学生数据测试学生导入的耗时，测试数据不会保留"
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument('-n', '--students', type=int, default=4000,
+                            help='模拟导入人数，默认4000')
+        parser.add_argument('-w', '--workers', type=int, nargs='+', default=None,
+                            help='依次测试的哈希进程数，默认为1和CPU核数')
+        parser.add_argument('--prefix', type=str, default='99',
+                            help='模拟学号的前缀，应避免与已有学号重复')
+
+    def make_students(self, count: int, prefix: str) -> pd.DataFrame:
+        return pd.DataFrame([{
+            '学号': f'{prefix}{i:08d}',
+            '姓名': f'测试{i}',
+            '性别': '男' if i % 2 else '女',
+            '专业': 'None',
+            '班级': str(i % 10),
+            '邮箱': 'None',
+            '手机号': 'None',
+        } for i in range(count)])
+
+    def handle(self, *args, **options):
+        count = options['students']
+        workers_list = options['workers'] or sorted({1, os.cpu_count() or 1})
+        with TemporaryDirectory() as tmpdir:
+            filepath = os.path.join(tmpdir, 'students.csv')
+            self.make_students(count, options['prefix']).to_csv(
+                filepath, index=False, encoding='utf-8')
+            for workers in workers_list:
+                with transaction.atomic():
+                    start = perf_counter()
+                    msg = load_stu(filepath, html=True, workers=workers)
+                    elapsed = perf_counter() - start
+                    # 测试数据全部回滚
+                    transaction.set_rollback(True)
+                self.stdout.write(
+                    f'进程数{workers}：{count}人，用时{elapsed:.2f}s，'
+                    f'{count / elapsed:.0f}人/s')
+                self.stdout.write(msg.split('<br/>')[1])
@@ -1,11 +1,11 @@
 import os
 from typing import List
-import pandas as pd
 from datetime import datetime
 
 from django.core.management.base import BaseCommand
 
 from utils.hasher import MySHA256Hasher
+from utils.export import get_writer
 from dm.management import dump_map, dump_groups
 
 
@@ -30,12 +30,14 @@ def valid_datetime(s: str) -> datetime:
     raise ValueError(msg)
 
 
-def complete_filename(filename: str = None) -> str:
+def complete_filename(filename: str = None, suffix: str = '.xlsx') -> str:
     """
     处理缺省的文件名和没有后缀的文件名
 
     :param filename: 待处理的文件名, defaults to None
     :type filename: str, optional
+    :param suffix: 缺省的后缀, defaults to '.xlsx'
+    :type suffix: str, optional
     :return: 处理后的文件名
     :rtype: str
     """
@@ -44,8 +46,8 @@ def complete_filename(filename: str = None) -> str:
         datetime.now().strftime('%Y年%m月%d日') + MySHA256Hasher('').encode(
             datetime.now().strftime(' %H:%M:%S.%f'))[:4]
     )
-    if not filename.endswith(('.xlsx', '.xls')):
-        filename += '.xlsx'
+    if not filename.endswith(('.xlsx', '.xls', '.csv', '.csv.gz')):
+        filename += suffix
     return filename
 
 
@@ -94,6 +96,9 @@ class Command(BaseCommand):
         parser.add_argument('-m', '--mask', type=bool,
                             default=True, help='Mask student id.')
         parser.add_argument('-S', '--salt', type=str, help='hash salt')
+        parser.add_argument('-F', '--format', type=str, default='xlsx',
+                            choices=['xlsx', 'csv', 'csv.gz'],
+                            help='Output format. CSV writes one file per task.')
 
     def handle(self, *args, **options):
         hash_func = (MySHA256Hasher(options['salt'] or str(os.urandom(8))).encode
@@ -104,15 +109,17 @@ class Command(BaseCommand):
             for label in extend_group_label(options['exclude'], dump_groups):
                 if label in tasks:
                     tasks.remove(label)
-        filename = complete_filename(options['filename'])
+        filename = complete_filename(options['filename'], '.' + options['format'])
         filepath = os.path.join(options['dir'], filename)
-        with pd.ExcelWriter(filepath) as writer:
+        # 逐行写入，内存占用与导出行数无关
+        with get_writer(filepath, options['format']) as writer:
             for task in tasks:
                 dump_cls, accept_params = dump_map[task]
                 self.stdout.write(f'正在导出 {task} 到 {filepath}')
-                df: pd.DataFrame = dump_cls.dump(
+                columns, rows = dump_cls.stream(
                     hash_func=hash_func,
                     **{k: options[k] for k in set(accept_params).intersection(options.keys())}
                 )
-                df.to_excel(writer, sheet_name=task, index=False)
+                count = writer.write_sheet(task, columns, rows)
+                self.stdout.write(f'已导出 {task} 共{count}行')
         self.stdout.write(f'导出结束！已导出至 {filepath}')
@@ -2,23 +2,24 @@ import json
 
 from django.core.management.base import BaseCommand
 from app.models import NaturalPerson
-from dm.summary import cal_co_appoint, cal_appoint
+from dm.models import UserSummary
+from dm.summary import SUMMARY_YEAR
 
 
 class Command(BaseCommand):
-    help = '导入测试数据'
+    help = '根据预计算的年度总结导出排名信息，请先运行summarize'
 
     def handle(self, *args, **option):
         cur_year = 2022
+        persons = NaturalPerson.objects.activated().exclude(stu_grade=cur_year)
+        summaries = UserSummary.objects.filter(
+            year=SUMMARY_YEAR, user__in=persons.values('person_id'),
+        ).values_list('user__username', 'data')
         co_list, func_list, discuss_list = [], [], []
-        for person in NaturalPerson.objects.activated().exclude(stu_grade=cur_year):
-            sid = person.person_id.username
-            co_list.append((sid, cal_co_appoint(
-                person).get('co_appoint_hour', 0)))
-            appoint_info = cal_appoint(person)
-            discuss_list.append(
-                (sid, appoint_info.get('discuss_appoint_hour', 0)))
-            func_list.append((sid, appoint_info.get('func_appoint_hour', 0)))
+        for sid, data in summaries:
+            co_list.append((sid, data.get('co_appoint_hour', 0)))
+            discuss_list.append((sid, data.get('discuss_appoint_hour', 0)))
+            func_list.append((sid, data.get('func_appoint_hour', 0)))
         co_list = sorted(co_list, key=lambda x: x[1])
         func_list = sorted(func_list, key=lambda x: x[1])
         discuss_list = sorted(discuss_list, key=lambda x: x[1])
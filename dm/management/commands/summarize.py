@@ -0,0 +1,25 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from dm.summary import compute_summaries, SUMMARY_YEAR
+
+
+class Command(BaseCommand):
+    help = "预计算个人年度总结，默认只重新计算统计结果有变化的用户"
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument('users', nargs='*', help='只计算这些学号，默认为所有人')
+        parser.add_argument('--full', action='store_true', help='忽略已有结果全部重新计算')
+        parser.add_argument('-w', '--workers', type=int, default=None,
+                            help='计算细节的进程数，默认为CPU核数')
+        parser.add_argument('--chunk-size', type=int, default=100,
+                            help='每个子任务的人数，默认100')
+
+    def handle(self, *args, **options):
+        start = perf_counter()
+        count = compute_summaries(
+            options['users'] or None, full=options['full'],
+            workers=options['workers'], chunk_size=options['chunk_size'])
+        self.stdout.write(f'{SUMMARY_YEAR}年度总结：重新计算{count}人，'
+                          f'耗时{perf_counter() - start:.1f}s')
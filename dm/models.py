@@ -0,0 +1,28 @@
+from django.db import models
+
+from generic.models import User
+
+
+__all__ = ['UserSummary']
+
+
+class UserSummary(models.Model):
+    '''
+    预计算的个人年度总结
+
+    由`dm.summary.compute_summaries`批量生成，总结页面直接读取，
+    digest为批量统计结果的摘要，未变化的用户在增量运行时跳过
+    '''
+    class Meta:
+        verbose_name = '个人年度总结'
+        verbose_name_plural = verbose_name
+        unique_together = ['user', 'year']
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='用户')
+    year = models.IntegerField('年份')
+    data = models.JSONField('总结数据', default=dict)
+    digest = models.CharField('统计摘要', max_length=40)
+    updated_at = models.DateTimeField('更新时间', auto_now=True)
+
+    def __str__(self):
+        return f'{self.user} {self.year}'
@@ -2,18 +2,31 @@
 TODO: Remove type errors
 """
 
-from typing import Dict, Any
+import os
+import json
+import hashlib
+import multiprocessing
+from typing import Dict, Any, Callable
 from datetime import *
+from decimal import Decimal
 from collections import defaultdict, Counter
 
+import django
+from django.db import connection
 from django.db.models import *
+from django.db.models.functions import ExtractHour
+from django.utils.formats import localize
 
 from utils.models.query import *
 from app.config import *
 from app.models import *
-from Appointment.models import Appoint, CardCheckInfo, Room
+from Appointment.models import Appoint, CardCheckInfo, Room, Participant
 from Appointment.utils.identity import get_participant
-from Appointment.config import CONFIG
+from Appointment.config import appointment_config as CONFIG
+from record.log.utils import get_logger
+from dm.models import UserSummary
+
+logger = get_logger('summary')
 
 SUMMARY_YEAR = 2021
 SUMMARY_SEM_START = datetime(2021, 9, 1)
@@ -367,7 +380,7 @@ def cal_late_room(np: NaturalPerson):
                                                     Cardtime__date=_late_room_ref_date,
                                                     Cardtime__hour__gte=22
                                             ).values_list('Cardstudent'))))
-    return locals()
+    return remove_local_var(locals())
 
 
 def cal_appoint(np: NaturalPerson):
@@ -481,3 +494,269 @@ def cal_co_appoint(np: NaturalPerson):
     co_keyword = Counter(_key_words).most_common(1)[0]
 
     return remove_local_var(locals())
+
+
+# 批量预计算部分从此开始
+# 先用分组聚合一次算出所有用户的计数，只对有记录的用户逐个计算细节
+_EMPTY_COURSE = dict(
+    course_num=0, course_hour=0, course_type=' 0',
+    course_most_time_name='无', course_most_hour=0,
+    course_most_num_name='无', course_most_num=0,
+    max_type_info=('无', 0), type_count=0,
+)
+
+_DETAIL_FUNCS: dict[str, list[Callable[[NaturalPerson], dict]]] = dict(
+    sharp=[cal_sharp_appoint],
+    course=[cal_course],
+    study=[cal_study_room],
+    early=[cal_early_room],
+    late=[cal_late_room],
+    appoint=[cal_appoint, cal_appoint_kw, cal_co_appoint],
+)
+
+
+def _grouped(queryset: QuerySet, key: str, **aggregates) -> dict[Any, dict[str, Any]]:
+    '''按key分组聚合，清除默认排序以免影响分组'''
+    rows = queryset.order_by().values(key).annotate(**aggregates)
+    return {row.pop(key): row for row in rows}
+
+
+def _counts(queryset: QuerySet, key: str) -> dict[Any, int]:
+    return {k: row['num'] for k, row in _grouped(queryset, key, num=Count('pk')).items()}
+
+
+def bulk_metrics(persons: list[NaturalPerson]) -> tuple[dict[str, dict], dict[str, list[str]]]:
+    '''
+    用分组聚合计算所有用户的计数类指标，查询次数与人数无关
+
+    :return: 用户名到指标的映射，以及用户名到仍需逐个计算的细节类别
+    :rtype: tuple[dict[str, dict], dict[str, list[str]]]
+    '''
+    usernames = {np.id: np.person_id.username for np in persons}
+    user_ids = {np.person_id_id: np.person_id.username for np in persons}
+    metrics = {username: dict(
+        appoint_num=0, appoint_hour=0.0, sharp_appoint_num=0,
+        IScreate=False, myclub_name='', club_num=0, course_org_num=0,
+        act_num=0, position_num=0,
+    ) for username in usernames.values()}
+    details: dict[str, list[str]] = {username: [] for username in usernames.values()}
+
+    # 预约，以主预约人统计
+    appoints = Appoint.objects.filter(
+        Astart__gte=SUMMARY_SEM_START, Astart__lt=SUMMARY_SEM_END,
+        major_student__in=list(metrics))
+    for sid, row in _grouped(appoints.not_canceled(), 'major_student',
+                             num=Count('pk'), time=Sum(F('Afinish') - F('Astart'))).items():
+        metrics[sid].update(
+            appoint_num=row['num'],
+            appoint_hour=round((row['time'] or timedelta()).total_seconds() / 3600, 1))
+    sharp_appoints = appoints.exclude(Atype=Appoint.Type.TEMPORARY).filter(
+        Astart__lt=F('Atime') + timedelta(minutes=30))
+    for sid, num in _counts(sharp_appoints, 'major_student').items():
+        metrics[sid]['sharp_appoint_num'] = num
+        details[sid].append('sharp')
+
+    # 小组与活动
+    for pos, oname in ModifyOrganization.objects.filter(
+            pos__in=list(user_ids), status=ModifyOrganization.Status.CONFIRMED
+            ).order_by('id').values_list('pos', 'oname'):
+        info = metrics[user_ids[pos]]
+        info['myclub_name'] = '，'.join(filter(None, [info['myclub_name'], oname]))
+        info['IScreate'] = True
+    positions = Position.objects.activated(noncurrent=None).filter(
+        person__in=list(usernames), year=SUMMARY_YEAR)
+    for person, row in _grouped(
+            positions, 'person', position_num=Count('pk'),
+            club_num=Count('pk', filter=Q(org__otype__otype_name='学生小组')),
+            course_org_num=Count('pk', filter=Q(org__otype__otype_name='书院课程'))).items():
+        metrics[usernames[person]].update(row)
+    participation = Participation.objects.activated().filter(
+        person__in=list(usernames), activity__year=SUMMARY_YEAR)
+    for person, num in _counts(participation, 'person').items():
+        metrics[usernames[person]]['act_num'] = num
+
+    # 书院课程
+    course_nums = _counts(CourseRecord.objects.filter(
+        person__in=list(usernames), invalid=False, year=SUMMARY_YEAR), 'person')
+    for person, username in usernames.items():
+        if course_nums.get(person):
+            details[username].append('course')
+        else:
+            metrics[username].update(_EMPTY_COURSE)
+
+    # 刷卡和参与预约，只统计有预约身份的用户
+    participants = set(Participant.objects.filter(
+        Sid__in=list(metrics)).values_list('Sid', flat=True))
+    records = CardCheckInfo.objects.filter(
+        Cardtime__gt=SUMMARY_SEM_START, Cardtime__lt=SUMMARY_SEM_END,
+        Cardstudent__in=participants).annotate(hour=ExtractHour('Cardtime'))
+    study = _counts(records.filter(Cardroom__Rtitle__contains='自习'), 'Cardstudent')
+    early = _counts(records.filter(hour__gte=6, hour__lt=8), 'Cardstudent')
+    late = _counts(records.filter(hour__gte=23), 'Cardstudent')
+    joined = _counts(Appoint.objects.not_canceled().filter(
+        Astart__gt=SUMMARY_SEM_START, Astart__lt=SUMMARY_SEM_END,
+        students__in=participants), 'students')
+    for sid in participants:
+        info, detail = metrics[sid], details[sid]
+        for kind, counts, empty in [
+            ('study', study, dict(study_room_num=0)),
+            ('early', early, dict(early_day_num=0)),
+            ('late', late, dict(late_room_num=0)),
+            ('appoint', joined, dict(Skeywords=[])),
+        ]:
+            if counts.get(sid):
+                detail.append(kind)
+            else:
+                info.update(empty)
+    return metrics, details
+
+
+def bulk_sources(persons: list[NaturalPerson]) -> dict[str, dict[str, list]]:
+    '''
+    各用户年度总结所依据的源数据指纹，记录每类数据的行数、最大id和id之和
+
+    仅靠统计结果无法发现数量不变的数据变化，如删除一条预约后又新建一条
+    '''
+    usernames = {np.id: np.person_id.username for np in persons}
+    user_ids = {np.person_id_id: np.person_id.username for np in persons}
+    sources: dict[str, dict[str, list]] = {username: {} for username in usernames.values()}
+
+    def collect(name: str, queryset: QuerySet, key: str, keymap: dict | None = None):
+        rows = _grouped(queryset, key, num=Count('pk'), last=Max('pk'), total=Sum('pk'))
+        for k, row in rows.items():
+            username = keymap[k] if keymap is not None else k
+            sources[username][name] = [row['num'], row['last'], row['total']]
+
+    participants = list(sources)
+    sem_range = dict(Astart__gte=SUMMARY_SEM_START, Astart__lt=SUMMARY_SEM_END)
+    collect('appoint', Appoint.objects.filter(
+        major_student__in=participants, **sem_range), 'major_student')
+    collect('joined', Appoint.objects.filter(
+        students__in=participants, **sem_range), 'students')
+    collect('card', CardCheckInfo.objects.filter(
+        Cardtime__gt=SUMMARY_SEM_START, Cardtime__lt=SUMMARY_SEM_END,
+        Cardstudent__in=participants), 'Cardstudent')
+    collect('org', ModifyOrganization.objects.filter(pos__in=list(user_ids)),
+            'pos', user_ids)
+    collect('position', Position.objects.filter(
+        person__in=list(usernames), year=SUMMARY_YEAR), 'person', usernames)
+    collect('participation', Participation.objects.filter(
+        person__in=list(usernames), activity__year=SUMMARY_YEAR), 'person', usernames)
+    collect('course', CourseRecord.objects.filter(
+        person__in=list(usernames), year=SUMMARY_YEAR), 'person', usernames)
+    return sources
+
+
+def _jsonable(value):
+    '''转为可存入JSON的值，日期和时间按页面的显示格式转为字符串'''
+    if isinstance(value, dict):
+        return {k: _jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, (datetime, date, time)):
+        return localize(value)
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    if isinstance(value, Decimal):
+        return float(value)
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    return str(value)
+
+
+def _digest(info: dict, sources: dict) -> str:
+    content = json.dumps([_jsonable(info), sources], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+def compute_details(tasks: list[tuple[str, list[str]]]) -> dict[str, dict]:
+    '''逐个计算细节类指标，可在子进程中运行，单项出错时跳过该项'''
+    persons = {np.person_id.username: np for np in NaturalPerson.objects.select_related(
+        f(NaturalPerson.person_id)).filter(
+        person_id__username__in=[username for username, _ in tasks])}
+    results = {}
+    for username, kinds in tasks:
+        np, info = persons[username], {}
+        for kind in kinds:
+            for func in _DETAIL_FUNCS[kind]:
+                try:
+                    info.update(func(np))
+                except Exception as e:
+                    logger.warning(f'计算{username}的年度总结{func.__name__}出错：{e}')
+        results[username] = info
+    return results
+
+
+def compute_summaries(usernames: list[str] | None = None, full: bool = False,
+                      workers: int | None = None, chunk_size: int = 100) -> int:
+    '''
+    预计算个人年度总结并存入`UserSummary`，默认只重新计算统计结果变化的用户
+
+    :param usernames: 只计算这些用户，默认为所有自然人
+    :type usernames: list[str] | None, optional
+    :param full: 忽略已有结果全部重新计算, defaults to False
+    :type full: bool, optional
+    :param workers: 计算细节的进程数，默认为CPU核数，为1时在当前进程计算
+    :type workers: int | None, optional
+    :param chunk_size: 每个子任务的人数, defaults to 100
+    :type chunk_size: int, optional
+    :return: 重新计算的人数
+    :rtype: int
+    '''
+    persons = NaturalPerson.objects.select_related(f(NaturalPerson.person_id))
+    if usernames is not None:
+        persons = persons.filter(person_id__username__in=usernames)
+    persons = list(persons)
+    metrics, details = bulk_metrics(persons)
+    sources = bulk_sources(persons)
+    digests = {username: _digest(info, sources[username])
+               for username, info in metrics.items()}
+    if not full:
+        stored = dict(UserSummary.objects.filter(
+            year=SUMMARY_YEAR, user__username__in=list(metrics),
+        ).values_list('user__username', 'digest'))
+        persons = [np for np in persons
+                   if stored.get(np.person_id.username) != digests[np.person_id.username]]
+
+    tasks = [(np.person_id.username, details[np.person_id.username]) for np in persons]
+    chunks = [tasks[i:i + chunk_size] for i in range(0, len(tasks), chunk_size)]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(chunks))
+    if workers <= 1:
+        results = map(compute_details, chunks)
+        pool = None
+    else:
+        # 子进程使用spawn启动，需要重新初始化Django
+        pool = multiprocessing.get_context('spawn').Pool(workers, initializer=django.setup)
+        results = pool.imap_unordered(compute_details, chunks)
+
+    users = {np.person_id.username: np for np in persons}
+    # MySQL的ON DUPLICATE KEY UPDATE不能指定冲突的字段
+    conflict_target = (dict(unique_fields=['user', 'year'])
+                       if connection.features.supports_update_conflicts_with_target
+                       else {})
+    try:
+        for result in results:
+            UserSummary.objects.bulk_create([
+                UserSummary(
+                    user_id=users[username].person_id_id, year=SUMMARY_YEAR,
+                    data=_jsonable(dict(Sname=users[username].name)
+                                   | metrics[username] | info),
+                    digest=digests[username],
+                ) for username, info in result.items()
+            ], update_conflicts=True, update_fields=['data', 'digest', 'updated_at'],
+               **conflict_target)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    return len(tasks)
+
+
+def load_person_summary(user: User) -> dict[str, Any]:
+    '''读取预计算的个人年度总结，尚未计算时实时计算'''
+    summary = UserSummary.objects.filter(user=user, year=SUMMARY_YEAR).first()
+    if summary is not None:
+        return summary.data
+    return person_info(user)
@@ -1,7 +1,59 @@
+import os
+import csv
+import gzip
 from io import StringIO
+from tempfile import TemporaryDirectory
+
+from openpyxl import load_workbook
 from django.core.management import call_command
 from django.test import TestCase
 
+from app.models import User, Notification
 from dm.management import register_dump
+from dm.dump_funcs import BaseDump, NotificationDump
 
 # 编写导出测试
+
+
+class StreamDumpTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            'p0', 'p0', User.Type.PERSON, password='111')
+        for i in range(5):
+            Notification.objects.create(
+                receiver=cls.user, sender=cls.user, title='t', content=str(i))
+
+    def test_chunked(self):
+        '''分块读取的结果与直接查询一致'''
+        notifications = Notification.objects.all()
+        self.assertEqual(list(BaseDump.chunked(notifications, chunk_size=2)),
+                         list(notifications.order_by('pk')))
+        values = notifications.values_list('pk', 'content')
+        self.assertEqual(list(BaseDump.chunked(values, chunk_size=5)),
+                         list(values.order_by('pk')))
+
+    def test_hash(self):
+        columns, rows = NotificationDump.stream(hash_func=lambda x: 'h' + x)
+        rows = list(rows)
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[0][:4], ('hp0', 'hp0', 't', '0'))
+
+    def dump(self, tmpdir, format):
+        call_command('dump', 'notification', '-d', tmpdir, '-f', 'out',
+                     '-F', format, '-m', '', stdout=StringIO())
+
+    def test_formats(self):
+        with TemporaryDirectory() as tmpdir:
+            self.dump(tmpdir, 'xlsx')
+            sheet = load_workbook(os.path.join(tmpdir, 'out.xlsx'))['notification']
+            rows = list(sheet.values)
+            self.assertEqual(rows[0], NotificationDump.columns)
+            self.assertEqual(len(rows), 6)
+
+            self.dump(tmpdir, 'csv.gz')
+            path = os.path.join(tmpdir, 'out_notification.csv.gz')
+            with gzip.open(path, 'rt', encoding='utf-8-sig') as f:
+                rows = list(csv.reader(f))
+            self.assertEqual(rows[0], list(NotificationDump.columns))
+            self.assertEqual([row[3] for row in rows[1:]], list('01234'))
@@ -1,8 +1,10 @@
 from io import StringIO
 from django.core.management import call_command
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
+from app.models import User, NaturalPerson
 from dm.management import register_load
+from dm.load_funcs import bulk_create_persons
 
 class LoadCommandTest(TestCase):
     def test_register_command(self):
@@ -19,3 +21,26 @@ class LoadCommandTest(TestCase):
         out = StringIO()
         call_command('load', cmd_label, '-d=', stdout=out, stderr=out)
         self.assertIn(f'filepath is {filepath}', out.getvalue())
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LoadStudentTest(TestCase):
+    def test_bulk_create(self):
+        '''已存在、重复和出错的行不影响其它行的导入'''
+        User.objects.create_user('2300000001', '已有', User.Type.STUDENT)
+        person = dict(gender=NaturalPerson.Gender.MALE, stu_grade='2023')
+        rows = [
+            dict(username=f'230000000{i}', password=f'pw{i}',
+                 name=f'学生{i}', person=dict(person, name=f'学生{i}'))
+            for i in range(4)
+        ]
+        rows.append(dict(rows[0]))
+        rows[2]['person'] = dict(person, name='学生2', gender='男')
+        created, existed, failed = bulk_create_persons(rows, workers=2, batch_size=2)
+        self.assertEqual(created, ['2300000000', '2300000003'])
+        self.assertEqual(existed, ['2300000001', '2300000000'])
+        self.assertEqual(list(failed), ['2300000002'])
+        user = User.objects.get(username='2300000003')
+        self.assertTrue(user.check_password('pw3'))
+        self.assertEqual(user.utype, User.Type.STUDENT)
+        self.assertEqual(NaturalPerson.objects.get_by_user(user).name, '学生3')
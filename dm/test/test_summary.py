@@ -0,0 +1,67 @@
+from datetime import datetime, time, timedelta
+
+from django.test import TestCase
+
+from app.models import User, NaturalPerson
+from Appointment.models import Room, Participant, Appoint
+from dm.models import UserSummary
+from dm.summary import (
+    bulk_metrics, compute_summaries, load_person_summary,
+    cal_appoint_sum, cal_sharp_appoint, cal_act, SUMMARY_SEM_START,
+)
+
+
+class SummaryTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f'{i}', f'学生{i}') for i in range(3)]
+        cls.persons = [NaturalPerson.objects.create(user, name=user.name)
+                       for user in cls.users]
+        cls.participants = [Participant.objects.create(Sid=user) for user in cls.users[:2]]
+        cls.room = Room.objects.create(Rid='B101', Rtitle='自习室',
+                                       Rstart=time(8), Rfinish=time(23))
+        for hours in [1, 2]:
+            cls.appoint(cls.participants[0], hours)
+        cls.appoint(cls.participants[1], 3, Astatus=Appoint.Status.CANCELED)
+
+    @classmethod
+    def appoint(cls, participant: Participant, hours: int, **fields) -> Appoint:
+        start = SUMMARY_SEM_START + timedelta(days=hours)
+        return Appoint.objects.create(
+            Room=cls.room, major_student=participant, Astart=start,
+            Afinish=start + timedelta(hours=hours), Ausage='学习', Aneed_num=1, **fields)
+
+    def test_bulk_metrics(self):
+        '''分组聚合的结果与逐人计算的结果一致'''
+        metrics, details = bulk_metrics(self.persons)
+        for person in self.persons:
+            expected = cal_appoint_sum(person) | cal_act(person)
+            expected['sharp_appoint_num'] = cal_sharp_appoint(person)['sharp_appoint_num']
+            info = metrics[person.person_id.username]
+            self.assertEqual({k: info[k] for k in expected}, expected)
+        self.assertEqual(metrics['0']['appoint_num'], 2)
+        self.assertEqual(details['0'], ['sharp'])
+        self.assertEqual(details['2'], [])
+        self.assertNotIn('study_room_num', metrics['2'])
+
+    def test_incremental(self):
+        '''只重新计算统计结果变化的用户'''
+        self.assertEqual(compute_summaries(workers=1), 3)
+        self.assertEqual(UserSummary.objects.count(), 3)
+        self.assertEqual(compute_summaries(workers=1), 0)
+
+        self.appoint(self.participants[1], 4)
+        self.assertEqual(compute_summaries(workers=1), 1)
+        data = load_person_summary(self.users[1])
+        self.assertEqual((data['Sname'], data['appoint_num'], data['appoint_hour']),
+                         ('学生1', 1, 4.0))
+        self.assertEqual(compute_summaries(['0'], full=True, workers=1), 1)
+
+    def test_source_change(self):
+        '''统计结果不变但源数据变化时也重新计算'''
+        compute_summaries(workers=1)
+        replaced = Appoint.objects.filter(major_student=self.participants[0]).first()
+        hours = int((replaced.Afinish - replaced.Astart).total_seconds() // 3600)
+        replaced.delete()
+        self.appoint(self.participants[0], hours)
+        self.assertEqual(compute_summaries(workers=1), 1)
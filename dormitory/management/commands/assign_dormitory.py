@@ -1,10 +1,13 @@
-import copy
-import random
+import os
+from time import perf_counter
 from collections import defaultdict
 
 import numpy as np
 import pandas as pd
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandParser
+
+from boot import config
+from dormitory.optimizer import AnnealConfig, encode_students, optimize
 
 '''
 有关reference文件夹的说明：
@@ -12,9 +15,12 @@ reference文件夹用于存放宿舍分配时的参考信息。
 results.xlsx是新生问卷填写结果；
 info.xlsx是学院提供的含有新生姓名、学号、生源地、生源高中的表格；
 dorm.xlsx是学院提供的含有空余宿舍列表的表格；
-dorm_assigned.xlsx是保存宿舍分配结果的目标文件。
+dorm_assigned.xlsx是保存宿舍分配结果的默认目标文件。
+以上路径均可通过命令参数指定。
 '''
 
+DEFAULT_REFERENCE_DIR = os.path.join(config.BASE_DIR, 'dormitory', 'references')
+
 
 class Freshman:
     def __init__(self, data):
@@ -98,12 +104,12 @@ class Dormitory:
         return score
 
 
-def read_info():
+def read_info(results_path: str, info_path: str):
     '''返回一个Freshman的list'''
     freshmen = []
 
-    df = pd.read_excel("/workspace/dormitory/references/results.xlsx")
-    df2 = pd.read_excel("/workspace/dormitory/references/info.xlsx")
+    df = pd.read_excel(results_path)
+    df2 = pd.read_excel(info_path)
 
     for index, stu in df.iterrows():
         data = defaultdict()
@@ -166,11 +172,11 @@ def read_info():
     return freshmen
 
 
-def read_dorm():
+def read_dorm(dorm_path: str):
     '''返回一个Dormitory的list'''
     dorm = []
 
-    df = pd.read_excel("/workspace/dormitory/references/dorm.xlsx")
+    df = pd.read_excel(dorm_path)
 
     for index, room in df.iterrows():
         rid = int(room["房间"])
@@ -187,147 +193,44 @@ def read_dorm():
     return male_dorm, female_dorm
 
 
-def assign_dorm():
+def assign_group(freshmen: list[Freshman], dorms: list[Dormitory],
+                 anneal_config: AnnealConfig, restarts: int = 1,
+                 workers: int = None, seed: int = 0) -> float:
+    '''
+    使用模拟退火将一组同性别的新生分入宿舍，结果写入各宿舍的stu，返回总得分
+    参数见dormitory.optimizer.optimize
+    '''
+    problem = encode_students([stu.data for stu in freshmen],
+                              [dorm.remain for dorm in dorms])
+    result = optimize(problem, anneal_config, restarts=restarts,
+                      workers=workers, seed=seed)
+    for dorm, members in zip(dorms, result.rooms()):
+        dorm.stu = [freshmen[i] for i in members]
+        dorm.remain -= len(members)
+        assert dorm.check_must(), f'宿舍{dorm.id}不满足分配条件'
+    return result.score
+
+
+def assign_dorm(freshmen: list[Freshman], male_dorm: list[Dormitory],
+                female_dorm: list[Dormitory], **options):
     '''
     分配宿舍算法：
-    执行若干次（250000次）随机交换（选取任一宿舍，选取任一床位），
-    衡量交换前后两宿舍得分之和，使得总得分最大化
+    男女生分别从随机的初始分配开始模拟退火，每步随机交换两名同学或将一名同学移入空床位，
+    只比较涉及的两间宿舍的得分变化，使得总得分最大化
+    options见assign_group
     '''
-    freshmen = read_info()
-    male_dorm, female_dorm = read_dorm()
-
-    # 初始随机分配
-    # TODO: 如果运气很烂，最后剩余4人无法分到同一宿舍，可能导致算法卡死。
-    for stu in freshmen:
-        assigned = False
-        while not assigned:
-            male_vacant = [d for d in male_dorm if d.remain > 0]
-            female_vacant = [d for d in female_dorm if d.remain > 0]
-            if stu.data['gender'] == "男":
-                dorm = random.choice(male_vacant)
-                dorm.add(stu)
-                if dorm.check_must():
-                    dorm.remain -= 1
-                    assigned = True
-                else:
-                    dorm.stu.pop()
-            else:
-                dorm = random.choice(female_vacant)
-                dorm.add(stu)
-                if dorm.check_must():
-                    dorm.remain -= 1
-                    assigned = True
-                else:
-                    dorm.stu.pop()
-
-    # 随机交换
-    epsilon = 0.3
-    for episode in range(250000):
-        print(episode)
-
-        rid1 = random.randint(0, len(male_dorm) - 1)
-        rid2 = random.randint(0, len(male_dorm) - 1)
-        if rid1 == rid2:
-            continue
-
-        room1: Dormitory = copy.deepcopy(male_dorm[rid1])
-        room2: Dormitory = copy.deepcopy(male_dorm[rid2])
-        o_score = room1.check_better() + room2.check_better()
-        if len(room1.stu) == 0 or len(room2.stu) == 0:
-            continue
-
-        temp1: Dormitory = copy.deepcopy(room1)
-        temp2: Dormitory = copy.deepcopy(room2)
-
-        del male_dorm[max(rid1, rid2)]
-        del male_dorm[min(rid1, rid2)]
-
-        if random.random() < epsilon:
-            if len(room1.stu) != 4 and len(room2.stu) != 4:
-                temp2.add(temp1.stu.pop())
-                if temp1.check_must() and temp2.check_must() and (temp1.check_better() + temp2.check_better() > o_score):
-                    room1 = temp1
-                    room2 = temp2
-                    o_score = room1.check_better() + room2.check_better()
-
-        if len(room1.stu) == 0 or len(room2.stu) == 0:
-            male_dorm.append(room1)
-            male_dorm.append(room2)
-            continue
-
-        temp1: Dormitory = copy.deepcopy(room1)
-        temp2: Dormitory = copy.deepcopy(room2)
-
-        bid1 = random.randint(0, len(room1.stu) - 1)
-        bid2 = random.randint(0, len(room2.stu) - 1)
-
-        temp1.stu[bid1], temp2.stu[bid2] = temp2.stu[bid2], temp1.stu[bid1]
-        if temp1.check_must() and temp2.check_must() and (temp1.check_better() + temp2.check_better() > o_score):
-            male_dorm.append(temp1)
-            male_dorm.append(temp2)
-        else:
-            male_dorm.append(room1)
-            male_dorm.append(room2)
-
-    for episode in range(250000):
-        print(episode)
-
-        rid1 = random.randint(0, len(female_dorm) - 1)
-        rid2 = random.randint(0, len(female_dorm) - 1)
-        if rid1 == rid2:
-            continue
-
-        room1: Dormitory = copy.deepcopy(female_dorm[rid1])
-        room2: Dormitory = copy.deepcopy(female_dorm[rid2])
-        o_score = room1.check_better() + room2.check_better()
-        if len(room1.stu) == 0 or len(room2.stu) == 0:
-            continue
-
-        temp1: Dormitory = copy.deepcopy(room1)
-        temp2: Dormitory = copy.deepcopy(room2)
-
-        del female_dorm[max(rid1, rid2)]
-        del female_dorm[min(rid1, rid2)]
-
-        if random.random() < epsilon:
-            if len(room1.stu) != 4 and len(room2.stu) != 4:
-                temp2.add(temp1.stu.pop())
-                if temp1.check_must() and temp2.check_must() and (temp1.check_better() + temp2.check_better() > o_score):
-                    room1 = temp1
-                    room2 = temp2
-                    o_score = room1.check_better() + room2.check_better()
-
-        if len(room1.stu) == 0 or len(room2.stu) == 0:
-            female_dorm.append(room1)
-            female_dorm.append(room2)
-            continue
-
-        temp1: Dormitory = copy.deepcopy(room1)
-        temp2: Dormitory = copy.deepcopy(room2)
-
-        bid1 = random.randint(0, len(room1.stu) - 1)
-        bid2 = random.randint(0, len(room2.stu) - 1)
-
-        temp1.stu[bid1], temp2.stu[bid2] = temp2.stu[bid2], temp1.stu[bid1]
-        if temp1.check_must() and temp2.check_must() and (temp1.check_better() + temp2.check_better() > o_score):
-            female_dorm.append(temp1)
-            female_dorm.append(temp2)
-        else:
-            female_dorm.append(room1)
-            female_dorm.append(room2)
-
-    male_dorm.sort(key=lambda d: d.id)
-    female_dorm.sort(key=lambda d: d.id)
+    male = [stu for stu in freshmen if stu.data['gender'] == "男"]
+    female = [stu for stu in freshmen if stu.data['gender'] != "男"]
+    assign_group(male, male_dorm, **options)
+    assign_group(female, female_dorm, **options)
 
-    dorm_result = male_dorm + female_dorm
+    dorm_result = sorted(male_dorm, key=lambda d: d.id) + sorted(female_dorm, key=lambda d: d.id)
     return dorm_result
 
 
-def out_as_excel():
-    '''将结果导出为excel文件，存储在reference/dorm_assigned.xlsx下'''
-    dorm_result = assign_dorm()
-
-    df = pd.DataFrame()
+def out_as_excel(dorm_result: list[Dormitory], output: str):
+    '''将结果导出为excel文件'''
+    rows = []
 
     major_list = ["文科类", "理工类"]
     international_list = ["不愿意", "都可以", "愿意"]
@@ -352,15 +255,47 @@ def out_as_excel():
                 "夏天能接受的最低空调温度": stu.data['ac_temp'],
                 "是否接受夏天整夜开空调": ac_list[stu.data['all_night_ac']],
             }
-            temp_df = pd.DataFrame(data, index=[0])
-            df = pd.concat([df, temp_df], ignore_index=True)
+            rows.append(data)
 
-    df.to_excel(
-        '/workspace/dormitory/references/dorm_assigned.xlsx', index=False)
+    pd.DataFrame(rows).to_excel(output, index=False)
 
 
 class Command(BaseCommand):
     help = "Assign dormitory."
 
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument('--reference-dir', type=str, default=DEFAULT_REFERENCE_DIR,
+                            help='参考文件所在的文件夹')
+        parser.add_argument('-o', '--output', type=str, default=None,
+                            help='分配结果的保存路径，默认为参考文件夹下的dorm_assigned.xlsx')
+        parser.add_argument('--seed', type=int, default=0, help='随机种子')
+        parser.add_argument('--steps', type=int, default=AnnealConfig.steps,
+                            help='每次退火的迭代次数')
+        parser.add_argument('--t-start', type=float, default=AnnealConfig.t_start,
+                            help='初始温度')
+        parser.add_argument('--t-end', type=float, default=AnnealConfig.t_end,
+                            help='终止温度')
+        parser.add_argument('--schedule', choices=['geometric', 'linear'],
+                            default=AnnealConfig.schedule, help='降温方式')
+        parser.add_argument('--restarts', type=int, default=4, help='独立重启次数')
+        parser.add_argument('-w', '--workers', type=int, default=None,
+                            help='并行的进程数，默认为CPU核数')
+
     def handle(self, *args, **options):
-        out_as_excel()
+        reference_dir = options['reference_dir']
+        freshmen = read_info(os.path.join(reference_dir, 'results.xlsx'),
+                             os.path.join(reference_dir, 'info.xlsx'))
+        male_dorm, female_dorm = read_dorm(os.path.join(reference_dir, 'dorm.xlsx'))
+        anneal_config = AnnealConfig(
+            steps=options['steps'], t_start=options['t_start'],
+            t_end=options['t_end'], schedule=options['schedule'])
+        start = perf_counter()
+        dorm_result = assign_dorm(
+            freshmen, male_dorm, female_dorm, anneal_config=anneal_config,
+            restarts=options['restarts'], workers=options['workers'],
+            seed=options['seed'])
+        score = sum(dorm.check_better() for dorm in dorm_result if dorm.stu)
+        self.stdout.write(f'总得分{score:.1f}，用时{perf_counter() - start:.1f}s')
+        output = options['output'] or os.path.join(reference_dir, 'dorm_assigned.xlsx')
+        out_as_excel(dorm_result, output)
+        self.stdout.write(f'分配结果已保存至{output}')
@@ -0,0 +1,47 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandParser
+
+from dormitory.optimizer import (
+    AnnealConfig,
+    encode_students,
+    optimize,
+    synthetic_cohort,
+)
+
+
+class Command(BaseCommand):
+    help = "使用随机生成的新生数据比较宿舍分配的得分和耗时"
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument('-n', '--students', type=int, default=200,
+                            help='同一性别的新生人数，默认200')
+        parser.add_argument('--steps', type=int, nargs='+', default=[10000, 50000, 250000],
+                            help='依次测试的迭代次数')
+        parser.add_argument('--restarts', type=int, nargs='+', default=[1, 4],
+                            help='依次测试的重启次数')
+        parser.add_argument('-w', '--workers', type=int, default=None,
+                            help='并行的进程数，默认为CPU核数')
+        parser.add_argument('--seed', type=int, default=0, help='随机种子')
+
+    def handle(self, *args, **options):
+        students = options['students']
+        cohort = synthetic_cohort(students, options['seed'])
+        # 留出约10%的空床位
+        rooms = (students * 11 // 10 + 3) // 4
+        problem = encode_students(cohort, [4] * rooms)
+        self.stdout.write(f'{students}人，{rooms}间宿舍')
+        # 温度极低时只接受更优的解，即原先的随机交换算法
+        methods = [('模拟退火', {}), ('仅接受更优', {'t_start': 1e-6, 't_end': 1e-6})]
+        for name, kwargs in methods:
+            for steps in options['steps']:
+                for restarts in options['restarts']:
+                    start = perf_counter()
+                    result = optimize(
+                        problem, AnnealConfig(steps=steps, **kwargs),
+                        restarts=restarts, workers=options['workers'],
+                        seed=options['seed'])
+                    elapsed = perf_counter() - start
+                    self.stdout.write(
+                        f'{name}：迭代{steps}次，重启{restarts}次，'
+                        f'得分{result.score:.1f}，用时{elapsed:.2f}s')
@@ -0,0 +1,421 @@
+'''
+optimizer.py
+
+新生宿舍分配的模拟退火优化
+
+- 学生的各项特征编码为NumPy数组，每间宿舍维护特征的和与平方和等充分统计量，
+  交换或移动学生后只需更新两间宿舍的统计量，即可在O(1)时间内得到得分的变化
+- 宿舍得分与assign_dormitory.Dormitory.check_better一致，约束与check_must一致
+- 多次独立重启可在多个进程中并行，随机种子确定时结果可复现
+'''
+import os
+import math
+from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+
+import numpy as np
+
+
+__all__ = [
+    'Problem', 'AnnealConfig', 'Assignment',
+    'encode_students', 'room_scores', 'anneal', 'optimize',
+    'synthetic_cohort',
+]
+
+
+# 学生特征矩阵的各列，宿舍的统计量是成员特征之和
+(_COUNT, _MAJOR, _WAKE, _WAKE_SQ, _SLEEP, _SLEEP_SQ, _AC, _AC_SQ,
+ _NIGHT, _INTL_ZERO, _INTL_LOG, _BEIJING) = range(12)
+_FEATURES = 12
+
+
+@dataclass
+class Problem:
+    '''一组待分配的学生和宿舍'''
+    features: np.ndarray    # (学生数, _FEATURES)
+    origins: np.ndarray     # 生源地编号
+    schools: np.ndarray     # 生源高中编号
+    capacity: np.ndarray    # 各宿舍的床位数
+
+    @property
+    def students(self) -> int:
+        return len(self.features)
+
+    @property
+    def rooms(self) -> int:
+        return len(self.capacity)
+
+
+@dataclass
+class AnnealConfig:
+    '''
+    模拟退火的参数
+
+    温度从t_start降至t_end，schedule为geometric时按比例下降，linear时线性下降
+    '''
+    steps: int = 250000
+    t_start: float = 300.0
+    t_end: float = 1.0
+    schedule: str = 'geometric'
+    # 尝试将学生移入空床位的概率，其余为交换两名学生
+    move_prob: float = 0.3
+    # 生成初始分配的最大尝试次数
+    init_attempts: int = 100
+
+    def temperatures(self) -> np.ndarray:
+        if self.schedule == 'geometric':
+            return np.geomspace(self.t_start, self.t_end, self.steps)
+        if self.schedule == 'linear':
+            return np.linspace(self.t_start, self.t_end, self.steps)
+        raise ValueError(f'未知的降温方式：{self.schedule}')
+
+
+@dataclass
+class Assignment:
+    '''分配结果，beds[宿舍, 床位]为学生序号，空床位为-1'''
+    beds: np.ndarray
+    score: float
+    seed: int
+
+    def rooms(self) -> list[list[int]]:
+        return [[s for s in row if s >= 0] for row in self.beds.tolist()]
+
+
+def _codes(values: list) -> np.ndarray:
+    index: dict[Any, int] = {}
+    return np.array([index.setdefault(v, len(index)) for v in values], dtype=np.int64)
+
+
+def encode_students(students: list[dict], capacity: list[int]) -> Problem:
+    '''
+    将学生信息编码为数组
+
+    :param students: 学生信息，字段同assign_dormitory.read_info
+    :type students: list[dict]
+    :param capacity: 各宿舍的床位数
+    :type capacity: list[int]
+    :return: 待优化的问题
+    :rtype: Problem
+    '''
+    features = np.zeros((len(students), _FEATURES))
+    for i, data in enumerate(students):
+        intl = data['international']
+        features[i] = [
+            1, data['major'],
+            data['wake'], data['wake'] ** 2,
+            data['sleep'], data['sleep'] ** 2,
+            data['ac_temp'], data['ac_temp'] ** 2,
+            data['all_night_ac'],
+            intl == 0, math.log(intl) if intl else 0,
+            data['origin'] == '北京',
+        ]
+    return Problem(
+        features=features,
+        origins=_codes([data['origin'] for data in students]),
+        schools=_codes([data['high_school'] for data in students]),
+        capacity=np.asarray(capacity, dtype=np.int64),
+    )
+
+
+def _stat_scores(stats: np.ndarray) -> np.ndarray:
+    '''由宿舍统计量计算得分，不含生源地重复的扣分，stats的最后一维为特征'''
+    n = stats[..., _COUNT]
+    safe_n = np.where(n > 0, n, 1)
+
+    def _var(total: np.ndarray, square: np.ndarray) -> np.ndarray:
+        return np.maximum(square / safe_n - (total / safe_n) ** 2, 0)
+
+    major = stats[..., _MAJOR]
+    score = np.where(major == 2, 1200, np.where((major == 0) | (major == 4), 800, 0))
+    score = score - np.where(stats[..., _BEIJING] >= 2, 700, 0)
+    score = score - 30 * _var(stats[..., _WAKE], stats[..., _WAKE_SQ])
+    score = score - 30 * _var(stats[..., _SLEEP], stats[..., _SLEEP_SQ])
+    score = score - 20 * _var(stats[..., _AC], stats[..., _AC_SQ])
+    night = stats[..., _NIGHT]
+    score = score - 400 * ((night > 0).astype(int) + (night < n) - 1)
+    score = score + np.where(n == 4, 600, np.where(n == 3, 400, 0))
+    intl = np.where(stats[..., _INTL_ZERO] > 0, 0, np.exp(stats[..., _INTL_LOG]))
+    score = score + 8 * intl
+    return np.where(n > 0, score, 0)
+
+
+def _stat_score(stat: list[float]) -> float:
+    '''单间宿舍的_stat_scores，避免小数组运算的开销'''
+    n = stat[_COUNT]
+    if n <= 0:
+        return 0.0
+
+    def _var(total: float, square: float) -> float:
+        return max(square / n - (total / n) ** 2, 0.0)
+
+    major = stat[_MAJOR]
+    score = 1200.0 if major == 2 else 800.0 if major == 0 or major == 4 else 0.0
+    if stat[_BEIJING] >= 2:
+        score -= 700
+    score -= 30 * _var(stat[_WAKE], stat[_WAKE_SQ])
+    score -= 30 * _var(stat[_SLEEP], stat[_SLEEP_SQ])
+    score -= 20 * _var(stat[_AC], stat[_AC_SQ])
+    night = stat[_NIGHT]
+    score -= 400 * ((night > 0) + (night < n) - 1)
+    score += 600 if n == 4 else 400 if n == 3 else 0
+    if stat[_INTL_ZERO] == 0:
+        score += 8 * math.exp(stat[_INTL_LOG])
+    return score
+
+
+def _origin_check(problem: Problem, members: list[int]) -> float | None:
+    '''
+    检查宿舍是否满足生源地的约束，满足时返回生源地重复的扣分，否则返回None
+
+    宿舍里至多两人来自同一省份，且来自同一省份的2人不能来自同一所高中
+    '''
+    origins = [problem.origins[s] for s in members]
+    distinct = len(set(origins))
+    if distinct < len(members) - 1:
+        return None
+    if distinct == len(members) - 1:
+        seen: dict[int, int] = {}
+        for s, origin in zip(members, origins):
+            if origin in seen:
+                if problem.schools[seen[origin]] == problem.schools[s]:
+                    return None
+                break
+            seen[origin] = s
+        return -300
+    return 0
+
+
+def room_scores(problem: Problem, beds: np.ndarray) -> np.ndarray:
+    '''计算各宿舍的得分，不满足约束的宿舍得分为负无穷'''
+    if problem.students == 0:
+        return np.zeros(len(beds))
+    occupied = beds >= 0
+    stats = (problem.features[np.where(occupied, beds, 0)]
+             * occupied[..., None]).sum(axis=1)
+    scores = _stat_scores(stats)
+    for room, row in enumerate(beds.tolist()):
+        penalty = _origin_check(problem, [s for s in row if s >= 0])
+        scores[room] += -np.inf if penalty is None else penalty
+    return scores
+
+
+class _IndexSet:
+    '''整数集合，支持O(1)的增删和按位置取元素，用于维护有空床位的宿舍'''
+    def __init__(self, items: list[int]):
+        self.items = list(items)
+        self.pos = {item: i for i, item in enumerate(self.items)}
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __contains__(self, item: int) -> bool:
+        return item in self.pos
+
+    def add(self, item: int) -> None:
+        if item not in self.pos:
+            self.pos[item] = len(self.items)
+            self.items.append(item)
+
+    def discard(self, item: int) -> None:
+        i = self.pos.pop(item, None)
+        if i is None:
+            return
+        last = self.items.pop()
+        if i < len(self.items):
+            self.items[i] = last
+            self.pos[last] = i
+
+    def pick(self, k: int, exclude: int) -> int | None:
+        '''按序号k取除exclude外的元素，k对剩余元素数取模，没有剩余元素时返回None'''
+        n = len(self.items) - (exclude in self.pos)
+        if n <= 0:
+            return None
+        item = self.items[k % n]
+        # exclude不在前n个位置时必在最后，用最后一个元素代替它所在的位置
+        return self.items[n] if item == exclude else item
+
+
+def _vacant_rooms(problem: Problem, counts: np.ndarray) -> _IndexSet:
+    return _IndexSet(np.flatnonzero(counts < problem.capacity).tolist())
+
+
+def _initial_beds(problem: Problem, rng: np.random.Generator,
+                  attempts: int) -> np.ndarray:
+    '''随机生成满足约束的初始分配'''
+    width = int(problem.capacity.max(initial=0))
+    if problem.capacity.sum() < problem.students:
+        raise ValueError('床位数少于学生数')
+    for _ in range(attempts):
+        beds = np.full((problem.rooms, width), -1, dtype=np.int64)
+        counts = np.zeros(problem.rooms, dtype=np.int64)
+        members: list[list[int]] = [[] for _ in range(problem.rooms)]
+        vacant = _vacant_rooms(problem, counts)
+        for student in rng.permutation(problem.students).tolist():
+            for i in rng.permutation(len(vacant)).tolist():
+                room = vacant.items[i]
+                if _origin_check(problem, members[room] + [student]) is not None:
+                    break
+            else:
+                break
+            beds[room, counts[room]] = student
+            counts[room] += 1
+            members[room].append(student)
+            if counts[room] >= problem.capacity[room]:
+                vacant.discard(room)
+        else:
+            return beds
+    raise ValueError('无法生成满足约束的初始分配')
+
+
+def anneal(problem: Problem, config: AnnealConfig, seed: int) -> Assignment:
+    '''从随机初始分配开始进行一次模拟退火，返回找到的最优分配'''
+    rng = np.random.default_rng(seed)
+    beds = _initial_beds(problem, rng, config.init_attempts)
+    if problem.students < 2 or problem.rooms < 2:
+        return Assignment(beds, float(room_scores(problem, beds).sum()), seed)
+    features = problem.features
+    occupied = beds >= 0
+    stats = (features[np.where(occupied, beds, 0)] * occupied[..., None]).sum(axis=1)
+    scores = room_scores(problem, beds)
+    counts = occupied.sum(axis=1)
+    vacant = _vacant_rooms(problem, counts)
+    room_of = np.empty(problem.students, dtype=np.int64)
+    slot_of = np.empty(problem.students, dtype=np.int64)
+    for room, slot in zip(*np.nonzero(occupied)):
+        room_of[beds[room, slot]] = room
+        slot_of[beds[room, slot]] = slot
+
+    total = float(scores.sum())
+    best = Assignment(beds.copy(), total, seed)
+
+    temperatures = config.temperatures()
+    picks = rng.integers(0, problem.students, size=(config.steps, 2))
+    moves = rng.random(config.steps) < config.move_prob
+    thresholds = np.log(rng.random(config.steps)) * temperatures
+
+    for step in range(config.steps):
+        a = int(picks[step, 0])
+        r1 = int(room_of[a])
+        if moves[step]:
+            # 将a移入另一宿舍的空床位
+            r2 = vacant.pick(int(picks[step, 1]), r1)
+            if r2 is None:
+                continue
+            b = -1
+            new1 = stats[r1] - features[a]
+            new2 = stats[r2] + features[a]
+        else:
+            # 交换a和b
+            b = int(picks[step, 1])
+            r2 = int(room_of[b])
+            if r1 == r2:
+                continue
+            new1 = stats[r1] - features[a] + features[b]
+            new2 = stats[r2] - features[b] + features[a]
+        row1 = [s for s in beds[r1].tolist() if s >= 0 and s != a]
+        row2 = [s for s in beds[r2].tolist() if s >= 0 and s != b]
+        if b >= 0:
+            row1.append(b)
+        row2.append(a)
+        penalty1 = _origin_check(problem, row1)
+        penalty2 = _origin_check(problem, row2)
+        if penalty1 is None or penalty2 is None:
+            continue
+        score1 = _stat_score(new1.tolist()) + penalty1
+        score2 = _stat_score(new2.tolist()) + penalty2
+        delta = score1 + score2 - scores[r1] - scores[r2]
+        # 以exp(delta / T)的概率接受更差的解
+        if delta < 0 and delta < thresholds[step]:
+            continue
+
+        stats[r1], stats[r2] = new1, new2
+        scores[r1], scores[r2] = score1, score2
+        if b >= 0:
+            beds[r1, slot_of[a]], beds[r2, slot_of[b]] = b, a
+            slot_of[a], slot_of[b] = slot_of[b], slot_of[a]
+            room_of[b] = r1
+        else:
+            # 移出后将宿舍的学生集中到前面的床位
+            last = counts[r1] - 1
+            moved = beds[r1, last]
+            beds[r1, slot_of[a]] = moved
+            slot_of[moved] = slot_of[a]
+            beds[r1, last] = -1
+            beds[r2, counts[r2]] = a
+            slot_of[a] = counts[r2]
+            counts[r1] -= 1
+            counts[r2] += 1
+            vacant.add(r1)
+            if counts[r2] >= problem.capacity[r2]:
+                vacant.discard(r2)
+        room_of[a] = r2
+        total += delta
+        if total > best.score:
+            best = Assignment(beds.copy(), total, seed)
+
+    # 消除浮点误差的累积
+    best.score = float(room_scores(problem, best.beds).sum())
+    return best
+
+
+def _anneal_task(args: tuple[Problem, AnnealConfig, int]) -> Assignment:
+    return anneal(*args)
+
+
+def optimize(problem: Problem, config: AnnealConfig | None = None, *,
+             restarts: int = 1, workers: int | None = None,
+             seed: int = 0) -> Assignment:
+    '''
+    多次独立重启模拟退火，返回得分最高的分配
+
+    :param problem: 待优化的问题
+    :type problem: Problem
+    :param config: 模拟退火参数, defaults to None
+    :type config: AnnealConfig, optional
+    :param restarts: 重启次数, defaults to 1
+    :type restarts: int, optional
+    :param workers: 进程数，默认为CPU核数，为1时在当前进程执行
+    :type workers: int, optional
+    :param seed: 随机种子，各次重启的种子由其派生, defaults to 0
+    :type seed: int, optional
+    :return: 最优分配
+    :rtype: Assignment
+    '''
+    config = config or AnnealConfig()
+    seeds = [int(s.generate_state(1)[0])
+             for s in np.random.SeedSequence(seed).spawn(restarts)]
+    tasks = [(problem, config, s) for s in seeds]
+    workers = min(workers or os.cpu_count() or 1, restarts)
+    if workers <= 1:
+        results = list(map(_anneal_task, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_anneal_task, tasks))
+    # 得分相同时取靠前的重启，保证结果与进程数无关
+    return max(results, key=lambda result: result.score)
+
+
+def synthetic_cohort(students: int, seed: int = 0) -> list[dict]:
+    '''随机生成新生信息，字段同assign_dormitory.read_info，用于测试和性能评估'''
+    rng = np.random.default_rng(seed)
+    provinces = ['北京', '上海', '天津', '河北', '山东', '江苏', '浙江', '广东',
+                 '四川', '湖北', '湖南', '河南', '陕西', '福建', '辽宁', '吉林']
+    cohort = []
+    for i in range(students):
+        origin = provinces[min(rng.geometric(0.15) - 1, len(provinces) - 1)]
+        cohort.append({
+            'name': f'学生{i}',
+            'gender': '男' if i % 2 else '女',
+            'sid': f'{2400000000 + i}',
+            'origin': origin,
+            'high_school': f'{origin}{rng.integers(10)}中',
+            'major': int(rng.integers(2)),
+            'weight': 60.0,
+            'international': int(rng.choice([0, 1, 5])),
+            'wake': int(rng.integers(6)),
+            'sleep': int(rng.integers(6)),
+            'ac_temp': int(rng.integers(16, 28)),
+            'all_night_ac': int(rng.integers(2)),
+        })
+    return cohort
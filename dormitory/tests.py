@@ -1,3 +1,77 @@
-from django.test import TestCase
+import os
+from io import StringIO
+from tempfile import TemporaryDirectory
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+from dormitory.optimizer import (
+    AnnealConfig,
+    encode_students,
+    optimize,
+    room_scores,
+    synthetic_cohort,
+)
+from dormitory.management.commands.assign_dormitory import Dormitory, Freshman
+
+
+class OptimizerTestCase(SimpleTestCase):
+    def setUp(self):
+        self.cohort = synthetic_cohort(60, seed=1)
+        self.problem = encode_students(self.cohort, [4] * 17)
+
+    def test_scores(self):
+        '''得分和约束与原有的宿舍类一致'''
+        result = optimize(self.problem, AnnealConfig(steps=3000), workers=1)
+        scores = room_scores(self.problem, result.beds)
+        for members, score in zip(result.rooms(), scores):
+            if not members:
+                continue
+            dorm = Dormitory(0, 4)
+            dorm.stu = [Freshman(self.cohort[i]) for i in members]
+            self.assertTrue(dorm.check_must())
+            self.assertAlmostEqual(score, dorm.check_better())
+        self.assertAlmostEqual(result.score, scores.sum())
+        self.assertEqual(sorted(sum(result.rooms(), [])), list(range(60)))
+
+    def test_seed(self):
+        '''种子相同时结果相同，与进程数无关'''
+        config = AnnealConfig(steps=2000)
+        first = optimize(self.problem, config, restarts=2, workers=1, seed=3)
+        second = optimize(self.problem, config, restarts=2, workers=2, seed=3)
+        np.testing.assert_array_equal(first.beds, second.beds)
+        self.assertEqual(first.score, second.score)
+
+
+class AssignCommandTestCase(SimpleTestCase):
+    def test_command(self):
+        cohort = synthetic_cohort(40, seed=2)
+        wake = ["上午6点之前", "6点-7点", "7点-8点", "8点-9点", "9点-10点", "10点之后"]
+        sleep = ["22点之前", "22点-23点", "23点-24点", "0点-1点", "1点-2点", "2点之后"]
+        with TemporaryDirectory() as tmpdir:
+            pd.DataFrame([{
+                "姓名*": stu['name'], "性别*": stu['gender'], "学号*": stu['sid'],
+                "生源地*": "", "生源高中*": "",
+                "大学专业意向*": ["文科类", "理工类"][stu['major']],
+                "体重*（单位：kg）": "60kg",
+                "是否愿意与留学生住在同一间宿舍? (都在元培35号宿舍楼居住，即你是否愿意舍友中有留学生同学? )*":
+                    {0: "不愿意", 1: "都可以", 5: "愿意"}[stu['international']],
+                "起床时间*": wake[stu['wake']], "入睡时间*": sleep[stu['sleep']],
+                "夏天能接受的最低空调温度*": f"{stu['ac_temp']}度",
+                "是否接受夏天整夜开空调*": ["否", "是"][stu['all_night_ac']],
+            } for stu in cohort]).to_excel(os.path.join(tmpdir, 'results.xlsx'), index=False)
+            pd.DataFrame([{
+                "学号": stu['sid'], "省市": stu['origin'], "中学": stu['high_school'],
+            } for stu in cohort]).to_excel(os.path.join(tmpdir, 'info.xlsx'), index=False)
+            rooms = [301 + i for i in range(6)] + [501 + i for i in range(6)]
+            pd.DataFrame({"房间": [room for room in rooms for _ in range(4)]}).to_excel(
+                os.path.join(tmpdir, 'dorm.xlsx'), index=False)
+            output = os.path.join(tmpdir, 'out.xlsx')
+            call_command('assign_dormitory', reference_dir=tmpdir, output=output,
+                         steps=1000, restarts=1, workers=1, stdout=StringIO())
+            result = pd.read_excel(output)
+        self.assertEqual(len(result), 40)
+        self.assertTrue((result[result["性别"] == "男"]["宿舍号"] < 500).all())
+        self.assertTrue((result.groupby("宿舍号").size() <= 4).all())
@@ -22,6 +22,10 @@ class WechatConfig(Config):
     # 发送数量设置
     # 批量发送大小
     send_batch = LazySetting('batch', lambda x: min(1000, x), 500)
+    # 并发发送的批次数，为1时顺序发送
+    send_workers = LazySetting('workers', lambda x: max(1, x), 4)
+    # 共享连接池大小，不应小于并发数
+    pool_size = LazySetting('pool_size', lambda x: max(1, x), 8)
 
     # 发送设置
     # 订阅系统的发送量很大，不建议重发且重发通常无效
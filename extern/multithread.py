@@ -3,6 +3,7 @@ from datetime import datetime, timedelta
 
 from extern.config import wechat_config as CONFIG
 from scheduler.adder import ScheduleAdder
+from scheduler.executors import REALTIME
 
 
 __all__ = [
@@ -20,10 +21,11 @@ P = ParamSpec('P')
 def get_caller(func: Callable[P, None], *, multithread: bool = True,
                run_time: datetime | timedelta | None = None,
                job_id: str | None = None, replace: bool = True) -> Callable[P, None]:
-    '''获取函数的调用者'''
+    '''获取函数的调用者，定时任务在实时执行器中运行'''
     if not scheduler_enabled(multithread):
         return func
-    adder = ScheduleAdder(func, run_time=run_time, id=job_id, replace=replace)
+    adder = ScheduleAdder(func, run_time=run_time, id=job_id, replace=replace,
+                          executor=REALTIME)
     # 不应使用返回值，但要确保调用参数正确
     adder: Callable[P, Any]
     return adder  # type: ignore
@@ -0,0 +1,152 @@
+'''
+sender.py
+
+复用连接的批量并发发送工具
+
+- 所有请求共享同一个`requests.Session`，连接保持，避免每批重新建立TCP/TLS连接
+- 批次在有界线程池中并行发送，单个批次失败不影响其它批次
+- 发送结果汇总为`SendReport`，用于记录日志和基准测试
+'''
+from dataclasses import dataclass, field
+from threading import Lock
+from time import perf_counter
+from typing import Callable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from extern.config import wechat_config as CONFIG
+from extern.log import ExternLogger
+
+
+__all__ = [
+    'new_session',
+    'get_session',
+    'SendReport',
+    'BatchSender',
+]
+
+
+logger = ExternLogger.getLogger('wechat')
+
+
+def new_session(pool_size: int | None = None) -> requests.Session:
+    '''创建指定连接池大小的会话，默认使用配置的大小'''
+    if pool_size is None:
+        pool_size = CONFIG.pool_size
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+_session: requests.Session | None = None
+_session_lock = Lock()
+
+
+def get_session() -> requests.Session:
+    '''获取进程内共享的会话，首次调用时创建'''
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = new_session()
+    return _session
+
+
+@dataclass
+class SendReport:
+    '''批量发送的统计结果
+
+    Attributes:
+        batches (int): 总批次数
+        users (int): 总用户数
+        failed_batches (int): 存在失败用户的批次数
+        failed_users (list[str]): 最终发送失败的用户
+        elapsed (float): 用时，单位为秒
+    '''
+    batches: int = 0
+    users: int = 0
+    failed_batches: int = 0
+    failed_users: list[str] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def succeeded(self) -> int:
+        '''成功发送的用户数'''
+        return self.users - len(self.failed_users)
+
+    @property
+    def rate(self) -> float:
+        '''每秒成功发送的消息数'''
+        if self.elapsed <= 0:
+            return 0.0
+        return self.succeeded / self.elapsed
+
+
+BatchFunc = Callable[[list[str]], list[str]]
+
+
+class BatchSender:
+    '''批量并发发送器
+
+    将用户分批后交给发送函数，发送函数返回该批次最终失败的用户列表。
+    并发数为1时在当前线程顺序发送。
+
+    Attributes:
+        workers (int): 最大并发批次数
+    '''
+    def __init__(self, workers: int | None = None):
+        '''
+        Args:
+            workers (int, optional): 最大并发批次数，默认使用配置
+        '''
+        if workers is None:
+            workers = CONFIG.send_workers
+        self.workers = max(1, workers)
+
+    @staticmethod
+    def split(users: Sequence[str], batch_size: int) -> list[list[str]]:
+        '''按批次大小切分用户'''
+        return [list(users[i : i + batch_size])
+                for i in range(0, len(users), batch_size)]
+
+    @staticmethod
+    def _safe_call(send_batch: BatchFunc, batch: list[str]) -> list[str]:
+        try:
+            return send_batch(batch)
+        except Exception as e:
+            # 发送函数不应抛出异常，出现时视为整批失败
+            logger.exception(f'批量发送出现异常：{e}')
+            return batch
+
+    def send(self, users: Sequence[str], batch_size: int,
+             send_batch: BatchFunc) -> SendReport:
+        '''分批发送，等待所有批次完成后返回统计结果
+
+        Args:
+            users (Sequence[str]): 全部接收用户
+            batch_size (int): 单批次用户数
+            send_batch (BatchFunc): 发送单批次的函数，返回失败的用户列表
+
+        Returns:
+            SendReport: 发送统计
+        '''
+        batches = self.split(users, batch_size)
+        report = SendReport(batches=len(batches), users=len(users))
+        start = perf_counter()
+        if self.workers == 1 or len(batches) <= 1:
+            results = [self._safe_call(send_batch, batch) for batch in batches]
+        else:
+            workers = min(self.workers, len(batches))
+            with ThreadPoolExecutor(workers, thread_name_prefix='sender') as pool:
+                results = list(pool.map(
+                    lambda batch: self._safe_call(send_batch, batch), batches))
+        report.elapsed = perf_counter() - start
+        for failed in results:
+            if failed:
+                report.failed_batches += 1
+                report.failed_users.extend(failed)
+        return report
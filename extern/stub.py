@@ -0,0 +1,164 @@
+'''
+stub.py
+
+模拟微信发送接口的本地HTTP服务器，用于离线测试与基准测试
+
+- 接口格式与真实接口一致，回应的`status`为200时表示全部成功
+- 可配置延迟、整批失败率和部分失败率，随机数可固定种子
+- 支持HTTP/1.1连接保持，并统计连接数以验证连接复用
+'''
+import json
+import random
+from time import sleep
+from threading import Thread, Lock
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+__all__ = [
+    'StubStats',
+    'StubWechatServer',
+]
+
+
+@dataclass
+class StubStats:
+    '''模拟服务器收到的请求统计'''
+    connections: int = 0
+    requests: int = 0
+    messages: int = 0
+    delivered: int = 0
+    errors: int = 0
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server: '_StubHTTPServer'
+
+    def setup(self) -> None:
+        super().setup()
+        self.server.stub.count(connections=1)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+    def _reply(self, response: dict) -> None:
+        body = json.dumps(response).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            data = json.loads(self.rfile.read(length))
+        except ValueError:
+            return self._reply({'status': 400, 'data': {'errMsg': '请求格式错误'}})
+        users = data.get('touser')
+        if users is None:
+            users = [data['user']] if 'user' in data else []
+        self._reply(self.server.stub.respond(users))
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: tuple[str, int], stub: 'StubWechatServer'):
+        self.stub = stub
+        super().__init__(address, _StubHandler)
+
+
+class StubWechatServer:
+    '''模拟微信发送接口的服务器
+
+    可作为上下文管理器使用，在后台线程中运行::
+
+        with StubWechatServer(latency=0.05, error_rate=0.01) as stub:
+            requests.post(stub.url, ...)
+        print(stub.stats)
+
+    Attributes:
+        latency (float): 每个请求的基础延迟，单位为秒
+        jitter (float): 延迟的随机浮动上限，单位为秒
+        error_rate (float): 整批失败的概率
+        partial_rate (float): 部分用户失败的概率
+        stats (StubStats): 请求统计
+    '''
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, *,
+                 latency: float = 0.0, jitter: float = 0.0,
+                 error_rate: float = 0.0, partial_rate: float = 0.0,
+                 seed: int | None = None):
+        '''
+        Args:
+            host (str, optional): 监听地址
+            port (int, optional): 监听端口，0表示自动分配
+
+        Keyword Args:
+            latency, jitter, error_rate, partial_rate: 见类属性
+            seed (int, optional): 随机数种子
+        '''
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.partial_rate = partial_rate
+        self.stats = StubStats()
+        self._random = random.Random(seed)
+        self._lock = Lock()
+        self._server = _StubHTTPServer((host, port), self)
+        self._thread: Thread | None = None
+
+    @property
+    def url(self) -> str:
+        '''服务器的根地址，以/结尾'''
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/'
+
+    def count(self, **increments: int) -> None:
+        with self._lock:
+            for name, value in increments.items():
+                setattr(self.stats, name, getattr(self.stats, name) + value)
+
+    def _roll(self) -> tuple[float, float, float]:
+        with self._lock:
+            return (self._random.random(), self._random.random(),
+                    self._random.random())
+
+    def respond(self, users: list[str]) -> dict:
+        '''模拟处理一次发送请求，返回回应内容'''
+        delay_roll, error_roll, partial_roll = self._roll()
+        delay = self.latency + self.jitter * delay_roll
+        if delay > 0:
+            sleep(delay)
+        self.count(requests=1, messages=len(users))
+        if error_roll < self.error_rate:
+            self.count(errors=1)
+            return {'status': 500, 'data': {'errMsg': '模拟发送失败'}}
+        if users and partial_roll < self.partial_rate:
+            failed = users[::10]
+            self.count(errors=1, delivered=len(users) - len(failed))
+            return {'status': 206, 'data': {
+                'detail': [[user, '模拟部分失败'] for user in failed]}}
+        self.count(delivered=len(users))
+        return {'status': 200, 'data': {}}
+
+    def start(self) -> 'StubWechatServer':
+        '''在后台线程中启动服务器'''
+        self._thread = Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        '''停止服务器并释放端口'''
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> 'StubWechatServer':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.stop()
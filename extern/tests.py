@@ -0,0 +1,68 @@
+from django.test import SimpleTestCase
+
+from extern.sender import BatchSender
+from extern.stub import StubWechatServer
+from extern.wechat import _deliver_wechat
+
+
+class BatchSenderTestCase(SimpleTestCase):
+    users = [str(2300000000 + i) for i in range(25)]
+
+    def test_split(self):
+        '''按批次大小切分，最后一批可以不满'''
+        batches = BatchSender.split(self.users, 10)
+        self.assertEqual([len(batch) for batch in batches], [10, 10, 5])
+        self.assertEqual(sum(batches, []), self.users)
+        self.assertEqual(BatchSender.split([], 10), [])
+
+    def test_failed_batch(self):
+        '''发送函数抛出异常时整批失败，不影响其它批次'''
+        def send_batch(batch: list[str]) -> list[str]:
+            if batch[0] == self.users[10]:
+                raise RuntimeError('发送失败')
+            return batch[-1:]
+
+        report = BatchSender(workers=3).send(self.users, 10, send_batch)
+        self.assertEqual((report.batches, report.users, report.failed_batches), (3, 25, 3))
+        self.assertEqual(sorted(report.failed_users),
+                         sorted([self.users[9], self.users[24], *self.users[10:20]]))
+        self.assertEqual(report.succeeded, 13)
+
+
+class StubDeliveryTestCase(SimpleTestCase):
+    users = [str(2300000000 + i) for i in range(25)]
+
+    def deliver(self, stub: StubWechatServer, retry_times: int = 1, workers: int = 2):
+        return _deliver_wechat(self.users, '测试消息', stub.url,
+                               retry_times=retry_times, batch_size=10, workers=workers)
+
+    def test_chunking(self):
+        '''分批发送全部成功，并发批次复用连接'''
+        with StubWechatServer() as stub:
+            report = self.deliver(stub)
+        self.assertEqual((report.batches, report.succeeded, report.failed_batches), (3, 25, 0))
+        self.assertEqual((stub.stats.requests, stub.stats.messages, stub.stats.delivered),
+                         (3, 25, 25))
+        self.assertLessEqual(stub.stats.connections, 2)
+
+    def test_partial_failure(self):
+        '''部分失败时只重发失败的用户，重试后仍失败的用户计入统计'''
+        with StubWechatServer(partial_rate=1) as stub:
+            report = self.deliver(stub)
+        # 模拟接口使每批的第1个用户失败
+        self.assertEqual(sorted(report.failed_users),
+                         [self.users[i] for i in (0, 10, 20)])
+        self.assertEqual(stub.stats.requests, 3)
+
+        with StubWechatServer(partial_rate=1) as stub:
+            report = self.deliver(stub, retry_times=2)
+        self.assertEqual(sorted(report.failed_users), [self.users[i] for i in (0, 10, 20)])
+        # 每批重试时只发送失败的1个用户
+        self.assertEqual((stub.stats.requests, stub.stats.messages), (6, 25 + 3))
+
+    def test_error(self):
+        '''整批失败且无失败详情时不重试'''
+        with StubWechatServer(error_rate=1) as stub:
+            report = self.deliver(stub, retry_times=3, workers=1)
+        self.assertEqual((report.failed_batches, len(report.failed_users)), (3, 25))
+        self.assertEqual(stub.stats.requests, 3)
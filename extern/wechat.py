@@ -6,8 +6,8 @@ wechat.py
 - 可导出函数可以假设是异步IO，参数符合条件时不抛出异常，具体情况见配置文件
 - 异步时，函数只返回尝试状态，即是否设置了定时任务，不保证成功发送
 - _开头的函数是私有函数，子模块不应调用
+- 发送复用进程内共享的连接池，同一次调用的多个批次并发发送
 '''
-import requests
 import json
 from typing import Iterable, Callable, Any
 from datetime import datetime, timedelta
@@ -15,6 +15,7 @@ from datetime import datetime, timedelta
 from extern.config import wechat_config as CONFIG
 from extern.multithread import get_caller, scheduler_enabled
 from extern.log import ExternLogger
+from extern.sender import get_session, BatchSender, SendReport
 from utils.http.utils import build_full_url
 
 
@@ -49,7 +50,7 @@ def _post_and_parse(
     detail_parser: Callable[[Any], ParseResult] | None = None,
 ) -> ParseResult:
     '''
-    发送post请求并解析回应，返回解析结果，解析结果
+    使用共享会话发送post请求并解析回应，返回解析结果，解析结果
 
     Args:
         post_url(str): 请求的url
@@ -62,7 +63,7 @@ def _post_and_parse(
     '''
     try: _post_data = json.dumps(post_data)
     except: return "JSON编码失败", None
-    try: raw_response = requests.post(post_url, _post_data, timeout=timeout)
+    try: raw_response = get_session().post(post_url, _post_data, timeout=timeout)
     except: return "连接API失败", None
     try: response: dict[str, Any] = raw_response.json()
     except: return "JSON解析失败", None
@@ -95,8 +96,8 @@ def _send_wechat(
     btntxt: str | None = None,
     *,
     retry_times: int = 1,
-):
-    """底层实现发送到微信，是为了方便设置定时任务"""
+) -> list[str]:
+    """底层实现单批次发送到微信，返回最终发送失败的用户"""
     post_data = {
         "touser": users,
         "content": content,
@@ -119,12 +120,55 @@ def _send_wechat(
         errmsg, retrys = _post_and_parse(api_url, post_data, CONFIG.timeout, _parser)
         if errmsg is None:
             logger.info(f"成功向{_log_users(users)}发送消息")
-            break
+            return []
         if retrys is None:
             logger.warning(f"向{_log_users(users)}发送消息失败：{errmsg}")
-            break
+            return post_data["touser"]
         post_data["touser"] = retrys
         logger.warning(f"向{_log_users(users)}发送时，{_log_users(retrys)}失败：{errmsg}")
+    return post_data["touser"]
+
+
+def _deliver_wechat(
+    users: list[str],
+    content: str,
+    api_url: str,
+    card: bool = True,
+    url: str | None = None,
+    btntxt: str | None = None,
+    *,
+    retry_times: int = 1,
+    batch_size: int | None = None,
+    workers: int | None = None,
+) -> SendReport:
+    """分批并发发送到微信，逐批重试，返回发送统计"""
+    def _send_batch(batch: list[str]) -> list[str]:
+        return _send_wechat(batch, content, api_url, card, url, btntxt,
+                            retry_times=retry_times)
+
+    sender = BatchSender(workers)
+    report = sender.send(users, batch_size or CONFIG.send_batch, _send_batch)
+    if report.batches > 1:
+        logger.info(
+            f"分{report.batches}批发送完成，成功{report.succeeded}/{report.users}，"
+            f"失败{report.failed_batches}批，用时{report.elapsed:.2f}s"
+        )
+    return report
+
+
+def _send_wechat_batches(
+    users: list[str],
+    content: str,
+    api_url: str,
+    card: bool = True,
+    url: str | None = None,
+    btntxt: str | None = None,
+    *,
+    retry_times: int = 1,
+):
+    """底层实现发送到微信，是为了方便设置定时任务"""
+    _deliver_wechat(users, content, api_url, card, url, btntxt,
+                    retry_times=retry_times)
 
 
 def send_wechat(
@@ -143,7 +187,7 @@ def send_wechat(
     task_id: str | None = None,
 ):
     """
-    附带了去重、多线程和batch的发送；不应被服务直接调用
+    附带了去重、多线程和并发batch的发送；不应被服务直接调用
 
     参数
     --------
@@ -188,16 +232,14 @@ def send_wechat(
         logger.error(f'无法设置{_schedule_time}的任务{task_id}：定时任务未启用')
         raise RuntimeError('定时任务未启用')
 
-    total_ct = len(users)
-    caller = get_caller(_send_wechat, multithread=multithread,
+    # 所有批次在同一任务中并发发送，共享连接池
+    caller = get_caller(_send_wechat_batches, multithread=multithread,
                         job_id=task_id, run_time=run_time)
-    for i in range(0, total_ct, CONFIG.send_batch):
-        userids = users[i : i + CONFIG.send_batch]
-        caller(
-            userids, content, build_full_url(api_path, CONFIG.api_url),
-            card=card, url=url, btntxt=btntxt,
-            retry_times=retry_times,
-        )
+    caller(
+        users, content, build_full_url(api_path, CONFIG.api_url),
+        card=card, url=url, btntxt=btntxt,
+        retry_times=retry_times,
+    )
 
 
 def send_verify_code(stu_id: str | int, captcha: str, url: str | None = '/forgetpw/'):
@@ -1,8 +1,9 @@
 from scheduler.periodic import periodical
+from scheduler.executors import BATCH
 from generic.models import User
 
 
-@periodical('cron', 'recover_credits_per_month', day=1, hour=6)
+@periodical('cron', 'recover_credits_per_month', day=1, hour=6, executor=BATCH)
 def recover_credits_per_month():
     from Appointment.models import Participant
     from utils.models.query import qsvlist, sfilter, sq
@@ -13,14 +13,16 @@ models.py
 @Author pht
 @Date 2022-08-19
 '''
-from typing import Type, NoReturn, Final
+from typing import Type, NoReturn, Final, Iterator
+from datetime import datetime
 
 from django.db import models
 from django.contrib.auth import get_permission_codename
 from django.contrib.auth.models import AbstractUser, AnonymousUser
 from django.contrib.auth.models import UserManager as _UserManager
-from django.db import transaction
-from django.db.models import QuerySet, F
+from django.db import connections, transaction
+from django.db.models import QuerySet, F, Value, Case, When, Min, Max, Expression
+from django.db.models.functions import Least
 import pypinyin
 
 from utils.models.choice import choice
@@ -44,6 +46,43 @@ def to_acronym(name: str) -> str:
     return ''.join([pron[0] for pron in get_pinyin(name)])
 
 
+def _id_chunks(queryset: QuerySet, chunk_size: int) -> Iterator[QuerySet]:
+    '''按主键范围将查询集分块，只查询主键的最值'''
+    bounds = queryset.aggregate(lo=Min('pk'), hi=Max('pk'))
+    if bounds['lo'] is None:
+        return
+    for start in range(bounds['lo'], bounds['hi'] + 1, chunk_size):
+        yield queryset.filter(pk__gte=start, pk__lt=start + chunk_size)
+
+
+def _insert_from_select(model: Type[models.Model], queryset: QuerySet,
+                        **columns: Expression) -> int:
+    '''
+    以`INSERT INTO ... SELECT ...`将查询集的每一行转为一条记录插入，数据不经过应用
+
+    Args:
+    - model: 插入的模型，auto_now_add等默认值不会生效，需在columns中给出
+    - queryset: 数据来源，可以加锁
+    - columns: 模型字段名到表达式的映射，表达式基于queryset的模型计算
+
+    Returns:
+        int: 插入的行数
+    '''
+    # 注解名不能与来源模型的字段重名，且全部使用注解以确定SELECT的列顺序
+    names = {name: f'insert_{name}' for name in columns}
+    select = queryset.annotate(**{names[name]: expr for name, expr in columns.items()})
+    select = select.values_list(*names.values())
+    sql, params = select.query.sql_with_params()
+    opts = model._meta
+    db_columns = ', '.join(
+        connections[select.db].ops.quote_name(opts.get_field(name).column)
+        for name in columns)
+    table = connections[select.db].ops.quote_name(opts.db_table)
+    with connections[select.db].cursor() as cursor:
+        cursor.execute(f'INSERT INTO {table} ({db_columns}) {sql}', params)
+        return cursor.rowcount
+
+
 class UserManager(_UserManager['User']):
     '''
     用户管理器，提供对信用分等通用字段的修改方法
@@ -151,11 +190,15 @@ class UserManager(_UserManager['User']):
             user.credit = update_user.credit
         return new_credit - old_credit
 
-    @transaction.atomic
+    BULK_CHUNK_SIZE: Final = 2000
+
     def bulk_recover_credit(self, users: QuerySet['User'],
-                            delta: int, source: str):
+                            delta: int, source: str,
+                            chunk_size: int = BULK_CHUNK_SIZE) -> int:
         '''
-        批量恢复信用分并记录，原子化操作
+        批量恢复信用分并记录，按主键范围分块，每块为一个事务
+
+        记录和修改均在数据库中完成，超过MAX_CREDIT的用户不扣分
 
         :param users: 修改的用户集合，**不修改**内部对象
         :type users: QuerySet[User]
@@ -163,28 +206,37 @@ class UserManager(_UserManager['User']):
         :type delta: int
         :param source: 修改来源，可以是“地下室”等应用名，尽量简单
         :type source: str
+        :param chunk_size: 每个事务的主键范围大小, defaults to BULK_CHUNK_SIZE
+        :type chunk_size: int, optional
+        :return: 记录的用户数
+        :rtype: int
         '''
         assert delta > 0, '恢复的信用分必须为正数'
-        records = []
-        users = users.select_for_update().all()
-        for user in users:
-            old_value = user.credit
-            if user.credit > User.MAX_CREDIT:
-                user.credit = old_value
-            else:
-                user.credit = min(old_value + delta, User.MAX_CREDIT)
-            overflow = (user.credit != old_value + delta)
-            records.append(
-                CreditRecord(
-                    user=user,
-                    old_credit=old_value,
-                    new_credit=user.credit,
-                    delta=delta,
+        new_credit = Case(
+            When(credit__gt=User.MAX_CREDIT, then=F('credit')),
+            default=Least(F('credit') + delta, Value(User.MAX_CREDIT)),
+        )
+        # 已超过上限的用户不变，因此溢出等价于恢复后超过上限
+        overflow = Case(
+            When(credit__gt=User.MAX_CREDIT - delta, then=Value(True)),
+            default=Value(False), output_field=models.BooleanField(),
+        )
+        count = 0
+        for chunk in _id_chunks(users, chunk_size):
+            with transaction.atomic():
+                count += _insert_from_select(
+                    CreditRecord, chunk.select_for_update(),
+                    user=F('username'),
+                    old_credit=F('credit'),
+                    new_credit=new_credit,
+                    delta=Value(delta),
                     overflow=overflow,
-                    source=source,
-                ))
-        CreditRecord.objects.bulk_create(records)
-        self.select_for_update().bulk_update(users, ['credit'])
+                    source=Value(source),
+                    time=Value(datetime.now(), output_field=models.DateTimeField()),
+                )
+                chunk.filter(credit__lt=User.MAX_CREDIT).update(
+                    credit=Least(F('credit') + delta, Value(User.MAX_CREDIT)))
+        return count
 
     def _record_credit_modify(self, user: 'User', delta: int, source: str,
                               old_value: int | None = None,
@@ -217,29 +269,33 @@ class UserManager(_UserManager['User']):
         if isinstance(user, User):
             user.YQpoint = update_user.YQpoint
 
-    @transaction.atomic
     def _bulk_change_YQPoint(self, users: QuerySet['User'], delta: int,
-                             source: str, source_type: 'YQPointRecord.SourceType'):
+                             source: str, source_type: 'YQPointRecord.SourceType',
+                             chunk_size: int = BULK_CHUNK_SIZE) -> int:
         '''
-        无条件批量修改元气值并记录，不论元气值**是否足够**，原子化操作
+        无条件批量修改元气值并记录，不论元气值**是否足够**，返回记录的用户数
+
+        按主键范围分块，每块为一个事务，记录和修改均在数据库中完成
 
         Warning:
             请勿直接调用，应使用`bulk_increase_YQPoint`或`bulk_withdraw_YQPoint`
             实验表明`users`不应该包含复杂的级联查询，如`id__in=xxx.values('id')`，
             否则可能由未知原因导致`OperationalError`
         '''
-        users = users.select_for_update()
-        point_records = [
-            YQPointRecord(
-                user=user,
-                delta=delta,
-                source=source,
-                source_type=source_type,
-            ) for user in users
-        ]
-        YQPointRecord.objects.bulk_create(point_records)
-        if delta != 0:
-            users.update(YQpoint=F('YQpoint') + delta)
+        count = 0
+        for chunk in _id_chunks(users, chunk_size):
+            with transaction.atomic():
+                count += _insert_from_select(
+                    YQPointRecord, chunk.select_for_update(),
+                    user=F('username'),
+                    delta=Value(delta),
+                    source=Value(source),
+                    source_type=Value(source_type),
+                    time=Value(datetime.now(), output_field=models.DateTimeField()),
+                )
+                if delta != 0:
+                    chunk.update(YQpoint=F('YQpoint') + delta)
+        return count
 
     def bulk_increase_YQPoint(self, users: QuerySet['User'], delta: int,
                               source: str, source_type: 'YQPointRecord.SourceType'):
@@ -1,3 +1,76 @@
 from django.test import TestCase
+from django.db import transaction
+from django.db.models import QuerySet
 
-# Create your tests here.
+from generic.models import User, CreditRecord, YQPointRecord
+
+
+def python_recover_credit(users: QuerySet[User], delta: int, source: str):
+    '''逐个用户计算的原实现，作为集合化实现的对照'''
+    records = []
+    users = users.select_for_update().all()
+    for user in users:
+        old_value = user.credit
+        if user.credit > User.MAX_CREDIT:
+            user.credit = old_value
+        else:
+            user.credit = min(old_value + delta, User.MAX_CREDIT)
+        overflow = (user.credit != old_value + delta)
+        records.append(CreditRecord(
+            user=user, old_credit=old_value, new_credit=user.credit,
+            delta=delta, overflow=overflow, source=source,
+        ))
+    CreditRecord.objects.bulk_create(records)
+    User.objects.bulk_update(users, ['credit'])
+
+
+class _Rollback(Exception):
+    pass
+
+
+class BulkChangeTestCase(TestCase):
+    CREDITS = [0, 1, User.MAX_CREDIT - 1, User.MAX_CREDIT, User.MAX_CREDIT + 2]
+
+    def setUp(self):
+        self.users = [User.objects.create_user(f'{i}', f'{i}', credit=credit, YQpoint=i)
+                      for i, credit in enumerate(self.CREDITS * 2)]
+
+    def state(self, source: str):
+        credits = list(User.objects.order_by('pk').values_list('username', 'credit'))
+        records = list(CreditRecord.objects.filter(source=source).order_by('user').values_list(
+            'user', 'old_credit', 'new_credit', 'delta', 'overflow'))
+        return credits, records
+
+    def test_recover_credit(self):
+        '''分块的集合化实现与逐个计算的结果一致'''
+        for delta in [1, 2, User.MAX_CREDIT]:
+            with self.subTest(delta=delta):
+                try:
+                    with transaction.atomic():
+                        python_recover_credit(User.objects.all(), delta, 'python')
+                        expected = self.state('python')
+                        raise _Rollback
+                except _Rollback:
+                    pass
+                count = User.objects.bulk_recover_credit(
+                    User.objects.all(), delta, 'sql', chunk_size=3)
+                self.assertEqual(count, len(self.users))
+                self.assertEqual(self.state('sql'), expected)
+                User.objects.bulk_update(self.users, ['credit'])
+                CreditRecord.objects.all().delete()
+
+    def test_change_YQPoint(self):
+        '''只修改和记录选中的用户'''
+        users = User.objects.filter(pk__in=[user.pk for user in self.users[::2]])
+        User.objects.bulk_increase_YQPoint(
+            users, 3, 'test', YQPointRecord.SourceType.ACTIVITY)
+        User.objects._bulk_change_YQPoint(users, -1, 'test', YQPointRecord.SourceType.SYSTEM,
+                                          chunk_size=4)
+        for i, user in enumerate(User.objects.order_by('pk')):
+            self.assertEqual(user.YQpoint, i + 2 if i % 2 == 0 else i)
+        records = YQPointRecord.objects.filter(source='test')
+        self.assertEqual(records.count(), len(users) * 2)
+        self.assertEqual(set(records.values_list('user', flat=True)),
+                         set(users.values_list('username', flat=True)))
+        self.assertEqual(records.filter(
+            source_type=YQPointRecord.SourceType.ACTIVITY, delta=3).count(), len(users))
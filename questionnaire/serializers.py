@@ -8,6 +8,7 @@ __all__ = [
     'SurveySerializer',
     'AnswerSheetSerializer',
     'AnswerTextSerializer',
+    'AnswerSheetSubmitSerializer',
 ]
 
 
@@ -53,3 +54,72 @@ class AnswerTextSerializer(serializers.ModelSerializer):
         if attrs['question'].survey != attrs['answersheet'].survey:
             raise serializers.ValidationError("问题与答卷不属于同一问卷！")
         return attrs
+
+
+class AnswerItemSerializer(serializers.Serializer):
+    # 只接收编号，统一校验，避免逐题查询
+    question = serializers.IntegerField()
+    body = serializers.CharField(allow_blank=True)
+
+
+class AnswerSheetSubmitSerializer(serializers.Serializer):
+    '''
+    一次提交整张答卷
+
+    选择题的回答为选项序号，多选题和排序题以逗号分隔，排序题按选择的先后排列
+    '''
+    survey = serializers.PrimaryKeyRelatedField(queryset=Survey.objects.all())
+    status = serializers.ChoiceField(choices=AnswerSheet.Status.choices,
+                                     default=AnswerSheet.Status.SUBMITTED)
+    answers = AnswerItemSerializer(many=True)
+
+    def _check_choice(self, question: Question, body: str, orders: set[int]):
+        try:
+            selected = [int(order) for order in body.split(',')]
+        except ValueError:
+            raise serializers.ValidationError(f"“{question.topic}”的选项格式错误！")
+        if not set(selected) <= orders or len(set(selected)) != len(selected):
+            raise serializers.ValidationError(f"“{question.topic}”的选项不存在或重复！")
+        if question.type == Question.Type.SINGLE and len(selected) != 1:
+            raise serializers.ValidationError(f"“{question.topic}”只能选择一项！")
+
+    def validate(self, attrs):
+        survey: Survey = attrs['survey']
+        if survey.status != Survey.Status.PUBLISHED:
+            raise serializers.ValidationError("只能创建已发布问卷的答案！")
+        if AnswerSheet.objects.filter(creator=self.context['request'].user,
+                                      survey=survey).exists():
+            raise serializers.ValidationError("禁止重复创建答卷！")
+        questions = {question.id: question for question
+                     in survey.questions.prefetch_related('choices')}
+        answered = set()
+        for answer in attrs['answers']:
+            question = questions.get(answer['question'])
+            if question is None:
+                raise serializers.ValidationError("问题与答卷不属于同一问卷！")
+            if question.id in answered:
+                raise serializers.ValidationError("禁止重复提交答案！")
+            answered.add(question.id)
+            if question.have_choice():
+                orders = {choice.order for choice in question.choices.all()}
+                self._check_choice(question, answer['body'], orders)
+        if attrs['status'] == AnswerSheet.Status.SUBMITTED:
+            missing = [question.topic for question in questions.values()
+                       if question.required and question.id not in answered]
+            if missing:
+                raise serializers.ValidationError(f"请回答必填题：{'、'.join(missing)}")
+        attrs['questions'] = questions
+        return attrs
+
+    def create(self, validated_data):
+        sheet = AnswerSheet.objects.create(
+            survey=validated_data['survey'],
+            creator=self.context['request'].user,
+            status=validated_data['status'],
+        )
+        AnswerText.objects.bulk_create([
+            AnswerText(question_id=answer['question'], answersheet=sheet,
+                       body=answer['body'])
+            for answer in validated_data['answers']
+        ])
+        return sheet
@@ -1,3 +1,89 @@
+import csv
+from io import StringIO
+from datetime import datetime, timedelta
+
 from django.test import TestCase
+from rest_framework.test import APIClient
+
+from generic.models import User
+from questionnaire.models import *
+
+
+class AnswerSubmitTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(
+            'owner', 'owner', User.Type.PERSON, password='111')
+        cls.users = [User.objects.create_user(
+            f'p{i}', f'p{i}', User.Type.PERSON, password='111') for i in range(3)]
+        now = datetime.now()
+        cls.survey = Survey.objects.create(
+            title='调研', creator=cls.owner, status=Survey.Status.PUBLISHED,
+            start_time=now, end_time=now + timedelta(days=1))
+        cls.single = Question.objects.create(
+            survey=cls.survey, order=1, topic='单选', type=Question.Type.SINGLE)
+        cls.multiple = Question.objects.create(
+            survey=cls.survey, order=2, topic='多选', type=Question.Type.MULTIPLE)
+        cls.text = Question.objects.create(
+            survey=cls.survey, order=3, topic='填空', type=Question.Type.TEXT,
+            required=False)
+        for question in [cls.single, cls.multiple]:
+            for order, text in enumerate(['甲', '乙', '丙']):
+                Choice.objects.create(question=question, order=order, text=text)
+
+    def submit(self, user: User, answers: list[tuple[Question, str]]):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.post('/questionnaire/answersheet/submit/', {
+            'survey': self.survey.id,
+            'answers': [{'question': q.id, 'body': body} for q, body in answers],
+        }, format='json')
+
+    def test_submit(self):
+        '''整张答卷一次校验和写入，错误时不写入任何内容'''
+        response = self.submit(self.users[0], [(self.single, '0'), (self.multiple, '0,2')])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(AnswerText.objects.count(), 2)
+        invalid = [
+            [(self.single, '0,1'), (self.multiple, '0')],
+            [(self.single, '5'), (self.multiple, '0')],
+            [(self.single, '0'), (self.single, '1'), (self.multiple, '0')],
+            [(self.multiple, '0')],
+        ]
+        for answers in invalid:
+            self.assertEqual(self.submit(self.users[1], answers).status_code, 400)
+        self.assertEqual(self.submit(self.users[0], [
+            (self.single, '0'), (self.multiple, '0')]).status_code, 400)
+        self.assertEqual(AnswerSheet.objects.count(), 1)
+        self.assertEqual(AnswerText.objects.count(), 2)
+
+    def test_results(self):
+        '''统计选项人数，分页查看填空，导出CSV'''
+        self.submit(self.users[0], [(self.single, '0'), (self.multiple, '0,2'),
+                                    (self.text, 'a')])
+        self.submit(self.users[1], [(self.single, '1'), (self.multiple, '0'),
+                                    (self.text, 'b')])
+        self.submit(self.users[2], [(self.single, '0'), (self.multiple, '2,0')])
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        url = f'/questionnaire/survey/{self.survey.id}/'
+        self.assertEqual(client.get(url + 'results/').status_code, 403)
+
+        client.force_authenticate(self.owner)
+        results = client.get(url + 'results/').json()
+        self.assertEqual(results['sheets'], 3)
+        single, multiple, text = results['questions']
+        self.assertEqual([c['count'] for c in single['choices']], [2, 1, 0])
+        self.assertEqual([c['count'] for c in multiple['choices']], [3, 0, 2])
+        self.assertEqual(text['answers'], 2)
+
+        page = client.get(url + 'texts/', {'question': self.text.id, 'page_size': 1}).json()
+        self.assertEqual(page['count'], 2)
+        self.assertEqual([answer['body'] for answer in page['results']], ['a'])
 
-# Create your tests here.
+        response = client.get(url + 'export/')
+        content = b''.join(response.streaming_content).decode('utf-8-sig')
+        rows = list(csv.reader(StringIO(content)))
+        self.assertEqual(rows[0][3:], ['单选', '多选', '填空'])
+        self.assertEqual(rows[1][1:2] + rows[1][3:], ['p0', '甲', '甲，丙', 'a'])
+        self.assertEqual(len(rows), 4)
@@ -0,0 +1,128 @@
+import csv
+from typing import Iterator
+
+from django.db.models import Count, QuerySet
+
+from questionnaire.models import Survey, AnswerSheet, Question, AnswerText
+
+__all__ = [
+    'submitted_answers',
+    'survey_results',
+    'text_answers',
+    'iter_survey_csv',
+]
+
+
+# 导出时每次查询的答卷数
+EXPORT_CHUNK_SIZE = 500
+
+
+def submitted_answers(survey: Survey) -> QuerySet[AnswerText]:
+    '''问卷所有已提交答卷的回答'''
+    return AnswerText.objects.filter(
+        answersheet__survey=survey,
+        answersheet__status=AnswerSheet.Status.SUBMITTED,
+    )
+
+
+def _split_orders(body: str) -> list[int]:
+    try:
+        return [int(order) for order in body.split(',')]
+    except ValueError:
+        return []
+
+
+def survey_results(survey: Survey) -> dict:
+    '''
+    统计问卷结果，选择题统计各选项的人数，填空题只统计回答数
+
+    回答在数据库中按内容分组计数，多选题和排序题的每种组合再拆分到选项
+    '''
+    questions = list(survey.questions.prefetch_related('choices'))
+    answers = submitted_answers(survey)
+    answer_counts = dict(answers.values_list('question').annotate(count=Count('id')))
+    choice_counts: dict[int, dict[int, int]] = {}
+    for question_id, body, count in answers.filter(
+        question__type__in=Question.Type.WithChoice(),
+    ).values_list('question', 'body').annotate(count=Count('id')):
+        counts = choice_counts.setdefault(question_id, {})
+        for order in _split_orders(body):
+            counts[order] = counts.get(order, 0) + count
+
+    results = []
+    for question in questions:
+        result = dict(
+            id=question.id,
+            order=question.order,
+            topic=question.topic,
+            type=question.type,
+            answers=answer_counts.get(question.id, 0),
+        )
+        if question.have_choice():
+            counts = choice_counts.get(question.id, {})
+            result['choices'] = [dict(
+                order=choice.order,
+                text=choice.text,
+                count=counts.get(choice.order, 0),
+            ) for choice in question.choices.all()]
+        results.append(result)
+    return dict(
+        survey=survey.id,
+        sheets=AnswerSheet.objects.filter(
+            survey=survey, status=AnswerSheet.Status.SUBMITTED).count(),
+        questions=results,
+    )
+
+
+def text_answers(survey: Survey, question_id: int) -> QuerySet:
+    '''问卷某题已提交的回答，按答卷顺序排列'''
+    return submitted_answers(survey).filter(question_id=question_id).order_by(
+        'answersheet_id').values('answersheet', 'body')
+
+
+class _Echo:
+    '''csv.writer的伪文件，直接返回写入的内容'''
+    def write(self, value: str) -> str:
+        return value
+
+
+def iter_survey_csv(survey: Survey) -> Iterator[str]:
+    '''
+    逐行生成问卷已提交答卷的CSV，每张答卷一行，每题一列，选项转为内容
+
+    答卷按编号分块读取，每块的回答一次查询
+    '''
+    questions = list(survey.questions.prefetch_related('choices'))
+    choice_texts = {
+        question.id: {choice.order: choice.text for choice in question.choices.all()}
+        for question in questions if question.have_choice()
+    }
+    writer = csv.writer(_Echo())
+    # 使用带BOM的UTF-8以兼容Excel
+    yield '﻿' + writer.writerow(
+        ['答卷编号', '答卷人', '填写时间'] + [question.topic for question in questions])
+
+    sheets = AnswerSheet.objects.filter(
+        survey=survey, status=AnswerSheet.Status.SUBMITTED).order_by('id')
+    last_id = 0
+    while True:
+        chunk = list(sheets.filter(id__gt=last_id).values_list(
+            'id', 'creator__username', 'create_time')[:EXPORT_CHUNK_SIZE])
+        if not chunk:
+            break
+        last_id = chunk[-1][0]
+        bodies: dict[tuple[int, int], str] = {
+            (sheet_id, question_id): body for sheet_id, question_id, body
+            in AnswerText.objects.filter(answersheet_id__in=[row[0] for row in chunk])
+            .values_list('answersheet_id', 'question_id', 'body')
+        }
+        for sheet_id, username, create_time in chunk:
+            row = [sheet_id, username, create_time.strftime('%Y-%m-%d %H:%M:%S')]
+            for question in questions:
+                body = bodies.get((sheet_id, question.id), '')
+                texts = choice_texts.get(question.id)
+                if texts is not None and body:
+                    body = '，'.join(texts.get(order, str(order))
+                                    for order in _split_orders(body))
+                row.append(body)
+            yield writer.writerow(row)
@@ -1,13 +1,24 @@
+from django.db import transaction
 from django.db.models import Q
-from rest_framework import viewsets
+from django.http import StreamingHttpResponse
+from rest_framework import viewsets, status
 from rest_framework.authentication import SessionAuthentication
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.pagination import PageNumberPagination
 from rest_framework.response import Response
 
 from questionnaire.models import *
 from questionnaire.serializers import *
 from questionnaire.permissions import *
+from questionnaire.utils import survey_results, text_answers, iter_survey_csv
+
+
+class AnswerPagination(PageNumberPagination):
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
 
 
 # 用viewsets
@@ -22,6 +33,39 @@ class SurveyViewSet(viewsets.ModelViewSet):
         else:  # 根据发布状态和发布时间来筛选
             return Survey.objects.filter(Q(status=Survey.Status.PUBLISHED) | Q(creator=self.request.user))
 
+    def get_owned_survey(self) -> Survey:
+        survey: Survey = self.get_object()
+        if survey.creator != self.request.user and not self.request.user.is_staff:
+            raise PermissionDenied("只有问卷创始人能查看结果！")
+        return survey
+
+    @action(detail=True, methods=['GET'])
+    def results(self, request, pk=None):
+        '''各题的回答数和选项人数'''
+        return Response(survey_results(self.get_owned_survey()))
+
+    @action(detail=True, methods=['GET'])
+    def texts(self, request, pk=None):
+        '''分页查看某题的回答，参数question为题目编号'''
+        survey = self.get_owned_survey()
+        try:
+            question_id = int(request.query_params['question'])
+        except (KeyError, ValueError):
+            raise ValidationError("请提供题目编号！")
+        paginator = AnswerPagination()
+        page = paginator.paginate_queryset(
+            text_answers(survey, question_id), request, view=self)
+        return paginator.get_paginated_response(page)
+
+    @action(detail=True, methods=['GET'])
+    def export(self, request, pk=None):
+        '''以CSV格式流式导出所有已提交的答卷'''
+        survey = self.get_owned_survey()
+        response = StreamingHttpResponse(
+            iter_survey_csv(survey), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="survey_{survey.id}.csv"'
+        return response
+
 
 class QuestionViewSet(viewsets.ModelViewSet):
     authentication_classes = [SessionAuthentication]
@@ -122,9 +166,11 @@ class AnswerTextViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['GET'])
     def survey_owner(self, request):
         text = AnswerText.objects.filter(
-            question__survey__creator=request.user)
-        serializer = AnswerTextSerializer(text, many=True)
-        return Response(serializer.data)
+            question__survey__creator=request.user).order_by('id')
+        paginator = AnswerPagination()
+        page = paginator.paginate_queryset(text, request, view=self)
+        serializer = AnswerTextSerializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
 
 class AnswerSheetViewSet(viewsets.ModelViewSet):
@@ -165,6 +211,23 @@ class AnswerSheetViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['GET'])
     def survey_owner(self, request):
-        sheet = AnswerSheet.objects.filter(survey__creator=request.user)
-        serializer = AnswerSheetSerializer(sheet, many=True)
-        return Response(serializer.data)
+        sheet = AnswerSheet.objects.filter(survey__creator=request.user).order_by('id')
+        paginator = AnswerPagination()
+        page = paginator.paginate_queryset(sheet, request, view=self)
+        serializer = AnswerSheetSerializer(page, many=True, context={'request': request})
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(detail=False, methods=['POST'])
+    def submit(self, request):
+        '''
+        一次提交整张答卷及其所有回答，校验通过后在同一事务中写入
+
+        参数见AnswerSheetSubmitSerializer
+        '''
+        serializer = AnswerSheetSubmitSerializer(
+            data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            sheet = serializer.save()
+        return Response(AnswerSheetSerializer(sheet, context={'request': request}).data,
+                        status=status.HTTP_201_CREATED)
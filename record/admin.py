@@ -18,3 +18,9 @@ class ModuleLogAdmin(admin.ModelAdmin):
     list_filter = ["type", "module_name", "time", "platform", "page"]
     search_fields = ["user__username", "page", "module_name"]
     date_hierarchy = "time"
+
+
+@admin.register(RateLimitCounter)
+class RateLimitCounterAdmin(admin.ModelAdmin):
+    list_display = ["key", "count", "expires"]
+    search_fields = ["key"]
@@ -0,0 +1,26 @@
+from utils.config import Config, LazySetting
+from boot.config import ROOT_CONFIG
+
+
+__all__ = [
+    'ratelimit_config',
+]
+
+
+class RateLimitConfig(Config):
+    # 限流计数的存储：db使用数据库表，多进程和多机共享；memory仅在进程内有效；
+    # cache使用Django缓存，仅适用于Redis、Memcached等共享且自增原子的后端，
+    # 进程内缓存各进程计数独立，文件缓存的自增不是原子操作
+    store = LazySetting('ratelimit/store', default='db')
+    cache_alias = LazySetting('ratelimit/cache_alias', default='default')
+    # 全站按IP的请求数限制，窗口（秒）内超过limit次返回429，为0时不限制
+    limit = LazySetting('ratelimit/limit', default=0)
+    window = LazySetting('ratelimit/window', default=60, type=(int, float))
+    # 窗口（秒）内被判定为攻击的次数达到上限后，拒绝该IP访问受保护的页面
+    attack_limit = LazySetting('ratelimit/attack_limit', default=1)
+    attack_window = LazySetting('ratelimit/attack_window', default=3600, type=(int, float))
+    # 通过和拒绝次数在进程内累计，每隔该秒数写入存储
+    stats_interval = LazySetting('ratelimit/stats_interval', default=60, type=(int, float))
+
+
+ratelimit_config = RateLimitConfig(ROOT_CONFIG, 'global')
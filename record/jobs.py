@@ -0,0 +1,11 @@
+from scheduler.periodic import periodical
+from scheduler.executors import BATCH
+from record.config import ratelimit_config as CONFIG
+from record.ratelimit import DatabaseRateStore
+
+
+@periodical('cron', 'purge_rate_limits', minute=17, executor=BATCH)
+def purge_rate_limits():
+    '''使用数据库存储限流计数时，每小时清除过期的计数'''
+    if CONFIG.store == 'db':
+        DatabaseRateStore().purge()
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('record', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateLimitCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=191, unique=True, verbose_name='键')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='计数')),
+                ('expires', models.DateTimeField(db_index=True, verbose_name='过期时间')),
+            ],
+            options={
+                'verbose_name': '限流计数',
+                'verbose_name_plural': '限流计数',
+            },
+        ),
+    ]
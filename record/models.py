@@ -9,6 +9,7 @@ from generic.models import User
 __all__ = [
     'PageLog',
     'ModuleLog',
+    'RateLimitCounter',
 ]
 
 
@@ -55,3 +56,16 @@ class ModuleLog(models.Model):
     platform = models.CharField('设备类型', max_length=32, null=True, blank=True)
     explore_name = models.CharField('浏览器类型', max_length=32, null=True, blank=True)
     explore_version = models.CharField('浏览器版本', max_length=32, null=True, blank=True)
+
+
+class RateLimitCounter(models.Model):
+    '''
+    限流计数，使用数据库存储时在同一台机器的多个进程间共享
+    '''
+    class Meta:
+        verbose_name = "限流计数"
+        verbose_name_plural = verbose_name
+
+    key = models.CharField('键', max_length=191, unique=True)
+    count = models.PositiveIntegerField('计数', default=0)
+    expires = models.DateTimeField('过期时间', db_index=True)
@@ -0,0 +1,320 @@
+'''滑动窗口限流
+
+按标识（通常是IP）统计窗口内的请求数，超过上限时拒绝请求。
+计数按固定窗口分桶保存，当前计数估计为
+``上一桶计数 * 上一窗口在滑动窗口中的比例 + 当前桶计数``，
+每次请求只需一次自增和一次读取，计数到期后由存储自动清除。
+
+计数保存在可替换的存储中：
+
+- :class:`DatabaseRateStore`: 数据库表，默认使用，各进程共享
+- :class:`CacheRateStore`: Django缓存，后端须在进程间共享且自增是原子的（如Redis、Memcached），
+  进程内缓存和文件缓存都不满足
+- :class:`MemoryRateStore`: 进程内字典，用于测试
+
+可作为视图装饰器 :func:`rate_limit` 或中间件 :class:`RateLimitMiddleware` 使用。
+各限流器每天的通过和拒绝次数先在进程内累计，每隔一段时间合并写入存储，
+避免每个请求都更新同一个统计键，由 :func:`rate_limit_stats` 汇总。
+'''
+import math
+import time
+import threading
+from collections import Counter
+from datetime import datetime, timedelta
+from functools import wraps, cache
+from typing import Callable
+
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import transaction
+from django.db.models import F
+
+from utils.http.dependency import HttpRequest, HttpResponse
+from utils.http.utils import get_ip
+from record.config import ratelimit_config as CONFIG
+from record.models import RateLimitCounter
+
+
+__all__ = [
+    'RateStore',
+    'MemoryRateStore',
+    'CacheRateStore',
+    'DatabaseRateStore',
+    'get_store',
+    'RateLimiter',
+    'rate_limit',
+    'rate_limit_stats',
+    'RateLimitMiddleware',
+]
+
+
+class RateStore:
+    '''限流计数的存储，计数在ttl秒后过期'''
+    def incr(self, key: str, ttl: float, amount: int = 1) -> int:
+        '''计数增加amount并返回新的计数，不存在或已过期时从0开始'''
+        raise NotImplementedError
+
+    def get_many(self, keys: list[str]) -> dict[str, int]:
+        '''读取未过期的计数，不存在的键不出现在结果中'''
+        raise NotImplementedError
+
+    def delete_many(self, keys: list[str]) -> None:
+        raise NotImplementedError
+
+
+class MemoryRateStore(RateStore):
+    '''进程内的计数存储，只用于测试和单进程调试'''
+    def __init__(self):
+        self._data: dict[str, tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def _purge(self, now: float) -> None:
+        expired = [key for key, (_, expires) in self._data.items() if expires <= now]
+        for key in expired:
+            del self._data[key]
+
+    def incr(self, key: str, ttl: float, amount: int = 1) -> int:
+        now = time.monotonic()
+        with self._lock:
+            count, expires = self._data.get(key, (0, 0))
+            if expires <= now:
+                count, expires = 0, now + ttl
+                self._purge(now)
+            self._data[key] = count + amount, expires
+            return count + amount
+
+    def get_many(self, keys: list[str]) -> dict[str, int]:
+        now = time.monotonic()
+        with self._lock:
+            return {key: self._data[key][0] for key in keys
+                    if key in self._data and self._data[key][1] > now}
+
+    def delete_many(self, keys: list[str]) -> None:
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+
+class CacheRateStore(RateStore):
+    '''Django缓存中的计数存储，依赖缓存后端的原子自增，不应使用进程内缓存和文件缓存'''
+    def __init__(self, alias: str = 'default'):
+        self.alias = alias
+
+    @property
+    def cache(self):
+        return caches[self.alias]
+
+    def incr(self, key: str, ttl: float, amount: int = 1) -> int:
+        cache = self.cache
+        timeout = math.ceil(ttl)
+        if cache.add(key, amount, timeout):
+            return amount
+        try:
+            return cache.incr(key, amount)
+        except ValueError:
+            # 检查和自增之间过期
+            cache.set(key, amount, timeout)
+            return amount
+
+    def get_many(self, keys: list[str]) -> dict[str, int]:
+        return self.cache.get_many(keys)
+
+    def delete_many(self, keys: list[str]) -> None:
+        self.cache.delete_many(keys)
+
+
+class DatabaseRateStore(RateStore):
+    '''数据库表中的计数存储，过期的行在下次使用该键时覆盖，也可定期调用purge清除'''
+    def incr(self, key: str, ttl: float, amount: int = 1) -> int:
+        counters = RateLimitCounter.objects
+        while True:
+            now = datetime.now()
+            with transaction.atomic():
+                if counters.filter(key=key, expires__gt=now).update(
+                        count=F('count') + amount):
+                    return counters.get(key=key).count
+                counters.filter(key=key, expires__lte=now).delete()
+                _, created = counters.get_or_create(key=key, defaults=dict(
+                    count=amount, expires=now + timedelta(seconds=ttl)))
+                if created:
+                    return amount
+            # 其它进程同时创建了计数，重新自增
+
+    def get_many(self, keys: list[str]) -> dict[str, int]:
+        return dict(RateLimitCounter.objects.filter(
+            key__in=keys, expires__gt=datetime.now()).values_list('key', 'count'))
+
+    def delete_many(self, keys: list[str]) -> None:
+        RateLimitCounter.objects.filter(key__in=keys).delete()
+
+    def purge(self) -> int:
+        '''删除过期的计数，返回删除的行数'''
+        return RateLimitCounter.objects.filter(expires__lte=datetime.now()).delete()[0]
+
+
+@cache
+def get_store() -> RateStore:
+    '''配置的默认存储，每个进程只创建一次'''
+    match CONFIG.store:
+        case 'cache':
+            return CacheRateStore(CONFIG.cache_alias)
+        case 'db':
+            return DatabaseRateStore()
+        case 'memory':
+            return MemoryRateStore()
+        case store:
+            raise ValueError(f'未知的限流存储: {store}')
+
+
+_limiters: dict[str, 'RateLimiter'] = {}
+
+
+class RateLimiter:
+    '''
+    滑动窗口限流器
+
+    Attributes:
+        name (str): 名称，用于区分计数的键和统计
+        limit (int): 窗口内允许的次数
+        window (float): 窗口长度（秒）
+    '''
+    ALLOWED = 'allowed'
+    BLOCKED = 'blocked'
+    EVENTS = (ALLOWED, BLOCKED)
+    STATS_TTL = 2 * 24 * 3600
+
+    def __init__(self, name: str, limit: int, window: float,
+                 store: RateStore | None = None):
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self._store = store
+        # 本进程尚未写入存储的统计：(事件, 日期) -> 次数
+        self._pending: Counter[tuple[str, str]] = Counter()
+        self._pending_lock = threading.Lock()
+        self._flushed = time.monotonic()
+        _limiters[name] = self
+
+    @property
+    def store(self) -> RateStore:
+        return self._store if self._store is not None else get_store()
+
+    def _buckets(self, ident: str, now: float | None) -> tuple[str, str, float]:
+        '''当前桶和上一桶的键，及上一桶在滑动窗口中的比例'''
+        if now is None:
+            now = time.time()
+        bucket, offset = divmod(now, self.window)
+        prefix = f'ratelimit:{self.name}:{ident}:'
+        return (prefix + str(int(bucket)), prefix + str(int(bucket) - 1),
+                1 - offset / self.window)
+
+    def _estimate(self, prev_key: str, weight: float, current: int) -> float:
+        previous = self.store.get_many([prev_key]).get(prev_key, 0)
+        return previous * weight + current
+
+    def count(self, ident: str, now: float | None = None) -> float:
+        '''滑动窗口内的估计次数'''
+        key, prev_key, weight = self._buckets(ident, now)
+        counts = self.store.get_many([key, prev_key])
+        return counts.get(prev_key, 0) * weight + counts.get(key, 0)
+
+    def hit(self, ident: str, now: float | None = None) -> bool:
+        '''记录一次请求，返回是否在限制内'''
+        key, prev_key, weight = self._buckets(ident, now)
+        current = self.store.incr(key, 2 * self.window)
+        allowed = self._estimate(prev_key, weight, current) <= self.limit
+        self._record(self.ALLOWED if allowed else self.BLOCKED)
+        return allowed
+
+    def check(self, ident: str, now: float | None = None) -> bool:
+        '''不记录请求，返回是否尚未达到限制，达到时计入拒绝次数'''
+        # 向上取整，上一桶的记录在其后的整个窗口内都有效
+        allowed = math.ceil(self.count(ident, now)) < self.limit
+        if not allowed:
+            self._record(self.BLOCKED)
+        return allowed
+
+    def reset(self, ident: str, now: float | None = None) -> None:
+        key, prev_key, _ = self._buckets(ident, now)
+        self.store.delete_many([key, prev_key])
+
+    def _stats_key(self, event: str, day: str) -> str:
+        return f'ratelimit-stats:{self.name}:{event}:{day}'
+
+    def _record(self, event: str) -> None:
+        with self._pending_lock:
+            self._pending[event, f'{datetime.now():%Y%m%d}'] += 1
+            due = time.monotonic() - self._flushed >= CONFIG.stats_interval
+        if due:
+            self.flush_stats()
+
+    def flush_stats(self) -> None:
+        '''将本进程累计的统计写入存储，进程退出前未写入的统计会丢失'''
+        with self._pending_lock:
+            pending, self._pending = self._pending, Counter()
+            self._flushed = time.monotonic()
+        # 统计失败不影响限流
+        try:
+            for (event, day), amount in pending.items():
+                self.store.incr(self._stats_key(event, day), self.STATS_TTL, amount)
+        except Exception:
+            pass
+
+    def stats(self, day: str | None = None) -> dict[str, int]:
+        '''某天（格式为YYYYmmdd，默认今天）通过和拒绝的次数，其它进程未写入的统计不计入'''
+        if day is None:
+            day = f'{datetime.now():%Y%m%d}'
+        self.flush_stats()
+        keys = {event: self._stats_key(event, day) for event in self.EVENTS}
+        counts = self.store.get_many(list(keys.values()))
+        return {event: counts.get(key, 0) for event, key in keys.items()}
+
+
+def rate_limit_stats(day: str | None = None) -> dict[str, dict[str, int]]:
+    '''所有限流器的统计'''
+    return {name: limiter.stats(day) for name, limiter in sorted(_limiters.items())}
+
+
+def rate_limit(name: str, limit: int, window: float,
+               key: Callable[[HttpRequest], str | None] = get_ip,
+               store: RateStore | None = None):
+    '''
+    视图的限流装饰器，超过限制时返回429
+
+    :param name: 限流器名称
+    :type name: str
+    :param limit: 窗口内允许的请求数
+    :type limit: int
+    :param window: 窗口长度（秒）
+    :type window: float
+    :param key: 从请求获取限流标识的函数，返回None时不限流, defaults to get_ip
+    :type key: Callable[[HttpRequest], str | None], optional
+    :param store: 计数存储，默认使用配置的存储, defaults to None
+    :type store: RateStore | None, optional
+    '''
+    limiter = RateLimiter(name, limit, window, store)
+
+    def actual_decorator(view_function):
+        @wraps(view_function)
+        def _wrapped_view(request: HttpRequest, *args, **kwargs):
+            ident = key(request)
+            if ident is not None and not limiter.hit(ident):
+                return HttpResponse(status=429)
+            return view_function(request, *args, **kwargs)
+        return _wrapped_view
+    return actual_decorator
+
+
+class RateLimitMiddleware:
+    '''全站按IP限流，未设置上限时不启用'''
+    def __init__(self, get_response):
+        if CONFIG.limit <= 0:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.limiter = RateLimiter('site', CONFIG.limit, CONFIG.window)
+
+    def __call__(self, request: HttpRequest):
+        ip = get_ip(request)
+        if ip is not None and not self.limiter.hit(ip):
+            return HttpResponse(status=429)
+        return self.get_response(request)
@@ -0,0 +1,61 @@
+from django.test import TestCase, RequestFactory
+
+from utils.http.dependency import HttpResponse
+from record.ratelimit import (
+    RateStore, MemoryRateStore, CacheRateStore, DatabaseRateStore,
+    RateLimiter, rate_limit,
+)
+
+
+class RateLimiterTestCase(TestCase):
+    def stores(self) -> list[RateStore]:
+        return [MemoryRateStore(), CacheRateStore(), DatabaseRateStore()]
+
+    def test_sliding_window(self):
+        '''上一窗口的计数按剩余比例计入，两个窗口后失效'''
+        for store in self.stores():
+            with self.subTest(store=type(store).__name__):
+                limiter = RateLimiter(f'test-{id(store)}', 3, 10, store)
+                self.assertEqual([limiter.hit('ip', 100 + i) for i in range(4)],
+                                 [True, True, True, False])
+                self.assertTrue(limiter.hit('other', 103))
+                # 上一窗口4次，剩余比例0.5
+                self.assertEqual(limiter.count('ip', 115), 2)
+                self.assertTrue(limiter.hit('ip', 115))
+                self.assertFalse(limiter.hit('ip', 115))
+                self.assertEqual(limiter.count('ip', 125), 1)
+                self.assertEqual(limiter.stats(), dict(allowed=5, blocked=2))
+                limiter.reset('ip', 115)
+                self.assertEqual(limiter.count('ip', 115), 0)
+
+    def test_check(self):
+        '''只检查不计数，上一窗口的记录在整个窗口内有效'''
+        limiter = RateLimiter('test-check', 1, 10, MemoryRateStore())
+        self.assertTrue(limiter.check('ip', 100))
+        limiter.hit('ip', 105)
+        self.assertFalse(limiter.check('ip', 105))
+        self.assertFalse(limiter.check('ip', 119))
+        self.assertTrue(limiter.check('ip', 120))
+        self.assertEqual(limiter.stats()['blocked'], 2)
+
+    def test_stats_batched(self):
+        '''统计在进程内累计，读取统计时写入存储'''
+        store = MemoryRateStore()
+        limiter = RateLimiter('test-stats', 5, 10, store)
+        for i in range(3):
+            limiter.hit('ip', 100 + i)
+        self.assertEqual(len(store._data), 1)
+        self.assertEqual(limiter.stats(), dict(allowed=3, blocked=0))
+        self.assertEqual(limiter.stats(), dict(allowed=3, blocked=0))
+
+    def test_decorator(self):
+        '''超过限制时返回429，不同IP分别计数'''
+        @rate_limit('test-view', 2, 60, store=MemoryRateStore())
+        def view(request):
+            return HttpResponse()
+
+        factory = RequestFactory()
+        status = [view(factory.get('/', REMOTE_ADDR='1.1.1.1')).status_code
+                  for _ in range(3)]
+        self.assertEqual(status, [200, 200, 429])
+        self.assertEqual(view(factory.get('/', REMOTE_ADDR='2.2.2.2')).status_code, 200)
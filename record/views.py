@@ -0,0 +1,31 @@
+from django.http import JsonResponse
+
+from utils.views import SecureView
+from record.ratelimit import rate_limit_stats
+
+
+class RateLimitStatsView(SecureView):
+    '''限流统计
+
+    返回各限流器某天通过和拒绝的次数，GET参数day格式为YYYYmmdd，默认今天，
+    只有工作人员可访问
+    '''
+    http_method_names = ['get']
+
+    def check_perm(self) -> None:
+        super().check_perm()
+        if not self.request.user.is_staff:
+            self.permission_denied()
+
+    def dispatch_prepare(self, method: str):
+        match method:
+            case 'get':
+                return self.show_stats
+            case _:
+                return self.default_prepare(method)
+
+    def show_stats(self):
+        day = self.request.GET.get('day')
+        if day is not None and not (len(day) == 8 and day.isdigit()):
+            return self.permission_denied('Invalid day.')
+        return JsonResponse(rate_limit_stats(day))
@@ -31,6 +31,7 @@ from datetime import datetime, timedelta
 
 from scheduler.scheduler import scheduler
 from scheduler.utils import as_schedule_time
+from scheduler.executors import DEFAULT, job_options
 
 
 __all__ = ['ScheduleAdder', 'MultipleAdder']
@@ -51,13 +52,15 @@ class ScheduleAdder(Generic[P]):
         run_time (datetime | timedelta | None): 运行的时间
             运行时间，指定时间、时间差或即刻发送
         replace (bool): 是否替换已存在的任务
+        executor (str): 执行任务的执行器名称
     '''
     def __init__(
         self, func: Callable[P, None], *,
         id: str | None = None,
         name: str | None = None,
         run_time: datetime | timedelta | None = None,
-        replace: bool = True
+        replace: bool = True,
+        executor: str = DEFAULT,
     ):
         '''创建定时任务添加器
 
@@ -72,12 +75,14 @@ class ScheduleAdder(Generic[P]):
             run_time (datetime | timedelta, optional): 运行的时间
                 运行时间，指定时间、时间差或即刻发送，默认在短暂延迟后立刻发送
             replace (bool, optional): 替换已存在的任务，默认为True
+            executor (str, optional): 执行器名称，见 :module:`scheduler.executors`
         '''
         self.func = func
         self.id = id
         self.name = name
         self.run_time = run_time
         self.replace = replace
+        self.executor = executor
 
     def __call__(self, *args: P.args, **kwargs: P.kwargs) -> str:
         '''添加定时任务
@@ -101,6 +106,7 @@ class ScheduleAdder(Generic[P]):
             id=self.id,
             name=self.name,
             replace_existing=self.replace,
+            **job_options(self.executor),
         ).id
 
 
@@ -118,7 +124,8 @@ class MultipleAdder(Generic[P]):
 
     def schedule(self, id: str | None = None, name: str | None = None, *,
                  run_time: datetime | timedelta | None = None,
-                 replace: bool = True) -> ScheduleAdder[P]:
+                 replace: bool = True,
+                 executor: str = DEFAULT) -> ScheduleAdder[P]:
         '''规划单次定时任务
 
         Returns:
@@ -128,4 +135,5 @@ class MultipleAdder(Generic[P]):
             :class:`ScheduleAdder`
             :method:`ScheduleAdder.__init__`
         '''
-        return ScheduleAdder(self.func, id=id, name=name, run_time=run_time, replace=replace)
+        return ScheduleAdder(self.func, id=id, name=name, run_time=run_time,
+                             replace=replace, executor=executor)
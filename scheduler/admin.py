@@ -0,0 +1,11 @@
+from django.contrib import admin
+
+from scheduler.models import JobMetricRollup
+
+
+@admin.register(JobMetricRollup)
+class JobMetricRollupAdmin(admin.ModelAdmin):
+    list_display = ['func', 'period', 'count', 'errors', 'missed', 'skipped',
+                    'lag_p95', 'lag_max', 'duration_p95', 'duration_max']
+    list_filter = ['period']
+    search_fields = ['func']
@@ -1,6 +1,7 @@
-from typing import overload, Literal
+from typing import overload, Literal, Iterable
 
 from apscheduler.jobstores.base import JobLookupError
+from django_apscheduler.models import DjangoJob
 
 from scheduler.scheduler import scheduler
 from scheduler.config import scheduler_config as CONFIG
@@ -36,3 +37,53 @@ def remove_job(job_id: str, no_except: bool = True):
     if CONFIG.use_scheduler:
         scheduler.remove_job(job_id)
     return True
+
+
+def _wakeup():
+    # 未启用定时任务时，scheduler是不会执行任务的BackgroundScheduler，无需唤醒
+    if hasattr(scheduler, 'wakeup_executor'):
+        scheduler.wakeup_executor()
+
+
+def remove_jobs(job_ids: Iterable[str]) -> set[str]:
+    '''批量删除定时任务
+
+    在任务存储中一次删除所有任务，并只唤醒一次执行器，不存在的任务将被忽略，
+    不启用定时任务时，不进行任何操作
+
+    Args:
+        job_ids(Iterable[str]): 任务ID
+
+    Returns:
+        set[str]: 实际删除的任务ID
+    '''
+    job_ids = set(job_ids)
+    if not CONFIG.use_scheduler or not job_ids:
+        return set()
+    jobs = DjangoJob.objects.filter(id__in=job_ids)
+    removed = set(jobs.values_list('id', flat=True))
+    if removed:
+        DjangoJob.objects.filter(id__in=removed).delete()
+        _wakeup()
+    return removed
+
+
+def remove_jobs_by_prefix(prefix: str) -> int:
+    '''删除ID以给定前缀开头的所有定时任务
+
+    在任务存储中一次删除，并只唤醒一次执行器，不启用定时任务时，不进行任何操作
+
+    Args:
+        prefix(str): 任务ID前缀，不能为空
+
+    Returns:
+        int: 删除的任务数
+    '''
+    assert prefix, '前缀不能为空'
+    if not CONFIG.use_scheduler:
+        return 0
+    count = DjangoJob.objects.filter(id__startswith=prefix).delete()[1].get(
+        DjangoJob._meta.label, 0)
+    if count:
+        _wakeup()
+    return count
@@ -5,6 +5,14 @@ from boot.config import ROOT_CONFIG
 class SchedulerConfig(Config):
     rpc_port = LazySetting('rpc_port', type=int)
     use_scheduler = LazySetting('use_scheduler', default=False)
+    # 执行器的并发数，实时任务和批处理任务分开执行，互不阻塞
+    default_workers = LazySetting('default_workers', default=10)
+    realtime_workers = LazySetting('realtime_workers', default=4)
+    batch_workers = LazySetting('batch_workers', default=2)
+    # 运行指标：内存中保留的记录数，是否每小时汇总入库，p95延迟告警阈值（秒）
+    metrics_size = LazySetting('metrics_size', default=5000)
+    metrics_rollup = LazySetting('metrics_rollup', default=False)
+    lag_alert_seconds = LazySetting('lag_alert_seconds', default=30, type=(int, float))
 
 
 scheduler_config = SchedulerConfig(ROOT_CONFIG, 'scheduler')
@@ -0,0 +1,73 @@
+'''定时任务执行器
+
+执行器只在运行定时任务的进程中创建，添加任务时只需指定执行器名称。
+
+- ``default``: 默认线程池，用于一般任务
+- ``realtime``: 小型线程池，用于预约开始结束、微信消息等对延迟敏感的任务
+- ``batch``: 进程池，用于数据同步、积分计算等耗时较长的批处理任务，
+  避免占用其它任务的线程和解释器
+
+Examples:
+    指定定期任务和单次任务的执行器::
+
+        @periodical('cron', 'sync', minute=0, executor=BATCH)
+        def sync(): ...
+
+        ScheduleAdder(func, run_time=start, executor=REALTIME)(*args)
+'''
+from typing import Any
+
+import django
+from apscheduler.executors.pool import ThreadPoolExecutor, ProcessPoolExecutor
+
+from scheduler.config import scheduler_config as CONFIG
+
+
+__all__ = ['DEFAULT', 'REALTIME', 'BATCH', 'job_options']
+
+
+DEFAULT = 'default'
+REALTIME = 'realtime'
+BATCH = 'batch'
+
+
+# 各执行器中任务的默认设置，添加任务时写入任务存储
+# 错过运行时间超过misfire_grace_time秒的任务不再执行，批处理任务可能在进程池中排队较久
+_JOB_DEFAULTS: dict[str, dict[str, Any]] = {
+    DEFAULT: dict(),
+    REALTIME: dict(coalesce=True, max_instances=1, misfire_grace_time=60),
+    BATCH: dict(coalesce=True, max_instances=1, misfire_grace_time=3600),
+}
+
+
+def job_options(executor: str = DEFAULT, **options) -> dict[str, Any]:
+    '''获取添加任务时的执行器参数，未指定的参数使用执行器的默认设置
+
+    Args:
+        executor(str, optional): 执行器名称，默认为`DEFAULT`
+
+    Keyword Args:
+        max_instances, coalesce, misfire_grace_time: 同`add_job`，为None时使用默认值
+
+    Returns:
+        dict[str, Any]: 可传递给`add_job`的参数
+    '''
+    assert executor in _JOB_DEFAULTS, f'未知的执行器：{executor}'
+    job_kwargs = dict(_JOB_DEFAULTS[executor], executor=executor)
+    job_kwargs.update((key, value) for key, value in options.items() if value is not None)
+    return job_kwargs
+
+
+def _init_batch_worker():
+    # 进程池使用spawn启动子进程，需要重新初始化Django
+    django.setup()
+
+
+def build_executors() -> dict[str, ThreadPoolExecutor | ProcessPoolExecutor]:
+    '''创建运行定时任务所需的执行器'''
+    return {
+        DEFAULT: ThreadPoolExecutor(CONFIG.default_workers),
+        REALTIME: ThreadPoolExecutor(CONFIG.realtime_workers),
+        BATCH: ProcessPoolExecutor(CONFIG.batch_workers,
+                                   pool_kwargs=dict(initializer=_init_batch_worker)),
+    }
@@ -0,0 +1,56 @@
+'''定时任务运行指标的汇总和告警
+
+这些任务读取执行器进程内存中的指标，必须在默认的线程池执行器中运行
+'''
+from datetime import datetime, timedelta
+
+from record.log.utils import get_logger
+from scheduler.periodic import periodical
+from scheduler.config import scheduler_config as CONFIG
+from scheduler.metrics import job_metrics, JobMetrics
+from scheduler.models import JobMetricRollup
+
+
+logger = get_logger('apscheduler')
+LAG_CHECK_MINUTES = 5
+
+
+def rollup_job_metrics(period: datetime) -> int:
+    '''将计划时间在给定一小时内的记录汇总入库，返回汇总的任务函数数'''
+    end = period + timedelta(hours=1)
+    samples = [sample for sample in job_metrics.recent(period)
+               if sample.scheduled < end.astimezone()]
+    summary = JobMetrics.summarize(samples)
+    for func, stats in summary.items():
+        JobMetricRollup.objects.update_or_create(
+            func=func[:255], period=period,
+            defaults=dict(
+                count=stats['count'],
+                errors=stats['errors'],
+                missed=stats['missed'],
+                skipped=stats['skipped'],
+                lag_p95=stats['lag']['p95'],
+                lag_max=stats['lag']['max'],
+                duration_p95=stats['duration']['p95'],
+                duration_max=stats['duration']['max'],
+            ),
+        )
+    return len(summary)
+
+
+@periodical('cron', 'job_metrics_rollup', minute=1)
+def rollup_last_hour():
+    '''每小时汇总上一小时的运行指标'''
+    if not CONFIG.metrics_rollup:
+        return
+    period = datetime.now().replace(minute=0, second=0, microsecond=0)
+    rollup_job_metrics(period - timedelta(hours=1))
+
+
+@periodical('interval', 'job_lag_alert', minutes=LAG_CHECK_MINUTES)
+def alert_job_lag():
+    '''最近一段时间内p95延迟超过阈值时记录告警'''
+    since = datetime.now() - timedelta(minutes=LAG_CHECK_MINUTES)
+    for func, lag in job_metrics.lagging(CONFIG.lag_alert_seconds, since).items():
+        logger.warning(f'定时任务{func}最近{LAG_CHECK_MINUTES}分钟的p95延迟为{lag:.1f}秒，'
+                       f'超过{CONFIG.lag_alert_seconds}秒')
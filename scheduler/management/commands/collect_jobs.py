@@ -22,4 +22,5 @@ class Command(BaseCommand):
         for pjob in _periodical_jobs:
             job_id, fn, trigger = pjob.job_id, pjob.function, pjob.trigger
             print(f'\t{job_id} (fn: {fn.__name__}, trigger: {trigger})')
-            scheduler.add_job(fn, trigger, id=job_id, replace_existing=True, **pjob.tg_args)
+            scheduler.add_job(fn, trigger, id=job_id, replace_existing=True,
+                              **pjob.tg_args, **pjob.job_args)
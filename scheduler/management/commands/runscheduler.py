@@ -7,6 +7,8 @@ from rpyc.utils.server import ThreadedServer
 
 from record.log.utils import get_logger
 from scheduler.config import scheduler_config as CONFIG
+from scheduler.executors import build_executors
+from scheduler.metrics import job_metrics, local_job_metrics
 from utils.health_check import db_connection_healthy
 
 TZ = settings.TIME_ZONE
@@ -25,13 +27,17 @@ class SchedulerService(rpyc.Service):
     def exposed_health_check(self) -> bool:
         return db_connection_healthy() and self.scheduler.running
 
+    def exposed_job_metrics(self, minutes: int | None = None) -> str:
+        return local_job_metrics(minutes)
+
 class Command(BaseCommand):
     help = "Runs apscheduler."
 
     def handle(self, *args, **options):
 
-        scheduler = BackgroundScheduler(timezone=TZ)
+        scheduler = BackgroundScheduler(timezone=TZ, executors=build_executors())
         scheduler.add_jobstore(DjangoJobStore(), "default")
+        job_metrics.install(scheduler)
         scheduler.start()
 
         protocol_config = {
@@ -0,0 +1,35 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError, CommandParser
+
+from scheduler.metrics import fetch_job_metrics
+
+
+class Command(BaseCommand):
+    help = "获取定时任务的延迟、耗时和出错情况，时间单位为秒"
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument('-m', '--minutes', type=int, default=None,
+                            help='只统计最近若干分钟，默认统计内存中的全部记录')
+        parser.add_argument('--json', action='store_true', help='以JSON格式输出')
+
+    def handle(self, *args, **options):
+        try:
+            metrics = fetch_job_metrics(options['minutes'])
+        except Exception as e:
+            raise CommandError(f'无法连接定时任务执行器：{e}')
+        if options['json']:
+            self.stdout.write(json.dumps(metrics, ensure_ascii=False, indent=2))
+            return
+
+        def fmt(value: float | None) -> str:
+            return '-' if value is None else f'{value:.2f}'
+
+        for func, stats in metrics.items():
+            lag, duration = stats['lag'], stats['duration']
+            self.stdout.write(
+                f'{func}\n'
+                f'\t运行{stats["count"]}次，出错{stats["errors"]}次，'
+                f'错过{stats["missed"]}次，跳过{stats["skipped"]}次；'
+                f'延迟p95 {fmt(lag["p95"])}，最大{fmt(lag["max"])}；'
+                f'耗时p95 {fmt(duration["p95"])}，最大{fmt(duration["max"])}')
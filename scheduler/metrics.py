@@ -0,0 +1,215 @@
+'''定时任务运行指标
+
+在运行定时任务的进程中监听APScheduler事件，按任务函数统计：
+
+- 延迟：计划运行时间到提交执行器的时间
+- 耗时：提交执行器到运行结束的时间，进程池中包含排队时间
+- 错过运行时间、出错和因实例数达到上限而跳过的次数
+
+最近的记录保存在内存的环形缓冲区中，只在执行器进程中有效，
+其它进程通过rpyc获取，也可定期汇总到 :class:`JobMetricRollup` 表中。
+
+See Also:
+    - :module:`scheduler.jobs`: 定期汇总和延迟告警
+    - :class:`scheduler.management.commands.runscheduler.SchedulerService`
+'''
+import json
+import math
+import threading
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any
+
+import rpyc
+from apscheduler.schedulers.base import BaseScheduler
+from apscheduler.events import (
+    JobEvent, JobExecutionEvent, JobSubmissionEvent,
+    EVENT_JOB_SUBMITTED, EVENT_JOB_EXECUTED, EVENT_JOB_ERROR,
+    EVENT_JOB_MISSED, EVENT_JOB_MAX_INSTANCES,
+)
+
+from scheduler.config import scheduler_config as CONFIG
+
+
+__all__ = [
+    'JobSample',
+    'JobMetrics',
+    'job_metrics',
+    'fetch_job_metrics',
+    'local_job_metrics',
+]
+
+
+@dataclass
+class JobSample:
+    '''一次任务运行的记录，耗时为None表示未运行'''
+    name: str
+    job_id: str
+    scheduled: datetime
+    lag: float
+    duration: float | None
+    status: str
+
+    OK = 'ok'
+    ERROR = 'error'
+    MISSED = 'missed'
+    SKIPPED = 'skipped'
+
+
+def _percentile(values: list[float], percent: float) -> float | None:
+    '''最近秩法计算百分位数，空列表返回None'''
+    if not values:
+        return None
+    values = sorted(values)
+    rank = max(math.ceil(percent / 100 * len(values)), 1)
+    return round(values[rank - 1], 3)
+
+
+def _distribution(values: list[float]) -> dict[str, float | None]:
+    return dict(
+        p50=_percentile(values, 50),
+        p95=_percentile(values, 95),
+        max=_percentile(values, 100),
+    )
+
+
+class JobMetrics:
+    '''定时任务运行指标的环形缓冲区
+
+    Attributes:
+        samples (deque[JobSample]): 最近的运行记录，按完成顺序排列
+    '''
+    EVENTS = (EVENT_JOB_SUBMITTED | EVENT_JOB_EXECUTED | EVENT_JOB_ERROR
+              | EVENT_JOB_MISSED | EVENT_JOB_MAX_INSTANCES)
+
+    def __init__(self, size: int):
+        self.samples: deque[JobSample] = deque(maxlen=size)
+        # 已提交未完成的任务：(任务ID, 计划时间) -> (任务函数, 提交时间)
+        self._pending: dict[tuple[str, datetime], tuple[str, datetime]] = {}
+        self._names: dict[str, str] = {}
+        self._scheduler: BaseScheduler | None = None
+        self._lock = threading.Lock()
+
+    def install(self, scheduler: BaseScheduler) -> None:
+        '''在执行任务的调度器上注册监听器'''
+        self._scheduler = scheduler
+        scheduler.add_listener(self.listener, self.EVENTS)
+
+    def _job_name(self, event: JobEvent) -> str:
+        # 单次任务在执行完成后即从任务存储中删除，提交时记录任务函数
+        name = self._names.get(event.job_id)
+        if name is None:
+            job = None
+            if self._scheduler is not None:
+                job = self._scheduler.get_job(event.job_id, event.jobstore)
+            name = job.func_ref if job is not None else event.job_id
+        return name
+
+    def listener(self, event: JobEvent) -> None:
+        now = datetime.now().astimezone()
+        with self._lock:
+            if isinstance(event, JobSubmissionEvent):
+                self._on_submission(event, now)
+            elif isinstance(event, JobExecutionEvent):
+                self._on_execution(event, now)
+
+    def _on_submission(self, event: JobSubmissionEvent, now: datetime) -> None:
+        name = self._job_name(event)
+        if event.code == EVENT_JOB_MAX_INSTANCES:
+            for scheduled in event.scheduled_run_times:
+                self._add(JobSample(name, event.job_id, scheduled,
+                                    (now - scheduled).total_seconds(),
+                                    None, JobSample.SKIPPED))
+            return
+        self._names[event.job_id] = name
+        for scheduled in event.scheduled_run_times:
+            self._pending[event.job_id, scheduled] = name, now
+        # 执行器异常退出时可能收不到结束事件，丢弃最早的记录
+        while len(self._pending) > self.samples.maxlen:
+            self._pending.pop(next(iter(self._pending)))
+
+    def _on_execution(self, event: JobExecutionEvent, now: datetime) -> None:
+        scheduled = event.scheduled_run_time
+        pending = self._pending.pop((event.job_id, scheduled), None)
+        if pending is None:
+            # 调度器判定错过运行时间时不提交任务
+            name = self._job_name(event)
+            lag, duration = (now - scheduled).total_seconds(), None
+        else:
+            name, submitted = pending
+            lag = (submitted - scheduled).total_seconds()
+            duration = (now - submitted).total_seconds()
+        if not any(job_id == event.job_id for job_id, _ in self._pending):
+            self._names.pop(event.job_id, None)
+        if event.code == EVENT_JOB_MISSED:
+            status, duration = JobSample.MISSED, None
+        elif event.code == EVENT_JOB_ERROR:
+            status = JobSample.ERROR
+        else:
+            status = JobSample.OK
+        self._add(JobSample(name, event.job_id, scheduled, max(lag, 0), duration, status))
+
+    def _add(self, sample: JobSample) -> None:
+        self.samples.append(sample)
+
+    def recent(self, since: datetime | None = None) -> list[JobSample]:
+        '''计划时间不早于since的记录，since为不含时区的本地时间'''
+        with self._lock:
+            samples = list(self.samples)
+        if since is not None:
+            since = since.astimezone()
+            samples = [sample for sample in samples if sample.scheduled >= since]
+        return samples
+
+    @staticmethod
+    def summarize(samples: list[JobSample]) -> dict[str, dict[str, Any]]:
+        '''按任务函数汇总记录，延迟和耗时给出p50、p95和最大值（秒）'''
+        groups: dict[str, list[JobSample]] = {}
+        for sample in samples:
+            groups.setdefault(sample.name, []).append(sample)
+        summary = {}
+        for name, group in sorted(groups.items()):
+            statuses = [sample.status for sample in group]
+            summary[name] = dict(
+                count=len(group),
+                errors=statuses.count(JobSample.ERROR),
+                missed=statuses.count(JobSample.MISSED),
+                skipped=statuses.count(JobSample.SKIPPED),
+                lag=_distribution([sample.lag for sample in group]),
+                duration=_distribution([sample.duration for sample in group
+                                        if sample.duration is not None]),
+            )
+        return summary
+
+    def summary(self, since: datetime | None = None) -> dict[str, dict[str, Any]]:
+        return self.summarize(self.recent(since))
+
+    def lagging(self, threshold: float,
+                since: datetime | None = None) -> dict[str, float]:
+        '''p95延迟超过阈值（秒）的任务函数及其p95延迟'''
+        return {
+            name: stats['lag']['p95']
+            for name, stats in self.summary(since).items()
+            if stats['lag']['p95'] is not None and stats['lag']['p95'] > threshold
+        }
+
+
+job_metrics = JobMetrics(CONFIG.metrics_size)
+
+
+def fetch_job_metrics(minutes: int | None = None) -> dict[str, dict[str, Any]]:
+    '''从执行器进程获取最近若干分钟的指标汇总，连接失败时抛出异常'''
+    conn = rpyc.connect("localhost", CONFIG.rpc_port)
+    try:
+        return json.loads(conn.root.job_metrics(minutes))
+    finally:
+        conn.close()
+
+
+def local_job_metrics(minutes: int | None = None) -> str:
+    '''执行器进程中的指标汇总，序列化为JSON以便通过rpyc传递'''
+    since = None
+    if minutes is not None:
+        since = datetime.now() - timedelta(minutes=minutes)
+    return json.dumps(job_metrics.summary(since), ensure_ascii=False)
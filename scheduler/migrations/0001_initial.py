@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-19 16:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobMetricRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('func', models.CharField(max_length=255, verbose_name='任务函数')),
+                ('period', models.DateTimeField(db_index=True, verbose_name='汇总时段开始')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='运行次数')),
+                ('errors', models.PositiveIntegerField(default=0, verbose_name='出错次数')),
+                ('missed', models.PositiveIntegerField(default=0, verbose_name='错过次数')),
+                ('skipped', models.PositiveIntegerField(default=0, verbose_name='跳过次数')),
+                ('lag_p95', models.FloatField(null=True, verbose_name='延迟p95')),
+                ('lag_max', models.FloatField(null=True, verbose_name='最大延迟')),
+                ('duration_p95', models.FloatField(null=True, verbose_name='耗时p95')),
+                ('duration_max', models.FloatField(null=True, verbose_name='最大耗时')),
+            ],
+            options={
+                'verbose_name': '定时任务运行指标',
+                'verbose_name_plural': '定时任务运行指标',
+                'ordering': ['-period', 'func'],
+                'unique_together': {('func', 'period')},
+            },
+        ),
+    ]
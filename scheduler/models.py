@@ -0,0 +1,27 @@
+from django.db import models
+
+
+__all__ = ['JobMetricRollup']
+
+
+class JobMetricRollup(models.Model):
+    '''定时任务运行指标的小时汇总，时间单位为秒'''
+    class Meta:
+        verbose_name = '定时任务运行指标'
+        verbose_name_plural = verbose_name
+        unique_together = ['func', 'period']
+        ordering = ['-period', 'func']
+
+    func = models.CharField('任务函数', max_length=255)
+    period = models.DateTimeField('汇总时段开始', db_index=True)
+    count = models.PositiveIntegerField('运行次数', default=0)
+    errors = models.PositiveIntegerField('出错次数', default=0)
+    missed = models.PositiveIntegerField('错过次数', default=0)
+    skipped = models.PositiveIntegerField('跳过次数', default=0)
+    lag_p95 = models.FloatField('延迟p95', null=True)
+    lag_max = models.FloatField('最大延迟', null=True)
+    duration_p95 = models.FloatField('耗时p95', null=True)
+    duration_max = models.FloatField('最大耗时', null=True)
+
+    def __str__(self):
+        return f'{self.func} {self.period}'
@@ -1,5 +1,7 @@
-from typing import Callable
-from dataclasses import dataclass
+from typing import Callable, Any
+from dataclasses import dataclass, field
+
+from scheduler.executors import DEFAULT, job_options
 
 
 __all__ = ['periodical']
@@ -15,21 +17,28 @@ class PeriodicalJob:
     job_id: str
     trigger: str
     tg_args: dict[str, int]
+    job_args: dict[str, Any] = field(default_factory=job_options)
 
 
 _periodical_jobs: list[PeriodicalJob] = []
 
 
-def periodical(trigger: str, job_id: str = '', **trigger_args):
+def periodical(trigger: str, job_id: str = '', *, executor: str = DEFAULT,
+               max_instances: int | None = None, coalesce: bool | None = None,
+               **trigger_args):
     """Wrap a function into a periodical job.
 
     If `job_id` is not provided, use function name.
+    Options not provided use the defaults of the executor.
 
     :param trigger: 'cron' or 'interval'
     :type trigger: str
+    :param executor: executor alias, see :module:`scheduler.executors`
+    :type executor: str
     """
+    job_args = job_options(executor, max_instances=max_instances, coalesce=coalesce)
     def wrapper(fn: Callable[..., None]):
-        _job = PeriodicalJob(fn, job_id or fn.__name__, trigger, trigger_args)
+        _job = PeriodicalJob(fn, job_id or fn.__name__, trigger, trigger_args, job_args)
         _periodical_jobs.append(_job)
         return fn
     return wrapper
@@ -1,4 +1,4 @@
-from typing import Callable, overload, Literal
+from typing import Callable, overload, Literal, Any
 from datetime import datetime, tzinfo
 from dataclasses import dataclass
 
@@ -16,6 +16,7 @@ class PeriodicalJob:
     job_id: str
     trigger: str
     tg_args: dict[str, int]
+    job_args: dict[str, Any]
 
 _periodical_jobs: list[PeriodicalJob]
 
@@ -27,7 +28,8 @@ def periodical(
     week: int | str = ..., day_of_week: int | str = ...,
     hour: int | str = ..., minute: int | str = ..., second: int | str = ...,
     start_date: datetime | str = ..., end_date: datetime | str = ..., timezone: tzinfo | str = ...,
-    jitter: int | None = ...
+    jitter: int | None = ...,
+    executor: str = ..., max_instances: int | None = ..., coalesce: bool | None = ...
 ) -> Callable[[Callable[..., None]], Callable[..., None]]:
     '''Wrap a function into a cron job.
 
@@ -41,7 +43,8 @@ def periodical(
     trigger: Literal['interval'], job_id: str = '', *,
     weeks: int = 0, days: int = 0, hours: int = 0, minutes: int = 0, seconds: int = 0,
     start_date: datetime | str = ..., end_date: datetime | str = ..., timezone: tzinfo | str = ...,
-    jitter: int | None = ...
+    jitter: int | None = ...,
+    executor: str = ..., max_instances: int | None = ..., coalesce: bool | None = ...
 ) -> Callable[[Callable[..., None]], Callable[..., None]]:
     '''Wrap a function into a interval job.
 
@@ -0,0 +1,123 @@
+from types import SimpleNamespace
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from apscheduler.events import (
+    JobSubmissionEvent, JobExecutionEvent,
+    EVENT_JOB_SUBMITTED, EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, EVENT_JOB_MISSED,
+)
+
+from django.test import SimpleTestCase, TestCase
+from django_apscheduler.models import DjangoJob
+
+from scheduler.cancel import remove_jobs, remove_jobs_by_prefix
+from scheduler.executors import DEFAULT, BATCH, job_options
+from scheduler.periodic import periodical, _periodical_jobs
+from scheduler.metrics import JobMetrics
+from scheduler.models import JobMetricRollup
+from scheduler.jobs import rollup_job_metrics
+from generic.models import User
+
+
+@patch('scheduler.cancel.CONFIG', SimpleNamespace(use_scheduler=True))
+class RemoveJobsTestCase(TestCase):
+    def setUp(self):
+        for job_id in ['activity_1_remind', 'activity_1_end', 'activity_12_end', '1_finish']:
+            DjangoJob.objects.create(id=job_id, job_state=b'')
+
+    def remaining(self) -> set[str]:
+        return set(DjangoJob.objects.values_list('id', flat=True))
+
+    def test_remove_jobs(self):
+        '''只删除存在的任务，并返回实际删除的任务'''
+        removed = remove_jobs(['activity_1_end', '1_finish', '1_start'])
+        self.assertEqual(removed, {'activity_1_end', '1_finish'})
+        self.assertEqual(self.remaining(), {'activity_1_remind', 'activity_12_end'})
+        self.assertEqual(remove_jobs([]), set())
+
+    def test_remove_by_prefix(self):
+        '''按前缀删除不影响ID相近的任务'''
+        self.assertEqual(remove_jobs_by_prefix('activity_1_'), 2)
+        self.assertEqual(self.remaining(), {'activity_12_end', '1_finish'})
+        self.assertEqual(remove_jobs_by_prefix('activity_1_'), 0)
+
+
+class JobOptionsTestCase(SimpleTestCase):
+    def test_job_options(self):
+        '''未指定的参数使用执行器的默认设置'''
+        self.assertEqual(job_options(), dict(executor=DEFAULT))
+        options = job_options(BATCH, max_instances=2, coalesce=None)
+        self.assertEqual(options['executor'], BATCH)
+        self.assertEqual(options['max_instances'], 2)
+        self.assertTrue(options['coalesce'])
+        self.assertRaises(AssertionError, job_options, 'unknown')
+
+    def test_periodical(self):
+        @periodical('interval', 'test_batch_job', hours=1, executor=BATCH)
+        def job(): ...
+        try:
+            pjob = _periodical_jobs[-1]
+            self.assertEqual(pjob.tg_args, dict(hours=1))
+            self.assertEqual(pjob.job_args, job_options(BATCH))
+        finally:
+            _periodical_jobs.pop()
+
+
+class JobMetricsTestCase(TestCase):
+    def setUp(self):
+        self.metrics = JobMetrics(100)
+        self.period = datetime.now().replace(minute=0, second=0, microsecond=0)
+
+    def run_job(self, job_id: str, lag: float, duration: float, code=EVENT_JOB_EXECUTED):
+        '''模拟提交和运行一次任务'''
+        scheduled = (self.period + timedelta(minutes=1)).astimezone()
+        now = scheduled + timedelta(seconds=lag)
+        self.metrics._names[job_id] = f'jobs:{job_id}'
+        with self.metrics._lock:
+            self.metrics._on_submission(JobSubmissionEvent(
+                EVENT_JOB_SUBMITTED, job_id, 'default', [scheduled]), now)
+            self.metrics._on_execution(JobExecutionEvent(
+                code, job_id, 'default', scheduled), now + timedelta(seconds=duration))
+
+    def test_summary(self):
+        '''按任务函数统计延迟和耗时的分位数'''
+        for i in range(20):
+            self.run_job('fast', lag=i / 10, duration=1)
+        self.run_job('slow', lag=60, duration=10, code=EVENT_JOB_ERROR)
+        scheduled = (datetime.now() - timedelta(minutes=5)).astimezone()
+        # 未提交的任务无法获取任务函数时以ID代替
+        self.metrics.listener(JobExecutionEvent(EVENT_JOB_MISSED, 'late', 'default', scheduled))
+
+        summary = self.metrics.summary()
+        fast, slow, late = summary['jobs:fast'], summary['jobs:slow'], summary['late']
+        self.assertEqual(fast['count'], 20)
+        self.assertEqual(fast['lag'], dict(p50=0.9, p95=1.8, max=1.9))
+        self.assertEqual(fast['duration']['p95'], 1)
+        self.assertEqual((slow['errors'], slow['duration']['max']), (1, 10))
+        self.assertEqual((late['missed'], late['duration']['max']), (1, None))
+        self.assertEqual(set(self.metrics.lagging(30)), {'jobs:slow', 'late'})
+
+    def test_rollup(self):
+        '''汇总上一时段的记录，重复汇总时覆盖'''
+        self.run_job('fast', lag=1, duration=2)
+        with patch('scheduler.jobs.job_metrics', self.metrics):
+            self.assertEqual(rollup_job_metrics(self.period), 1)
+            self.run_job('fast', lag=3, duration=2)
+            self.assertEqual(rollup_job_metrics(self.period), 1)
+            self.assertEqual(rollup_job_metrics(self.period - timedelta(hours=1)), 0)
+        rollup = JobMetricRollup.objects.get()
+        self.assertEqual((rollup.func, rollup.count, rollup.lag_max), ('jobs:fast', 2, 3))
+
+    def test_view(self):
+        '''只有工作人员可以查看，参数错误时返回400，执行器不可用时返回503'''
+        user = User.objects.create_user('user', 'user')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get('/scheduler/metrics/').status_code, 403)
+        User.objects.filter(pk=user.pk).update(is_staff=True)
+        for minutes in ['abc', '-5']:
+            response = self.client.get('/scheduler/metrics/', {'minutes': minutes})
+            self.assertEqual(response.status_code, 400)
+        with patch('scheduler.views.fetch_job_metrics', side_effect=ConnectionError):
+            response = self.client.get('/scheduler/metrics/')
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.json()['running'])
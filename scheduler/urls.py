@@ -0,0 +1,8 @@
+from django.urls import path
+
+from scheduler import views
+
+
+urlpatterns = [
+    path('metrics/', views.JobMetricsView.as_view(), name='metrics'),
+]
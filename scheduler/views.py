@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+from django.http import JsonResponse
+
+from utils.views import SecureView
+from scheduler.config import scheduler_config as CONFIG
+from scheduler.metrics import fetch_job_metrics
+from scheduler.models import JobMetricRollup
+
+
+class JobMetricsView(SecureView):
+    '''定时任务运行指标
+
+    返回执行器内存中的指标汇总，GET参数minutes限定统计最近的分钟数，
+    启用汇总时附带最近一天的小时汇总，只有工作人员可访问
+    '''
+    http_method_names = ['get']
+
+    def check_perm(self) -> None:
+        super().check_perm()
+        if not self.request.user.is_staff:
+            self.permission_denied()
+
+    def dispatch_prepare(self, method: str):
+        match method:
+            case 'get':
+                return self.show_metrics
+            case _:
+                return self.default_prepare(method)
+
+    def show_metrics(self):
+        minutes = self.request.GET.get('minutes') or None
+        if minutes is not None:
+            # 参数错误属于请求错误，不是权限问题
+            if not minutes.isdecimal():
+                return JsonResponse(dict(error='minutes须为非负整数'), status=400)
+            minutes = int(minutes)
+        data = dict(running=True, lag_alert_seconds=CONFIG.lag_alert_seconds)
+        status = 200
+        try:
+            data['jobs'] = fetch_job_metrics(minutes)
+        except Exception:
+            data.update(running=False, jobs={})
+            status = 503
+        if CONFIG.metrics_rollup:
+            since = datetime.now() - timedelta(days=1)
+            data['rollups'] = list(JobMetricRollup.objects.filter(
+                period__gte=since).values(
+                'func', 'period', 'count', 'errors', 'missed', 'skipped',
+                'lag_p95', 'lag_max', 'duration_p95', 'duration_max'))
+        return JsonResponse(data, status=status)
@@ -2,6 +2,7 @@ from datetime import date
 
 from django.db.models import Q
 
+from utils.cache import cached
 from semester.models import Semester
 
 
@@ -20,11 +21,13 @@ def next_semester() -> Semester:
     return Semester.objects.filter(start_date__gt=today).earliest('start_date')
 
 
+@cached('semester:semester_of', ttl=3600, version_key='semester')
 def semester_of(date, allow_fallback: bool = True) -> Semester:
     """
     Get semester containing date.
     If no semester contains date and `fallback` is `True`, return the semester just passed.
     Otherwise, raise Exception.
+    Results are cached until semesters change.
     """
     q = Q(start_date__lte=date)
     if not allow_fallback:
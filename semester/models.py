@@ -1,5 +1,7 @@
 from django.db import models
 
+from utils.cache import invalidate_on
+
 
 __all__ = ['SemesterType', 'Semester']
 
@@ -35,3 +37,7 @@ class Semester(models.Model):
     type = models.ForeignKey(SemesterType, on_delete=models.CASCADE)
     start_date = models.DateField('开学日期')
     end_date = models.DateField('放假日期')
+
+
+# 学期信息变化后，缓存的学期查询结果失效
+invalidate_on('semester', Semester, SemesterType)
@@ -0,0 +1,122 @@
+'''
+项目缓存工具
+
+缓存后端见settings.CACHES，部署时默认为文件缓存，各进程共享，测试时为进程内缓存。
+
+- :func:`cached`: 按参数缓存函数结果
+- :func:`get_version` / :func:`bump_version`: 缓存版本，递增版本后旧版本的结果不再使用
+- :func:`invalidate_on`: 模型保存或删除时递增版本
+- :func:`cache_stats`: 本进程中各缓存函数的命中和未命中次数
+
+缓存的结果由键前缀、版本和参数的摘要组成键，版本存储在缓存中，
+版本不存在时以当前时间初始化，因此版本被淘汰后也不会误用旧结果。
+'''
+import json
+import time
+import hashlib
+import threading
+from collections import Counter
+from functools import wraps
+from typing import Any, Callable, ParamSpec, TypeVar
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Model
+from django.db.models.signals import post_save, post_delete
+
+
+__all__ = [
+    'cached',
+    'get_version',
+    'bump_version',
+    'invalidate_on',
+    'cache_stats',
+]
+
+
+P = ParamSpec('P')
+T = TypeVar('T')
+
+_VERSION_PREFIX = 'cache-version:'
+_MISSING = object()
+
+_stats: dict[str, Counter[str]] = {}
+_stats_lock = threading.Lock()
+
+
+def _new_version() -> int:
+    return time.time_ns() // 1000
+
+
+def get_version(version_key: str) -> int:
+    '''当前版本号，不存在时初始化'''
+    return cache.get_or_set(_VERSION_PREFIX + version_key, _new_version, timeout=None)
+
+
+def bump_version(version_key: str) -> None:
+    '''递增版本号，使旧版本的缓存结果失效'''
+    key = _VERSION_PREFIX + version_key
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), timeout=None)
+
+
+def invalidate_on(version_key: str, *models: type[Model]) -> None:
+    '''
+    模型保存或删除后递增版本，不处理QuerySet.update和bulk_create等不发送信号的操作
+
+    事务中修改时，提交前其它进程可能以旧数据重新计算并缓存，因此提交后再递增一次
+    '''
+    def receiver(sender, **kwargs):
+        bump_version(version_key)
+        transaction.on_commit(lambda: bump_version(version_key))
+
+    for model in models:
+        uid = f'{version_key}:{model._meta.label}'
+        post_save.connect(receiver, sender=model, weak=False, dispatch_uid=uid)
+        post_delete.connect(receiver, sender=model, weak=False, dispatch_uid=uid)
+
+
+def _record(name: str, event: str) -> None:
+    with _stats_lock:
+        _stats.setdefault(name, Counter())[event] += 1
+
+
+def cache_stats() -> dict[str, dict[str, int]]:
+    '''本进程中各缓存函数的命中和未命中次数'''
+    with _stats_lock:
+        return {name: dict(hit=counter['hit'], miss=counter['miss'])
+                for name, counter in sorted(_stats.items())}
+
+
+def cached(key: str, ttl: int | None = 300, version_key: str | None = None):
+    '''
+    按参数缓存函数结果，参数应能转为JSON或有稳定的字符串表示，函数抛出异常时不缓存
+
+    :param key: 缓存键的前缀，同时作为统计的名称
+    :type key: str
+    :param ttl: 过期时间（秒），None表示不过期, defaults to 300
+    :type ttl: int | None, optional
+    :param version_key: 版本名，递增该版本后已缓存的结果失效, defaults to None
+    :type version_key: str | None, optional
+    '''
+    def actual_decorator(func: Callable[P, T]) -> Callable[P, T]:
+        @wraps(func)
+        def _wrapped(*args: P.args, **kwargs: P.kwargs) -> T:
+            digest = hashlib.md5(json.dumps(
+                [args, kwargs], sort_keys=True, ensure_ascii=False, default=str,
+            ).encode()).hexdigest()
+            version = get_version(version_key) if version_key is not None else 0
+            cache_key = f'{key}:{version}:{digest}'
+            value: Any = cache.get(cache_key, _MISSING)
+            if value is not _MISSING:
+                _record(key, 'hit')
+                return value
+            _record(key, 'miss')
+            value = func(*args, **kwargs)
+            cache.set(cache_key, value, ttl)
+            return value
+        return _wrapped
+    return actual_decorator
+
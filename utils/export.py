@@ -0,0 +1,172 @@
+'''
+export.py
+
+流式写入表格文件，内存占用与行数无关
+
+- `XlsxWriter`: 使用openpyxl的只写模式，每个工作表逐行写入临时文件
+- `CsvWriter`: 每个工作表写入单独的CSV文件，可选gzip压缩
+- 两者接口相同，均可作为上下文管理器使用::
+
+    with XlsxWriter('a.xlsx') as writer:
+        writer.write_sheet('sheet', ['列1', '列2'], rows)
+
+- `xlsx_response`: 将工作表写入临时文件，作为下载回应返回
+'''
+import csv
+import gzip
+from tempfile import SpooledTemporaryFile
+from typing import IO, Any, Iterable, Sequence, TypeAlias
+
+from openpyxl import Workbook
+from django.http import FileResponse
+
+
+__all__ = [
+    'Sheet',
+    'TableWriter',
+    'XlsxWriter',
+    'CsvWriter',
+    'get_writer',
+    'write_xlsx',
+    'xlsx_response',
+]
+
+
+# 工作表名称、表头和逐行数据
+Sheet: TypeAlias = tuple[str, Sequence[str], Iterable[Sequence[Any]]]
+
+
+class TableWriter:
+    '''表格写入器的基类'''
+    suffix: str = ''
+
+    def write_sheet(self, title: str, columns: Sequence[str],
+                    rows: Iterable[Sequence[Any]]) -> int:
+        '''写入一个工作表，返回写入的行数（不含表头）'''
+        raise NotImplementedError
+
+    def close(self) -> None:
+        '''完成写入'''
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+class XlsxWriter(TableWriter):
+    '''写入xlsx文件，工作表以只写模式创建，写入后无法再读取'''
+    suffix = '.xlsx'
+
+    # Excel对工作表名称的限制
+    _TITLE_MAX_LENGTH = 31
+    _TITLE_INVALID_CHARS = str.maketrans({c: '_' for c in '\\/*?:[]'})
+
+    def __init__(self, file: str | IO[bytes]):
+        '''
+        Args:
+            file (str | IO[bytes]): 文件路径或可写的二进制文件对象
+        '''
+        self.file = file
+        self.workbook = Workbook(write_only=True)
+
+    def write_sheet(self, title: str, columns: Sequence[str],
+                    rows: Iterable[Sequence[Any]]) -> int:
+        title = title.translate(self._TITLE_INVALID_CHARS)
+        sheet = self.workbook.create_sheet(title[:self._TITLE_MAX_LENGTH])
+        sheet.append(list(columns))
+        count = 0
+        for row in rows:
+            sheet.append(list(row))
+            count += 1
+        return count
+
+    def close(self) -> None:
+        if not self.workbook.worksheets:
+            # 空工作簿无法保存
+            self.workbook.create_sheet()
+        self.workbook.save(self.file)
+
+
+class CsvWriter(TableWriter):
+    '''写入CSV文件，每个工作表对应`{前缀}_{工作表}.csv`，使用带BOM的UTF-8以兼容Excel'''
+    suffix = '.csv'
+
+    def __init__(self, prefix: str, compress: bool = False):
+        '''
+        Args:
+            prefix (str): 文件路径的前缀，不含后缀
+            compress (bool, optional): 是否使用gzip压缩，压缩后后缀为.csv.gz
+        '''
+        self.prefix = prefix
+        self.compress = compress
+        self.paths: list[str] = []
+
+    def _open(self, path: str) -> IO[str]:
+        if self.compress:
+            return gzip.open(path, 'wt', encoding='utf-8-sig', newline='')
+        return open(path, 'w', encoding='utf-8-sig', newline='')
+
+    def write_sheet(self, title: str, columns: Sequence[str],
+                    rows: Iterable[Sequence[Any]]) -> int:
+        path = f'{self.prefix}_{title}{self.suffix}'
+        if self.compress:
+            path += '.gz'
+        count = 0
+        with self._open(path) as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+        self.paths.append(path)
+        return count
+
+
+def get_writer(path: str, format: str) -> TableWriter:
+    '''
+    根据格式获取写入器
+
+    Args:
+        path (str): xlsx为文件路径，CSV为文件前缀，后缀会被忽略
+        format (str): xlsx, csv或csv.gz
+
+    Raises:
+        ValueError: 不支持的格式
+    '''
+    prefix = path
+    for suffix in ['.gz', '.csv', '.xlsx', '.xls']:
+        prefix = prefix.removesuffix(suffix)
+    if format == 'xlsx':
+        return XlsxWriter(prefix + XlsxWriter.suffix)
+    if format == 'csv':
+        return CsvWriter(prefix)
+    if format == 'csv.gz':
+        return CsvWriter(prefix, compress=True)
+    raise ValueError(f'不支持的导出格式：{format}')
+
+
+def write_xlsx(file: str | IO[bytes], sheets: Iterable[Sheet]) -> None:
+    '''依次写入工作表并保存xlsx文件'''
+    with XlsxWriter(file) as writer:
+        for title, columns, rows in sheets:
+            writer.write_sheet(title, columns, rows)
+
+
+# 临时文件超过该大小时才写入磁盘
+SPOOL_MAX_SIZE = 4 * 1024 * 1024
+
+
+def xlsx_response(file_name: str, sheets: Iterable[Sheet]) -> FileResponse:
+    '''
+    返回xlsx文件的下载回应，文件内容在临时文件中生成，回应按块读取发送
+
+    Args:
+        file_name (str): 未转义的文件名，不含后缀
+        sheets (Iterable[Sheet]): 依次写入的工作表
+    '''
+    file = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    write_xlsx(file, sheets)
+    file.seek(0)
+    return FileResponse(file, as_attachment=True, filename=f'{file_name}.xlsx')
@@ -7,6 +7,9 @@ class LibraryConfig(Config):
     organization_name = LazySetting('organization_name', type=str)
     start_time = LazySetting('open_time_start', type=str)
     end_time = LazySetting('open_time_end', type=str)
+    # 书籍检索每页的数量和结果缓存的秒数
+    search_page_size = LazySetting('search/page_size', lambda x: max(1, x), default=20)
+    search_cache_timeout = LazySetting('search/cache_timeout', int, default=300)
 
     
 library_config = LibraryConfig(ROOT_CONFIG, 'library')
@@ -0,0 +1,85 @@
+import os
+import random
+from time import perf_counter
+from datetime import datetime, timedelta
+from tempfile import TemporaryDirectory
+
+from django.db import transaction
+from django.core.management.base import BaseCommand, CommandParser
+
+from yp_library.sync import (
+    SQLiteSource,
+    sync_readers,
+    sync_books,
+    sync_records,
+    sync_book_status,
+)
+
+
+class Command(BaseCommand):
+    help = '使用随机生成的SQLite书房数据测试同步的耗时，本地数据不会保留'
+
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument('--readers', type=int, default=5000, help='读者数，默认5000')
+        parser.add_argument('--books', type=int, default=20000, help='书籍数，默认20000')
+        parser.add_argument('--records', type=int, default=50000,
+                            help='借阅记录数，默认50000')
+        parser.add_argument('--seed', type=int, default=0, help='随机种子')
+
+    def fill(self, source: SQLiteSource, options) -> None:
+        rng = random.Random(options['seed'])
+        readers, books = options['readers'], options['books']
+        source.create_tables()
+        source.insert('Readers', ({
+            'ID': i, 'IDCardNo': f'{2000000000 + i}',
+        } for i in range(1, readers + 1)))
+        source.insert('CircMarc', ({
+            'MarcID': i, 'Title': f'书{i}', 'Author': f'作者{i % 100}',
+            'Publisher': f'出版社{i % 10}', 'ReqNo': f'I{i}',
+        } for i in range(1, books + 1)))
+        source.insert('Items', ({
+            'BarCode': f'2110{i % 100:02d}ZW{i:06d}', 'MarcID': i,
+        } for i in range(1, books + 1)))
+        start = datetime.now() - timedelta(days=365)
+        rows = []
+        for i in range(1, options['records'] + 1):
+            lend_time = start + timedelta(minutes=10 * i)
+            returned = rng.random() < 0.9
+            book = rng.randint(1, books)
+            rows.append({
+                'ID': i, 'ReaderID': rng.randint(1, readers),
+                'BarCode': f'2110{book % 100:02d}ZW{book:06d}',
+                'LendTM': lend_time, 'DueTm': lend_time + timedelta(days=30),
+                'IsReturn': int(returned),
+                'ReturnTime': lend_time + timedelta(days=7) if returned else None,
+            })
+        source.insert('LendHist', rows)
+
+    def run_sync(self, source: SQLiteSource, label: str) -> None:
+        for name, sync in [('读者', sync_readers), ('书籍', sync_books),
+                           ('借阅记录', sync_records)]:
+            start = perf_counter()
+            result = sync(source)
+            elapsed = perf_counter() - start
+            self.stdout.write(
+                f'{label}{name}：用时{elapsed:.2f}s，新增{result.created}，'
+                f'更新{result.updated}，删除{result.deleted}')
+        start = perf_counter()
+        count = sync_book_status(datetime.now() - timedelta(days=1))
+        self.stdout.write(
+            f'{label}书籍状态：用时{perf_counter() - start:.2f}s，更新{count}')
+
+    def handle(self, *args, **options):
+        with TemporaryDirectory() as tmpdir:
+            with SQLiteSource(os.path.join(tmpdir, 'library.sqlite3')) as source:
+                self.fill(source, options)
+                with transaction.atomic():
+                    self.run_sync(source, '首次同步')
+                    # 模拟一小时内的变化：新的借阅和归还
+                    source.conn.execute(
+                        'UPDATE LendHist SET IsReturn=1, ReturnTime=? '
+                        'WHERE IsReturn=0 AND ID % 10 = 0', (datetime.now(),))
+                    source.conn.commit()
+                    self.run_sync(source, '增量同步')
+                    # 测试数据全部回滚
+                    transaction.set_rollback(True)
@@ -1,11 +1,19 @@
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandParser
 
 from yp_library.jobs import update_lib_data
+from yp_library.sync import SQLiteSource
 
 
 
 class Command(BaseCommand):
     help = '同步书房信息'
 
+    def add_arguments(self, parser: CommandParser):
+        parser.add_argument('--sqlite', type=str, default=None,
+                            help='从结构相同的SQLite数据库同步，默认使用书房数据库')
+
     def handle(self, *args, **options):
-        update_lib_data()
+        source = None
+        if options['sqlite'] is not None:
+            source = SQLiteSource(options['sqlite'])
+        update_lib_data(source)
@@ -0,0 +1,88 @@
+# Generated by Django 4.2.30 on 2026-10-19 15:47
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+# 与Book.get_search_text一致
+def _search_text(book) -> str:
+    fields = [book.title, book.author, book.publisher, book.identity_code]
+    return '\n'.join(unicodedata.normalize('NFKC', field or '').casefold()
+                     for field in fields)
+
+
+def fill_search_text(apps, schema_editor):
+    Book = apps.get_model('yp_library', 'Book')
+    books = []
+    for book in Book.objects.iterator(chunk_size=2000):
+        book.search_text = _search_text(book)
+        books.append(book)
+        if len(books) >= 2000:
+            Book.objects.bulk_update(books, ['search_text'])
+            books = []
+    Book.objects.bulk_update(books, ['search_text'])
+
+
+# SQLite使用FTS5的trigram分词，由触发器与书籍表保持一致
+SQLITE_CREATE = [
+    '''CREATE VIRTUAL TABLE yp_library_book_fts USING fts5(
+        search_text, content='yp_library_book', content_rowid='id', tokenize='trigram')''',
+    '''CREATE TRIGGER yp_library_book_fts_insert AFTER INSERT ON yp_library_book BEGIN
+        INSERT INTO yp_library_book_fts(rowid, search_text) VALUES (new.id, new.search_text);
+    END''',
+    '''CREATE TRIGGER yp_library_book_fts_delete AFTER DELETE ON yp_library_book BEGIN
+        INSERT INTO yp_library_book_fts(yp_library_book_fts, rowid, search_text)
+        VALUES ('delete', old.id, old.search_text);
+    END''',
+    '''CREATE TRIGGER yp_library_book_fts_update AFTER UPDATE ON yp_library_book BEGIN
+        INSERT INTO yp_library_book_fts(yp_library_book_fts, rowid, search_text)
+        VALUES ('delete', old.id, old.search_text);
+        INSERT INTO yp_library_book_fts(rowid, search_text) VALUES (new.id, new.search_text);
+    END''',
+    "INSERT INTO yp_library_book_fts(yp_library_book_fts) VALUES ('rebuild')",
+]
+SQLITE_DROP = [
+    'DROP TRIGGER IF EXISTS yp_library_book_fts_insert',
+    'DROP TRIGGER IF EXISTS yp_library_book_fts_delete',
+    'DROP TRIGGER IF EXISTS yp_library_book_fts_update',
+    'DROP TABLE IF EXISTS yp_library_book_fts',
+]
+# MySQL使用ngram分词的全文索引，以支持中文
+MYSQL_CREATE = [
+    '''ALTER TABLE yp_library_book
+        ADD FULLTEXT INDEX yp_library_book_search (search_text) WITH PARSER ngram''',
+]
+MYSQL_DROP = [
+    'ALTER TABLE yp_library_book DROP INDEX yp_library_book_search',
+]
+
+
+def _execute(schema_editor, statements: dict[str, list[str]]):
+    for sql in statements.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def create_search_index(apps, schema_editor):
+    _execute(schema_editor, {'sqlite': SQLITE_CREATE, 'mysql': MYSQL_CREATE})
+
+
+def drop_search_index(apps, schema_editor):
+    _execute(schema_editor, {'sqlite': SQLITE_DROP, 'mysql': MYSQL_DROP})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('yp_library', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='检索文本'),
+        ),
+        migrations.RunPython(fill_search_text, migrations.RunPython.noop),
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 4.2.30 on 2026-10-19 17:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('yp_library', '0002_book_search'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchVersion',
+            fields=[
+                ('id', models.PositiveSmallIntegerField(default=1, primary_key=True, serialize=False)),
+                ('version', models.PositiveIntegerField(default=0, verbose_name='版本')),
+            ],
+            options={
+                'verbose_name': '检索缓存版本',
+                'verbose_name_plural': '检索缓存版本',
+            },
+        ),
+    ]
@@ -1,3 +1,5 @@
+import unicodedata
+
 from django.db import models
 from django.contrib import admin
 from generic.models import User
@@ -7,6 +9,7 @@ __all__ = [
     "Reader",
     "Book",
     "LendRecord",
+    "SearchVersion",
 ]
 
 
@@ -36,10 +39,28 @@ class Book(models.Model):
     author = models.CharField("作者", max_length=254, blank=True, null=True)
     publisher = models.CharField("出版商", max_length=254, blank=True, null=True)
     returned = models.BooleanField("是否已还", default=True)
+    # 书名、作者、出版商和索书号的规范化文本，用于全文检索，参见yp_library.search
+    search_text = models.TextField("检索文本", blank=True, default='', editable=False)
 
     def __str__(self):
         return str(self.title)
 
+    @staticmethod
+    def normalize(text: str) -> str:
+        '''统一全角半角和大小写'''
+        return unicodedata.normalize('NFKC', text).casefold()
+
+    def get_search_text(self) -> str:
+        fields = [self.title, self.author, self.publisher, self.identity_code]
+        return '\n'.join(self.normalize(field or '') for field in fields)
+
+    def save(self, *args, **kwargs):
+        self.search_text = self.get_search_text()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'search_text' not in update_fields:
+            kwargs['update_fields'] = [*update_fields, 'search_text']
+        super().save(*args, **kwargs)
+
 
 class LendRecord(models.Model):
     class Meta:
@@ -86,3 +107,17 @@ class LendRecord(models.Model):
             return self.book_id.title
         else:
             return "未知"
+
+
+class SearchVersion(models.Model):
+    '''
+    书籍检索缓存的版本，书房数据同步后递增
+
+    版本保存在数据库中，同步任务和各网页进程看到的版本一致，不依赖缓存在进程间共享
+    '''
+    class Meta:
+        verbose_name = "检索缓存版本"
+        verbose_name_plural = verbose_name
+
+    id = models.PositiveSmallIntegerField(primary_key=True, default=1)
+    version = models.PositiveIntegerField("版本", default=0)
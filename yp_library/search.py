@@ -0,0 +1,167 @@
+"""
+search.py
+
+书籍检索
+
+- 关键词在`Book.search_text`上检索，多个关键词以空格分隔，须同时包含
+- 全文索引用于缩小范围：SQLite使用FTS5的trigram分词，MySQL使用ngram分词的FULLTEXT索引，
+  关键词短于分词长度或其它数据库时退化为逐行匹配，索引见迁移0002_book_search
+- 结果按相关度排序：书名完全相同、书名开头、书名包含、作者包含，相同时按编号排序
+- 分页使用游标，热门查询的结果短时间缓存，书房数据同步后缓存失效，
+  缓存版本保存在数据库中，缓存后端不在进程间共享时也能失效
+"""
+import json
+import hashlib
+from typing import Any
+
+from django.db import connection
+from django.db.models import F, Q, QuerySet, Case, When, Value, IntegerField
+from django.db.models.expressions import RawSQL
+from django.core.cache import cache
+
+from yp_library.models import Book, SearchVersion
+from yp_library.config import library_config as CONFIG
+
+
+__all__ = [
+    'search_queryset',
+    'search_page',
+    'search_count',
+    'clear_search_cache',
+]
+
+
+# 各数据库全文索引分词的长度，更短的关键词无法使用索引
+_TOKEN_SIZE = {'sqlite': 3, 'mysql': 2}
+
+
+def _split_keywords(keywords: str) -> list[str]:
+    return Book.normalize(keywords).split()
+
+
+def _fulltext_filter(queryset: QuerySet[Book], keyword: str) -> QuerySet[Book]:
+    '''使用全文索引缩小范围，不保证结果都包含关键词'''
+    vendor = connection.vendor
+    if len(keyword) < _TOKEN_SIZE.get(vendor, len(keyword) + 1):
+        return queryset
+    phrase = '"{}"'.format(keyword.replace('"', '""' if vendor == 'sqlite' else ' '))
+    if vendor == 'sqlite':
+        return queryset.filter(id__in=RawSQL(
+            'SELECT rowid FROM yp_library_book_fts WHERE yp_library_book_fts MATCH %s',
+            [phrase]))
+    return queryset.filter(id__in=RawSQL(
+        'SELECT id FROM yp_library_book '
+        'WHERE MATCH(search_text) AGAINST (%s IN BOOLEAN MODE)', [phrase]))
+
+
+def _relevance(keywords: str) -> Case:
+    return Case(
+        When(title__iexact=keywords, then=Value(4)),
+        When(title__istartswith=keywords, then=Value(3)),
+        When(title__icontains=keywords, then=Value(2)),
+        When(author__icontains=keywords, then=Value(1)),
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def search_queryset(**query_dict) -> QuerySet[Book]:
+    '''
+    根据给定的属性查询书，按相关度和编号排序，相关度为rank字段
+
+    :param query_dict: 参数见`yp_library.utils.search_books`
+    :type query_dict: dict
+    :return: 查询结果
+    :rtype: QuerySet[Book]
+    '''
+    query = Q()
+    if query_dict.get("id", "") != "":
+        query &= Q(id=int(query_dict["id"]))
+    for field in ["identity_code", "title", "author", "publisher"]:
+        if query_dict.get(field, "") != "":
+            query &= Q(**{f'{field}__contains': query_dict[field]})
+    if query_dict.get("returned", "") != "":
+        query &= Q(returned=query_dict["returned"])
+    books = Book.objects.filter(query)
+
+    keywords = query_dict.get("keywords", "").strip()
+    for keyword in _split_keywords(keywords):
+        books = _fulltext_filter(books, keyword).filter(search_text__contains=keyword)
+    if keywords:
+        books = books.annotate(rank=_relevance(keywords))
+    else:
+        books = books.annotate(rank=Value(0, output_field=IntegerField()))
+    return books.order_by('-rank', 'id')
+
+
+def _decode_cursor(cursor: str) -> tuple[int, int]:
+    try:
+        rank, id = map(int, cursor.split('_'))
+    except (AttributeError, ValueError):
+        raise ValueError(f'非法的游标：{cursor}')
+    return rank, id
+
+
+def _search_version() -> int:
+    return SearchVersion.objects.filter(id=1).values_list(
+        'version', flat=True).first() or 0
+
+
+def _cache_key(kind: str, *args) -> str:
+    version = _search_version()
+    digest = hashlib.md5(json.dumps(
+        args, sort_keys=True, ensure_ascii=False, default=str).encode()).hexdigest()
+    return f'yp_library:search:{kind}:{version}:{digest}'
+
+
+def search_page(query_dict: dict[str, Any], cursor: str | None = None,
+                page_size: int | None = None) -> tuple[list[dict], str | None]:
+    '''
+    分页查询书籍
+
+    :param query_dict: 参数见`yp_library.utils.search_books`
+    :type query_dict: dict[str, Any]
+    :param cursor: 上一页返回的游标，为None时返回第一页
+    :type cursor: str | None, optional
+    :param page_size: 每页的数量，默认为配置值
+    :type page_size: int | None, optional
+    :raises ValueError: 游标无法解析
+    :return: 本页书籍的字段字典，和下一页的游标，没有下一页时为None
+    :rtype: tuple[list[dict], str | None]
+    '''
+    page_size = page_size or CONFIG.search_page_size
+    key = _cache_key('page', query_dict, cursor, page_size)
+    cached = cache.get(key)
+    if cached is not None:
+        return cached
+
+    books = search_queryset(**query_dict)
+    if cursor is not None:
+        rank, id = _decode_cursor(cursor)
+        books = books.filter(Q(rank__lt=rank) | Q(rank=rank, id__gt=id))
+    page = list(books.values(
+        'id', 'identity_code', 'title', 'author', 'publisher', 'returned', 'rank',
+    )[:page_size + 1])
+    next_cursor = None
+    if len(page) > page_size:
+        page = page[:page_size]
+        next_cursor = f'{page[-1]["rank"]}_{page[-1]["id"]}'
+    result = page, next_cursor
+    cache.set(key, result, CONFIG.search_cache_timeout)
+    return result
+
+
+def search_count(query_dict: dict[str, Any]) -> int:
+    '''查询结果的总数'''
+    key = _cache_key('count', query_dict)
+    count = cache.get(key)
+    if count is None:
+        count = search_queryset(**query_dict).count()
+        cache.set(key, count, CONFIG.search_cache_timeout)
+    return count
+
+
+def clear_search_cache() -> None:
+    '''书籍信息变化后使缓存的查询结果失效'''
+    if not SearchVersion.objects.filter(id=1).update(version=F('version') + 1):
+        SearchVersion.objects.get_or_create(id=1, defaults=dict(version=1))
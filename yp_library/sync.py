@@ -0,0 +1,292 @@
+"""
+sync.py
+
+从书房的数据库同步读者、书籍和借阅记录
+
+- 数据源按块读取，每块与本地同主键的记录比较，只写入新增和变化的行
+- `MSSQLSource`: 书房的MSSQL数据库，连接信息来自环境变量
+- `SQLiteSource`: 结构相同的SQLite数据库，用于测试和性能评估
+"""
+import os
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Iterable, Iterator
+
+from django.db import models, transaction
+from django.db.models import Exists, Max, OuterRef, Q
+
+from yp_library.models import Reader, Book, LendRecord
+
+
+__all__ = [
+    'LibrarySource', 'MSSQLSource', 'SQLiteSource',
+    'SyncResult', 'sync_table', 'get_barcode_map',
+    'sync_readers', 'sync_books', 'sync_records', 'sync_book_status',
+]
+
+
+# 每次从数据源读取和写入本地的行数
+CHUNK_SIZE = 2000
+# 同步借阅记录时，重新读取本地最晚归还时间之前该时长内归还的记录
+RETURN_MARGIN = timedelta(days=1)
+
+Row = dict[str, Any]
+
+
+class LibrarySource:
+    '''
+    书房数据源，需要作为上下文管理器使用，期间保持同一连接
+
+    查询语句的参数占位符统一为`%s`，由子类转换
+    '''
+    placeholder = '%s'
+
+    def __init__(self):
+        self.conn = None
+
+    def connect(self):
+        raise NotImplementedError
+
+    def cursor(self):
+        return self.conn.cursor()
+
+    def to_dict(self, row) -> Row:
+        return row
+
+    def __enter__(self):
+        self.conn = self.connect()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback) -> None:
+        self.conn.close()
+        self.conn = None
+
+    def fetch(self, sql: str, params: tuple = (),
+              chunk_size: int = CHUNK_SIZE) -> Iterator[list[Row]]:
+        '''执行查询，按块返回以列名为键的行'''
+        cursor = self.cursor()
+        try:
+            cursor.execute(sql.replace('%s', self.placeholder), params)
+            while rows := cursor.fetchmany(chunk_size):
+                yield [self.to_dict(row) for row in rows]
+        finally:
+            cursor.close()
+
+
+class MSSQLSource(LibrarySource):
+    '''书房的MSSQL数据库'''
+    def connect(self):
+        import pymssql
+        return pymssql.connect(server=os.environ["LIB_DB_HOST"],
+                               user=os.environ["LIB_DB_USER"],
+                               password=os.environ["LIB_DB_PASSWORD"],
+                               database=os.environ["LIB_DB"],
+                               login_timeout=5)
+
+    def cursor(self):
+        return self.conn.cursor(as_dict=True)
+
+
+class SQLiteSource(LibrarySource):
+    '''与书房数据库结构相同的SQLite数据库，只包含同步用到的列'''
+    placeholder = '?'
+
+    SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS Readers (
+        ID INTEGER PRIMARY KEY, IDCardNo VARCHAR(30));
+    CREATE TABLE IF NOT EXISTS CircMarc (
+        MarcID INTEGER PRIMARY KEY, Title VARCHAR(500), Author VARCHAR(254),
+        Publisher VARCHAR(254), ReqNo VARCHAR(254));
+    CREATE TABLE IF NOT EXISTS Items (
+        BarCode VARCHAR(20) PRIMARY KEY, MarcID INTEGER);
+    CREATE TABLE IF NOT EXISTS LendHist (
+        ID INTEGER PRIMARY KEY, ReaderID INTEGER, BarCode VARCHAR(20),
+        LendTM TIMESTAMP, DueTm TIMESTAMP, IsReturn INTEGER, ReturnTime TIMESTAMP);
+    CREATE INDEX IF NOT EXISTS LendHist_LendTM ON LendHist (LendTM);
+    '''
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.path = path
+
+    def connect(self):
+        conn = sqlite3.connect(self.path, detect_types=sqlite3.PARSE_DECLTYPES)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def to_dict(self, row: sqlite3.Row) -> Row:
+        return dict(row)
+
+    def create_tables(self) -> None:
+        self.conn.executescript(self.SCHEMA)
+
+    def insert(self, table: str, rows: Iterable[Row]) -> None:
+        '''写入测试数据，各行的列须相同'''
+        rows = list(rows)
+        if not rows:
+            return
+        columns = list(rows[0])
+        self.conn.executemany(
+            f'INSERT OR REPLACE INTO {table} ({",".join(columns)}) '
+            f'VALUES ({",".join("?" * len(columns))})',
+            [tuple(row[column] for column in columns) for row in rows])
+        self.conn.commit()
+
+
+@dataclass
+class SyncResult:
+    created: int = 0
+    updated: int = 0
+    deleted: int = 0
+
+
+def sync_table(model: type[models.Model], chunks: Iterable[list[models.Model]],
+               fields: list[str], *, delete: bool = False) -> SyncResult:
+    '''
+    将数据源的各块记录同步到本地，按主键比较
+
+    :param model: 本地模型
+    :type model: type[models.Model]
+    :param chunks: 逐块的未保存模型实例，主键须与本地一致
+    :type chunks: Iterable[list[models.Model]]
+    :param fields: 需要同步的字段名，其它字段在更新时保持不变
+    :type fields: list[str]
+    :param delete: 是否删除数据源中不存在的本地记录，要求数据源提供全部记录
+    :type delete: bool, optional
+    :return: 新增、更新和删除的行数
+    :rtype: SyncResult
+    '''
+    result = SyncResult()
+    attnames = [model._meta.get_field(field).attname for field in fields]
+    seen: set = set()
+    for chunk in chunks:
+        local = model.objects.only(*fields).in_bulk([obj.pk for obj in chunk])
+        created, updated = [], []
+        for obj in chunk:
+            old = local.get(obj.pk)
+            if old is None:
+                created.append(obj)
+                continue
+            changed = False
+            for attname in attnames:
+                value = getattr(obj, attname)
+                if getattr(old, attname) != value:
+                    setattr(old, attname, value)
+                    changed = True
+            if changed:
+                updated.append(old)
+        if delete:
+            seen.update(local)
+            seen.update(obj.pk for obj in created)
+        model.objects.bulk_create(created, batch_size=CHUNK_SIZE)
+        model.objects.bulk_update(updated, fields, batch_size=CHUNK_SIZE)
+        result.created += len(created)
+        result.updated += len(updated)
+    if delete:
+        stale = [pk for pk in model.objects.values_list('pk', flat=True).iterator()
+                 if pk not in seen]
+        for i in range(0, len(stale), CHUNK_SIZE):
+            model.objects.filter(pk__in=stale[i:i + CHUNK_SIZE]).delete()
+        result.deleted = len(stale)
+    return result
+
+
+def sync_readers(source: LibrarySource) -> SyncResult:
+    '''同步读者信息，书房的读者不会删除，本地也不删除以保留借阅记录'''
+    # 存在空缺的数据较多，暂时比较全部读者，待书房的数据修订完成后，可以只考虑新增数据
+    chunks = ([Reader(id=row['ID'], student_id=row['IDCardNo']) for row in rows]
+              for rows in source.fetch('SELECT ID,IDCardNo FROM Readers'))
+    with transaction.atomic():
+        return sync_table(Reader, chunks, ['student_id'])
+
+
+def sync_books(source: LibrarySource) -> SyncResult:
+    '''同步书籍信息，书房删除的书籍在本地也删除，借阅记录的书籍置空'''
+    def _to_books(rows: list[Row]) -> list[Book]:
+        books = []
+        for row in rows:
+            book = Book(
+                id=row['MarcID'],
+                identity_code=row['ReqNo'],
+                title=row['Title'],
+                author=row['Author'],
+                publisher=row['Publisher'],
+            )
+            book.search_text = book.get_search_text()
+            books.append(book)
+        return books
+
+    rows = source.fetch('SELECT MarcID,Title,Author,Publisher,ReqNo FROM CircMarc')
+    with transaction.atomic():
+        return sync_table(
+            Book, map(_to_books, rows),
+            ['identity_code', 'title', 'author', 'publisher', 'search_text'],
+            delete=True)
+
+
+def _barcode_key(barcode: str) -> str:
+    # 形如'211046ZW005377'，最后六位代表书的编号
+    return barcode.strip()[-6:]
+
+
+def get_barcode_map(source: LibrarySource) -> dict[str, int]:
+    '''一次读取全部馆藏，返回书的编号到书籍编号的映射'''
+    barcode_map: dict[str, int] = {}
+    for rows in source.fetch('SELECT BarCode,MarcID FROM Items'):
+        for row in rows:
+            barcode_map.setdefault(_barcode_key(row['BarCode']), row['MarcID'])
+    return barcode_map
+
+
+def sync_records(source: LibrarySource) -> SyncResult:
+    '''
+    同步借阅记录
+
+    只读取本地最新记录之后借出的、仍未归还的，以及本地最晚归还时间前后归还的记录，
+    本地不存在的读者的记录被忽略，借阅记录的状态等本地字段保持不变
+    '''
+    bounds = LendRecord.objects.aggregate(
+        latest=Max('lend_time'), returned=Max('return_time'))
+    latest: datetime = bounds['latest'] or datetime.now() - timedelta(days=3650)
+    # 归还时间可能补录，留出余量
+    since: datetime = (bounds['returned'] or latest) - RETURN_MARGIN
+    barcode_map = get_barcode_map(source)
+    book_ids = set(Book.objects.values_list('id', flat=True))
+    reader_ids = set(Reader.objects.values_list('id', flat=True))
+
+    def _to_records(rows: list[Row]) -> list[LendRecord]:
+        records = []
+        for row in rows:
+            if row['ReaderID'] not in reader_ids:
+                continue
+            book_id = barcode_map.get(_barcode_key(row['BarCode']))
+            records.append(LendRecord(
+                id=row['ID'],
+                reader_id_id=row['ReaderID'],
+                book_id_id=book_id if book_id in book_ids else None,
+                lend_time=row['LendTM'],
+                due_time=row['DueTm'],
+                returned=row['IsReturn'] == 1,
+                return_time=row['ReturnTime'],
+            ))
+        return records
+
+    rows = source.fetch(
+        '''SELECT ID,ReaderID,BarCode,LendTM,DueTm,IsReturn,ReturnTime
+           FROM LendHist
+           WHERE LendTM > %s OR ReturnTime > %s OR IsReturn IS NULL OR IsReturn <> 1''',
+        (latest, since),
+    )
+    with transaction.atomic():
+        return sync_table(
+            LendRecord, map(_to_records, rows),
+            ['reader_id', 'book_id', 'lend_time', 'due_time', 'returned', 'return_time'])
+
+
+def sync_book_status(since: datetime) -> int:
+    '''根据借阅记录更新近期借出或归还的书籍是否在馆，返回更新的书籍数'''
+    recent_books = LendRecord.objects.filter(
+        Q(lend_time__gt=since) | Q(return_time__gt=since)).values('book_id')
+    unreturned = LendRecord.objects.filter(book_id=OuterRef('pk'), returned=False)
+    return Book.objects.filter(id__in=recent_books).update(returned=~Exists(unreturned))
@@ -1,6 +1,7 @@
 from django.test import TestCase
-from yp_library.models import Book, LendRecord, Reader
+from yp_library.models import Book, LendRecord, Reader, SearchVersion
 from yp_library.utils import search_books
+from yp_library.search import search_page, search_count, clear_search_cache
 
 
 class BookSearchTestCase(TestCase):
@@ -53,3 +54,38 @@ class BookSearchTestCase(TestCase):
         self.assertEqual(len(search_books(**query11)), 1)
         self.assertEqual(len(search_books(**query12)), 3)
         self.assertEqual(len(search_books(**query13)), 3)
+
+    def test_fulltext_query(self):
+        '''全文索引与逐行匹配结果一致，且忽略全角半角和大小写'''
+        self.assertEqual(len(search_books(keywords="北京大学出版社")), 2)
+        self.assertEqual(len(search_books(keywords="ＭＡＴＨ－1")), 2)
+        self.assertEqual(len(search_books(keywords="数学 伍胜健")), 2)
+        # 书籍信息修改后索引随之更新
+        book = Book.objects.get(id=4)
+        book.publisher = "北京大学出版社"
+        book.save()
+        self.assertEqual(len(search_books(keywords="北京大学出版社")), 3)
+
+    def test_page(self):
+        '''按相关度排序，游标分页不重不漏，同步后缓存失效'''
+        query = {"keywords": "数"}
+        books, cursor = search_page(query, page_size=100)
+        self.assertIsNone(cursor)
+        self.assertEqual([book["id"] for book in books], [1, 2, 5, 3])
+        pages = []
+        while True:
+            page, cursor = search_page(query, cursor, page_size=1)
+            pages.extend(page)
+            if cursor is None:
+                break
+        self.assertEqual(pages, books)
+        with self.assertRaises(ValueError):
+            search_page(query, "abc")
+
+        Book.objects.filter(id=3).update(title="数")
+        self.assertEqual(search_page(query, page_size=100)[0], books)
+        clear_search_cache()
+        # 版本保存在数据库中，其它进程的缓存同样失效
+        self.assertEqual(SearchVersion.objects.get().version, 1)
+        self.assertEqual(search_page(query, page_size=100)[0][0]["id"], 3)
+        self.assertEqual(search_count(query), 4)
@@ -0,0 +1,68 @@
+import os
+from datetime import datetime, timedelta
+from tempfile import TemporaryDirectory
+
+from django.test import TestCase
+
+from yp_library.models import Book, LendRecord, Reader
+from yp_library.sync import SQLiteSource
+from yp_library.jobs import update_lib_data
+
+
+class LibrarySyncTestCase(TestCase):
+    def setUp(self):
+        self.tmpdir = TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.source = SQLiteSource(os.path.join(self.tmpdir.name, 'lib.sqlite3'))
+        self.lend_time = datetime.now() - timedelta(hours=3)
+        with self.source as source:
+            source.create_tables()
+            source.insert('Readers', [
+                {'ID': 1, 'IDCardNo': '1900010000'},
+                {'ID': 2, 'IDCardNo': None},
+            ])
+            source.insert('CircMarc', [
+                {'MarcID': i, 'Title': f'书{i}', 'Author': 'a',
+                 'Publisher': 'p', 'ReqNo': f'I{i}'} for i in range(1, 4)
+            ])
+            source.insert('Items', [
+                {'BarCode': f' 211046ZW00000{i} ', 'MarcID': i} for i in range(1, 4)
+            ])
+            source.insert('LendHist', [
+                self.lend_row(1, 1, 1, returned=True),
+                self.lend_row(2, 1, 2, returned=False),
+                # 未知读者的记录被忽略
+                self.lend_row(3, 9, 3, returned=False),
+            ])
+
+    def lend_row(self, id: int, reader: int, book: int, returned: bool):
+        return {
+            'ID': id, 'ReaderID': reader, 'BarCode': f'211046ZW00000{book}',
+            'LendTM': self.lend_time, 'DueTm': self.lend_time + timedelta(days=30),
+            'IsReturn': int(returned),
+            'ReturnTime': self.lend_time + timedelta(hours=1) if returned else None,
+        }
+
+    def test_sync(self):
+        update_lib_data(self.source)
+        self.assertEqual(Reader.objects.count(), 2)
+        self.assertEqual(Book.objects.count(), 3)
+        self.assertEqual(list(LendRecord.objects.order_by('id').values_list(
+            'id', 'book_id', 'returned')), [(1, 1, True), (2, 2, False)])
+        self.assertFalse(Book.objects.get(id=2).returned)
+
+        # 归还、修改和删除后再次同步，本地状态字段保持不变
+        LendRecord.objects.filter(id=2).update(status=LendRecord.Status.OVERTIME)
+        with self.source as source:
+            source.conn.execute('UPDATE LendHist SET IsReturn=1, ReturnTime=? WHERE ID=2',
+                                (datetime.now(),))
+            source.conn.execute("UPDATE Readers SET IDCardNo='2000010000' WHERE ID=2")
+            source.conn.execute('DELETE FROM CircMarc WHERE MarcID=3')
+            source.conn.commit()
+        update_lib_data(self.source)
+        self.assertEqual(Reader.objects.get(id=2).student_id, '2000010000')
+        self.assertFalse(Book.objects.filter(id=3).exists())
+        record = LendRecord.objects.get(id=2)
+        self.assertTrue(record.returned)
+        self.assertEqual(record.status, LendRecord.Status.OVERTIME)
+        self.assertTrue(Book.objects.get(id=2).returned)
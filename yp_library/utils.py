@@ -15,6 +15,7 @@ from yp_library.models import (
     LendRecord,
 )
 from yp_library.config import library_config as CONFIG
+from yp_library.search import search_queryset
 from achievement.models import AchievementUnlock, Achievement
 
 __all__ = [
@@ -118,42 +119,20 @@ def search_books(**query_dict) -> QuerySet[Book]:
 
     :param query_dict: key为id/identity_code/title/author/publisher/returned, value为相应的query
         id和returned是精确查询，剩下四个是string按contains查询
-        特别地，还支持全关键词查询：同时在identity_code/title/author/publisher中检索word
+        特别地，还支持全关键词查询：同时在identity_code/title/author/publisher中检索word，
+        多个关键词以空格分隔，结果按相关度排序，见`yp_library.search`
     :type query_dict: dict
     :return: 查询结果，每个记录是Book表的一行
     :rtype: QuerySet[Book]
     """
-    query = Q()
-    if query_dict.get("id", "") != "":
-        query &= Q(id=int(query_dict["id"]))
-    if query_dict.get("identity_code", "") != "":
-        query &= Q(identity_code__contains=query_dict["identity_code"])
-    if query_dict.get("title", "") != "":
-        query &= Q(title__contains=query_dict["title"])
-    if query_dict.get("author", "") != "":
-        query &= Q(author__contains=query_dict["author"])
-    if query_dict.get("publisher", "") != "":
-        query &= Q(publisher__contains=query_dict["publisher"])
-    if query_dict.get("returned", "") != "":
-        query &= Q(returned=query_dict["returned"])
-
-    if query_dict.get("keywords", "") != "":
-        kw_query = (Q(title__contains=query_dict["keywords"]) |
-                    Q(author__contains=query_dict["keywords"]) |
-                    Q(publisher__contains=query_dict["keywords"]) |
-                    Q(identity_code__contains=query_dict["keywords"]))
-        query &= kw_query
-
-    search_results = Book.objects.filter(query).values()
-    # TODO: Return type doesn't match
-    return search_results
+    return search_queryset(**query_dict).values()
 
 
 def get_query_dict(post_dict: QueryDict) -> Dict[str, Any]:
     """
-    从HttpRequest的POST中提取出用作search_books参数的query_dict
+    从HttpRequest的POST或GET中提取出用作search_books参数的query_dict
 
-    :param post_dict: request.POST
+    :param post_dict: request.POST或request.GET
     :type post_dict: QueryDict
     :return: 一个词典，key为id/identity_code/title/author/publisher/returned/keywords, value为相应的query
     :rtype: dict
@@ -175,7 +154,7 @@ def get_query_dict(post_dict: QueryDict) -> Dict[str, Any]:
         query_dict["returned"] = True
 
     # 全关键词检索
-    query_dict["keywords"] = post_dict["keywords"]
+    query_dict["keywords"] = post_dict.get("keywords", "")
 
     return query_dict
 
@@ -1,13 +1,17 @@
+from urllib.parse import urlencode
+
+from django.http import QueryDict
+
 from app.views_dependency import ProfileTemplateView
-from utils.global_messages import transfer_message_context
+from utils.global_messages import transfer_message_context, wrong
 from yp_library.utils import (
     get_readers_by_user,
-    search_books,
     get_query_dict,
     get_lendinfo_by_readers,
     get_library_activity,
     get_recommended_or_newest_books,
 )
+from yp_library.search import search_page, search_count
 from yp_library.config import library_config as CONFIG
 from achievement.api import unlock_achievement
 
@@ -62,11 +66,32 @@ class SearchView(ProfileTemplateView):
     def get(self):
         transfer_message_context(self.request.GET, self.extra_context,
                                  normalize=True)
+        if "keywords" in self.request.GET:
+            # 翻页时查询条件和游标在GET参数中
+            self.search(self.request.GET, self.request.GET.get("cursor"))
         return self.render()
 
     def post(self):
-        self.extra_context.update({
-            "search_results_list": search_books(**get_query_dict(self.request.POST)),
-        })
+        self.search(self.request.POST)
         unlock_achievement(self.request.user, "使用一次元培书房查询") # 解锁成就-使用一次元培书房查询
         return self.render()
+
+    def search(self, params: QueryDict, cursor: str | None = None):
+        query_dict = get_query_dict(params)
+        try:
+            books, next_cursor = search_page(query_dict, cursor)
+        except ValueError:
+            wrong("页码错误，已返回第一页", self.extra_context)
+            books, next_cursor = search_page(query_dict)
+            cursor = None
+        # 下一页和第一页的链接参数
+        base_query = {"keywords": query_dict["keywords"]}
+        if query_dict.get("returned"):
+            base_query["returned"] = "on"
+        self.extra_context.update({
+            "search_results_list": books,
+            "search_count": search_count(query_dict),
+            "first_page_query": urlencode(base_query) if cursor is not None else None,
+            "next_page_query": (urlencode(base_query | {"cursor": next_cursor})
+                                if next_cursor is not None else None),
+        })